@@ -1,5 +1,15 @@
 from __future__ import annotations
 
-from tprof.api import tprof
+from tprof.api import region, set_tag, start_region, stop_region, tprof
+from tprof.armed import arm
+from tprof.counts import count_calls
 
-__all__ = ("tprof",)
+__all__ = (
+    "arm",
+    "count_calls",
+    "region",
+    "set_tag",
+    "start_region",
+    "stop_region",
+    "tprof",
+)
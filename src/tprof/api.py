@@ -1,22 +1,130 @@
 from __future__ import annotations
 
+import csv
+import gc
 import json
+import os
+import re
 import sys
-from collections.abc import Generator
+import threading
+from collections.abc import Callable, Generator, Hashable
 from contextlib import contextmanager
+from contextvars import ContextVar
+from math import log
 from pkgutil import resolve_name
 from types import CodeType
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from rich.console import Console
-from rich.table import Table
+from tprof import record
+from tprof.record import Region
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from tprof.auto import Discovery
+    from tprof.slow import SlowCall, SlowRecorder
+
+region = Region
+start_region = record.start_region
+stop_region = record.stop_region
+
+# Code object flags, as in the inspect module, which is slow to import.
+CO_VARARGS = 0x04
+CO_VARKEYWORDS = 0x08
 
 TOOL_ID = sys.monitoring.PROFILER_ID
 TOOL_NAME = "tprof"
 
-console = Console(stderr=True)
+# Maximum number of calls each thread keeps for a timeline trace. Once full,
+# the oldest calls are overwritten.
+TRACE_LIMIT = 1_000_000
+
+# How far above the steady-state median a window of early calls' median must
+# be to count as warmup, as a fraction.
+WARMUP_TOLERANCE = 0.25
+
+# Clocks that can time calls, where available: the clock behind
+# time.perf_counter_ns(), Linux’s CLOCK_MONOTONIC_RAW, and the x86-64 TSC.
+CLOCKS = ("perf_counter", "monotonic_raw", "tsc")
+
+# Report formats: a Rich table for terminals, the same table as plain text
+# without Rich, comma- or tab-separated values for log aggregation, or no
+# report, such as when only writing JSON.
+REPORT_FORMATS = ("rich", "plain", "csv", "tsv", "none")
+
+# Deltas with p-values at or above this, where known, aren't significant, so
+# are dimmed in the report.
+SIGNIFICANCE_LEVEL = 0.05
+
+# Tag indexes from record.tag_stats() for untagged calls, and calls beyond the
+# limit of distinct tag values, with the names they're reported under.
+NO_TAG = -1
+OTHER_TAG = -2
+UNTAGGED = "<untagged>"
+OTHER_TAGS = "<other>"
+
+# Maximum number of tags shown per target in the report, by total time. JSON
+# output includes them all.
+TAG_DISPLAY_LIMIT = 20
+
+# The value set by set_tag(), which tags target calls with tprof(tag=True).
+default_tag_var: ContextVar[Hashable] = ContextVar("tprof_tag")
+
+# Rich is slow to import, so the console is created on first use, by
+# _console(). Until then this is None.
+console: Console | None = None
+
+# Markup tags used in reports, for the plain format to strip.
+MARKUP_RE = re.compile(
+    r"\[/?(?:bold )?(?:bold|dim|red|yellow|cyan|magenta|bright_(?:blue|green|red))\]"
+)
+
+# Targets are code objects, regions, or callables without code objects, such
+# as builtins, which are matched by identity in CALL events.
+Target = CodeType | Region | Callable[..., Any]
+
+code_to_name: dict[Target, str] = {}
+code_to_size_arg: dict[Target, str] = {}
+
+
+class SizeBucket:
+    """
+    Statistics for calls whose size argument has the given bit length, so a
+    length in [2 ** (bits - 1), 2 ** bits), or zero when bits is zero.
+    """
+
+    __slots__ = ("bits", "calls", "median_size", "median_ns")
+
+    def __init__(
+        self, bits: int, calls: int, median_size: float, median_ns: float
+    ) -> None:
+        self.bits = bits
+        self.calls = calls
+        self.median_size = median_size
+        self.median_ns = median_ns
+
+    @property
+    def min_size(self) -> int:
+        return 1 << (self.bits - 1) if self.bits else 0
+
+    @property
+    def max_size(self) -> int:
+        return (1 << self.bits) - 1
 
-code_to_name: dict[CodeType, str] = {}
+
+class TagStats:
+    """
+    Statistics for calls made with one tag value, named by the value itself
+    if it's a string, or its repr() otherwise.
+    """
+
+    __slots__ = ("tag", "calls", "total_ns", "median_ns")
+
+    def __init__(self, tag: str, calls: int, total_ns: int, median_ns: float) -> None:
+        self.tag = tag
+        self.calls = calls
+        self.total_ns = total_ns
+        self.median_ns = median_ns
 
 
 class FunctionStats:
@@ -28,6 +136,26 @@ class FunctionStats:
         "max_ns",
         "median_ns",
         "stdev_ns",
+        "kind",
+        "errors",
+        "success_median_ns",
+        "error_median_ns",
+        "warmup_calls",
+        "warmup_median_ns",
+        "steady_median_ns",
+        "size_arg",
+        "size_buckets",
+        "total_bytes",
+        "median_bytes",
+        "total_allocs",
+        "median_allocs",
+        "run_medians",
+        "sketch",
+        "collections",
+        "gc_total_ns",
+        "gc_inclusive_median_ns",
+        "gc_exclusive_median_ns",
+        "tags",
     )
 
     def __init__(
@@ -39,6 +167,26 @@ class FunctionStats:
         max_ns: int,
         median_ns: float,
         stdev_ns: float,
+        kind: str = "function",
+        errors: int = 0,
+        success_median_ns: float = 0.0,
+        error_median_ns: float = 0.0,
+        warmup_calls: int = 0,
+        warmup_median_ns: float = 0.0,
+        steady_median_ns: float = 0.0,
+        size_arg: str | None = None,
+        size_buckets: list[SizeBucket] | None = None,
+        total_bytes: int | None = None,
+        median_bytes: float | None = None,
+        total_allocs: int | None = None,
+        median_allocs: float | None = None,
+        run_medians: list[float] | None = None,
+        sketch: dict[int, int] | None = None,
+        collections: int = 0,
+        gc_total_ns: int = 0,
+        gc_inclusive_median_ns: float = 0.0,
+        gc_exclusive_median_ns: float = 0.0,
+        tags: list[TagStats] | None = None,
     ) -> None:
         self.name = name
         self.calls = calls
@@ -47,6 +195,68 @@ class FunctionStats:
         self.max_ns = max_ns
         self.median_ns = median_ns
         self.stdev_ns = stdev_ns
+        self.kind = kind
+        self.errors = errors
+        self.success_median_ns = success_median_ns
+        self.error_median_ns = error_median_ns
+        self.warmup_calls = warmup_calls
+        self.warmup_median_ns = warmup_median_ns
+        self.steady_median_ns = steady_median_ns
+        self.size_arg = size_arg
+        self.size_buckets = size_buckets
+        self.total_bytes = total_bytes
+        self.median_bytes = median_bytes
+        self.total_allocs = total_allocs
+        self.median_allocs = median_allocs
+        self.run_medians = run_medians
+        self.sketch = sketch
+        self.collections = collections
+        self.gc_total_ns = gc_total_ns
+        self.gc_inclusive_median_ns = gc_inclusive_median_ns
+        self.gc_exclusive_median_ns = gc_exclusive_median_ns
+        self.tags = tags
+
+    @property
+    def error_rate(self) -> float:
+        """The fraction of calls that raised an exception."""
+        return self.errors / self.calls if self.calls else 0.0
+
+    @property
+    def collections_per_call(self) -> float:
+        """The mean number of garbage collections during each call."""
+        return self.collections / self.calls if self.calls else 0.0
+
+    @property
+    def run_stdev_ns(self) -> float | None:
+        """
+        The standard deviation of the median across runs, or None unless
+        merged from at least two runs.
+        """
+        if self.run_medians is None or len(self.run_medians) < 2:
+            return None
+        from statistics import stdev
+
+        return stdev(self.run_medians)
+
+    @property
+    def exponent(self) -> float | None:
+        """
+        The fitted exponent k in median time ∝ size ** k, across size buckets,
+        or None without size buckets for at least two distinct sizes.
+        """
+        if self.size_buckets is None:
+            return None
+        points = [
+            (log(bucket.median_size), log(bucket.median_ns))
+            for bucket in self.size_buckets
+            if bucket.median_size > 0 and bucket.median_ns > 0
+        ]
+        if len({x for x, _ in points}) < 2:
+            return None
+        xs, ys = zip(*points, strict=True)
+        from statistics import linear_regression
+
+        return linear_regression(xs, ys).slope
 
 
 @contextmanager
@@ -56,27 +266,187 @@ def tprof(
     compare: bool = False,
     json_path: str | None = None,
     baseline_path: str | None = None,
+    trace_path: str | None = None,
+    store_path: str | None = None,
+    openmetrics_path: str | None = None,
+    size_args: dict[Any, str] | None = None,
+    memory: bool = False,
+    slow_threshold: str | None = None,
+    skip_warmup: bool = False,
+    clock: str = "perf_counter",
+    report_format: str = "rich",
+    auto: int | None = None,
+    sketch: bool = False,
+    exclude_gc: bool = False,
+    tag: ContextVar[Any] | bool = False,
 ) -> Generator[list[FunctionStats]]:
     """
-    Profile time spent in target callables and print a report when done.
-    """
+    Profile time spent in target callables and regions, and print a report
+    when done.
 
-    from tprof import record
+    With tag, also break down each target's calls by the value of a context
+    variable when they end: the value passed to set_tag() if tag is True.
 
-    if not targets:
+    With auto instead of targets, discover targets by sampling stacks, then
+    profile the top auto functions by inclusive time for the rest of the
+    block.
+    """
+
+    if auto is not None:
+        if targets:
+            raise ValueError("targets and auto may not be combined.")
+        if auto < 1:
+            raise ValueError("auto must be at least 1.")
+    elif not targets:
         raise ValueError("At least one target callable must be provided.")
     if compare and baseline_path is not None:
         raise ValueError("compare and baseline_path may not be combined.")
+    if sketch and skip_warmup:
+        raise ValueError("sketch and skip_warmup may not be combined.")
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(
+            f"Invalid report format {report_format!r}, expected one of: "
+            f"{', '.join(REPORT_FORMATS)}."
+        )
+    if clock not in record.clocks():
+        raise ValueError(
+            f"Clock {clock!r} is not available, expected one of: "
+            f"{', '.join(record.clocks())}."
+        )
 
     baseline = None
+    success_baseline = None
+    error_baseline = None
+    memory_baseline = None
     if baseline_path is not None:
         baseline = _load_baseline(baseline_path)
+        success_baseline = _load_baseline(baseline_path, "success_median_ns")
+        error_baseline = _load_baseline(baseline_path, "error_median_ns")
+        if memory:
+            memory_baseline = _load_baseline(baseline_path, "median_bytes")
+
+    slow_ns = _parse_duration(slow_threshold) if slow_threshold is not None else 0
+    tag_var = default_tag_var if tag is True else tag or None
+
+    names = _resolve_targets(targets)
+    resolved_size_args = _resolve_size_args(size_args or {}, names)
+    slow_recorder: SlowRecorder | None = None
+
+    def configure(names: dict[Target, str]) -> None:
+        nonlocal slow_recorder
+        if slow_threshold is not None:
+            from tprof.slow import SlowRecorder
+
+            slow_recorder = SlowRecorder(tuple(names), tuple(names.values()))
+        _configure(
+            names,
+            TRACE_LIMIT if trace_path is not None else 0,
+            resolved_size_args,
+            memory,
+            slow_ns,
+            slow_recorder.capture if slow_recorder is not None else None,
+            clock,
+            tag_var,
+            exclude_gc,
+        )
+
+    discovery: Discovery | None = None
+    if auto is not None:
+        from tprof.auto import Discovery
+
+        def start(discovered: dict[CodeType, str]) -> None:
+            names: dict[Target, str] = dict(discovered.items())
+            configure(names)
+            _enable_events()
+
+        # Register callbacks up front, so the tool ID is claimed before the
+        # program runs, but only enable events once discovery picks targets.
+        _register_callbacks()
+        discovery = Discovery(auto, start)
+    else:
+        configure(names)
+        _register_callbacks()
+        _enable_events()
+
+    results: list[FunctionStats] = []
+    exc = False
+    try:
+        yield results
+    except Exception:
+        exc = True
+        raise
+    finally:
+        if discovery is not None:
+            discovery.stop()
+        _stop_monitoring()
+        results[:] = _collect_stats(skip_warmup=skip_warmup, exclude_gc=exclude_gc)
+        if sketch:
+            from tprof.sketch import add_sketches
+
+            add_sketches(results)
+        slow_calls = slow_recorder.results() if slow_recorder is not None else None
+
+        if not exc:
+            if json_path is not None:
+                _write_json(json_path, label, results, slow_calls)
+            if trace_path is not None:
+                _write_trace(trace_path, results)
+            if store_path is not None:
+                _save_run(store_path, label, results)
+            if openmetrics_path is not None:
+                from tprof.openmetrics import write_textfile
+
+                write_textfile(openmetrics_path)
+            if discovery is not None and report_format in ("rich", "plain"):
+                from tprof.auto import display_discovered
+
+                display_discovered(discovery, report_format == "plain")
+            display_report(
+                results,
+                label=label,
+                compare=compare,
+                baseline=baseline,
+                success_baseline=success_baseline,
+                error_baseline=error_baseline,
+                memory_baseline=memory_baseline,
+                report_format=report_format,
+            )
+            # Slow calls don't fit delimited formats, but are in JSON output.
+            if slow_calls is not None and report_format in ("rich", "plain"):
+                from tprof.slow import display_slow_calls
+
+                display_slow_calls(slow_calls, slow_ns, report_format == "plain")
+
+        code_to_name.clear()
+        code_to_size_arg.clear()
+        record.configure(())
 
-    names: dict[CodeType, str] = {}
+
+def set_tag(value: Hashable) -> None:
+    """
+    Tag target calls in the current context with a value, such as a tenant or
+    job type, for tprof(tag=True) to break down statistics by.
+    """
+    default_tag_var.set(value)
+
+
+def _resolve_targets(targets: tuple[Any, ...]) -> dict[Target, str]:
+    """
+    Map each target's code object, region, or callable without a code object
+    to its reported name.
+    """
+    names: dict[Target, str] = {}
     for target in targets:
-        code = _extract_code(target)
-        if code is None:
-            raise ValueError(f"Cannot extract code object from {target!r}.")
+        if isinstance(target, Region):
+            names[target] = target.name
+            continue
+
+        key: Target | None = _extract_code(target)
+        if key is None:
+            obj = resolve_name(target) if isinstance(target, str) else target
+            if not callable(obj):
+                raise ValueError(f"Cannot extract code object from {target!r}.")
+            key = obj
 
         if isinstance(target, str):
             name = target
@@ -87,18 +457,97 @@ def tprof(
                 or repr(target)
             )
 
-            module = getattr(target, "__module__", None)
+            # Method descriptors, such as re.Pattern.match, have no module of
+            # their own.
+            module = getattr(target, "__module__", None) or getattr(
+                getattr(target, "__objclass__", None), "__module__", None
+            )
             if module:
                 name = f"{module}:{base_name}"
             else:
                 name = f"<unknown>:{base_name}"
 
-        names[code] = name
+        names[key] = name
+    return names
+
+
+def _resolve_size_args(
+    size_args: dict[Any, str], names: dict[Target, str]
+) -> dict[Target, str]:
+    """
+    Map each size_args target's code object to the name of the argument to
+    take len() of, checking the target is profiled and has that argument.
+    """
+    resolved: dict[Target, str] = {}
+    for target, argument in size_args.items():
+        if isinstance(target, Region):
+            raise ValueError(f"Cannot take argument sizes for region {target!r}.")
+        code = _extract_code(target)
+        if code is None:
+            raise ValueError(f"Cannot take argument sizes for {target!r}.")
+        if code not in names:
+            raise ValueError(f"Size argument target {target!r} is not a target.")
+        num_arguments = (
+            code.co_argcount
+            + code.co_kwonlyargcount
+            + bool(code.co_flags & CO_VARARGS)
+            + bool(code.co_flags & CO_VARKEYWORDS)
+        )
+        if argument not in code.co_varnames[:num_arguments]:
+            raise ValueError(f"{names[code]}() has no argument {argument!r}.")
+        resolved[code] = argument
+    return resolved
+
 
+def _start_monitoring(
+    names: dict[Target, str],
+    trace_limit: int,
+    size_args: dict[Target, str] | None = None,
+    memory: bool = False,
+    slow_ns: int = 0,
+    slow_callback: Callable[[int, int], object] | None = None,
+    clock: str = "perf_counter",
+    tag_var: ContextVar[Any] | None = None,
+) -> None:
+    _configure(
+        names, trace_limit, size_args, memory, slow_ns, slow_callback, clock, tag_var
+    )
+    _register_callbacks()
+    _enable_events()
+
+
+def _configure(
+    names: dict[Target, str],
+    trace_limit: int,
+    size_args: dict[Target, str] | None = None,
+    memory: bool = False,
+    slow_ns: int = 0,
+    slow_callback: Callable[[int, int], object] | None = None,
+    clock: str = "perf_counter",
+    tag_var: ContextVar[Any] | None = None,
+    exclude_gc: bool = False,
+) -> None:
     code_to_name.clear()
     code_to_name.update(names)
-    record.configure(tuple(names))
+    code_to_size_arg.clear()
+    code_to_size_arg.update(size_args or {})
+    record.configure(
+        tuple(names),
+        trace_limit,
+        tuple(code_to_size_arg.get(target) for target in names)
+        if code_to_size_arg
+        else None,
+        memory,
+        slow_ns,
+        slow_callback,
+        clock,
+        tag_var,
+        None,
+        exclude_gc,
+    )
+
 
+def _register_callbacks() -> None:
     sys.monitoring.use_tool_id(TOOL_ID, TOOL_NAME)
     sys.monitoring.register_callback(
         TOOL_ID, sys.monitoring.events.PY_START, record.py_start_callback
@@ -109,77 +558,211 @@ def tprof(
     sys.monitoring.register_callback(
         TOOL_ID, sys.monitoring.events.PY_UNWIND, record.py_unwind_callback
     )
+    sys.monitoring.register_callback(
+        TOOL_ID, sys.monitoring.events.CALL, record.call_callback
+    )
+    sys.monitoring.register_callback(
+        TOOL_ID, sys.monitoring.events.C_RETURN, record.c_return_callback
+    )
+    sys.monitoring.register_callback(
+        TOOL_ID, sys.monitoring.events.C_RAISE, record.c_raise_callback
+    )
+    gc.callbacks.append(record.gc_callback)
 
-    sys.monitoring.set_events(
-        TOOL_ID,
-        (
-            sys.monitoring.events.PY_START
-            | sys.monitoring.events.PY_RETURN
-            | sys.monitoring.events.PY_UNWIND
-        ),
+
+def _enable_events(restart: bool = True) -> None:
+    events = (
+        sys.monitoring.events.PY_START
+        | sys.monitoring.events.PY_RETURN
+        | sys.monitoring.events.PY_UNWIND
     )
-    # Re-enable events at code locations that callbacks disabled with
-    # sys.monitoring.DISABLE during any previous profiling session.
-    sys.monitoring.restart_events()
+    # CALL events fire for every call, until disabled per call site, so only
+    # enable them for callable targets.
+    if any(not isinstance(target, (CodeType, Region)) for target in code_to_name):
+        events |= (
+            sys.monitoring.events.CALL
+            | sys.monitoring.events.C_RETURN
+            | sys.monitoring.events.C_RAISE
+        )
+    sys.monitoring.set_events(TOOL_ID, events)
+    if restart:
+        # Re-enable events at code locations that callbacks disabled with
+        # sys.monitoring.DISABLE during any previous profiling session.
+        sys.monitoring.restart_events()
 
-    results: list[FunctionStats] = []
-    exc = False
-    try:
-        yield results
-    except Exception:
-        exc = True
-        raise
-    finally:
-        sys.monitoring.set_events(TOOL_ID, sys.monitoring.events.NO_EVENTS)
-        sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.PY_START, None)
-        sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.PY_RETURN, None)
-        sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.PY_UNWIND, None)
-        sys.monitoring.free_tool_id(TOOL_ID)
-
-        results[:] = [
-            FunctionStats(name, count, total, min_ns, max_ns, median_ns, stdev_ns)
-            for name, (count, total, min_ns, max_ns, median_ns, stdev_ns) in zip(
-                code_to_name.values(), record.stats(), strict=True
-            )
-        ]
 
-        if not exc:
-            if json_path is not None:
-                _write_json(json_path, label, results)
-            display_report(results, label=label, compare=compare, baseline=baseline)
+def _disable_events() -> None:
+    sys.monitoring.set_events(TOOL_ID, sys.monitoring.events.NO_EVENTS)
 
-        code_to_name.clear()
-        record.configure(())
+
+def _stop_monitoring() -> None:
+    _disable_events()
+    sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.PY_START, None)
+    sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.PY_RETURN, None)
+    sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.PY_UNWIND, None)
+    sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.CALL, None)
+    sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.C_RETURN, None)
+    sys.monitoring.register_callback(TOOL_ID, sys.monitoring.events.C_RAISE, None)
+    sys.monitoring.free_tool_id(TOOL_ID)
+    if record.gc_callback in gc.callbacks:
+        gc.callbacks.remove(record.gc_callback)
+
+
+def _collect_stats(
+    since_mark: bool = False, skip_warmup: bool = False, exclude_gc: bool = False
+) -> list[FunctionStats]:
+    """
+    Collect statistics for the current targets. With skip_warmup, marks are
+    moved to the end of each thread's warmup calls, so the timing statistics
+    only cover steady-state calls. exclude_gc must match the configuration,
+    to tell which median GC time was subtracted from.
+    """
+    warmup_stats = record.warmup_stats(WARMUP_TOLERANCE, skip_warmup)
+    tags = record.tags()
+    if skip_warmup:
+        since_mark = True
+    return [
+        _function_stats(
+            target,
+            name,
+            target_stats,
+            outcome_stats,
+            target_warmup_stats,
+            size_stats,
+            memory_stats,
+            gc_stats,
+            exclude_gc,
+            tag_stats,
+            tags,
+        )
+        for (
+            (target, name),
+            target_stats,
+            outcome_stats,
+            target_warmup_stats,
+            size_stats,
+            memory_stats,
+            gc_stats,
+            tag_stats,
+        ) in zip(
+            code_to_name.items(),
+            record.stats(since_mark),
+            record.outcome_stats(since_mark),
+            warmup_stats,
+            record.size_stats(),
+            record.memory_stats(),
+            record.gc_stats(since_mark),
+            record.tag_stats(),
+            strict=True,
+        )
+    ]
 
 
-def _load_baseline(path: str) -> dict[str, float]:
+def _function_stats(
+    target: Target,
+    name: str,
+    target_stats: tuple[int, int, int, int, float, float],
+    outcome_stats: tuple[int, float, float],
+    warmup_stats: tuple[int, float, float],
+    size_stats: list[tuple[int, int, float, float]] | None,
+    memory_stats: tuple[int, float, int, float] | None,
+    gc_stats: tuple[int, int, float],
+    exclude_gc: bool,
+    tag_stats: list[tuple[int, int, int, float]] | None,
+    tags: tuple[Any, ...],
+) -> FunctionStats:
+    total_bytes, median_bytes, total_allocs, median_allocs = (
+        memory_stats if memory_stats is not None else (None, None, None, None)
+    )
+    collections, gc_total_ns, other_median_ns = gc_stats
+    median_ns = target_stats[4]
+    if not collections:
+        other_median_ns = median_ns
+    inclusive_median_ns, exclusive_median_ns = (
+        (other_median_ns, median_ns) if exclude_gc else (median_ns, other_median_ns)
+    )
+    return FunctionStats(
+        name,
+        *target_stats,
+        kind=("region" if isinstance(target, Region) else "function"),
+        errors=outcome_stats[0],
+        success_median_ns=outcome_stats[1],
+        error_median_ns=outcome_stats[2],
+        warmup_calls=warmup_stats[0],
+        warmup_median_ns=warmup_stats[1],
+        steady_median_ns=warmup_stats[2],
+        size_arg=code_to_size_arg.get(target),
+        size_buckets=(
+            [SizeBucket(*bucket) for bucket in size_stats]
+            if size_stats is not None
+            else None
+        ),
+        total_bytes=total_bytes,
+        median_bytes=median_bytes,
+        total_allocs=total_allocs,
+        median_allocs=median_allocs,
+        collections=collections,
+        gc_total_ns=gc_total_ns,
+        gc_inclusive_median_ns=inclusive_median_ns,
+        gc_exclusive_median_ns=exclusive_median_ns,
+        tags=_tag_stats(tag_stats, tags) if tag_stats is not None else None,
+    )
+
+
+def _tag_stats(
+    tag_stats: list[tuple[int, int, int, float]], tags: tuple[Any, ...]
+) -> list[TagStats]:
+    """Name each tag's statistics, in descending order of total time."""
+    result = []
+    for tag, calls, total_ns, median_ns in tag_stats:
+        if tag == NO_TAG:
+            name = UNTAGGED
+        elif tag == OTHER_TAG:
+            name = OTHER_TAGS
+        else:
+            value = tags[tag]
+            name = value if isinstance(value, str) else repr(value)
+        result.append(TagStats(name, calls, total_ns, median_ns))
+    result.sort(key=lambda tag_stats: tag_stats.total_ns, reverse=True)
+    return result
+
+
+def _load_baseline(path: str, key: str = "median_ns") -> dict[str, float]:
+    """
+    Load each function's median time, or another value by key, from a
+    previous run's JSON statistics. For other keys, functions without a value
+    are skipped, such as for median_bytes from runs without memory accounting.
+    """
     try:
         with open(path) as fp:
             data = json.load(fp)
         return {
-            function["name"]: function["median_ns"] for function in data["functions"]
+            function["name"]: function[key]
+            for function in data["functions"]
+            if key == "median_ns" or function.get(key) is not None
         }
     except (OSError, ValueError, TypeError, KeyError) as exc:
         raise ValueError(f"Cannot load baseline from {path!r}: {exc}") from exc
 
 
-def _write_json(path: str, label: str | None, results: list[FunctionStats]) -> None:
-    data = {
+def _write_json(
+    path: str,
+    label: str | None,
+    results: list[FunctionStats],
+    slow_calls: list[SlowCall] | None = None,
+    test_medians: dict[str, dict[str, float]] | None = None,
+) -> None:
+    data: dict[str, Any] = {
         "version": 1,
         "label": label,
-        "functions": [
-            {
-                "name": function_stats.name,
-                "calls": function_stats.calls,
-                "total_ns": function_stats.total_ns,
-                "min_ns": function_stats.min_ns,
-                "max_ns": function_stats.max_ns,
-                "median_ns": function_stats.median_ns,
-                "stdev_ns": function_stats.stdev_ns,
-            }
-            for function_stats in results
-        ],
+        "functions": [_function_json(function_stats) for function_stats in results],
     }
+    if slow_calls is not None:
+        from tprof.slow import slow_call_json
+
+        data["slow_calls"] = [slow_call_json(slow_call) for slow_call in slow_calls]
+    if test_medians is not None:
+        data["tests"] = test_medians
     if path == "-":
         json.dump(data, sys.stdout, indent=2)
         sys.stdout.write("\n")
@@ -189,32 +772,277 @@ def _write_json(path: str, label: str | None, results: list[FunctionStats]) -> N
             fp.write("\n")
 
 
+def _function_json(function_stats: FunctionStats) -> dict[str, Any]:
+    data: dict[str, Any] = {
+        "name": function_stats.name,
+        "kind": function_stats.kind,
+        "calls": function_stats.calls,
+        "total_ns": function_stats.total_ns,
+        "min_ns": function_stats.min_ns,
+        "max_ns": function_stats.max_ns,
+        "median_ns": function_stats.median_ns,
+        "stdev_ns": function_stats.stdev_ns,
+        "errors": function_stats.errors,
+        "success_median_ns": function_stats.success_median_ns,
+        "error_median_ns": function_stats.error_median_ns,
+        "warmup_calls": function_stats.warmup_calls,
+        "warmup_median_ns": function_stats.warmup_median_ns,
+        "steady_median_ns": function_stats.steady_median_ns,
+        "collections": function_stats.collections,
+        "gc_total_ns": function_stats.gc_total_ns,
+        "gc_inclusive_median_ns": function_stats.gc_inclusive_median_ns,
+        "gc_exclusive_median_ns": function_stats.gc_exclusive_median_ns,
+    }
+    if function_stats.size_buckets is not None:
+        data["size_arg"] = function_stats.size_arg
+        data["size_buckets"] = [
+            {
+                "min_size": bucket.min_size,
+                "max_size": bucket.max_size,
+                "calls": bucket.calls,
+                "median_size": bucket.median_size,
+                "median_ns": bucket.median_ns,
+            }
+            for bucket in function_stats.size_buckets
+        ]
+        data["exponent"] = function_stats.exponent
+    if function_stats.total_bytes is not None:
+        data["total_bytes"] = function_stats.total_bytes
+        data["median_bytes"] = function_stats.median_bytes
+        data["total_allocs"] = function_stats.total_allocs
+        data["median_allocs"] = function_stats.median_allocs
+    if function_stats.run_medians is not None:
+        data["runs"] = len(function_stats.run_medians)
+        data["run_medians_ns"] = function_stats.run_medians
+        data["run_stdev_ns"] = function_stats.run_stdev_ns
+    if function_stats.tags is not None:
+        data["tags"] = [
+            {
+                "tag": tag_stats.tag,
+                "calls": tag_stats.calls,
+                "total_ns": tag_stats.total_ns,
+                "median_ns": tag_stats.median_ns,
+            }
+            for tag_stats in function_stats.tags
+        ]
+    if function_stats.sketch is not None:
+        from tprof.sketch import RELATIVE_ERROR
+
+        data["sketch"] = {
+            "relative_error": RELATIVE_ERROR,
+            "buckets": [[i, count] for i, count in function_stats.sketch.items()],
+        }
+    return data
+
+
+def _read_json(path: str) -> tuple[str | None, list[FunctionStats]]:
+    with open(path) as fp:
+        data = json.load(fp)
+    return data["label"], [
+        FunctionStats(
+            function["name"],
+            function["calls"],
+            function["total_ns"],
+            function["min_ns"],
+            function["max_ns"],
+            function["median_ns"],
+            function["stdev_ns"],
+            kind=function.get("kind", "function"),
+            errors=function.get("errors", 0),
+            success_median_ns=function.get("success_median_ns", 0.0),
+            error_median_ns=function.get("error_median_ns", 0.0),
+            warmup_calls=function.get("warmup_calls", 0),
+            warmup_median_ns=function.get("warmup_median_ns", 0.0),
+            steady_median_ns=function.get("steady_median_ns", 0.0),
+            size_arg=function.get("size_arg"),
+            size_buckets=(
+                [
+                    SizeBucket(
+                        bucket["max_size"].bit_length(),
+                        bucket["calls"],
+                        bucket["median_size"],
+                        bucket["median_ns"],
+                    )
+                    for bucket in function["size_buckets"]
+                ]
+                if "size_buckets" in function
+                else None
+            ),
+            total_bytes=function.get("total_bytes"),
+            median_bytes=function.get("median_bytes"),
+            total_allocs=function.get("total_allocs"),
+            median_allocs=function.get("median_allocs"),
+            run_medians=function.get("run_medians_ns"),
+            sketch=_read_sketch(function["sketch"]) if "sketch" in function else None,
+            collections=function.get("collections", 0),
+            gc_total_ns=function.get("gc_total_ns", 0),
+            gc_inclusive_median_ns=function.get(
+                "gc_inclusive_median_ns", function["median_ns"]
+            ),
+            gc_exclusive_median_ns=function.get(
+                "gc_exclusive_median_ns", function["median_ns"]
+            ),
+            tags=(
+                [
+                    TagStats(
+                        tag_stats["tag"],
+                        tag_stats["calls"],
+                        tag_stats["total_ns"],
+                        tag_stats["median_ns"],
+                    )
+                    for tag_stats in function["tags"]
+                ]
+                if "tags" in function
+                else None
+            ),
+        )
+        for function in data["functions"]
+    ]
+
+
+def _read_sketch(data: dict[str, Any]) -> dict[int, int]:
+    from tprof.sketch import RELATIVE_ERROR
+
+    if data["relative_error"] != RELATIVE_ERROR:
+        raise ValueError(
+            f"Unsupported sketch relative error {data['relative_error']!r}, "
+            f"expected {RELATIVE_ERROR!r}."
+        )
+    return dict(data["buckets"])
+
+
+def _write_trace(path: str, results: list[FunctionStats]) -> None:
+    """
+    Write recorded calls in Chrome’s trace event format, one event at a time
+    to avoid building the whole trace in memory.
+    """
+    pid = os.getpid()
+    thread_names = {thread.native_id: thread.name for thread in threading.enumerate()}
+    event_names = [json.dumps(function_stats.name) for function_stats in results]
+    event_kinds = [json.dumps(function_stats.kind) for function_stats in results]
+    dropped = 0
+
+    with open(path, "w") as fp:
+        fp.write('{"displayTimeUnit": "ns", "traceEvents": [\n')
+        separator = ""
+        for thread_id, thread_dropped, events in record.trace():
+            dropped += thread_dropped
+            thread_name = thread_names.get(thread_id, f"Thread {thread_id}")
+            fp.write(
+                f'{separator}{{"name": "thread_name", "ph": "M", "pid": {pid}, '
+                f'"tid": {thread_id}, "args": {{"name": {json.dumps(thread_name)}}}}}'
+            )
+            separator = ",\n"
+            values = memoryview(events).cast("q")
+            for i in range(0, len(values), 3):
+                target, start, end = values[i : i + 3]
+                fp.write(
+                    f'{separator}{{"name": {event_names[target]}, '
+                    f'"cat": {event_kinds[target]}, "ph": "X", '
+                    f'"ts": {start / 1_000:.3f}, "dur": {(end - start) / 1_000:.3f}, '
+                    f'"pid": {pid}, "tid": {thread_id}}}'
+                )
+        fp.write(f'\n], "otherData": {{"dropped_events": {dropped}}}}}\n')
+
+
+def _save_run(path: str, label: str | None, results: list[FunctionStats]) -> None:
+    """
+    Append a run's statistics to the store, printing any error rather than
+    raising it, so a bad path or locked database doesn't lose the report.
+    """
+    import sqlite3
+
+    from tprof.store import save_run
+
+    try:
+        save_run(path, label, results)
+    except (sqlite3.Error, OSError, ValueError) as exc:
+        print(f"tprof: Couldn't save run to {path}: {exc}", file=sys.stderr)
+
+
 def display_report(
     results: list[FunctionStats],
     label: str | None = None,
     compare: bool = False,
     baseline: dict[str, float] | None = None,
+    success_baseline: dict[str, float] | None = None,
+    error_baseline: dict[str, float] | None = None,
+    memory_baseline: dict[str, float] | None = None,
+    report_format: str = "rich",
+    p_values: dict[str, float] | None = None,
 ) -> None:
+    if report_format == "none":
+        return
+    if report_format in ("csv", "tsv"):
+        _write_delimited(
+            results,
+            label,
+            "," if report_format == "csv" else "\t",
+            compare,
+            baseline,
+            p_values,
+        )
+        return
+    plain = report_format == "plain"
+
     heading = "[bold red]🎯 tprof[/bold red] results"
     if label:
         heading += f" @ [bold bright_blue]{label}[/bold bright_blue]"
     heading += ":"
-    console.print(heading)
-
-    table = Table(box=None, collapse_padding=True)
-
-    table.add_column("function")
-    table.add_column("calls", justify="right")
-    table.add_column("total", justify="right")
-    table.add_column("median", header_style="bright_green", justify="right")
-    table.add_column("±", justify="right")
-    table.add_column("σ", header_style="bright_green", justify="left")
-    table.add_column("min", header_style="cyan", justify="right")
-    table.add_column("…", justify="right")
-    table.add_column("max", header_style="magenta", justify="left")
+    _print(heading, plain)
+
+    columns: list[tuple[str, str, str | None]] = [
+        ("function", "left", None),
+        ("calls", "right", None),
+        ("total", "right", None),
+        ("median", "right", "bright_green"),
+        ("±", "right", None),
+        ("σ", "left", "bright_green"),
+        ("min", "right", "cyan"),
+        ("…", "right", None),
+        ("max", "left", "magenta"),
+    ]
+    runs = any(function_stats.run_stdev_ns is not None for function_stats in results)
+    if runs:
+        columns.append(("run σ", "right", "yellow"))
+    warmup = any(function_stats.warmup_calls for function_stats in results)
+    if warmup:
+        columns += [
+            ("warmup", "right", "yellow"),
+            ("warmup median", "right", "yellow"),
+            ("steady median", "right", "bright_green"),
+        ]
     if compare or baseline is not None:
-        table.add_column("delta")
+        columns.append(("delta", "left", None))
+    outcomes = any(function_stats.errors for function_stats in results)
+    if outcomes:
+        columns += [
+            ("errors", "right", "red"),
+            ("success", "right", "bright_green"),
+            ("error", "right", "red"),
+        ]
+        if success_baseline is not None and error_baseline is not None:
+            columns += [("success delta", "left", None), ("error delta", "left", None)]
+    memory = any(function_stats.total_bytes is not None for function_stats in results)
+    if memory:
+        columns += [
+            ("bytes", "right", "yellow"),
+            ("Σ bytes", "right", None),
+            ("allocs", "right", "yellow"),
+            ("Σ allocs", "right", None),
+        ]
+        if memory_baseline is not None:
+            columns.append(("bytes delta", "left", None))
+    collected = any(function_stats.collections for function_stats in results)
+    if collected:
+        columns += [
+            ("gc/call", "right", "yellow"),
+            ("Σ gc", "right", None),
+            ("incl. gc", "right", "bright_green"),
+            ("excl. gc", "right", "bright_green"),
+        ]
 
+    rows: list[tuple[str, ...]] = []
     compare_baseline: float | None = None
     first = True
 
@@ -236,40 +1064,433 @@ def display_report(
         elif baseline is not None:
             baseline_median = baseline.get(function_stats.name)
             if count and baseline_median:
-                delta = (_format_delta(median_ns, baseline_median),)
+                p_value = (
+                    p_values.get(function_stats.name) if p_values is not None else None
+                )
+                delta = (_format_delta(median_ns, baseline_median, p_value),)
             else:
                 delta = ("[dim]n/a[/dim]",)
 
+        run_columns: tuple[str, ...] = ()
+        if runs:
+            run_stdev_ns = function_stats.run_stdev_ns
+            run_columns = (
+                _format_time(int(run_stdev_ns), "yellow")
+                if run_stdev_ns is not None
+                else "[dim]n/a[/dim]",
+            )
+        warmup_columns: tuple[str, ...] = ()
+        if warmup:
+            warmup_columns = _warmup_columns(function_stats)
+        outcome_columns: tuple[str, ...] = ()
+        if outcomes:
+            outcome_columns = _outcome_columns(
+                function_stats, success_baseline, error_baseline
+            )
+        memory_columns: tuple[str, ...] = ()
+        if memory:
+            memory_columns = _memory_columns(function_stats, memory_baseline)
+        gc_columns: tuple[str, ...] = ()
+        if collected:
+            gc_columns = _gc_columns(function_stats)
+
         first = False
-        table.add_row(
-            f"[bold]{function_stats.name}()[/bold]",
-            str(count),
-            _format_time(function_stats.total_ns, None),
+        if function_stats.kind == "region":
+            row_name = function_stats.name
+        else:
+            row_name = f"{function_stats.name}()"
+        rows.append(
             (
-                _format_time(int(median_ns), "bright_green")
+                f"[bold]{row_name}[/bold]",
+                str(count),
+                _format_time(function_stats.total_ns, None),
+                (
+                    _format_time(int(median_ns), "bright_green")
+                    if count
+                    else "[dim]n/a[/dim]"
+                ),
+                "±" if count > 1 else "",
+                (
+                    _format_time(int(function_stats.stdev_ns), "bright_green")
+                    if count > 1
+                    else ""
+                ),
+                _format_time(function_stats.min_ns, "cyan")
                 if count
-                else "[dim]n/a[/dim]"
-            ),
-            "±" if count > 1 else "",
+                else "[dim]n/a[/dim]",
+                "…",
+                _format_time(function_stats.max_ns, "magenta")
+                if count
+                else "[dim]n/a[/dim]",
+                *run_columns,
+                *warmup_columns,
+                *delta,
+                *outcome_columns,
+                *memory_columns,
+                *gc_columns,
+            )
+        )
+    _print_table(columns, rows, plain)
+
+    for function_stats in results:
+        if function_stats.size_buckets is not None:
+            _display_size_buckets(function_stats, plain)
+        if function_stats.tags is not None:
+            _display_tags(function_stats, plain)
+
+
+def _console() -> Console:
+    global console
+    if console is None:
+        from rich.console import Console
+
+        console = Console(stderr=True)
+    return console
+
+
+def _print(markup: str, plain: bool = False, highlight: bool = True) -> None:
+    """
+    Print a line of report markup to stderr, with Rich, or stripped of markup
+    for the plain format.
+    """
+    if plain:
+        print(MARKUP_RE.sub("", markup), file=sys.stderr)
+    else:
+        _console().print(markup, highlight=highlight)
+
+
+def _print_table(
+    columns: list[tuple[str, str, str | None]],
+    rows: list[tuple[str, ...]],
+    plain: bool = False,
+) -> None:
+    """
+    Print a table of report markup cells, given columns as (header, justify,
+    header style) tuples, laid out like a Rich table without borders.
+    """
+    if not plain:
+        from rich.table import Table
+
+        table = Table(box=None, collapse_padding=True)
+        for header, justify, header_style in columns:
+            table.add_column(
+                header,
+                justify=justify,  # type: ignore [arg-type]
+                header_style=header_style,
+            )
+        for row in rows:
+            table.add_row(*row)
+        _console().print(table)
+        return
+
+    lines = [
+        [header for header, _, _ in columns],
+        *([MARKUP_RE.sub("", cell) for cell in row] for row in rows),
+    ]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(columns))]
+    for line in lines:
+        cells = [
+            cell.rjust(width) if justify == "right" else cell.ljust(width)
+            for cell, width, (_, justify, _) in zip(line, widths, columns, strict=True)
+        ]
+        print(" " + " ".join(cells).rstrip(), file=sys.stderr)
+
+
+# Columns of the CSV and TSV formats, the same whichever features are used, so
+# logs from different runs line up.
+DELIMITED_COLUMNS = (
+    "label",
+    "name",
+    "kind",
+    "calls",
+    "total_ns",
+    "min_ns",
+    "max_ns",
+    "median_ns",
+    "stdev_ns",
+    "delta_percent",
+    "errors",
+    "success_median_ns",
+    "error_median_ns",
+    "warmup_calls",
+    "warmup_median_ns",
+    "steady_median_ns",
+    "total_bytes",
+    "median_bytes",
+    "total_allocs",
+    "median_allocs",
+    "runs",
+    "run_stdev_ns",
+    "delta_p_value",
+    "collections",
+    "gc_total_ns",
+    "gc_inclusive_median_ns",
+    "gc_exclusive_median_ns",
+)
+
+
+def _write_delimited(
+    results: list[FunctionStats],
+    label: str | None,
+    delimiter: str,
+    compare: bool = False,
+    baseline: dict[str, float] | None = None,
+    p_values: dict[str, float] | None = None,
+) -> None:
+    """
+    Write statistics to stderr as delimited values with a header row, in
+    nanoseconds and bytes, leaving values that don’t apply empty.
+    """
+    writer = csv.writer(sys.stderr, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(DELIMITED_COLUMNS)
+    compare_baseline: float | None = None
+    for i, function_stats in enumerate(results):
+        reference: float | None = None
+        if compare:
+            if i == 0:
+                compare_baseline = function_stats.median_ns or None
+            else:
+                reference = compare_baseline
+        elif baseline is not None:
+            reference = baseline.get(function_stats.name)
+        delta: float | str = ""
+        p_value: float | None = None
+        if function_stats.calls and reference:
+            delta = round((function_stats.median_ns - reference) / reference * 100, 2)
+            if p_values is not None:
+                p_value = p_values.get(function_stats.name)
+        writer.writerow(
             (
-                _format_time(int(function_stats.stdev_ns), "bright_green")
-                if count > 1
-                else ""
-            ),
-            _format_time(function_stats.min_ns, "cyan") if count else "[dim]n/a[/dim]",
-            "…",
-            _format_time(function_stats.max_ns, "magenta")
-            if count
-            else "[dim]n/a[/dim]",
-            *delta,
+                label or "",
+                function_stats.name,
+                function_stats.kind,
+                function_stats.calls,
+                function_stats.total_ns,
+                function_stats.min_ns,
+                function_stats.max_ns,
+                function_stats.median_ns,
+                function_stats.stdev_ns,
+                delta,
+                function_stats.errors,
+                function_stats.success_median_ns,
+                function_stats.error_median_ns,
+                function_stats.warmup_calls,
+                function_stats.warmup_median_ns,
+                function_stats.steady_median_ns,
+                *(
+                    "" if value is None else value
+                    for value in (
+                        function_stats.total_bytes,
+                        function_stats.median_bytes,
+                        function_stats.total_allocs,
+                        function_stats.median_allocs,
+                        len(function_stats.run_medians)
+                        if function_stats.run_medians is not None
+                        else None,
+                        function_stats.run_stdev_ns,
+                        p_value,
+                    )
+                ),
+                function_stats.collections,
+                function_stats.gc_total_ns,
+                function_stats.gc_inclusive_median_ns,
+                function_stats.gc_exclusive_median_ns,
+            )
+        )
+
+
+def _warmup_columns(function_stats: FunctionStats) -> tuple[str, ...]:
+    if not function_stats.warmup_calls:
+        return ("0", "[dim]n/a[/dim]", "[dim]n/a[/dim]")
+    return (
+        str(function_stats.warmup_calls),
+        _format_time(int(function_stats.warmup_median_ns), "yellow"),
+        _format_time(int(function_stats.steady_median_ns), "bright_green"),
+    )
+
+
+def _outcome_columns(
+    function_stats: FunctionStats,
+    success_baseline: dict[str, float] | None,
+    error_baseline: dict[str, float] | None,
+) -> tuple[str, ...]:
+    errors = function_stats.errors
+    successes = function_stats.calls - errors
+    columns = (
+        f"{function_stats.error_rate:.1%}"
+        if function_stats.calls
+        else "[dim]n/a[/dim]",
+        (
+            _format_time(int(function_stats.success_median_ns), "bright_green")
+            if successes
+            else "[dim]n/a[/dim]"
+        ),
+        (
+            _format_time(int(function_stats.error_median_ns), "red")
+            if errors
+            else "[dim]n/a[/dim]"
+        ),
+    )
+    if success_baseline is None or error_baseline is None:
+        return columns
+
+    deltas = []
+    for count, median_ns, outcome_baseline in (
+        (successes, function_stats.success_median_ns, success_baseline),
+        (errors, function_stats.error_median_ns, error_baseline),
+    ):
+        baseline_median = outcome_baseline.get(function_stats.name)
+        if count and baseline_median:
+            deltas.append(_format_delta(median_ns, baseline_median))
+        else:
+            deltas.append("[dim]n/a[/dim]")
+    return (*columns, *deltas)
+
+
+def _memory_columns(
+    function_stats: FunctionStats, memory_baseline: dict[str, float] | None
+) -> tuple[str, ...]:
+    if function_stats.total_bytes is None or not function_stats.calls:
+        columns = ("[dim]n/a[/dim]",) * 4
+    else:
+        assert function_stats.median_bytes is not None
+        assert function_stats.total_allocs is not None
+        assert function_stats.median_allocs is not None
+        columns = (
+            _format_bytes(function_stats.median_bytes, "yellow"),
+            _format_bytes(function_stats.total_bytes, None),
+            _format_count(function_stats.median_allocs, "yellow"),
+            _format_count(function_stats.total_allocs, None),
         )
-    console.print(table)
+    if memory_baseline is None:
+        return columns
+
+    baseline_bytes = memory_baseline.get(function_stats.name)
+    if (
+        function_stats.median_bytes is not None
+        and function_stats.calls
+        and baseline_bytes
+    ):
+        return (*columns, _format_delta(function_stats.median_bytes, baseline_bytes))
+    return (*columns, "[dim]n/a[/dim]")
+
+
+def _gc_columns(function_stats: FunctionStats) -> tuple[str, ...]:
+    if not function_stats.calls:
+        return ("[dim]n/a[/dim]",) * 4
+    return (
+        f"{function_stats.collections_per_call:.3g}",
+        _format_time(function_stats.gc_total_ns, None),
+        _format_time(int(function_stats.gc_inclusive_median_ns), "bright_green"),
+        _format_time(int(function_stats.gc_exclusive_median_ns), "bright_green"),
+    )
 
 
-def _format_delta(median_ns: float, baseline_ns: float) -> str:
+def _display_size_buckets(function_stats: FunctionStats, plain: bool = False) -> None:
+    _print(
+        f"[bold]{function_stats.name}()[/bold] by "
+        f"len([bold]{function_stats.size_arg}[/bold]):",
+        plain,
+    )
+    if not function_stats.size_buckets:
+        _print("[dim]No sized calls.[/dim]", plain)
+        return
+
+    rows: list[tuple[str, ...]] = []
+    for bucket in function_stats.size_buckets:
+        if bucket.min_size == bucket.max_size:
+            size = str(bucket.min_size)
+        else:
+            size = f"{bucket.min_size}…{bucket.max_size}"
+        rows.append(
+            (
+                size,
+                str(bucket.calls),
+                _format_time(int(bucket.median_ns), "bright_green"),
+            )
+        )
+    _print_table(
+        [
+            ("size", "right", None),
+            ("calls", "right", None),
+            ("median", "right", "bright_green"),
+        ],
+        rows,
+        plain,
+    )
+
+    exponent = function_stats.exponent
+    if exponent is None:
+        _print("[dim]Too few sizes to fit an exponent.[/dim]", plain)
+    else:
+        _print(
+            f"Fitted exponent: [bold]{exponent:.2f}[/bold] "
+            f"(median time ∝ size ** {exponent:.2f})",
+            plain,
+        )
+
+
+def _display_tags(function_stats: FunctionStats, plain: bool = False) -> None:
+    assert function_stats.tags is not None
+    if function_stats.kind == "region":
+        row_name = function_stats.name
+    else:
+        row_name = f"{function_stats.name}()"
+    _print(f"[bold]{row_name}[/bold] by tag:", plain)
+    if not function_stats.tags:
+        _print("[dim]No calls.[/dim]", plain)
+        return
+
+    if plain:
+        names = [tag_stats.tag for tag_stats in function_stats.tags]
+    else:
+        from rich.markup import escape
+
+        # Tags are arbitrary strings, so mustn't be read as markup.
+        names = [escape(tag_stats.tag) for tag_stats in function_stats.tags]
+    _print_table(
+        [
+            ("tag", "left", None),
+            ("calls", "right", None),
+            ("total", "right", None),
+            ("median", "right", "bright_green"),
+        ],
+        [
+            (
+                name,
+                str(tag_stats.calls),
+                _format_time(tag_stats.total_ns, None),
+                _format_time(int(tag_stats.median_ns), "bright_green"),
+            )
+            for name, tag_stats in zip(
+                names[:TAG_DISPLAY_LIMIT],
+                function_stats.tags[:TAG_DISPLAY_LIMIT],
+                strict=True,
+            )
+        ],
+        plain,
+    )
+    hidden = len(function_stats.tags) - TAG_DISPLAY_LIMIT
+    if hidden > 0:
+        _print(f"[dim]… and {hidden} more tags, in JSON output.[/dim]", plain)
+
+
+def _format_delta(
+    median_ns: float, baseline_ns: float, p_value: float | None = None
+) -> str:
+    """
+    Format the change from a baseline median, with its p-value if known,
+    dimmed when the change isn't significant.
+    """
     percent_diff = ((median_ns - baseline_ns) / baseline_ns) * 100
-    colour = "bold bright_green" if percent_diff <= 0 else "bold bright_red"
-    return f"[{colour}]{percent_diff:+.2f}%[/{colour}]"
+    if p_value is None:
+        colour = "bold bright_green" if percent_diff <= 0 else "bold bright_red"
+        return f"[{colour}]{percent_diff:+.2f}%[/{colour}]"
+    if p_value >= SIGNIFICANCE_LEVEL:
+        colour = "dim"
+    else:
+        colour = "bold bright_green" if percent_diff <= 0 else "bold bright_red"
+    return f"[{colour}]{percent_diff:+.2f}% (p={p_value:.3f})[/{colour}]"
 
 
 def _format_time(ns: int, colour: str | None) -> str:
@@ -311,6 +1532,60 @@ def _format_time(ns: int, colour: str | None) -> str:
         return f"{value}{suffix}"
 
 
+def _format_bytes(size: float, colour: str | None) -> str:
+    """Format a size in bytes with binary units and at least 3 significant digits."""
+    units = ("B", "KiB", "MiB", "GiB", "TiB")
+    unit = 0
+    while size >= 1024 and unit < len(units) - 1:
+        size /= 1024
+        unit += 1
+    suffix = units[unit]
+
+    if unit == 0:
+        value = f"{size:.0f}"
+    elif size < 10:
+        value = f"{size:.2f}"
+    elif size < 100:
+        value = f"{size:.1f}"
+    else:
+        value = f"{size:,.0f}"
+
+    if colour:
+        return f"[{colour}]{value}[/{colour}]{suffix}"
+    else:
+        return f"{value}{suffix}"
+
+
+def _format_count(count: float, colour: str | None) -> str:
+    """Format a count, with one decimal place if it's a median between two."""
+    value = f"{count:,.0f}" if count == int(count) else f"{count:,.1f}"
+    if colour:
+        return f"[{colour}]{value}[/{colour}]"
+    else:
+        return value
+
+
+DURATION_UNITS = {
+    "ns": 1,
+    "us": 1_000,
+    "μs": 1_000,
+    "ms": 1_000_000,
+    "s": 1_000_000_000,
+}
+
+
+def _parse_duration(value: str) -> int:
+    """Parse a duration such as '2ms' or '1.5s' to nanoseconds."""
+    number = value.rstrip("nuμms")
+    unit = value[len(number) :]
+    try:
+        return int(float(number) * DURATION_UNITS[unit])
+    except (KeyError, ValueError):
+        raise ValueError(
+            f"Invalid duration {value!r}, expected a number with unit ns, us, ms, or s."
+        ) from None
+
+
 def _extract_code(obj: Any) -> CodeType | None:
     """Extract code object from various callable types."""
     if isinstance(obj, str):
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import os
+import signal
+import threading
+from types import FrameType
+from typing import Any
+
+from tprof import record
+from tprof.api import (
+    _collect_stats,
+    _configure,
+    _disable_events,
+    _enable_events,
+    _register_callbacks,
+    _resolve_targets,
+    _stop_monitoring,
+    _write_json,
+    code_to_name,
+)
+
+# Seconds between checks for the control file.
+CONTROL_INTERVAL = 1.0
+
+DEFAULT_JSON_PATH = "tprof-{pid}-{n}.json"
+
+
+class Armed:
+    """
+    Handle for a process armed with arm(), controlling recording from signals,
+    a control file, or directly.
+    """
+
+    def __init__(
+        self,
+        targets: tuple[Any, ...],
+        json_path: str,
+        toggle_signal: int | None,
+        dump_signal: int | None,
+        control_path: str | None,
+    ) -> None:
+        self.json_path = json_path
+        self.armed = True
+        self.recording = False
+        self.dumps = 0
+        self._lock = threading.RLock()
+        self._restarted = False
+        self._previous_handlers: dict[int, Any] = {}
+
+        self._names = _resolve_targets(targets)
+        _configure(self._names, 0)
+        _register_callbacks()
+
+        try:
+            for signum, handler in (
+                (toggle_signal, self._handle_toggle),
+                (dump_signal, self._handle_dump),
+            ):
+                if signum is not None:
+                    self._previous_handlers[signum] = signal.signal(signum, handler)
+        except BaseException:
+            self._restore_handlers()
+            _stop_monitoring()
+            code_to_name.clear()
+            record.configure(())
+            raise
+
+        self._control_stop = threading.Event()
+        self._control_thread: threading.Thread | None = None
+        if control_path is not None:
+            self._control_thread = threading.Thread(
+                target=self._watch_control,
+                args=(control_path,),
+                name="tprof-control",
+                daemon=True,
+            )
+            self._control_thread.start()
+
+    def __enter__(self) -> Armed:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.disarm()
+
+    def start(self) -> None:
+        """
+        Start recording calls to the targets.
+        """
+        with self._lock:
+            if self.recording:
+                return
+            # Only restart events the first time: later, code locations that
+            # callbacks disabled are still not targets, so can stay disabled.
+            _enable_events(restart=not self._restarted)
+            self._restarted = True
+            self.recording = True
+
+    def stop(self) -> None:
+        """
+        Stop recording, leaving no sys.monitoring events enabled.
+        """
+        with self._lock:
+            if not self.recording:
+                return
+            _disable_events()
+            self.recording = False
+
+    def toggle(self) -> None:
+        with self._lock:
+            if self.recording:
+                self.stop()
+            else:
+                self.start()
+
+    def dump(self) -> str:
+        """
+        Write the statistics recorded so far as JSON, reset them, and return
+        the path written to. Recording carries on if it was running.
+        """
+        with self._lock:
+            path = self.json_path.format(pid=os.getpid(), n=self.dumps)
+            self.dumps += 1
+            _write_json(path, None, _collect_stats())
+            # Reconfiguring with the same targets starts a new generation of
+            # recorded data, discarding the previous one.
+            record.configure(tuple(self._names))
+            return path
+
+    def disarm(self) -> None:
+        """
+        Stop recording, restore signal handlers, and release sys.monitoring.
+        """
+        if self._control_thread is not None:
+            self._control_stop.set()
+            self._control_thread.join()
+            self._control_thread = None
+        with self._lock:
+            if not self.armed:
+                return
+            self._restore_handlers()
+            _stop_monitoring()
+            self.armed = False
+            self.recording = False
+            code_to_name.clear()
+            record.configure(())
+
+    def _restore_handlers(self) -> None:
+        for signum, handler in self._previous_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_handlers.clear()
+
+    def _handle_toggle(self, signum: int, frame: FrameType | None) -> None:
+        self.toggle()
+
+    def _handle_dump(self, signum: int, frame: FrameType | None) -> None:
+        self.dump()
+
+    def _watch_control(self, control_path: str) -> None:
+        """
+        Record while the control file exists, and dump when it's removed.
+        """
+        while not self._control_stop.is_set():
+            exists = os.path.exists(control_path)
+            with self._lock:
+                if exists and not self.recording:
+                    self.start()
+                elif not exists and self.recording:
+                    self.stop()
+                    self.dump()
+            self._control_stop.wait(CONTROL_INTERVAL)
+
+
+def arm(
+    *targets: Any,
+    json_path: str = DEFAULT_JSON_PATH,
+    toggle_signal: int | None = getattr(signal, "SIGUSR1", None),
+    dump_signal: int | None = getattr(signal, "SIGUSR2", None),
+    control_path: str | None = None,
+) -> Armed:
+    """
+    Arm profiling of the given targets without recording anything yet.
+
+    Targets are resolved and sys.monitoring callbacks registered up front, but
+    no events are enabled, so there's no overhead until recording starts. The
+    toggle signal starts and stops recording, and the dump signal writes the
+    statistics so far to json_path and resets them, without any output. The
+    path may contain {pid} and {n}, the dump number.
+
+    With control_path, a background thread also records while that file
+    exists, dumping statistics when it's removed.
+
+    Signal handlers can only be installed from the main thread.
+    """
+    return Armed(targets, json_path, toggle_signal, dump_signal, control_path)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Sequence
+
+from tprof import record
+from tprof.api import (
+    FunctionStats,
+    _collect_stats,
+    _read_json,
+    _resolve_targets,
+    _start_monitoring,
+    _stop_monitoring,
+    _write_json,
+    code_to_name,
+)
+
+# Extra time to wait for results, beyond the profiling duration, since the
+# target process only runs the bootstrap once it reaches a safe point.
+RESULTS_TIMEOUT = 10.0
+
+BOOTSTRAP = """\
+from tprof.attach import _bootstrap
+
+_bootstrap({targets!r}, {duration!r}, {results_path!r})
+"""
+
+
+def attach(pid: int, targets: Sequence[str], duration: float) -> list[FunctionStats]:
+    """
+    Profile targets in a running Python 3.14+ process for the given number of
+    seconds, returning the statistics.
+
+    The process must be able to import tprof.
+    """
+    remote_exec = getattr(sys, "remote_exec", None)
+    if remote_exec is None:
+        raise RuntimeError("Attaching to a process requires Python 3.14+.")
+
+    with tempfile.TemporaryDirectory(prefix="tprof-") as directory:
+        script_path = os.path.join(directory, "bootstrap.py")
+        results_path = os.path.join(directory, "results.json")
+        with open(script_path, "w") as fp:
+            fp.write(
+                BOOTSTRAP.format(
+                    targets=tuple(targets),
+                    duration=duration,
+                    results_path=results_path,
+                )
+            )
+        _give_to_process_owner(pid, (directory, script_path))
+
+        remote_exec(pid, script_path)
+
+        deadline = time.monotonic() + duration + RESULTS_TIMEOUT
+        while not os.path.exists(results_path):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Timed out waiting for results from process {pid}.")
+            time.sleep(0.1)
+
+        with open(results_path) as fp:
+            error = json.load(fp).get("error")
+        if error is not None:
+            raise RuntimeError(f"Profiling failed in process {pid}: {error}")
+        _, results = _read_json(results_path)
+        return results
+
+
+def _give_to_process_owner(pid: int, paths: Sequence[str]) -> None:
+    """
+    Change the owner of paths to the process’s owner, if they differ, such as
+    when attaching with sudo, so the process can read the bootstrap script and
+    write results in the otherwise private directory.
+    """
+    try:
+        process_stat = os.stat(f"/proc/{pid}")
+    except OSError:
+        # No /proc, such as on macOS, where attaching requires the same user.
+        return
+    if process_stat.st_uid == os.geteuid():
+        return
+    for path in paths:
+        os.chown(path, process_stat.st_uid, process_stat.st_gid)
+
+
+def _bootstrap(targets: tuple[str, ...], duration: float, results_path: str) -> None:
+    """
+    Run in the attached process: start profiling, then stop after the duration
+    from a background thread, so the process carries on running meanwhile.
+    """
+    try:
+        _start_monitoring(_resolve_targets(targets), 0)
+    except Exception as exc:
+        _write_results(results_path, {"error": str(exc)})
+        return
+
+    thread = threading.Thread(
+        target=_finish,
+        args=(duration, results_path),
+        name="tprof-attach",
+        daemon=True,
+    )
+    thread.start()
+
+
+def _finish(duration: float, results_path: str) -> None:
+    time.sleep(duration)
+    try:
+        try:
+            _stop_monitoring()
+            results = _collect_stats()
+        finally:
+            code_to_name.clear()
+            record.configure(())
+
+        # Write then rename, so the CLI never reads a partially written file.
+        partial_path = f"{results_path}.partial"
+        _write_json(partial_path, None, results)
+        os.replace(partial_path, results_path)
+    except Exception as exc:
+        _write_results(results_path, {"error": str(exc)})
+
+
+def _write_results(path: str, data: dict[str, str]) -> None:
+    partial_path = f"{path}.partial"
+    try:
+        with open(partial_path, "w") as fp:
+            json.dump(data, fp)
+        os.replace(partial_path, path)
+    except OSError:
+        # The CLI removes the directory when it times out, so nothing is
+        # waiting for results, and raising would only disturb the process.
+        pass
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import os
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from types import CodeType, FrameType
+
+from tprof.api import _print
+
+# Seconds to sample stacks for before profiling the hottest functions.
+DISCOVERY_DURATION = 1.0
+
+# Seconds between stack samples. Sampling needs the GIL, so while other
+# threads are busy, samples are at most one per sys.getswitchinterval().
+SAMPLE_INTERVAL = 0.001
+
+# Code in these files runs tprof or the program itself, so isn't a candidate.
+IGNORED_FILES = (runpy.__file__, threading.__file__)
+IGNORED_DIRECTORY = os.path.dirname(__file__) + os.sep
+
+
+class Discovery:
+    """
+    Find the functions with the most inclusive time by sampling every other
+    thread's stack, then pass the top ones to start() from the sampling
+    thread, to profile them for the rest of the run.
+
+    Only functions seen to return during discovery are candidates, since a
+    call already running when profiling starts, such as a main() function,
+    can't be timed.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        start: Callable[[dict[CodeType, str]], None],
+    ) -> None:
+        self.limit = limit
+        self.profiling = False
+        self.names: dict[CodeType, str] = {}
+        self._start = start
+        # Per code object, the number of samples with it on the stack.
+        self._samples: Counter[CodeType] = Counter()
+        self._returned: set[CodeType] = set()
+        self._modules: dict[CodeType, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="tprof-auto", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop sampling, if the run ended before discovery did, choosing targets
+        from the samples so far.
+        """
+        self._stop.set()
+        self._thread.join()
+        if not self.profiling:
+            self.names = self._choose()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + DISCOVERY_DURATION
+        # Frames on a stack in the previous sample, by ID, to spot returns.
+        # Holding them until the next sample stops a new call reusing the
+        # memory, and so the ID, of a returned call's frame.
+        previous: dict[int, FrameType] = {}
+        while time.monotonic() < deadline:
+            if self._stop.wait(SAMPLE_INTERVAL):
+                return
+            current: dict[int, FrameType] = {}
+            for thread_id, top_frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frame: FrameType | None = top_frame
+                on_stack: set[CodeType] = set()
+                while frame is not None:
+                    code = frame.f_code
+                    if _is_candidate(code):
+                        current[id(frame)] = frame
+                        # Count each function once per sample, however deep
+                        # its recursion, for inclusive time.
+                        if code not in on_stack:
+                            on_stack.add(code)
+                            self._samples[code] += 1
+                        if code not in self._modules:
+                            self._modules[code] = _module_name(frame.f_globals)
+                    frame = frame.f_back
+            for frame_id, previous_frame in previous.items():
+                if frame_id not in current:
+                    self._returned.add(previous_frame.f_code)
+            previous = current
+
+        self.names = self._choose()
+        if self.names and not self._stop.is_set():
+            self._start(self.names)
+            self.profiling = True
+
+    def _choose(self) -> dict[CodeType, str]:
+        ranked = [
+            code for code, _ in self._samples.most_common() if code in self._returned
+        ]
+        return {
+            code: f"{self._modules[code]}:{code.co_qualname}"
+            for code in ranked[: self.limit]
+        }
+
+
+def _is_candidate(code: CodeType) -> bool:
+    filename = code.co_filename
+    return (
+        code.co_name != "<module>"
+        and filename not in IGNORED_FILES
+        and not filename.startswith(IGNORED_DIRECTORY)
+        and not filename.startswith("<frozen ")
+    )
+
+
+def _module_name(frame_globals: dict[str, object]) -> str:
+    """
+    The importable name of a frame's module. Modules run with -m have the
+    name __main__, but their spec has the real name.
+    """
+    spec = frame_globals.get("__spec__")
+    name = getattr(spec, "name", None) or frame_globals.get("__name__")
+    return name if isinstance(name, str) else "<unknown>"
+
+
+def display_discovered(discovery: Discovery, plain: bool = False) -> None:
+    if not discovery.names:
+        _print(
+            "[bold red]🎯 tprof[/bold red] found no functions to profile.",
+            plain,
+        )
+        return
+    options = " ".join(f"-t {name}" for name in discovery.names.values())
+    _print(
+        f"[bold red]🎯 tprof[/bold red] discovered targets: {options}",
+        plain,
+        highlight=False,
+    )
+    if not discovery.profiling:
+        _print(
+            "[dim]The run ended during discovery, so no calls were profiled. "
+            "Rerun with these targets to profile them.[/dim]",
+            plain,
+        )
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import csv
+import importlib.util
+import json
+import os
+import sys
+from collections.abc import Generator
+from contextlib import contextmanager
+
+from tprof import record
+from tprof.api import (
+    REPORT_FORMATS,
+    TOOL_ID,
+    TOOL_NAME,
+    _print,
+    _print_table,
+    _stop_monitoring,
+)
+
+
+@contextmanager
+def count_calls(
+    *modules: str,
+    label: str | None = None,
+    json_path: str | None = None,
+    report_format: str = "rich",
+) -> Generator[dict[str, int]]:
+    """
+    Count calls to every function in the given modules and packages, without
+    timing them, and print a report of the counts when done.
+    """
+    if not modules:
+        raise ValueError("At least one module must be provided.")
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(
+            f"Invalid report format {report_format!r}, expected one of: "
+            f"{', '.join(REPORT_FORMATS)}."
+        )
+    scopes = [scope for module in modules for scope in _module_scopes(module)]
+
+    record.configure(
+        (),
+        0,
+        None,
+        False,
+        0,
+        None,
+        "perf_counter",
+        None,
+        tuple(prefix for prefix, _ in scopes),
+    )
+    sys.monitoring.use_tool_id(TOOL_ID, TOOL_NAME)
+    sys.monitoring.register_callback(
+        TOOL_ID, sys.monitoring.events.PY_START, record.count_callback
+    )
+    sys.monitoring.set_events(TOOL_ID, sys.monitoring.events.PY_START)
+    # Re-enable events at code locations that callbacks disabled during any
+    # previous profiling session.
+    sys.monitoring.restart_events()
+
+    counts: dict[str, int] = {}
+    exc = False
+    try:
+        yield counts
+    except Exception:
+        exc = True
+        raise
+    finally:
+        _stop_monitoring()
+        named: dict[str, int] = {}
+        for code, count in record.count_stats().items():
+            name = f"{_module_name(code.co_filename, scopes)}:{code.co_qualname}"
+            named[name] = named.get(name, 0) + count
+        counts.update(sorted(named.items(), key=lambda item: (-item[1], item[0])))
+        record.configure(())
+
+        if not exc:
+            if json_path is not None:
+                _write_counts_json(json_path, label, counts)
+            display_counts(counts, label=label, report_format=report_format)
+
+
+def _module_scopes(module: str) -> list[tuple[str, str]]:
+    """
+    The filename prefixes covering a module or package's code, with the
+    module name each corresponds to. Only a package's parents are imported.
+    """
+    try:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None:
+        raise ValueError(f"Cannot find module {module!r}.")
+    if spec.submodule_search_locations is not None:
+        return [
+            (os.path.join(location, ""), module)
+            for location in spec.submodule_search_locations
+        ]
+    if spec.origin is None or not spec.has_location:
+        raise ValueError(f"Module {module!r} has no source file to count calls in.")
+    return [(spec.origin, module)]
+
+
+def _module_name(filename: str, scopes: list[tuple[str, str]]) -> str:
+    """The module name of a counted code object's file."""
+    for prefix, module in scopes:
+        if not filename.startswith(prefix):
+            continue
+        relative = filename[len(prefix) :]
+        if not relative:
+            return module
+        parts = os.path.splitext(relative)[0].split(os.sep)
+        if parts[-1] == "__init__":
+            parts.pop()
+        return ".".join([module, *parts])
+    return filename
+
+
+def _write_counts_json(path: str, label: str | None, counts: dict[str, int]) -> None:
+    data = {
+        "version": 1,
+        "label": label,
+        "counts": [{"name": name, "calls": calls} for name, calls in counts.items()],
+    }
+    if path == "-":
+        json.dump(data, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(path, "w") as fp:
+            json.dump(data, fp, indent=2)
+            fp.write("\n")
+
+
+def display_counts(
+    counts: dict[str, int], label: str | None = None, report_format: str = "rich"
+) -> None:
+    if report_format == "none":
+        return
+    if report_format in ("csv", "tsv"):
+        writer = csv.writer(
+            sys.stderr,
+            delimiter="," if report_format == "csv" else "\t",
+            lineterminator="\n",
+        )
+        writer.writerow(("label", "name", "calls"))
+        for name, calls in counts.items():
+            writer.writerow((label or "", name, calls))
+        return
+    plain = report_format == "plain"
+
+    heading = "[bold red]🎯 tprof[/bold red] call counts"
+    if label:
+        heading += f" @ [bold bright_blue]{label}[/bold bright_blue]"
+    heading += ":"
+    _print(heading, plain)
+    if not counts:
+        _print("[dim]No calls counted.[/dim]", plain)
+        return
+    _print_table(
+        [("function", "left", None), ("calls", "right", None)],
+        [(f"[bold]{name}()[/bold]", str(calls)) for name, calls in counts.items()],
+        plain,
+    )
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import math
+import os
+import subprocess
+import tempfile
+from collections.abc import Sequence
+from contextlib import suppress
+
+from tprof.api import FunctionStats
+from tprof.runs import merge_runs, run_once
+
+
+def diff(
+    base_ref: str,
+    head_ref: str,
+    options: Sequence[str],
+    program: Sequence[str],
+    runs: int,
+) -> tuple[list[FunctionStats], list[FunctionStats]]:
+    """
+    Profile the program at two git revisions of the current repository,
+    checked out into temporary worktrees, with the given tprof options,
+    returning the merged statistics of the base and head revisions.
+
+    Runs alternate between the revisions in ABBA order, so drift in the
+    machine's speed, such as from heating up, affects both equally.
+    """
+    toplevel = _git("rev-parse", "--show-toplevel")
+    # The program runs from the same subdirectory in each worktree.
+    prefix = _git("rev-parse", "--show-prefix")
+    commits = []
+    for ref in (base_ref, head_ref):
+        try:
+            commits.append(
+                _git("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}")
+            )
+        except RuntimeError:
+            raise RuntimeError(f"Unknown git revision {ref!r}.") from None
+
+    with tempfile.TemporaryDirectory(prefix="tprof-diff-") as directory:
+        worktrees = []
+        try:
+            for name, commit in zip(("base", "head"), commits, strict=True):
+                worktree = os.path.join(directory, name)
+                _git("-C", toplevel, "worktree", "add", "--detach", worktree, commit)
+                worktrees.append(worktree)
+
+            results: tuple[list[list[FunctionStats]], ...] = ([], [])
+            for n in range(runs):
+                order = (0, 1) if n % 2 == 0 else (1, 0)
+                for side in order:
+                    ref = (base_ref, head_ref)[side]
+                    cwd = os.path.join(worktrees[side], prefix)
+                    if not os.path.isdir(cwd):
+                        raise RuntimeError(
+                            f"The directory {prefix.rstrip('/')!r} doesn't exist "
+                            f"at revision {ref!r}."
+                        )
+                    results[side].append(
+                        run_once(
+                            options,
+                            program,
+                            f"Run {n + 1} of {ref}",
+                            cwd=cwd,
+                            env=_environment(worktrees[side]),
+                        )
+                    )
+        finally:
+            for worktree in worktrees:
+                with suppress(RuntimeError):
+                    _git("-C", toplevel, "worktree", "remove", "--force", worktree)
+    # Clear records of any worktrees that couldn't be removed, now their
+    # directories are gone.
+    _git("-C", toplevel, "worktree", "prune")
+
+    return merge_runs(results[0]), merge_runs(results[1])
+
+
+def _environment(worktree: str) -> dict[str, str]:
+    """
+    The environment for runs in a worktree, which puts its root and any src
+    directory first on sys.path, so its code is imported rather than an
+    editable install of the original checkout.
+    """
+    paths = [worktree]
+    src = os.path.join(worktree, "src")
+    if os.path.isdir(src):
+        paths.insert(0, src)
+    existing = os.environ.get("PYTHONPATH")
+    if existing:
+        paths.append(existing)
+    return {**os.environ, "PYTHONPATH": os.pathsep.join(paths)}
+
+
+def _git(*args: str) -> str:
+    try:
+        result = subprocess.run(["git", *args], capture_output=True, text=True)
+    except OSError as exc:
+        raise RuntimeError(f"Cannot run git: {exc}") from exc
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        message = lines[-1] if lines else f"exit code {result.returncode}"
+        raise RuntimeError(f"git {' '.join(args)} failed: {message}")
+    return result.stdout.strip()
+
+
+def p_values(base: list[FunctionStats], head: list[FunctionStats]) -> dict[str, float]:
+    """
+    Two-sided p-values, by target name, for whether the head revision's
+    per-run medians differ from the base revision's, from an exact
+    Mann-Whitney U test, which doesn't assume the medians are normally
+    distributed.
+    """
+    base_medians = {
+        function_stats.name: function_stats.run_medians or [] for function_stats in base
+    }
+    result = {}
+    for function_stats in head:
+        before = base_medians.get(function_stats.name)
+        after = function_stats.run_medians
+        if before and after:
+            result[function_stats.name] = mann_whitney_p(before, after)
+    return result
+
+
+def mann_whitney_p(first: Sequence[float], second: Sequence[float]) -> float:
+    """
+    The exact two-sided p-value of the Mann-Whitney U test for two samples,
+    counting ties as half.
+    """
+    u = sum(1.0 if x > y else 0.5 if x == y else 0.0 for x in first for y in second)
+    m = len(first)
+    n = len(second)
+    counts = _u_counts(m, n)
+    total = math.comb(m + n, m)
+    below = sum(counts[: math.floor(u) + 1]) / total
+    above = sum(counts[math.ceil(u) :]) / total
+    return min(1.0, 2 * min(below, above))
+
+
+def _u_counts(m: int, n: int) -> list[int]:
+    """
+    The number of orderings of m first-sample and n second-sample values
+    with each value of U, indexed by U.
+    """
+    # table[j][k] is the number of orderings of i first-sample and j
+    # second-sample values with U equal to k, for the current i.
+    table = [[1] for _ in range(n + 1)]
+    for _ in range(m):
+        row = [[1]]
+        for j in range(1, n + 1):
+            # The largest value is from the first sample, beating all j
+            # second-sample values, or from the second sample.
+            with_first = [0] * j + table[j]
+            with_second = row[j - 1]
+            size = max(len(with_first), len(with_second))
+            row.append(
+                [
+                    (with_first[k] if k < len(with_first) else 0)
+                    + (with_second[k] if k < len(with_second) else 0)
+                    for k in range(size)
+                ]
+            )
+        table = row
+    return table[n]
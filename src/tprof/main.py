@@ -1,26 +1,165 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
 from collections.abc import Sequence
+from contextlib import ExitStack
+from typing import Any
 
-from tprof.api import _load_baseline, tprof
+from tprof import record
+from tprof.api import (
+    CLOCKS,
+    REPORT_FORMATS,
+    _load_baseline,
+    _parse_duration,
+    _read_json,
+    _save_run,
+    _write_json,
+    display_report,
+    region,
+    tprof,
+)
+from tprof.record import Region
 
 
 def main(argv: Sequence[str] | None = None) -> int:
     if argv is None:
         argv = sys.argv[1:]
 
-    parser = argparse.ArgumentParser(prog="tprof", allow_abbrev=False)
+    if argv[:1] == ["history"]:
+        return history_main(argv[1:])
+    if argv[:1] == ["attach"]:
+        return attach_main(argv[1:])
+    if argv[:1] == ["diff"]:
+        return diff_main(argv[1:])
+    if argv[:1] == ["merge"]:
+        return merge_main(argv[1:])
+
+    parser = argparse.ArgumentParser(
+        prog="tprof",
+        allow_abbrev=False,
+        epilog=(
+            "Run 'tprof history --help', 'tprof attach --help', 'tprof diff "
+            "--help', or 'tprof merge --help' for help on those commands."
+        ),
+    )
     parser.suggest_on_error = True
     parser.add_argument(
         "-t",
         metavar="target",
         action="append",
         dest="targets",
-        required=True,
         help="Target callable to profile (format: module:function).",
     )
+    parser.add_argument(
+        "-r",
+        metavar="region",
+        action="append",
+        dest="targets",
+        type=region,
+        help="Target region to profile, by the name passed to tprof.region().",
+    )
+    parser.add_argument(
+        "--auto",
+        metavar="N",
+        type=_positive_int,
+        help=(
+            "Instead of targets, sample stacks for a second to find the N "
+            "functions with the most inclusive time, then profile those."
+        ),
+    )
+    parser.add_argument(
+        "--count-only",
+        metavar="module",
+        action="append",
+        dest="count_modules",
+        help=(
+            "Instead of timing targets, count calls to every function in this "
+            "module or package."
+        ),
+    )
+    parser.add_argument(
+        "--size-arg",
+        metavar="target=argument",
+        action="append",
+        dest="size_args",
+        default=[],
+        type=_size_arg,
+        help=(
+            "Group a target's calls by len() of the named argument, to show how "
+            "its time scales."
+        ),
+    )
+    parser.add_argument(
+        "--slow",
+        dest="slow_threshold",
+        metavar="duration",
+        type=_duration,
+        help=(
+            "Capture the stack and arguments of target calls taking at least this "
+            "long, such as 50ms, and report the slowest."
+        ),
+    )
+    parser.add_argument(
+        "--skip-warmup",
+        action="store_true",
+        help=(
+            "Leave out each target's detected warmup calls from the statistics and "
+            "baseline comparison."
+        ),
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Also count bytes and allocations made during each target call.",
+    )
+    parser.add_argument(
+        "--exclude-gc",
+        action="store_true",
+        help=(
+            "Subtract time spent in garbage collections from each target call's "
+            "duration."
+        ),
+    )
+    parser.add_argument(
+        "--tags",
+        action="store_true",
+        help="Break down each target's calls by the tag set with tprof.set_tag().",
+    )
+    parser.add_argument(
+        "--runs",
+        metavar="N",
+        type=_positive_int,
+        help=(
+            "Run the program N times in fresh interpreters and merge the "
+            "statistics, reporting the spread of medians between runs."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        metavar="N",
+        type=_positive_int,
+        default=1,
+        help="With --runs, run up to N at once, each pinned to its own CPU.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "Profile the program again each time its source files change, "
+            "comparing against the previous run, with dependencies kept imported "
+            "in between."
+        ),
+    )
+    parser.add_argument(
+        "--clock",
+        choices=CLOCKS,
+        default="perf_counter",
+        help=(
+            "Clock to time calls with. tsc, where available, has the lowest overhead."
+        ),
+    )
     delta_group = parser.add_mutually_exclusive_group()
     delta_group.add_argument(
         "-x",
@@ -34,12 +173,53 @@ def main(argv: Sequence[str] | None = None) -> int:
         metavar="path",
         help="Compare against statistics from a previous run's --json file.",
     )
+    parser.add_argument(
+        "--format",
+        dest="report_format",
+        choices=REPORT_FORMATS,
+        default="rich",
+        help=(
+            "Format of the report: a table for terminals, the same as plain text, "
+            "or comma- or tab-separated values for log aggregation."
+        ),
+    )
     parser.add_argument(
         "--json",
         dest="json_path",
         metavar="path",
         help="Write statistics as JSON to this file, or '-' for stdout.",
     )
+    parser.add_argument(
+        "--sketch",
+        action="store_true",
+        help=(
+            "Include a sketch of each target's durations in JSON output, so "
+            "files can be combined with 'tprof merge'."
+        ),
+    )
+    parser.add_argument(
+        "--store",
+        dest="store_path",
+        metavar="path",
+        help="Append statistics to the run history in this SQLite database.",
+    )
+    parser.add_argument(
+        "--label",
+        metavar="label",
+        help="Label for the report heading, JSON output, and stored run.",
+    )
+    parser.add_argument(
+        "--trace",
+        dest="trace_path",
+        metavar="path",
+        help="Write a timeline of target calls to this file, in Chrome trace format.",
+    )
+    parser.add_argument(
+        "--openmetrics",
+        dest="openmetrics_path",
+        metavar="path",
+        help="Write call counts and latency histograms to this file, in OpenMetrics format.",
+    )
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument(
         "-m",
@@ -61,16 +241,59 @@ def main(argv: Sequence[str] | None = None) -> int:
         return 2
 
     args = parser.parse_args(argv)
+    if args.count_modules:
+        if args.targets:
+            parser.error("argument --count-only: not allowed with -t or -r")
+        for option, used in (
+            ("--auto", args.auto is not None),
+            ("--size-arg", bool(args.size_args)),
+            ("--slow", args.slow_threshold is not None),
+            ("--skip-warmup", args.skip_warmup),
+            ("--memory", args.memory),
+            ("--exclude-gc", args.exclude_gc),
+            ("--tags", args.tags),
+            ("--runs", args.runs is not None),
+            ("-x", args.compare),
+            ("--baseline", args.baseline_path is not None),
+            ("--store", args.store_path is not None),
+            ("--trace", args.trace_path is not None),
+            ("--openmetrics", args.openmetrics_path is not None),
+            ("--sketch", args.sketch),
+            ("--watch", args.watch),
+        ):
+            if used:
+                parser.error(f"argument --count-only: not allowed with {option}")
+        return _count_only(args)
+    if args.auto is not None:
+        if args.targets:
+            parser.error("argument --auto: not allowed with -t or -r")
+    elif not args.targets:
+        parser.error(
+            "at least one of the arguments -t -r --auto --count-only is required"
+        )
 
-    if args.module:
-        sys.path.insert(0, "")
+    targets, size_args = _qualify_targets(parser, args)
+    if args.clock not in record.clocks():
+        parser.error(f"clock {args.clock!r} is not available on this platform")
+    if args.sketch and args.skip_warmup:
+        parser.error("argument --sketch: not allowed with --skip-warmup")
 
-    targets = args.targets
-    if args.module:
-        targets = [
-            f"{args.module}:{target}" if ":" not in target else target
-            for target in targets
-        ]
+    if args.runs is not None:
+        for option, value in (
+            ("--auto", args.auto),
+            ("--slow", args.slow_threshold),
+            ("--trace", args.trace_path),
+            ("--openmetrics", args.openmetrics_path),
+        ):
+            if value is not None:
+                parser.error(f"argument --runs: not allowed with {option}")
+
+    if args.watch:
+        if not hasattr(os, "fork"):
+            parser.error("argument --watch: not supported on this platform")
+        for option, used in (("--runs", args.runs is not None), ("-x", args.compare)):
+            if used:
+                parser.error(f"argument --watch: not allowed with {option}")
 
     if args.baseline_path is not None:
         try:
@@ -79,33 +302,572 @@ def main(argv: Sequence[str] | None = None) -> int:
             print(f"tprof: {exc}", file=sys.stderr)
             return 2
 
+    if args.runs is not None:
+        return _run_many(args, targets, size_args)
+
+    if args.module:
+        sys.path.insert(0, "")
+
+    if args.watch:
+        result = _watch(args, targets, size_args)
+    else:
+        _profile(args, targets, size_args, args.json_path, args.baseline_path)
+        result = 0
+
+    if args.module:
+        sys.path.pop(0)
+
+    return result
+
+
+def _profile(
+    args: argparse.Namespace,
+    targets: list[Any],
+    size_args: dict[str, str],
+    json_path: str | None,
+    baseline_path: str | None,
+) -> None:
+    """Profile the program once, writing JSON and comparing as given."""
     with tprof(
         *targets,
+        label=args.label,
         compare=args.compare,
-        json_path=args.json_path,
-        baseline_path=args.baseline_path,
+        json_path=json_path,
+        baseline_path=baseline_path,
+        trace_path=args.trace_path,
+        store_path=args.store_path,
+        openmetrics_path=args.openmetrics_path,
+        size_args=size_args,
+        memory=args.memory,
+        slow_threshold=args.slow_threshold,
+        skip_warmup=args.skip_warmup,
+        clock=args.clock,
+        report_format=args.report_format,
+        auto=args.auto,
+        sketch=args.sketch,
+        exclude_gc=args.exclude_gc,
+        tag=args.tags,
     ):
-        orig_sys_argv = sys.argv
-        sys.argv = [args.module, *args.args]
+        _run_program(args)
+
+
+def _watch(
+    args: argparse.Namespace, targets: list[Any], size_args: dict[str, str]
+) -> int:
+    """
+    Profile the program in forked children, again whenever its source files
+    change, each compared against the last.
+    """
+    from tprof.watch import watch
+
+    def run(results_path: str, baseline_path: str | None) -> None:
+        _profile(args, targets, size_args, results_path, baseline_path)
+
+    return watch(
+        run,
+        baseline_path=args.baseline_path,
+        json_path=args.json_path,
+        script=args.script,
+        module=args.module,
+    )
+
+
+def _count_only(args: argparse.Namespace) -> int:
+    from tprof.counts import count_calls
+
+    if args.module:
+        sys.path.insert(0, "")
+
+    with ExitStack() as stack:
         try:
+            stack.enter_context(
+                count_calls(
+                    *args.count_modules,
+                    label=args.label,
+                    json_path=args.json_path,
+                    report_format=args.report_format,
+                )
+            )
+        except ValueError as exc:
+            print(f"tprof: {exc}", file=sys.stderr)
             if args.module:
-                import runpy
-
-                runpy.run_module(args.module, run_name="__main__", alter_sys=True)
-            else:
-                with open(args.script, "rb") as f:
-                    code = compile(f.read(), args.script, "exec")
-                    exec(
-                        code,
-                        {
-                            "__name__": "__main__",
-                            "__file__": args.script,
-                        },
-                    )
-        finally:
-            sys.argv = orig_sys_argv
+                sys.path.pop(0)
+            return 2
+        _run_program(args)
 
     if args.module:
         sys.path.pop(0)
 
     return 0
+
+
+def _run_program(args: argparse.Namespace) -> None:
+    """Run the script or module, as if run directly."""
+    orig_sys_argv = sys.argv
+    sys.argv = [args.module, *args.args]
+    try:
+        if args.module:
+            import runpy
+
+            runpy.run_module(args.module, run_name="__main__", alter_sys=True)
+        else:
+            with open(args.script, "rb") as f:
+                code = compile(f.read(), args.script, "exec")
+                exec(
+                    code,
+                    {
+                        "__name__": "__main__",
+                        "__file__": args.script,
+                    },
+                )
+    finally:
+        sys.argv = orig_sys_argv
+
+
+def _run_many(
+    args: argparse.Namespace, targets: list[Any], size_args: dict[str, str]
+) -> int:
+    """
+    Profile the program in several fresh interpreters, then report and write
+    the merged statistics.
+    """
+    from tprof.runs import merge_runs, run_many
+
+    options, program = _child_arguments(args, targets, size_args)
+    try:
+        results = merge_runs(run_many(options, program, args.runs, args.jobs))
+    except RuntimeError as exc:
+        print(f"tprof: {exc}", file=sys.stderr)
+        return 1
+
+    baseline = None
+    success_baseline = None
+    error_baseline = None
+    memory_baseline = None
+    if args.baseline_path is not None:
+        baseline = _load_baseline(args.baseline_path)
+        success_baseline = _load_baseline(args.baseline_path, "success_median_ns")
+        error_baseline = _load_baseline(args.baseline_path, "error_median_ns")
+        if args.memory:
+            memory_baseline = _load_baseline(args.baseline_path, "median_bytes")
+
+    if args.json_path is not None:
+        _write_json(args.json_path, args.label, results)
+    if args.store_path is not None:
+        _save_run(args.store_path, args.label, results)
+    display_report(
+        results,
+        label=args.label,
+        compare=args.compare,
+        baseline=baseline,
+        success_baseline=success_baseline,
+        error_baseline=error_baseline,
+        memory_baseline=memory_baseline,
+        report_format=args.report_format,
+    )
+    return 0
+
+
+def _qualify_targets(
+    parser: argparse.ArgumentParser, args: argparse.Namespace
+) -> tuple[list[Any], dict[str, str]]:
+    """
+    The targets and size arguments, with the module name added to targets
+    without one when running a module.
+    """
+    targets = args.targets or []
+    size_args = dict(args.size_args)
+    if args.module:
+        targets = [
+            f"{args.module}:{target}"
+            if isinstance(target, str) and ":" not in target
+            else target
+            for target in targets
+        ]
+        size_args = {
+            (f"{args.module}:{target}" if ":" not in target else target): argument
+            for target, argument in size_args.items()
+        }
+    for target in size_args:
+        if target not in targets:
+            parser.error(f"--size-arg target {target!r} is not a -t target")
+    return targets, size_args
+
+
+def _child_arguments(
+    args: argparse.Namespace, targets: list[Any], size_args: dict[str, str]
+) -> tuple[list[str], list[str]]:
+    """
+    The tprof options and program arguments for profiling the program in a
+    fresh interpreter.
+    """
+    options: list[str] = []
+    for target in targets:
+        if isinstance(target, Region):
+            options += ["-r", target.name]
+        else:
+            options += ["-t", target]
+    for target, argument in size_args.items():
+        options += ["--size-arg", f"{target}={argument}"]
+    if args.skip_warmup:
+        options.append("--skip-warmup")
+    if args.memory:
+        options.append("--memory")
+    if args.sketch:
+        options.append("--sketch")
+    if args.exclude_gc:
+        options.append("--exclude-gc")
+    if args.tags:
+        options.append("--tags")
+    options += ["--clock", args.clock]
+    if args.module:
+        program = ["-m", args.module, *args.args]
+    else:
+        program = [args.script, *args.args]
+    return options, program
+
+
+def _duration(value: str) -> str:
+    try:
+        _parse_duration(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid duration {value!r}, expected a number with unit ns, us, ms, or s"
+        ) from None
+    return value
+
+
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            f"invalid count {value!r}, expected a positive integer"
+        )
+    return number
+
+
+def _size_arg(value: str) -> tuple[str, str]:
+    target, sep, argument = value.rpartition("=")
+    if not sep or not target or not argument:
+        raise argparse.ArgumentTypeError(
+            f"invalid size argument {value!r}, expected target=argument"
+        )
+    return target, argument
+
+
+def history_main(argv: Sequence[str]) -> int:
+    import sqlite3
+
+    from tprof.store import display_history, load_history
+
+    parser = argparse.ArgumentParser(prog="tprof history", allow_abbrev=False)
+    parser.suggest_on_error = True
+    parser.add_argument(
+        "--store",
+        dest="store_path",
+        metavar="path",
+        required=True,
+        help="SQLite database written by tprof --store.",
+    )
+    parser.add_argument(
+        "-t",
+        metavar="target",
+        dest="target",
+        required=True,
+        help="Target to show history for (format: module:function).",
+    )
+    parser.add_argument(
+        "-n",
+        metavar="runs",
+        dest="limit",
+        type=int,
+        default=50,
+        help="Number of most recent runs to show (default: 50).",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        entries = load_history(args.store_path, args.target, args.limit)
+    except (sqlite3.Error, ValueError) as exc:
+        print(f"tprof: {exc}", file=sys.stderr)
+        return 2
+
+    display_history(args.target, entries)
+    return 0
+
+
+def attach_main(argv: Sequence[str]) -> int:
+    from tprof.attach import attach
+
+    parser = argparse.ArgumentParser(
+        prog="tprof attach",
+        allow_abbrev=False,
+        description=(
+            "Profile targets in a running Python 3.14+ process, which must be "
+            "able to import tprof."
+        ),
+    )
+    parser.suggest_on_error = True
+    parser.add_argument("pid", type=int, help="ID of the process to attach to.")
+    parser.add_argument(
+        "-t",
+        metavar="target",
+        action="append",
+        dest="targets",
+        required=True,
+        help="Target callable to profile (format: module:function).",
+    )
+    parser.add_argument(
+        "--duration",
+        metavar="seconds",
+        type=float,
+        default=10.0,
+        help="How long to profile for (default: 10).",
+    )
+    parser.add_argument(
+        "--format",
+        dest="report_format",
+        choices=REPORT_FORMATS,
+        default="rich",
+        help=(
+            "Format of the report: a table for terminals, the same as plain text, "
+            "or comma- or tab-separated values for log aggregation."
+        ),
+    )
+    parser.add_argument(
+        "--json",
+        dest="json_path",
+        metavar="path",
+        help="Write statistics as JSON to this file, or '-' for stdout.",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        results = attach(args.pid, args.targets, args.duration)
+    except (OSError, RuntimeError) as exc:
+        print(f"tprof: {exc}", file=sys.stderr)
+        return 1
+
+    if args.json_path is not None:
+        _write_json(args.json_path, None, results)
+    display_report(results, label=f"PID {args.pid}", report_format=args.report_format)
+    return 0
+
+
+def diff_main(argv: Sequence[str]) -> int:
+    from tprof.diff import diff, p_values
+
+    # The revisions come first, but argparse would pass options after them to
+    # the program, so they're split off by hand.
+    parser = argparse.ArgumentParser(
+        prog="tprof diff",
+        usage="%(prog)s [-h] base head [options] (-m module | script) [args ...]",
+        allow_abbrev=False,
+        description=(
+            "Compare targets at the git revision head against the revision "
+            "base, profiling each in a temporary worktree of the current "
+            "repository, alternating between them."
+        ),
+    )
+    parser.suggest_on_error = True
+    parser.add_argument(
+        "-t",
+        metavar="target",
+        action="append",
+        dest="targets",
+        required=True,
+        help="Target callable to profile (format: module:function).",
+    )
+    parser.add_argument(
+        "-r",
+        metavar="region",
+        action="append",
+        dest="targets",
+        type=region,
+        help="Target region to profile, by the name passed to tprof.region().",
+    )
+    parser.add_argument(
+        "--runs",
+        metavar="N",
+        type=_positive_int,
+        default=5,
+        help="Number of runs of each revision (default: 5).",
+    )
+    parser.add_argument(
+        "--size-arg",
+        metavar="target=argument",
+        action="append",
+        dest="size_args",
+        default=[],
+        type=_size_arg,
+        help=(
+            "Group a target's calls by len() of the named argument, to show how "
+            "its time scales."
+        ),
+    )
+    parser.add_argument(
+        "--skip-warmup",
+        action="store_true",
+        help="Leave out each target's detected warmup calls from the statistics.",
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Also count bytes and allocations made during each target call.",
+    )
+    parser.add_argument(
+        "--exclude-gc",
+        action="store_true",
+        help=(
+            "Subtract time spent in garbage collections from each target call's "
+            "duration."
+        ),
+    )
+    parser.add_argument(
+        "--tags",
+        action="store_true",
+        help="Break down each target's calls by the tag set with tprof.set_tag().",
+    )
+    parser.add_argument(
+        "--clock",
+        choices=CLOCKS,
+        default="perf_counter",
+        help=(
+            "Clock to time calls with. tsc, where available, has the lowest overhead."
+        ),
+    )
+    parser.add_argument(
+        "--format",
+        dest="report_format",
+        choices=REPORT_FORMATS,
+        default="rich",
+        help=(
+            "Format of the report: a table for terminals, the same as plain text, "
+            "or comma- or tab-separated values for log aggregation."
+        ),
+    )
+    parser.add_argument(
+        "--json",
+        dest="json_path",
+        metavar="path",
+        help="Write the head revision's statistics as JSON to this file, or '-'.",
+    )
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument(
+        "-m",
+        metavar="module",
+        dest="module",
+        help="Run library module as a script (like python -m)",
+    )
+    group.add_argument("script", nargs="?", help="Python script to run")
+    parser.add_argument(
+        "args",
+        nargs=argparse.REMAINDER,
+        help="Arguments to pass to the script or module",
+    )
+    revisions = list(argv[:2])
+    if len(revisions) < 2 or any(revision.startswith("-") for revision in revisions):
+        parser.parse_args(argv)
+        parser.error("the following arguments are required: base, head")
+    parser.set_defaults(sketch=False)
+    args = parser.parse_args(argv[2:])
+    args.base, args.head = revisions
+
+    targets, size_args = _qualify_targets(parser, args)
+    if args.clock not in record.clocks():
+        parser.error(f"clock {args.clock!r} is not available on this platform")
+    options, program = _child_arguments(args, targets, size_args)
+
+    try:
+        base, head = diff(args.base, args.head, options, program, args.runs)
+    except RuntimeError as exc:
+        print(f"tprof: {exc}", file=sys.stderr)
+        return 1
+
+    if args.json_path is not None:
+        _write_json(args.json_path, args.head, head)
+    display_report(
+        head,
+        label=f"{args.head} vs {args.base}",
+        baseline={
+            function_stats.name: function_stats.median_ns for function_stats in base
+        },
+        success_baseline={
+            function_stats.name: function_stats.success_median_ns
+            for function_stats in base
+        },
+        error_baseline={
+            function_stats.name: function_stats.error_median_ns
+            for function_stats in base
+        },
+        memory_baseline=(
+            {
+                function_stats.name: function_stats.median_bytes
+                for function_stats in base
+                if function_stats.median_bytes is not None
+            }
+            if args.memory
+            else None
+        ),
+        report_format=args.report_format,
+        p_values=p_values(base, head),
+    )
+    return 0
+
+
+def merge_main(argv: Sequence[str]) -> int:
+    from tprof.runs import merge_runs
+
+    parser = argparse.ArgumentParser(
+        prog="tprof merge",
+        allow_abbrev=False,
+        description=(
+            "Combine statistics from --json files of several runs, such as "
+            "shards of one job, then report them."
+        ),
+    )
+    parser.suggest_on_error = True
+    parser.add_argument(
+        "paths", metavar="path", nargs="+", help="JSON files written by --json."
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="json_path",
+        metavar="path",
+        help="Write the combined statistics as JSON to this file, or '-' for stdout.",
+    )
+    parser.add_argument(
+        "--label",
+        metavar="label",
+        help="Label for the report heading and JSON output.",
+    )
+    parser.add_argument(
+        "--format",
+        dest="report_format",
+        choices=REPORT_FORMATS,
+        default="rich",
+        help=(
+            "Format of the report: a table for terminals, the same as plain text, "
+            "or comma- or tab-separated values for log aggregation."
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    runs = []
+    for path in args.paths:
+        try:
+            _, results = _read_json(path)
+        except (OSError, ValueError, TypeError, KeyError) as exc:
+            print(f"tprof: Cannot read {path!r}: {exc}", file=sys.stderr)
+            return 2
+        runs.append(results)
+    results = merge_runs(runs)
+
+    if args.json_path is not None:
+        _write_json(args.json_path, args.label, results)
+    display_report(results, label=args.label, report_format=args.report_format)
+    return 0
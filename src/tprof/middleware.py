@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterable, Iterator
+from contextvars import Context, ContextVar, copy_context
+from typing import Any
+
+from tprof import record
+from tprof.api import (
+    NO_TAG,
+    OTHER_TAG,
+    _resolve_targets,
+    _start_monitoring,
+    _stop_monitoring,
+    code_to_name,
+)
+from tprof.record import Region
+
+# Route template of the request being handled, tagging each target call.
+route_var: ContextVar[str] = ContextVar("tprof_route")
+
+# Route that requests, and target calls, beyond the limit of distinct routes
+# are counted under.
+OTHER_ROUTE = "<other>"
+
+# Seconds between periodic dumps to json_path.
+DEFAULT_DUMP_INTERVAL = 60.0
+
+WSGIApp = Callable[[dict[str, Any], Callable[..., Any]], Iterable[bytes]]
+ASGIApp = Callable[
+    [dict[str, Any], Callable[[], Awaitable[Any]], Callable[[Any], Awaitable[None]]],
+    Awaitable[None],
+]
+
+
+def set_route(route: str) -> None:
+    """
+    Set the route template of the current request, such as "/items/{id}",
+    for example once the app's router has matched it. Target calls from then
+    on, and the request itself, are counted under that route.
+    """
+    route_var.set(route)
+
+
+class _Middleware:
+    """
+    One long-lived profiling session, recording target calls per route.
+    """
+
+    def __init__(
+        self,
+        targets: tuple[Any, ...],
+        json_path: str | None,
+        dump_interval: float,
+        endpoint_path: str | None,
+        endpoint_token: str | None,
+    ) -> None:
+        if endpoint_path is not None and not endpoint_token:
+            raise ValueError("endpoint_path requires an endpoint_token.")
+        self.json_path = json_path
+        self.endpoint_path = endpoint_path
+        self._endpoint_authorization = f"Bearer {endpoint_token}".encode()
+        self._lock = threading.Lock()
+        # Per route, the request count and total request time.
+        self._requests: dict[str, list[int]] = {}
+
+        self._names = _resolve_targets(targets)
+        _start_monitoring(self._names, 0, tag_var=route_var)
+
+        self._dump_stop = threading.Event()
+        self._dump_thread: threading.Thread | None = None
+        if json_path is not None:
+            self._dump_thread = threading.Thread(
+                target=self._dump_periodically,
+                args=(dump_interval,),
+                name="tprof-middleware",
+                daemon=True,
+            )
+            self._dump_thread.start()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Per-route request counts and target statistics, as served and dumped.
+        """
+        with self._lock:
+            requests = {
+                route: tuple(counts) for route, counts in self._requests.items()
+            }
+
+        tags = record.tags()
+        routes: dict[str, list[dict[str, Any]]] = {}
+        for (target, name), tag_stats in zip(
+            code_to_name.items(), record.tag_stats(), strict=True
+        ):
+            for tag, calls, total_ns, median_ns in tag_stats or ():
+                if tag == NO_TAG:
+                    continue
+                route = OTHER_ROUTE if tag == OTHER_TAG else tags[tag]
+                if route not in requests:
+                    route = OTHER_ROUTE
+                routes.setdefault(route, []).append(
+                    {
+                        "name": name,
+                        "kind": "region" if isinstance(target, Region) else "function",
+                        "calls": calls,
+                        "total_ns": total_ns,
+                        "median_ns": median_ns,
+                    }
+                )
+
+        result: list[dict[str, Any]] = []
+        for route, (count, request_ns) in requests.items():
+            targets = sorted(
+                routes.get(route, []), key=lambda item: item["total_ns"], reverse=True
+            )
+            for target_json in targets:
+                target_json["calls_per_request"] = target_json["calls"] / count
+                target_json["ns_per_request"] = target_json["total_ns"] / count
+                target_json["share"] = (
+                    target_json["total_ns"] / request_ns if request_ns else 0.0
+                )
+            result.append(
+                {
+                    "route": route,
+                    "requests": count,
+                    "total_ns": request_ns,
+                    "targets": targets,
+                }
+            )
+        result.sort(key=lambda item: item["total_ns"], reverse=True)
+        return {"version": 1, "routes": result}
+
+    def dump(self) -> str:
+        """
+        Write the statistics so far to json_path, returning the path written.
+        """
+        if self.json_path is None:
+            raise ValueError("No json_path to dump to.")
+        path = self.json_path.format(pid=os.getpid())
+        # Write then rename, so readers never see a partially written file.
+        partial_path = f"{path}.partial"
+        with open(partial_path, "w") as fp:
+            json.dump(self.stats(), fp, indent=2)
+        os.replace(partial_path, path)
+        return path
+
+    def close(self) -> None:
+        """
+        Stop profiling, dumping a final time if json_path is set, and release
+        sys.monitoring.
+        """
+        if self._dump_thread is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()
+            self._dump_thread = None
+            self.dump()
+        _stop_monitoring()
+        code_to_name.clear()
+        record.configure(())
+
+    def _record_request(self, route: str, start_ns: int) -> None:
+        duration_ns = time.perf_counter_ns() - start_ns
+        with self._lock:
+            counts = self._requests.get(route)
+            if counts is None:
+                if len(self._requests) >= record.TAG_LIMIT:
+                    route = OTHER_ROUTE
+                counts = self._requests.setdefault(route, [0, 0])
+            counts[0] += 1
+            counts[1] += duration_ns
+
+    def _serves_stats(self, path: str, authorization: bytes | None) -> bool:
+        """
+        Whether a request is for the JSON endpoint, with the token. Client
+        addresses aren't trusted, since behind a reverse proxy every request
+        comes from the proxy's.
+        """
+        return (
+            self.endpoint_path is not None
+            and path == self.endpoint_path
+            and authorization is not None
+            and hmac.compare_digest(authorization, self._endpoint_authorization)
+        )
+
+    def _stats_body(self) -> bytes:
+        return json.dumps(self.stats()).encode()
+
+    def _dump_periodically(self, dump_interval: float) -> None:
+        while not self._dump_stop.wait(dump_interval):
+            self.dump()
+
+
+class WSGIMiddleware(_Middleware):
+    """
+    Profile targets across a WSGI app's requests, per route.
+    """
+
+    def __init__(
+        self,
+        app: WSGIApp,
+        *targets: Any,
+        route: Callable[[dict[str, Any]], str] | None = None,
+        json_path: str | None = None,
+        dump_interval: float = DEFAULT_DUMP_INTERVAL,
+        endpoint_path: str | None = None,
+        endpoint_token: str | None = None,
+    ) -> None:
+        self.app = app
+        self.route = route
+        super().__init__(
+            targets, json_path, dump_interval, endpoint_path, endpoint_token
+        )
+
+    def __call__(
+        self, environ: dict[str, Any], start_response: Callable[..., Any]
+    ) -> Iterable[bytes]:
+        authorization = environ.get("HTTP_AUTHORIZATION")
+        if self._serves_stats(
+            environ.get("PATH_INFO", ""),
+            authorization.encode("latin-1") if authorization is not None else None,
+        ):
+            stats_body = self._stats_body()
+            start_response(
+                "200 OK",
+                [
+                    ("Content-Type", "application/json"),
+                    ("Content-Length", str(len(stats_body))),
+                ],
+            )
+            return [stats_body]
+
+        start_ns = time.perf_counter_ns()
+        route = (
+            self.route(environ)
+            if self.route is not None
+            else environ.get("PATH_INFO", "")
+        )
+        # Run the app in its own context, so set_route() calls within it
+        # apply to this request only, and can be read back afterwards.
+        context = copy_context()
+        context.run(route_var.set, route)
+        try:
+            body = context.run(self.app, environ, start_response)
+        except BaseException:
+            self._record_request(context[route_var], start_ns)
+            raise
+        return self._iterate(body, context, start_ns)
+
+    def _iterate(
+        self, body: Iterable[bytes], context: Context, start_ns: int
+    ) -> Iterator[bytes]:
+        """
+        Yield the response body, iterating in the request's context, so target
+        calls from lazily generated bodies count too.
+        """
+        try:
+            iterator = context.run(iter, body)
+            while True:
+                try:
+                    chunk = context.run(next, iterator)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            close = getattr(body, "close", None)
+            if close is not None:
+                context.run(close)
+            self._record_request(context[route_var], start_ns)
+
+
+class ASGIMiddleware(_Middleware):
+    """
+    Profile targets across an ASGI app's HTTP requests, per route.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        *targets: Any,
+        route: Callable[[dict[str, Any]], str] | None = None,
+        json_path: str | None = None,
+        dump_interval: float = DEFAULT_DUMP_INTERVAL,
+        endpoint_path: str | None = None,
+        endpoint_token: str | None = None,
+    ) -> None:
+        self.app = app
+        self.route = route
+        super().__init__(
+            targets, json_path, dump_interval, endpoint_path, endpoint_token
+        )
+
+    async def __call__(
+        self,
+        scope: dict[str, Any],
+        receive: Callable[[], Awaitable[Any]],
+        send: Callable[[Any], Awaitable[None]],
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        authorization = next(
+            (
+                value
+                for name, value in scope.get("headers", ())
+                if name.lower() == b"authorization"
+            ),
+            None,
+        )
+        if self._serves_stats(scope["path"], authorization):
+            body = self._stats_body()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start_ns = time.perf_counter_ns()
+        route = self.route(scope) if self.route is not None else scope["path"]
+        # The app runs in this task's context, so set_route() calls within it
+        # are visible here afterwards.
+        token = route_var.set(route)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._record_request(route_var.get(), start_ns)
+            route_var.reset(token)
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tprof import record
+from tprof.api import code_to_name
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Bucket upper bounds in seconds, from 1μs to 10s in 1-2.5-5 steps.
+DEFAULT_BUCKETS = (
+    0.000001,
+    0.0000025,
+    0.000005,
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def generate(buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> str:
+    """
+    Render the current targets' call counts and latency histograms, with the
+    given bucket upper bounds in seconds, in OpenMetrics text format.
+
+    Only calls completed since the previous call with the same buckets are
+    read from the recorded data.
+    """
+    bounds = tuple(round(bucket * 1e9) for bucket in buckets)
+    names = tuple(code_to_name.values())
+    histograms = record.histogram(bounds)
+    if len(histograms) != len(names):
+        # A session is starting or stopping, between setting the target names
+        # and configuring recording, so render no targets until it's done.
+        histograms = []
+    les = [_format_float(bucket) for bucket in buckets] + ["+Inf"]
+
+    calls_lines = [
+        "# TYPE tprof_calls counter",
+        "# HELP tprof_calls Completed calls to tprof targets.",
+    ]
+    duration_lines = [
+        "# TYPE tprof_duration_seconds histogram",
+        "# UNIT tprof_duration_seconds seconds",
+        "# HELP tprof_duration_seconds Durations of calls to tprof targets.",
+    ]
+    for name, (count, total_ns, cumulative) in zip(names, histograms, strict=True):
+        label = f'target="{_escape(name)}"'
+        calls_lines.append(f"tprof_calls_total{{{label}}} {count}")
+        for le, bucket_count in zip(les, cumulative, strict=True):
+            duration_lines.append(
+                f'tprof_duration_seconds_bucket{{{label},le="{le}"}} {bucket_count}'
+            )
+        duration_lines.append(f"tprof_duration_seconds_count{{{label}}} {count}")
+        duration_lines.append(
+            f"tprof_duration_seconds_sum{{{label}}} {_format_float(total_ns / 1e9)}"
+        )
+
+    return "\n".join([*calls_lines, *duration_lines, "# EOF", ""])
+
+
+def write_textfile(path: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+    """
+    Write metrics to a file for node_exporter's textfile collector.
+    """
+    # Write then rename, so the collector never reads a partially written file.
+    partial_path = f"{path}.partial"
+    with open(partial_path, "w") as fp:
+        fp.write(generate(buckets))
+    os.replace(partial_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = generate(self.buckets).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        # Don't write request logs to stderr.
+        pass
+
+
+def serve(
+    port: int,
+    host: str = "127.0.0.1",
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> ThreadingHTTPServer:
+    """
+    Serve metrics at /metrics from a background thread, returning the server.
+    Call its shutdown() and server_close() methods to stop serving.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"buckets": buckets})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(
+        target=server.serve_forever, name="tprof-openmetrics", daemon=True
+    )
+    thread.start()
+    return server
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_float(value: float) -> str:
+    return repr(float(value))
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Generator
+from typing import Any
+
+import pytest
+
+from tprof import record
+from tprof.api import (
+    FunctionStats,
+    Target,
+    _collect_stats,
+    _format_time,
+    _parse_duration,
+    _resolve_targets,
+    _start_monitoring,
+    _stop_monitoring,
+    _write_json,
+    code_to_name,
+    display_report,
+)
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("tprof")
+    group.addoption(
+        "--tprof-target",
+        action="append",
+        dest="tprof_targets",
+        default=[],
+        metavar="target",
+        help="Target callable to profile in every test (format: module:function).",
+    )
+    group.addoption(
+        "--tprof-json",
+        dest="tprof_json_path",
+        metavar="path",
+        help="Write statistics for the whole session as JSON to this file.",
+    )
+    group.addoption(
+        "--tprof-baseline",
+        dest="tprof_baseline_path",
+        metavar="path",
+        help=(
+            "Fail tests whose target medians regress against a previous run's "
+            "--tprof-json file."
+        ),
+    )
+    group.addoption(
+        "--tprof-max-regression",
+        dest="tprof_max_regression",
+        type=float,
+        default=10.0,
+        metavar="percent",
+        help="Allowed median regression against the baseline (default: 10).",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line(
+        "markers",
+        "tprof(targets, max_median=None): profile target callables in this test, "
+        "failing it if any target's median exceeds max_median, such as '2ms'.",
+    )
+    config.pluginmanager.register(TprofPlugin(config), "tprof-session")
+
+
+class TprofPlugin:
+    """
+    Profile targets for the whole session with one tprof session, marking the
+    recorded data at the start of each test to take per-test statistics. This
+    avoids reconfiguring and restarting sys.monitoring events for every test.
+    """
+
+    def __init__(self, config: pytest.Config) -> None:
+        self.targets: list[Any] = config.option.tprof_targets
+        self.json_path: str | None = config.option.tprof_json_path
+        self.max_regression: float = config.option.tprof_max_regression
+        self.baseline: dict[str, dict[str, float]] | None = None
+        if config.option.tprof_baseline_path is not None:
+            try:
+                self.baseline = _load_test_baseline(config.option.tprof_baseline_path)
+            except ValueError as exc:
+                raise pytest.UsageError(f"tprof: {exc}") from exc
+
+        self.names: dict[Target, str] = {}
+        self.item_names: dict[str, list[str]] = {}
+        self.results: list[FunctionStats] = []
+        # Each test's median per target, since one target can have very
+        # different medians in tests with different workloads.
+        self.test_medians: dict[str, dict[str, float]] = {}
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtestloop(
+        self, session: pytest.Session
+    ) -> Generator[None, object, object]:
+        try:
+            session_names = _resolve_targets(tuple(self.targets))
+            self.names.update(session_names)
+            for item in session.items:
+                item_names = list(session_names.values())
+                for marker in item.iter_markers("tprof"):
+                    marker_targets = marker.kwargs.get("targets", ())
+                    if isinstance(marker_targets, str):
+                        marker_targets = (marker_targets,)
+                    marker_names = _resolve_targets(tuple(marker_targets))
+                    self.names.update(marker_names)
+                    item_names.extend(marker_names.values())
+                if item_names:
+                    self.item_names[item.nodeid] = item_names
+        except (ImportError, AttributeError, ValueError) as exc:
+            raise pytest.UsageError(f"tprof: {exc}") from exc
+
+        if not self.names:
+            return (yield)
+
+        _start_monitoring(self.names, 0)
+        try:
+            return (yield)
+        finally:
+            _stop_monitoring()
+            self.results = _collect_stats()
+            if self.json_path is not None:
+                _write_json(
+                    self.json_path,
+                    "pytest",
+                    self.results,
+                    test_medians=self.test_medians,
+                )
+            code_to_name.clear()
+            record.configure(())
+
+    @pytest.hookimpl(wrapper=True)
+    def pytest_runtest_call(self, item: pytest.Item) -> Generator[None, object, object]:
+        item_names = self.item_names.get(item.nodeid)
+        if item_names is None:
+            return (yield)
+
+        record.mark()
+        result = yield
+
+        max_median = None
+        marker = item.get_closest_marker("tprof")
+        if marker is not None and marker.kwargs.get("max_median") is not None:
+            max_median = _parse_duration(marker.kwargs["max_median"])
+
+        failures = []
+        baseline = self.baseline.get(item.nodeid, {}) if self.baseline else {}
+        # Only the timing statistics since the mark, as the rest, such as
+        # warmup, read every call in the session. They're collected once at
+        # its end.
+        for name, (calls, _, _, _, median_ns, _) in zip(
+            code_to_name.values(), record.stats(True), strict=True
+        ):
+            if name not in item_names or not calls:
+                continue
+            item.user_properties.append((f"tprof:{name}:median_ns", median_ns))
+
+            self.test_medians.setdefault(item.nodeid, {})[name] = median_ns
+            if max_median is not None and median_ns > max_median:
+                failures.append(
+                    f"{name}() median {_format_time(int(median_ns), None)} exceeds "
+                    f"max_median {_format_time(max_median, None)}."
+                )
+
+            baseline_median = baseline.get(name)
+            if baseline_median:
+                percent_diff = ((median_ns - baseline_median) / baseline_median) * 100
+                if percent_diff > self.max_regression:
+                    failures.append(
+                        f"{name}() median {_format_time(int(median_ns), None)} "
+                        f"regressed {percent_diff:+.2f}% against baseline "
+                        f"{_format_time(int(baseline_median), None)}."
+                    )
+
+        if failures:
+            pytest.fail("tprof: " + " ".join(failures), pytrace=False)
+        return result
+
+    def pytest_terminal_summary(self) -> None:
+        if self.results:
+            display_report(self.results, label="pytest")
+
+
+def _load_test_baseline(path: str) -> dict[str, dict[str, float]]:
+    """
+    Load each test's target medians, by test node ID, from a previous run's
+    --tprof-json file.
+    """
+    try:
+        with open(path) as fp:
+            data = json.load(fp)
+        return {
+            nodeid: {name: float(median) for name, median in medians.items()}
+            for nodeid, medians in data["tests"].items()
+        }
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as exc:
+        raise ValueError(f"Cannot load baseline from {path!r}: {exc}") from exc
@@ -4,9 +4,29 @@
 
 #include <math.h>
 #include <stdbool.h>
+#include <stddef.h>
 #include <stdint.h>
 #include <string.h>
 
+#if defined(_WIN32)
+#include <windows.h>
+#elif defined(__APPLE__)
+#include <mach/mach_time.h>
+#include <time.h>
+#else
+#include <time.h>
+#endif
+
+#if defined(__linux__) && defined(__x86_64__) && (defined(__GNUC__) || defined(__clang__))
+#define HAVE_TSC_CLOCK
+#include <cpuid.h>
+#include <x86intrin.h>
+#endif
+
+#if !defined(_WIN32) && defined(CLOCK_MONOTONIC_RAW)
+#define HAVE_MONOTONIC_RAW_CLOCK
+#endif
+
 /*
  * Recorded times are stored in C data structures rather than Python objects,
  * to minimize per-call overhead and memory use:
@@ -22,12 +42,87 @@
  *   objects equal to those resolved from the initial import. Each thread
  *   caches the code pointers it has matched so the equality check runs at
  *   most once per (thread, code object).
- * - On Python 3.13+, timestamps come from PyTime_PerfCounterRaw(), avoiding
- *   a Python-level call to time.perf_counter_ns() and int boxing/unboxing.
+ * - Named code regions are Region objects, interned per name so they can be
+ *   matched by pointer like code objects. Entering and exiting a region are
+ *   single C calls that share the target storage above.
+ * - Callables without code objects, such as builtins, are matched by pointer
+ *   in CALL events, paired with C_RETURN or C_RAISE events. A CALL event for
+ *   any other callable disables CALL events at that call site.
+ * - Timestamps come from the same clock as time.perf_counter_ns(), read
+ *   directly in C: via PyTime_PerfCounterRaw() on Python 3.13+, and from the
+ *   platform's counter on Python 3.12, never calling back into Python.
+ *   configure() can select another clock: CLOCK_MONOTONIC_RAW, or on x86-64
+ *   Linux with an invariant TSC, the TSC itself, converted to nanoseconds
+ *   with a scale calibrated against CLOCK_MONOTONIC_RAW on first use.
+ *
+ * - Optionally, each thread also keeps the most recent calls' start and end
+ *   times in a bounded ring buffer, for timeline export. trace() copies each
+ *   buffer out as one bytes object, rather than a Python object per event.
  *
  * stats() computes the reported statistics directly over the raw values,
  * so recorded times never need converting to Python ints at all - only the
- * six aggregate values per target cross into Python.
+ * six aggregate values per target cross into Python. mark() records each
+ * thread's current position, so stats() can also cover only the calls
+ * completed since then, without reconfiguring.
+ *
+ * record_end() also keeps each target's count, total, minimum, maximum, and
+ * Welford running variance per thread, from the last mark() onwards, and
+ * stats() merges these across threads, so only the median needs the raw
+ * durations. The durations are gathered with the GIL held, since other
+ * threads may grow the arrays, then medians are taken with the GIL released,
+ * spread over a few native threads for large sample sets.
+ *
+ * For targets configured with a size argument, record_start() also takes
+ * len() of that argument from the starting frame, and record_end() stores
+ * it alongside the duration. size_stats() groups durations by the bit
+ * length of their sizes, for spotting how a target scales with its input.
+ *
+ * With memory accounting enabled, configure() installs a PyMem allocator
+ * hook for the "mem" and "object" domains that counts allocations and their
+ * requested bytes in thread-local counters, then forwards to the previous
+ * allocator. record_start() and record_end() snapshot the counters, so each
+ * call's allocations come from two subtractions. tprof's own storage uses
+ * the "raw" domain, so it isn't counted.
+ *
+ * Garbage collections are timed by gc_callback(), registered in gc.callbacks,
+ * which adds each one's duration to thread-local counters of GC time and
+ * collections, read like the allocation counters. Only calls that overlapped
+ * a collection store anything more, as (duration index, GC time, collections)
+ * triples in a per-target array, so gc_stats() can report medians with and
+ * without GC time. With exclude_gc configured, record_end() subtracts the GC
+ * time from the duration before storing it, so every statistic excludes it.
+ *
+ * Calls that end by raising, through PY_UNWIND events or a region exited by
+ * an exception, also have their index in the durations array appended to a
+ * per-target unwinds array. outcome_stats() uses these to split statistics
+ * between calls that returned and raised, without a second copy of the
+ * durations, or any cost for calls that return.
+ *
+ * With a slow threshold configured, record_end() passes calls taking at least
+ * that long to a Python callback, which captures their stack and arguments
+ * while the frame is still live. Faster calls only pay for one comparison.
+ *
+ * warmup_stats() splits each thread's durations into windows of call indexes
+ * doubling in size. Warmup is the run of windows from the start, within the
+ * first half, whose medians are well above the median of the second half, so
+ * a stray slow window later on isn't counted. It can move marks to the end of
+ * warmup, so stats() with since_mark covers only steady-state calls.
+ *
+ * With a tag variable configured, record_end() also reads that ContextVar and
+ * stores an index per call alongside the duration, such as the route of the
+ * request a call ran in. Tag values are interned to indexes in a dict, up to
+ * TAG_LIMIT distinct values, and tag_stats() groups durations by them.
+ *
+ * In call-count mode, configure() takes a count scope of filename prefixes
+ * instead of targets, and only PY_START events are enabled, calling
+ * count_callback(). Each thread counts calls in an open-addressing hash table
+ * keyed by code object pointer, so a call is one probe and an increment, with
+ * no timestamps. Code outside the scope is checked once, then disabled.
+ *
+ * histogram() folds durations into per-target bucket counts for metrics
+ * exporters. Each thread keeps a cursor per target of how many durations
+ * have been folded in, so each call only reads the durations completed since
+ * the previous one, without copying or sorting anything.
  *
  * ThreadData structs live in a linked list until the module is freed.
  * configure() bumps a generation counter; each thread lazily resets its
@@ -36,33 +131,120 @@
  * thread's in-flight callback might still be using.
  */
 
+#if defined(_MSC_VER)
+#define THREAD_LOCAL __declspec(thread)
+#else
+#define THREAD_LOCAL _Thread_local
+#endif
+
 typedef struct {
     int64_t *items;
     Py_ssize_t len;
     Py_ssize_t capacity;
 } I64Array;
 
+typedef struct {
+    int64_t target;
+    int64_t start;
+    int64_t end;
+} TraceEvent;
+
+typedef struct {
+    PyObject *code; /* strong reference, or NULL for an empty slot */
+    int64_t count;
+} CountEntry;
+
+typedef struct {
+    CountEntry *items;
+    Py_ssize_t len;
+    Py_ssize_t capacity; /* zero or a power of two */
+} CountTable;
+
+typedef struct {
+    TraceEvent *items;
+    Py_ssize_t capacity; /* grows up to the trace limit, then wraps around */
+    Py_ssize_t count;    /* events ever recorded, including overwritten ones */
+} TraceBuffer;
+
+typedef struct {
+    Py_ssize_t start; /* index in durations the statistics cover from */
+    Py_ssize_t count;
+    int64_t total;
+    int64_t minimum;
+    int64_t maximum;
+    double mean;
+    double m2; /* sum of squared deviations from the mean */
+} RunningStats;
+
 typedef struct ThreadData {
     struct ThreadData *next;
+    unsigned long thread_id; /* native thread ID where available */
     uint64_t generation;
     Py_ssize_t num_targets;
-    PyObject **codes;       /* per target, last matched code object (strong) */
-    I64Array *enter_stacks; /* per target, a stack of start times */
-    I64Array *durations;    /* per target, elapsed times of completed calls */
+    PyObject **codes;        /* per target, last matched code object (strong) */
+    I64Array *enter_stacks;  /* per target, a stack of start times */
+    I64Array *durations;     /* per target, elapsed times of completed calls */
+    I64Array *unwinds;       /* per target, indexes of durations that raised */
+    Py_ssize_t *marks;       /* per target, durations length at the last mark() */
+    RunningStats *running;   /* per target, statistics of durations since start */
+    Py_ssize_t *folded;      /* per target, durations folded into the histogram */
+    I64Array *size_stacks;   /* per target, a stack of argument sizes */
+    I64Array *sizes;         /* per target, argument sizes matching durations */
+    I64Array *memory_stacks; /* per target, a stack of (bytes, count) pairs */
+    I64Array *memory;        /* per target, allocated (bytes, count) per call */
+    I64Array *gc_stacks;     /* per target, a stack of (GC time, collections) pairs */
+    I64Array *gc;            /* per target, (index, GC time, collections) triples */
+    I64Array *tags;          /* per target, tag indexes matching durations */
+    CountTable counts;       /* calls per code object, in call-count mode */
+    TraceBuffer trace;
 } ThreadData;
 
+/* Generation of a ThreadData whose arrays configure() freed eagerly. It
+   never matches a live generation, so stats functions that snapshotted the
+   previous one skip the thread rather than reading its freed arrays. */
+#define STALE_GENERATION UINT64_MAX
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *name;
+} RegionObject;
+
+typedef enum {
+    PERF_COUNTER_CLOCK,
+    MONOTONIC_RAW_CLOCK,
+    TSC_CLOCK,
+    NUM_CLOCKS,
+} ClockKind;
+
+/* Indexed by ClockKind. */
+static const char *const clock_names[NUM_CLOCKS] = {"perf_counter", "monotonic_raw", "tsc"};
+
 typedef struct {
-    PyObject **codes; /* strong references to target code objects */
+    PyObject **codes;     /* strong references to target code objects and regions */
+    PyObject **size_args; /* per target, argument name to take len() of, or NULL */
     Py_ssize_t num_targets;
+    Py_ssize_t trace_limit;  /* per-thread trace buffer size, 0 to disable */
+    bool memory;             /* whether to count allocations per call */
+    bool exclude_gc;         /* whether to subtract GC time from durations */
+    ClockKind clock;         /* the clock now_ns() reads */
+    int64_t slow_ns;         /* duration from which calls are passed to slow_callback */
+    PyObject *slow_callback; /* called with (index, duration) for slow calls, or NULL */
+    PyObject *tag_var;       /* ContextVar whose value tags each call, or NULL */
+    PyObject *tag_indexes;   /* dict of tag value to its index in tag_values */
+    PyObject *tag_values;    /* list of distinct tag values, in order seen */
+    PyObject *count_scope;   /* tuple of filename prefixes to count calls in, or NULL */
     uint64_t generation;
     Py_tss_t tss;
     int tss_created;
     ThreadData *threads; /* linked list of every thread's data */
     PyThread_type_lock threads_lock;
     PyObject *monitoring_disable; /* sys.monitoring.DISABLE */
-#if PY_VERSION_HEX < 0x030D0000
-    PyObject *perf_counter_ns;
-#endif
+    PyTypeObject *region_type;
+    PyObject *regions;      /* dict of name to interned Region */
+    int64_t *bucket_bounds; /* histogram bucket upper bounds, inclusive */
+    Py_ssize_t num_bounds;
+    int64_t *bucket_counts; /* per target, num_bounds + 1 bucket counts */
+    int64_t *bucket_totals; /* per target, total of the folded durations */
 } RecordModuleState;
 
 static inline RecordModuleState *
@@ -73,33 +255,254 @@ get_module_state(PyObject *module)
     return (RecordModuleState *)state;
 }
 
-static int
-now_ns(RecordModuleState *state, int64_t *result)
+/* Critical sections, new in Python 3.13, lock objects on free-threaded
+   builds. Earlier versions always have the GIL. */
+#if PY_VERSION_HEX < 0x030D0000
+#define Py_BEGIN_CRITICAL_SECTION(op) {
+#define Py_END_CRITICAL_SECTION() }
+#endif
+
+/* Counter scales are process-wide, like the counters themselves. */
+#if PY_VERSION_HEX >= 0x030D0000
+#elif defined(_WIN32)
+static LARGE_INTEGER perf_frequency;
+#elif defined(__APPLE__)
+static mach_timebase_info_data_t perf_timebase;
+#endif
+
+/* Reads the clock behind time.perf_counter_ns(). */
+static inline int
+perf_counter_ns(int64_t *result)
 {
 #if PY_VERSION_HEX >= 0x030D0000
     PyTime_t timestamp;
-    (void)state;
     if (PyTime_PerfCounterRaw(&timestamp) < 0) {
         PyErr_SetString(PyExc_OSError, "failed to read performance counter");
         return -1;
     }
     *result = (int64_t)timestamp;
-    return 0;
+#elif defined(_WIN32)
+    LARGE_INTEGER counter;
+    QueryPerformanceCounter(&counter);
+    /* Split to avoid overflowing when multiplying by 10**9. */
+    int64_t frequency = perf_frequency.QuadPart;
+    *result = counter.QuadPart / frequency * 1000000000 +
+              counter.QuadPart % frequency * 1000000000 / frequency;
+#elif defined(__APPLE__)
+    *result = (int64_t)(mach_absolute_time() * perf_timebase.numer / perf_timebase.denom);
 #else
-    PyObject *timestamp = PyObject_CallNoArgs(state->perf_counter_ns);
-    if (timestamp == NULL) {
+    struct timespec timestamp;
+    if (clock_gettime(CLOCK_MONOTONIC, &timestamp) < 0) {
+        PyErr_SetFromErrno(PyExc_OSError);
         return -1;
     }
-    long long value = PyLong_AsLongLong(timestamp);
-    Py_DECREF(timestamp);
-    if (value == -1 && PyErr_Occurred()) {
-        return -1;
-    }
-    *result = (int64_t)value;
+    *result = (int64_t)timestamp.tv_sec * 1000000000 + timestamp.tv_nsec;
+#endif
     return 0;
+}
+
+#ifdef HAVE_MONOTONIC_RAW_CLOCK
+static inline int64_t
+monotonic_raw_ns(void)
+{
+    struct timespec timestamp;
+    clock_gettime(CLOCK_MONOTONIC_RAW, &timestamp);
+    return (int64_t)timestamp.tv_sec * 1000000000 + timestamp.tv_nsec;
+}
+#endif
+
+#ifdef HAVE_TSC_CLOCK
+/* How long to compare the TSC against CLOCK_MONOTONIC_RAW for. */
+#define TSC_CALIBRATION_NS 10000000
+
+static bool tsc_calibrated = false;
+static uint64_t tsc_base;
+static int64_t tsc_base_ns;
+static uint64_t tsc_scale; /* nanoseconds per tick, as 32.32 fixed point */
+
+/* Whether the TSC ticks at a constant rate, regardless of frequency scaling
+   and sleep states, and so can serve as a clock. */
+static bool
+tsc_invariant(void)
+{
+    unsigned int eax, ebx, ecx, edx;
+    if (!__get_cpuid(0x80000000, &eax, &ebx, &ecx, &edx) || eax < 0x80000007) {
+        return false;
+    }
+    __get_cpuid(0x80000007, &eax, &ebx, &ecx, &edx);
+    return (edx & (1u << 8)) != 0;
+}
+
+/* Reads the TSC alongside CLOCK_MONOTONIC_RAW, taking the midpoint of TSC
+   reads either side to halve the error. */
+static void
+tsc_pair(uint64_t *tsc, int64_t *ns)
+{
+    uint64_t before = __rdtsc();
+    *ns = monotonic_raw_ns();
+    uint64_t after = __rdtsc();
+    *tsc = before + (after - before) / 2;
+}
+
+/* Measures the TSC's rate across a short sleep. Doesn't need the GIL. */
+static void
+tsc_calibrate(void)
+{
+    uint64_t start_tsc, end_tsc;
+    int64_t start_ns, end_ns;
+    tsc_pair(&start_tsc, &start_ns);
+    struct timespec pause = {0, TSC_CALIBRATION_NS};
+    nanosleep(&pause, NULL);
+    tsc_pair(&end_tsc, &end_ns);
+    tsc_scale = ((uint64_t)(end_ns - start_ns) << 32) / (end_tsc - start_tsc);
+    tsc_base = start_tsc;
+    tsc_base_ns = start_ns;
+    tsc_calibrated = true;
+}
+
+static inline int64_t
+tsc_ns(void)
+{
+    unsigned __int128 elapsed = (unsigned __int128)(__rdtsc() - tsc_base) * tsc_scale;
+    return tsc_base_ns + (int64_t)(elapsed >> 32);
+}
+#endif
+
+static bool
+clock_available(ClockKind clock)
+{
+    switch (clock) {
+        case PERF_COUNTER_CLOCK:
+            return true;
+        case MONOTONIC_RAW_CLOCK:
+#ifdef HAVE_MONOTONIC_RAW_CLOCK
+            return true;
+#else
+            return false;
+#endif
+        case TSC_CLOCK:
+#ifdef HAVE_TSC_CLOCK
+            return tsc_invariant();
+#else
+            return false;
+#endif
+        default:
+            return false;
+    }
+}
+
+static inline int
+now_ns(RecordModuleState *state, int64_t *result)
+{
+#ifdef HAVE_TSC_CLOCK
+    if (state->clock == TSC_CLOCK) {
+        *result = tsc_ns();
+        return 0;
+    }
+#endif
+#ifdef HAVE_MONOTONIC_RAW_CLOCK
+    if (state->clock == MONOTONIC_RAW_CLOCK) {
+        *result = monotonic_raw_ns();
+        return 0;
+    }
 #endif
+    return perf_counter_ns(result);
+}
+
+/* The allocator hook is process-wide, so its state is too. */
+static THREAD_LOCAL int64_t thread_alloc_bytes;
+static THREAD_LOCAL int64_t thread_alloc_count;
+static PyMemAllocatorEx original_mem_allocator;
+static PyMemAllocatorEx original_obj_allocator;
+static bool allocator_installed = false;
+
+static void *
+counting_malloc(void *ctx, size_t size)
+{
+    PyMemAllocatorEx *original = (PyMemAllocatorEx *)ctx;
+    thread_alloc_bytes += (int64_t)size;
+    thread_alloc_count++;
+    return original->malloc(original->ctx, size);
+}
+
+static void *
+counting_calloc(void *ctx, size_t nelem, size_t elsize)
+{
+    PyMemAllocatorEx *original = (PyMemAllocatorEx *)ctx;
+    thread_alloc_bytes += (int64_t)(nelem * elsize);
+    thread_alloc_count++;
+    return original->calloc(original->ctx, nelem, elsize);
+}
+
+/* Counts a reallocation as allocating its whole new size, since the old
+   size is unknown. */
+static void *
+counting_realloc(void *ctx, void *ptr, size_t new_size)
+{
+    PyMemAllocatorEx *original = (PyMemAllocatorEx *)ctx;
+    thread_alloc_bytes += (int64_t)new_size;
+    thread_alloc_count++;
+    return original->realloc(original->ctx, ptr, new_size);
+}
+
+static void
+counting_free(void *ctx, void *ptr)
+{
+    PyMemAllocatorEx *original = (PyMemAllocatorEx *)ctx;
+    original->free(original->ctx, ptr);
+}
+
+static void
+install_allocator_hook(void)
+{
+    if (allocator_installed) {
+        return;
+    }
+    PyMem_GetAllocator(PYMEM_DOMAIN_MEM, &original_mem_allocator);
+    PyMem_GetAllocator(PYMEM_DOMAIN_OBJ, &original_obj_allocator);
+    PyMemAllocatorEx mem_allocator = {&original_mem_allocator,
+        counting_malloc,
+        counting_calloc,
+        counting_realloc,
+        counting_free};
+    PyMemAllocatorEx obj_allocator = {&original_obj_allocator,
+        counting_malloc,
+        counting_calloc,
+        counting_realloc,
+        counting_free};
+    PyMem_SetAllocator(PYMEM_DOMAIN_MEM, &mem_allocator);
+    PyMem_SetAllocator(PYMEM_DOMAIN_OBJ, &obj_allocator);
+    allocator_installed = true;
+}
+
+/* Restores the previous allocators, unless another hook such as tracemalloc
+   has since wrapped this one - then removing it would remove theirs too, so
+   it stays installed, forwarding as before. */
+static void
+uninstall_allocator_hook(void)
+{
+    if (!allocator_installed) {
+        return;
+    }
+    PyMemAllocatorEx mem_allocator;
+    PyMemAllocatorEx obj_allocator;
+    PyMem_GetAllocator(PYMEM_DOMAIN_MEM, &mem_allocator);
+    PyMem_GetAllocator(PYMEM_DOMAIN_OBJ, &obj_allocator);
+    if (mem_allocator.malloc != counting_malloc || obj_allocator.malloc != counting_malloc) {
+        return;
+    }
+    PyMem_SetAllocator(PYMEM_DOMAIN_MEM, &original_mem_allocator);
+    PyMem_SetAllocator(PYMEM_DOMAIN_OBJ, &original_obj_allocator);
+    allocator_installed = false;
 }
 
+/* The GC callback runs on the thread that collects, so its state is
+   thread-local like the allocation counters. */
+static THREAD_LOCAL int64_t thread_gc_ns;
+static THREAD_LOCAL int64_t thread_gc_count;
+static THREAD_LOCAL int64_t thread_gc_start;
+static THREAD_LOCAL bool thread_gc_running;
+
 static int
 i64array_append(I64Array *array, int64_t value)
 {
@@ -118,6 +521,47 @@ i64array_append(I64Array *array, int64_t value)
     return 0;
 }
 
+/* Appends two values, or neither if an error occurred. */
+static int
+i64array_append_pair(I64Array *array, int64_t first, int64_t second)
+{
+    if (i64array_append(array, first) < 0) {
+        return -1;
+    }
+    if (i64array_append(array, second) < 0) {
+        array->len--;
+        return -1;
+    }
+    return 0;
+}
+
+static int
+trace_append(
+    TraceBuffer *trace, Py_ssize_t limit, Py_ssize_t target, int64_t start, int64_t end)
+{
+    if (trace->count < limit && trace->count == trace->capacity) {
+        Py_ssize_t new_capacity = trace->capacity ? trace->capacity * 2 : 1024;
+        if (new_capacity > limit) {
+            new_capacity = limit;
+        }
+        TraceEvent *new_items =
+            PyMem_RawRealloc(trace->items, (size_t)new_capacity * sizeof(TraceEvent));
+        if (new_items == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        trace->items = new_items;
+        trace->capacity = new_capacity;
+    }
+    /* Once full, overwrite the oldest event. */
+    TraceEvent *event = &trace->items[trace->count % limit];
+    event->target = target;
+    event->start = start;
+    event->end = end;
+    trace->count++;
+    return 0;
+}
+
 static void
 thread_data_free_arrays(ThreadData *data)
 {
@@ -125,14 +569,55 @@ thread_data_free_arrays(ThreadData *data)
         Py_DECREF(data->codes[i]);
         PyMem_RawFree(data->enter_stacks[i].items);
         PyMem_RawFree(data->durations[i].items);
+        PyMem_RawFree(data->unwinds[i].items);
+        PyMem_RawFree(data->size_stacks[i].items);
+        PyMem_RawFree(data->sizes[i].items);
+        PyMem_RawFree(data->memory_stacks[i].items);
+        PyMem_RawFree(data->memory[i].items);
+        PyMem_RawFree(data->gc_stacks[i].items);
+        PyMem_RawFree(data->gc[i].items);
+        PyMem_RawFree(data->tags[i].items);
     }
     PyMem_RawFree(data->codes);
     PyMem_RawFree(data->enter_stacks);
     PyMem_RawFree(data->durations);
+    PyMem_RawFree(data->unwinds);
+    PyMem_RawFree(data->marks);
+    PyMem_RawFree(data->running);
+    PyMem_RawFree(data->folded);
+    PyMem_RawFree(data->size_stacks);
+    PyMem_RawFree(data->sizes);
+    PyMem_RawFree(data->memory_stacks);
+    PyMem_RawFree(data->memory);
+    PyMem_RawFree(data->gc_stacks);
+    PyMem_RawFree(data->gc);
+    PyMem_RawFree(data->tags);
     data->codes = NULL;
     data->enter_stacks = NULL;
     data->durations = NULL;
+    data->unwinds = NULL;
+    data->marks = NULL;
+    data->running = NULL;
+    data->folded = NULL;
+    data->size_stacks = NULL;
+    data->sizes = NULL;
+    data->memory_stacks = NULL;
+    data->memory = NULL;
+    data->gc_stacks = NULL;
+    data->gc = NULL;
+    data->tags = NULL;
     data->num_targets = 0;
+    for (Py_ssize_t i = 0; i < data->counts.capacity; i++) {
+        Py_XDECREF(data->counts.items[i].code);
+    }
+    PyMem_RawFree(data->counts.items);
+    data->counts.items = NULL;
+    data->counts.len = 0;
+    data->counts.capacity = 0;
+    PyMem_RawFree(data->trace.items);
+    data->trace.items = NULL;
+    data->trace.capacity = 0;
+    data->trace.count = 0;
 }
 
 static ThreadData *
@@ -150,6 +635,11 @@ get_thread_data(RecordModuleState *state)
             PyErr_SetString(PyExc_RuntimeError, "failed to set thread-specific storage");
             return NULL;
         }
+#ifdef PY_HAVE_THREAD_NATIVE_ID
+        data->thread_id = PyThread_get_thread_native_id();
+#else
+        data->thread_id = PyThread_get_thread_ident();
+#endif
         PyThread_acquire_lock(state->threads_lock, 1);
         data->next = state->threads;
         state->threads = data;
@@ -162,13 +652,24 @@ get_thread_data(RecordModuleState *state)
             data->codes = PyMem_RawCalloc((size_t)num_targets, sizeof(PyObject *));
             data->enter_stacks = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
             data->durations = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
-            if (data->codes == NULL || data->enter_stacks == NULL || data->durations == NULL) {
-                PyMem_RawFree(data->codes);
-                PyMem_RawFree(data->enter_stacks);
-                PyMem_RawFree(data->durations);
-                data->codes = NULL;
-                data->enter_stacks = NULL;
-                data->durations = NULL;
+            data->unwinds = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            data->marks = PyMem_RawCalloc((size_t)num_targets, sizeof(Py_ssize_t));
+            data->running = PyMem_RawCalloc((size_t)num_targets, sizeof(RunningStats));
+            data->folded = PyMem_RawCalloc((size_t)num_targets, sizeof(Py_ssize_t));
+            data->size_stacks = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            data->sizes = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            data->memory_stacks = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            data->memory = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            data->gc_stacks = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            data->gc = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            data->tags = PyMem_RawCalloc((size_t)num_targets, sizeof(I64Array));
+            if (data->codes == NULL || data->enter_stacks == NULL || data->durations == NULL ||
+                data->unwinds == NULL || data->marks == NULL || data->running == NULL ||
+                data->folded == NULL || data->size_stacks == NULL || data->sizes == NULL ||
+                data->memory_stacks == NULL || data->memory == NULL ||
+                data->gc_stacks == NULL || data->gc == NULL || data->tags == NULL) {
+                /* num_targets is still 0, so this only frees the arrays. */
+                thread_data_free_arrays(data);
                 PyErr_NoMemory();
                 return NULL;
             }
@@ -193,6 +694,9 @@ find_target(ThreadData *data, PyObject *code)
         }
     }
     for (Py_ssize_t i = 0; i < data->num_targets; i++) {
+        if (!PyCode_Check(data->codes[i])) {
+            continue;
+        }
         int equal = PyObject_RichCompareBool(data->codes[i], code, Py_EQ);
         if (equal < 0) {
             return -2;
@@ -206,6 +710,272 @@ find_target(ThreadData *data, PyObject *code)
     return -1;
 }
 
+/* Returns len() of the named argument in the currently starting frame, or -1
+   if it's unavailable or has no length. Errors are swallowed, since they
+   come from the profiled code's arguments rather than tprof. */
+static int64_t
+argument_size(PyObject *name)
+{
+    PyFrameObject *frame = PyEval_GetFrame();
+    if (frame == NULL) {
+        return -1;
+    }
+    PyObject *value = PyFrame_GetVar(frame, name);
+    if (value == NULL) {
+        PyErr_Clear();
+        return -1;
+    }
+    Py_ssize_t size = PyObject_Size(value);
+    Py_DECREF(value);
+    if (size < 0) {
+        PyErr_Clear();
+        return -1;
+    }
+    return (int64_t)size;
+}
+
+/* Maximum number of distinct tag values. Calls with later values share the
+   OTHER_TAG index, bounding memory however many values the tag takes. */
+#define TAG_LIMIT 1000
+
+/* Tag indexes for calls with the tag variable unset, or beyond TAG_LIMIT. */
+#define NO_TAG (-1)
+#define OTHER_TAG (-2)
+
+/* Returns the index of a tag value, interning it if new. Must be called in
+   tag_indexes's critical section, which guards tag_values too, so the two
+   change together. */
+static int64_t
+intern_tag(RecordModuleState *state, PyObject *value)
+{
+    PyObject *index;
+#if PY_VERSION_HEX >= 0x030D0000
+    if (PyDict_GetItemRef(state->tag_indexes, value, &index) < 0) {
+        PyErr_Clear();
+        return NO_TAG;
+    }
+#else
+    index = PyDict_GetItemWithError(state->tag_indexes, value);
+    if (index == NULL && PyErr_Occurred()) {
+        PyErr_Clear();
+        return NO_TAG;
+    }
+    Py_XINCREF(index);
+#endif
+    if (index != NULL) {
+        int64_t tag = PyLong_AsLongLong(index);
+        Py_DECREF(index);
+        return tag;
+    }
+
+    Py_ssize_t num_values = PyList_GET_SIZE(state->tag_values);
+    if (num_values >= TAG_LIMIT) {
+        return OTHER_TAG;
+    }
+    index = PyLong_FromSsize_t(num_values);
+    if (index == NULL) {
+        PyErr_Clear();
+        return NO_TAG;
+    }
+    int64_t tag = num_values;
+    if (PyList_Append(state->tag_values, value) < 0) {
+        PyErr_Clear();
+        tag = NO_TAG;
+    }
+    else if (PyDict_SetItem(state->tag_indexes, value, index) < 0) {
+        PyErr_Clear();
+        /* Keep the values list matching the dict. */
+        (void)PyList_SetSlice(state->tag_values, num_values, num_values + 1, NULL);
+        tag = NO_TAG;
+    }
+    Py_DECREF(index);
+    return tag;
+}
+
+/* Returns the index of the tag variable's current value, interning new
+   values. Errors, such as unhashable values, count as NO_TAG, since they come
+   from the profiled code rather than tprof. */
+static int64_t
+current_tag(RecordModuleState *state)
+{
+    PyObject *value;
+    if (PyContextVar_Get(state->tag_var, NULL, &value) < 0) {
+        PyErr_Clear();
+        return NO_TAG;
+    }
+    if (value == NULL) {
+        return NO_TAG;
+    }
+
+    int64_t tag;
+    Py_BEGIN_CRITICAL_SECTION(state->tag_indexes);
+    tag = intern_tag(state, value);
+    Py_END_CRITICAL_SECTION();
+    Py_DECREF(value);
+    return tag;
+}
+
+/* The number of interned tag values. */
+static Py_ssize_t
+num_tag_values(RecordModuleState *state)
+{
+    Py_ssize_t num_values;
+    Py_BEGIN_CRITICAL_SECTION(state->tag_indexes);
+    num_values = PyList_GET_SIZE(state->tag_values);
+    Py_END_CRITICAL_SECTION();
+    return num_values;
+}
+
+/* Adds a duration to running statistics, with Welford's update for the
+   variance, which stays accurate without a second pass over the values. */
+static inline void
+running_add(RunningStats *running, int64_t value)
+{
+    running->count++;
+    if (running->count == 1 || value < running->minimum) {
+        running->minimum = value;
+    }
+    if (running->count == 1 || value > running->maximum) {
+        running->maximum = value;
+    }
+    running->total += value;
+    double delta = (double)value - running->mean;
+    running->mean += delta / (double)running->count;
+    running->m2 += delta * ((double)value - running->mean);
+}
+
+/* Pushes the start time of a call to the target at index, its GC counters,
+   and its argument size and allocation counters if configured. The size is
+   taken first, so len() isn't timed, and the allocation counters last, so
+   reading the time on Python 3.12 isn't counted. */
+static int
+record_start(RecordModuleState *state, ThreadData *data, Py_ssize_t index)
+{
+    bool sized = state->size_args != NULL && state->size_args[index] != NULL;
+    if (sized && i64array_append(
+                     &data->size_stacks[index], argument_size(state->size_args[index])) < 0) {
+        return -1;
+    }
+
+    int64_t timestamp;
+    if (now_ns(state, &timestamp) < 0 ||
+        i64array_append(&data->enter_stacks[index], timestamp) < 0) {
+        goto error;
+    }
+
+    if (i64array_append_pair(&data->gc_stacks[index], thread_gc_ns, thread_gc_count) < 0) {
+        data->enter_stacks[index].len--;
+        goto error;
+    }
+
+    if (state->memory &&
+        i64array_append_pair(
+            &data->memory_stacks[index], thread_alloc_bytes, thread_alloc_count) < 0) {
+        data->gc_stacks[index].len -= 2;
+        data->enter_stacks[index].len--;
+        goto error;
+    }
+    return 0;
+
+error:
+    if (sized) {
+        data->size_stacks[index].len--;
+    }
+    return -1;
+}
+
+/* Pairs the end of a call to the target at index with its start time, and
+   records the elapsed time, and whether the call raised. */
+static int
+record_end(RecordModuleState *state, ThreadData *data, Py_ssize_t index, bool unwound)
+{
+    int64_t end_bytes = thread_alloc_bytes;
+    int64_t end_count = thread_alloc_count;
+    int64_t end_gc_ns = thread_gc_ns;
+    int64_t end_gc_count = thread_gc_count;
+    int64_t end_time;
+    if (now_ns(state, &end_time) < 0) {
+        return -1;
+    }
+
+    I64Array *enter_stack = &data->enter_stacks[index];
+    if (enter_stack->len == 0) {
+        /* No matching start, e.g. profiling started mid-call. */
+        return 0;
+    }
+    int64_t start_time = enter_stack->items[--enter_stack->len];
+    I64Array *gc_stack = &data->gc_stacks[index];
+    int64_t collections = end_gc_count - gc_stack->items[--gc_stack->len];
+    int64_t gc_ns = end_gc_ns - gc_stack->items[--gc_stack->len];
+    int64_t duration = end_time - start_time;
+    if (state->exclude_gc) {
+        duration -= gc_ns;
+    }
+
+    if (state->trace_limit > 0 &&
+        trace_append(&data->trace, state->trace_limit, index, start_time, end_time) < 0) {
+        return -1;
+    }
+
+    bool sized = state->size_args != NULL && state->size_args[index] != NULL;
+    int64_t size = -1;
+    if (sized) {
+        I64Array *size_stack = &data->size_stacks[index];
+        size = size_stack->items[--size_stack->len];
+    }
+
+    int64_t start_bytes = 0;
+    int64_t start_count = 0;
+    if (state->memory) {
+        I64Array *memory_stack = &data->memory_stacks[index];
+        start_count = memory_stack->items[--memory_stack->len];
+        start_bytes = memory_stack->items[--memory_stack->len];
+    }
+
+    /* Read before appending anything, since looking up the tag value can run
+       Python code, such as a custom __eq__(). */
+    int64_t tag = state->tag_var != NULL ? current_tag(state) : NO_TAG;
+
+    I64Array *durations = &data->durations[index];
+    if (i64array_append(durations, duration) < 0) {
+        return -1;
+    }
+    running_add(&data->running[index], duration);
+    if (unwound && i64array_append(&data->unwinds[index], durations->len - 1) < 0) {
+        return -1;
+    }
+    if (collections > 0 &&
+        (i64array_append(&data->gc[index], durations->len - 1) < 0 ||
+            i64array_append_pair(&data->gc[index], gc_ns, collections) < 0)) {
+        return -1;
+    }
+    /* Appended after the duration, so sizes, allocation counts, and tags never
+       outnumber durations. */
+    if (sized && i64array_append(&data->sizes[index], size) < 0) {
+        return -1;
+    }
+    if (state->memory &&
+        i64array_append_pair(
+            &data->memory[index], end_bytes - start_bytes, end_count - start_count) < 0) {
+        return -1;
+    }
+    if (state->tag_var != NULL && i64array_append(&data->tags[index], tag) < 0) {
+        return -1;
+    }
+
+    if (state->slow_callback != NULL && duration >= state->slow_ns) {
+        PyObject *result =
+            PyObject_CallFunction(state->slow_callback, "nL", index, (long long)duration);
+        if (result == NULL) {
+            /* Report the failure rather than raising it into the profiled
+               program. */
+            PyErr_WriteUnraisable(state->slow_callback);
+        }
+        Py_XDECREF(result);
+    }
+    return 0;
+}
+
 static PyObject *
 py_start_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
 {
@@ -230,11 +1000,7 @@ py_start_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
         return Py_NewRef(state->monitoring_disable);
     }
 
-    int64_t timestamp;
-    if (now_ns(state, &timestamp) < 0) {
-        return NULL;
-    }
-    if (i64array_append(&data->enter_stacks[index], timestamp) < 0) {
+    if (record_start(state, data, index) < 0) {
         return NULL;
     }
 
@@ -242,8 +1008,7 @@ py_start_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
 }
 
 static PyObject *
-py_end_common(
-    PyObject *module, PyObject *const *args, Py_ssize_t nargs, bool disable_on_non_target)
+py_end_common(PyObject *module, PyObject *const *args, Py_ssize_t nargs, bool unwound)
 {
     if (nargs != 3) {
         PyErr_SetString(PyExc_TypeError, "py_end callbacks require exactly 3 arguments");
@@ -262,22 +1027,12 @@ py_end_common(
         return NULL;
     }
     if (index == -1) {
-        return Py_NewRef(disable_on_non_target ? state->monitoring_disable : Py_None);
-    }
-
-    int64_t end_time;
-    if (now_ns(state, &end_time) < 0) {
-        return NULL;
-    }
-
-    I64Array *enter_stack = &data->enter_stacks[index];
-    if (enter_stack->len == 0) {
-        /* No matching PY_START, e.g. profiling started mid-call. */
-        Py_RETURN_NONE;
+        /* PY_UNWIND events cannot be disabled, so return None for non-targets.
+           Otherwise, stop PY_RETURN events firing for this code location. */
+        return Py_NewRef(unwound ? Py_None : state->monitoring_disable);
     }
-    int64_t start_time = enter_stack->items[--enter_stack->len];
 
-    if (i64array_append(&data->durations[index], end_time - start_time) < 0) {
+    if (record_end(state, data, index, unwound) < 0) {
         return NULL;
     }
 
@@ -287,226 +1042,2171 @@ py_end_common(
 static PyObject *
 py_return_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
 {
-    /* Not a target: stop PY_RETURN events firing for this code location. */
-    return py_end_common(module, args, nargs, true);
+    return py_end_common(module, args, nargs, false);
 }
 
 static PyObject *
 py_unwind_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
 {
-    /* PY_UNWIND events cannot be disabled, so return None for non-targets. */
-    return py_end_common(module, args, nargs, false);
+    return py_end_common(module, args, nargs, true);
 }
 
+/* Called through gc.callbacks at the start and stop of each collection,
+   adding its duration to the collecting thread's GC counters. */
 static PyObject *
-record_configure(PyObject *module, PyObject *arg)
+gc_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
 {
-    if (!PyTuple_Check(arg)) {
+    if (nargs != 2 || !PyUnicode_Check(args[0])) {
+        PyErr_SetString(PyExc_TypeError, "gc_callback requires a phase and an info dict");
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    int64_t timestamp;
+    if (now_ns(state, &timestamp) < 0) {
+        return NULL;
+    }
+    if (PyUnicode_CompareWithASCIIString(args[0], "start") == 0) {
+        thread_gc_start = timestamp;
+        thread_gc_running = true;
+    }
+    else if (thread_gc_running) {
+        /* A stop without a start means the callback was registered
+           mid-collection, so there's nothing to time. */
+        thread_gc_ns += timestamp - thread_gc_start;
+        thread_gc_count++;
+        thread_gc_running = false;
+    }
+
+    Py_RETURN_NONE;
+}
+
+/* Returns the slot for a code object in a count table with free slots: its
+   entry, or the empty slot where it belongs. */
+static inline CountEntry *
+count_slot(CountTable *table, PyObject *code)
+{
+    size_t mask = (size_t)table->capacity - 1;
+    /* Fibonacci hashing, dropping the low bits that alignment zeroes. */
+    size_t i = (size_t)(((uintptr_t)code >> 4) * 11400714819323198485ull) & mask;
+    while (table->items[i].code != NULL && table->items[i].code != code) {
+        i = (i + 1) & mask;
+    }
+    return &table->items[i];
+}
+
+/* Adds a code object with a count of one, growing the table to keep it at
+   most half full. Returns -1 with MemoryError set on failure. */
+static int
+count_insert(CountTable *table, PyObject *code)
+{
+    if ((table->len + 1) * 2 > table->capacity) {
+        Py_ssize_t capacity = table->capacity ? table->capacity * 2 : 64;
+        CountEntry *items = PyMem_RawCalloc((size_t)capacity, sizeof(CountEntry));
+        if (items == NULL) {
+            PyErr_NoMemory();
+            return -1;
+        }
+        CountTable grown = {items, table->len, capacity};
+        for (Py_ssize_t i = 0; i < table->capacity; i++) {
+            if (table->items[i].code != NULL) {
+                *count_slot(&grown, table->items[i].code) = table->items[i];
+            }
+        }
+        PyMem_RawFree(table->items);
+        *table = grown;
+    }
+    CountEntry *entry = count_slot(table, code);
+    entry->code = Py_NewRef(code);
+    entry->count = 1;
+    table->len++;
+    return 0;
+}
+
+/* Returns 1 if the code object's filename starts with a prefix in the count
+   scope, 0 if not, or -1 if an error occurred. */
+static int
+count_in_scope(RecordModuleState *state, PyObject *code)
+{
+    if (state->count_scope == NULL) {
+        return 0;
+    }
+    PyObject *filename = PyObject_GetAttrString(code, "co_filename");
+    if (filename == NULL) {
+        return -1;
+    }
+    int result = 0;
+    for (Py_ssize_t i = 0; i < PyTuple_GET_SIZE(state->count_scope) && result == 0; i++) {
+        Py_ssize_t match = PyUnicode_Tailmatch(
+            filename, PyTuple_GET_ITEM(state->count_scope, i), 0, PY_SSIZE_T_MAX, -1);
+        result = match < 0 ? -1 : (int)match;
+    }
+    Py_DECREF(filename);
+    return result;
+}
+
+static PyObject *
+count_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    if (nargs != 2) {
+        PyErr_SetString(PyExc_TypeError, "count_callback requires exactly 2 arguments");
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    ThreadData *data = get_thread_data(state);
+    if (data == NULL) {
+        return NULL;
+    }
+
+    PyObject *code = args[0];
+    if (data->counts.capacity > 0) {
+        CountEntry *entry = count_slot(&data->counts, code);
+        if (entry->code == code) {
+            entry->count++;
+            Py_RETURN_NONE;
+        }
+    }
+
+    int in_scope = count_in_scope(state, code);
+    if (in_scope < 0) {
+        return NULL;
+    }
+    if (!in_scope) {
+        /* Out of scope: stop PY_START events firing for this code location. */
+        return Py_NewRef(state->monitoring_disable);
+    }
+    if (count_insert(&data->counts, code) < 0) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+/* Regions are interned, and callables are targeted by identity, so unlike
+   code objects they only match by pointer. Returns the target index, or -1
+   if the object is not a target. */
+static Py_ssize_t
+find_identical(ThreadData *data, PyObject *obj)
+{
+    for (Py_ssize_t i = 0; i < data->num_targets; i++) {
+        if (data->codes[i] == obj) {
+            return i;
+        }
+    }
+    return -1;
+}
+
+static PyObject *
+call_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    if (nargs != 4) {
+        PyErr_SetString(PyExc_TypeError, "call_callback requires exactly 4 arguments");
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    ThreadData *data = get_thread_data(state);
+    if (data == NULL) {
+        return NULL;
+    }
+
+    Py_ssize_t index = find_identical(data, args[2]);
+    if (index == -1) {
+        /* Not a target: stop CALL events, and so C_RETURN and C_RAISE events,
+           firing for this call site. */
+        return Py_NewRef(state->monitoring_disable);
+    }
+
+    if (record_start(state, data, index) < 0) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+c_end_common(PyObject *module, PyObject *const *args, Py_ssize_t nargs, bool unwound)
+{
+    if (nargs != 4) {
+        PyErr_SetString(PyExc_TypeError, "c_end callbacks require exactly 4 arguments");
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    ThreadData *data = get_thread_data(state);
+    if (data == NULL) {
+        return NULL;
+    }
+
+    /* C_RETURN and C_RAISE events cannot be disabled, so return None for
+       non-targets. */
+    Py_ssize_t index = find_identical(data, args[2]);
+    if (index != -1 && record_end(state, data, index, unwound) < 0) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+c_return_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    return c_end_common(module, args, nargs, false);
+}
+
+static PyObject *
+c_raise_callback(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    return c_end_common(module, args, nargs, true);
+}
+
+static int
+region_start(RecordModuleState *state, PyObject *region)
+{
+    /* Fast path for regions in code run without an active session. */
+    if (state->num_targets == 0) {
+        return 0;
+    }
+    ThreadData *data = get_thread_data(state);
+    if (data == NULL) {
+        return -1;
+    }
+    Py_ssize_t index = find_identical(data, region);
+    if (index == -1) {
+        return 0;
+    }
+    return record_start(state, data, index);
+}
+
+static int
+region_stop(RecordModuleState *state, PyObject *region, bool unwound)
+{
+    if (state->num_targets == 0) {
+        return 0;
+    }
+    ThreadData *data = get_thread_data(state);
+    if (data == NULL) {
+        return -1;
+    }
+    Py_ssize_t index = find_identical(data, region);
+    if (index == -1) {
+        return 0;
+    }
+    return record_end(state, data, index, unwound);
+}
+
+/* Returns a new reference to the interned Region for name, creating it on
+   first use. */
+static PyObject *
+get_region(RecordModuleState *state, PyObject *name)
+{
+    PyObject *region;
+#if PY_VERSION_HEX >= 0x030D0000
+    if (PyDict_GetItemRef(state->regions, name, &region) < 0) {
+        return NULL;
+    }
+    if (region != NULL) {
+        return region;
+    }
+#else
+    region = PyDict_GetItemWithError(state->regions, name);
+    if (region != NULL) {
+        return Py_NewRef(region);
+    }
+    if (PyErr_Occurred()) {
+        return NULL;
+    }
+#endif
+
+    RegionObject *new_region = PyObject_GC_New(RegionObject, state->region_type);
+    if (new_region == NULL) {
+        return NULL;
+    }
+    new_region->name = Py_NewRef(name);
+    PyObject_GC_Track(new_region);
+
+    /* Another thread may have interned the same name meanwhile. */
+    region = PyDict_SetDefault(state->regions, name, (PyObject *)new_region);
+    Py_XINCREF(region);
+    Py_DECREF(new_region);
+    return region;
+}
+
+static PyObject *
+region_new(PyTypeObject *type, PyObject *args, PyObject *kwargs)
+{
+    if (kwargs != NULL && PyDict_GET_SIZE(kwargs) != 0) {
+        PyErr_SetString(PyExc_TypeError, "Region() takes no keyword arguments");
+        return NULL;
+    }
+    PyObject *name;
+    if (!PyArg_ParseTuple(args, "U:Region", &name)) {
+        return NULL;
+    }
+    return get_region(PyType_GetModuleState(type), name);
+}
+
+static PyObject *
+region_enter(PyObject *self, PyObject *Py_UNUSED(ignored))
+{
+    if (region_start(PyType_GetModuleState(Py_TYPE(self)), self) < 0) {
+        return NULL;
+    }
+    return Py_NewRef(self);
+}
+
+static PyObject *
+region_exit(PyObject *self, PyObject *const *args, Py_ssize_t nargs)
+{
+    /* Exiting because of an exception counts as an unwind. */
+    bool unwound = nargs > 0 && !Py_IsNone(args[0]);
+    if (region_stop(PyType_GetModuleState(Py_TYPE(self)), self, unwound) < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+region_repr(PyObject *self)
+{
+    return PyUnicode_FromFormat("Region(%R)", ((RegionObject *)self)->name);
+}
+
+static int
+region_traverse(PyObject *self, visitproc visit, void *arg)
+{
+    Py_VISIT(Py_TYPE(self));
+    return 0;
+}
+
+static void
+region_dealloc(PyObject *self)
+{
+    PyTypeObject *type = Py_TYPE(self);
+    PyObject_GC_UnTrack(self);
+    Py_XDECREF(((RegionObject *)self)->name);
+    type->tp_free(self);
+    Py_DECREF(type);
+}
+
+static PyMethodDef region_methods[] = {
+    {"__enter__", (PyCFunction)region_enter, METH_NOARGS, NULL},
+    {"__exit__", (PyCFunction)region_exit, METH_FASTCALL, NULL},
+    {NULL, NULL, 0, NULL}};
+
+static PyMemberDef region_members[] = {
+    {"name", Py_T_OBJECT_EX, offsetof(RegionObject, name), Py_READONLY, NULL},
+    {NULL, 0, 0, 0, NULL}};
+
+static PyType_Slot region_slots[] = {{Py_tp_new, region_new},
+    {Py_tp_repr, region_repr},
+    {Py_tp_traverse, region_traverse},
+    {Py_tp_dealloc, region_dealloc},
+    {Py_tp_methods, region_methods},
+    {Py_tp_members, region_members},
+    {0, NULL}};
+
+static PyType_Spec region_spec = {
+    .name = "tprof.record.Region",
+    .basicsize = sizeof(RegionObject),
+    .flags = Py_TPFLAGS_DEFAULT | Py_TPFLAGS_HAVE_GC | Py_TPFLAGS_IMMUTABLETYPE,
+    .slots = region_slots,
+};
+
+static PyObject *
+record_start_region(PyObject *module, PyObject *name)
+{
+    if (!PyUnicode_Check(name)) {
+        PyErr_SetString(PyExc_TypeError, "start_region() argument must be a str");
+        return NULL;
+    }
+    RecordModuleState *state = get_module_state(module);
+    PyObject *region = get_region(state, name);
+    if (region == NULL) {
+        return NULL;
+    }
+    if (region_start(state, region) < 0) {
+        Py_DECREF(region);
+        return NULL;
+    }
+    return region;
+}
+
+static PyObject *
+record_stop_region(PyObject *module, PyObject *region)
+{
+    RecordModuleState *state = get_module_state(module);
+    if (!Py_IS_TYPE(region, state->region_type)) {
+        PyErr_SetString(PyExc_TypeError, "stop_region() argument must be a Region");
+        return NULL;
+    }
+    if (region_stop(state, region, false) < 0) {
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static void
+size_args_free(RecordModuleState *state)
+{
+    if (state->size_args == NULL) {
+        return;
+    }
+    for (Py_ssize_t i = 0; i < state->num_targets; i++) {
+        Py_XDECREF(state->size_args[i]);
+    }
+    PyMem_RawFree(state->size_args);
+    state->size_args = NULL;
+}
+
+/* Frees the histogram buckets, so the next histogram() call starts again. */
+static void
+histogram_reset(RecordModuleState *state)
+{
+    PyMem_RawFree(state->bucket_bounds);
+    PyMem_RawFree(state->bucket_counts);
+    PyMem_RawFree(state->bucket_totals);
+    state->bucket_bounds = NULL;
+    state->num_bounds = 0;
+    state->bucket_counts = NULL;
+    state->bucket_totals = NULL;
+}
+
+static PyObject *
+record_configure(PyObject *module, PyObject *args)
+{
+    PyObject *arg;
+    Py_ssize_t trace_limit = 0;
+    PyObject *size_args_arg = Py_None;
+    int memory = 0;
+    long long slow_ns = 0;
+    PyObject *slow_callback = Py_None;
+    const char *clock_name = clock_names[PERF_COUNTER_CLOCK];
+    PyObject *tag_var = Py_None;
+    PyObject *count_scope = Py_None;
+    int exclude_gc = 0;
+    if (!PyArg_ParseTuple(args,
+            "O|nOpLOsOOp:configure",
+            &arg,
+            &trace_limit,
+            &size_args_arg,
+            &memory,
+            &slow_ns,
+            &slow_callback,
+            &clock_name,
+            &tag_var,
+            &count_scope,
+            &exclude_gc)) {
+        return NULL;
+    }
+    if (!PyTuple_Check(arg)) {
         PyErr_SetString(PyExc_TypeError, "configure() argument must be a tuple");
         return NULL;
     }
 
+    if (trace_limit < 0) {
+        PyErr_SetString(PyExc_ValueError, "configure() trace limit must be non-negative");
+        return NULL;
+    }
+
+    if (slow_ns < 0) {
+        PyErr_SetString(PyExc_ValueError, "configure() slow threshold must be non-negative");
+        return NULL;
+    }
+    if (slow_callback != Py_None && !PyCallable_Check(slow_callback)) {
+        PyErr_SetString(PyExc_TypeError, "configure() slow callback must be callable or None");
+        return NULL;
+    }
+    if (tag_var != Py_None && !PyContextVar_CheckExact(tag_var)) {
+        PyErr_SetString(
+            PyExc_TypeError, "configure() tag variable must be a ContextVar or None");
+        return NULL;
+    }
+    if (count_scope != Py_None) {
+        bool valid = PyTuple_Check(count_scope);
+        for (Py_ssize_t i = 0; valid && i < PyTuple_GET_SIZE(count_scope); i++) {
+            valid = PyUnicode_Check(PyTuple_GET_ITEM(count_scope, i));
+        }
+        if (!valid) {
+            PyErr_SetString(
+                PyExc_TypeError, "configure() count scope must be a tuple of str or None");
+            return NULL;
+        }
+    }
+
+    ClockKind clock = PERF_COUNTER_CLOCK;
+    while (clock < NUM_CLOCKS && strcmp(clock_name, clock_names[clock]) != 0) {
+        clock++;
+    }
+    if (clock == NUM_CLOCKS || !clock_available(clock)) {
+        PyErr_Format(PyExc_ValueError, "configure() clock %s is not available", clock_name);
+        return NULL;
+    }
+#ifdef HAVE_TSC_CLOCK
+    if (clock == TSC_CLOCK && !tsc_calibrated) {
+        Py_BEGIN_ALLOW_THREADS
+        tsc_calibrate();
+        Py_END_ALLOW_THREADS
+    }
+#endif
+
+    if (size_args_arg != Py_None) {
+        if (!PyTuple_Check(size_args_arg) ||
+            PyTuple_GET_SIZE(size_args_arg) != PyTuple_GET_SIZE(arg)) {
+            PyErr_SetString(PyExc_TypeError,
+                "configure() size arguments must be a tuple matching the targets");
+            return NULL;
+        }
+        for (Py_ssize_t i = 0; i < PyTuple_GET_SIZE(size_args_arg); i++) {
+            PyObject *size_arg = PyTuple_GET_ITEM(size_args_arg, i);
+            if (size_arg != Py_None && !PyUnicode_Check(size_arg)) {
+                PyErr_SetString(PyExc_TypeError,
+                    "configure() size arguments must contain only str or None");
+                return NULL;
+            }
+        }
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    Py_ssize_t num_targets = PyTuple_GET_SIZE(arg);
+    PyObject **codes = NULL;
+    if (num_targets > 0) {
+        codes = PyMem_RawCalloc((size_t)num_targets, sizeof(PyObject *));
+        if (codes == NULL) {
+            return PyErr_NoMemory();
+        }
+        for (Py_ssize_t i = 0; i < num_targets; i++) {
+            PyObject *code = PyTuple_GET_ITEM(arg, i);
+            if (!PyCode_Check(code) && !Py_IS_TYPE(code, state->region_type) &&
+                !PyCallable_Check(code)) {
+                for (Py_ssize_t j = 0; j < i; j++) {
+                    Py_DECREF(codes[j]);
+                }
+                PyMem_RawFree(codes);
+                PyErr_SetString(PyExc_TypeError,
+                    "configure() argument must contain only code objects, regions, and "
+                    "callables");
+                return NULL;
+            }
+            codes[i] = Py_NewRef(code);
+        }
+    }
+
+    PyObject **size_args = NULL;
+    if (size_args_arg != Py_None && num_targets > 0) {
+        size_args = PyMem_RawCalloc((size_t)num_targets, sizeof(PyObject *));
+        if (size_args == NULL) {
+            for (Py_ssize_t i = 0; i < num_targets; i++) {
+                Py_DECREF(codes[i]);
+            }
+            PyMem_RawFree(codes);
+            return PyErr_NoMemory();
+        }
+        for (Py_ssize_t i = 0; i < num_targets; i++) {
+            PyObject *size_arg = PyTuple_GET_ITEM(size_args_arg, i);
+            size_args[i] = size_arg == Py_None ? NULL : Py_NewRef(size_arg);
+        }
+    }
+
+    size_args_free(state);
+    for (Py_ssize_t i = 0; i < state->num_targets; i++) {
+        Py_DECREF(state->codes[i]);
+    }
+    PyMem_RawFree(state->codes);
+    state->codes = codes;
+    state->size_args = size_args;
+    state->num_targets = num_targets;
+    state->trace_limit = trace_limit;
+    state->clock = clock;
+    state->memory = memory && num_targets > 0;
+    if (state->memory) {
+        install_allocator_hook();
+    }
+    else {
+        uninstall_allocator_hook();
+    }
+    state->exclude_gc = exclude_gc;
+    state->slow_ns = (int64_t)slow_ns;
+    Py_XSETREF(state->slow_callback,
+        slow_callback != Py_None && num_targets > 0 ? Py_NewRef(slow_callback) : NULL);
+    Py_XSETREF(
+        state->tag_var, tag_var != Py_None && num_targets > 0 ? Py_NewRef(tag_var) : NULL);
+    Py_XSETREF(state->count_scope, count_scope != Py_None ? Py_NewRef(count_scope) : NULL);
+    int cleared;
+    Py_BEGIN_CRITICAL_SECTION(state->tag_indexes);
+    PyDict_Clear(state->tag_indexes);
+    cleared = PyList_SetSlice(state->tag_values, 0, PyList_GET_SIZE(state->tag_values), NULL);
+    Py_END_CRITICAL_SECTION();
+    if (cleared < 0) {
+        return NULL;
+    }
+    state->generation++;
+    histogram_reset(state);
+
+    /* Eagerly reset this thread's data, freeing the previous session's
+       storage. Other threads reset their own data lazily on their next
+       recorded event. */
+    ThreadData *data = (ThreadData *)PyThread_tss_get(&state->tss);
+    if (data != NULL && data->generation != state->generation) {
+        thread_data_free_arrays(data);
+        /* Deliberately mismatched: forces get_thread_data() to take its
+           reallocation branch on this thread's next recorded event,
+           repopulating the arrays to match the new num_targets. */
+        data->generation = STALE_GENERATION;
+    }
+
+    Py_RETURN_NONE;
+}
+
+/* Partially sort values so values[k] holds the k'th smallest value, with all
+   smaller values before it, using quickselect with Hoare partitioning. */
+static int64_t
+select_kth(int64_t *values, Py_ssize_t length, Py_ssize_t k)
+{
+    Py_ssize_t low = 0;
+    Py_ssize_t high = length - 1;
+    while (low < high) {
+        int64_t pivot = values[low + (high - low) / 2];
+        Py_ssize_t i = low - 1;
+        Py_ssize_t j = high + 1;
+        for (;;) {
+            do {
+                i++;
+            } while (values[i] < pivot);
+            do {
+                j--;
+            } while (values[j] > pivot);
+            if (i >= j) {
+                break;
+            }
+            int64_t swapped = values[i];
+            values[i] = values[j];
+            values[j] = swapped;
+        }
+        if (k <= j) {
+            high = j;
+        }
+        else {
+            low = j + 1;
+        }
+    }
+    return values[k];
+}
+
+/* Median, matching statistics.median(): for an even count, the midpoint of
+   the two middle values. Reorders values, and returns 0.0 if empty. */
+static double
+median_of(int64_t *values, Py_ssize_t count)
+{
+    if (count == 0) {
+        return 0.0;
+    }
+    int64_t upper = select_kth(values, count, count / 2);
+    if (count % 2) {
+        return (double)upper;
+    }
+    int64_t lower = values[0];
+    for (Py_ssize_t j = 1; j < count / 2; j++) {
+        if (values[j] > lower) {
+            lower = values[j];
+        }
+    }
+    return ((double)lower + (double)upper) / 2.0;
+}
+
+static PyObject *
+record_mark(PyObject *module, PyObject *Py_UNUSED(ignored))
+{
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* Threads that haven't recorded in this generation yet start with zeroed
+       marks when their data is reset. */
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != state->generation) {
+            continue;
+        }
+        for (Py_ssize_t i = 0; i < data->num_targets; i++) {
+            data->marks[i] = data->durations[i].len;
+            data->running[i] = (RunningStats){.start = data->marks[i]};
+        }
+    }
+
+    Py_RETURN_NONE;
+}
+
+/* Merges running statistics, with Chan et al.'s update for the variance. */
+static void
+running_merge(RunningStats *into, const RunningStats *other)
+{
+    if (other->count == 0) {
+        return;
+    }
+    if (into->count == 0) {
+        *into = *other;
+        return;
+    }
+    double count = (double)(into->count + other->count);
+    double delta = other->mean - into->mean;
+    into->m2 += other->m2 + delta * delta * (double)into->count * (double)other->count / count;
+    into->mean += delta * (double)other->count / count;
+    into->count += other->count;
+    into->total += other->total;
+    if (other->minimum < into->minimum) {
+        into->minimum = other->minimum;
+    }
+    if (other->maximum > into->maximum) {
+        into->maximum = other->maximum;
+    }
+}
+
+/* Returns the merged statistics of the target at index across threads. Each
+   thread's running statistics are used when they cover the requested range,
+   otherwise, such as after warmup_stats() moved marks, its durations are
+   read again. */
+static RunningStats
+target_running_stats(
+    ThreadData *threads, uint64_t generation, Py_ssize_t index, bool since_mark)
+{
+    RunningStats merged = {0};
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        Py_ssize_t start = since_mark ? data->marks[index] : 0;
+        if (data->running[index].start == start) {
+            running_merge(&merged, &data->running[index]);
+            continue;
+        }
+        RunningStats running = {.start = start};
+        I64Array *durations = &data->durations[index];
+        for (Py_ssize_t j = start; j < durations->len; j++) {
+            running_add(&running, durations->items[j]);
+        }
+        running_merge(&merged, &running);
+    }
+    return merged;
+}
+
+/* Returns -1 with RuntimeError set if configure() was called since a stats
+   function snapshotted generation, while it released the GIL. */
+static int
+check_generation(RecordModuleState *state, uint64_t generation)
+{
+    if (state->generation != generation) {
+        PyErr_SetString(PyExc_RuntimeError, "configure() was called while taking stats");
+        return -1;
+    }
+    return 0;
+}
+
+/* Targets whose medians are taken together with the GIL released, bounding
+   the scratch memory held at once. */
+#define STATS_BATCH 8
+
+/* Native threads used to take medians, including the calling thread, and
+   the number of values in a batch before more than one is used. */
+#define STATS_THREADS 4
+#define STATS_PARALLEL_MIN_VALUES 100000
+
+typedef struct {
+    int64_t *values;
+    Py_ssize_t count;
+    double median;
+} MedianJob;
+
+typedef struct {
+    MedianJob *jobs;
+    Py_ssize_t num_jobs;
+    Py_ssize_t next_job; /* guarded by lock, as is workers */
+    Py_ssize_t workers;
+    PyThread_type_lock lock;
+    PyThread_type_lock done; /* held until the last worker finishes */
+} MedianPool;
+
+/* Takes medians until no jobs are left. Runs without the GIL, so it must
+   only touch the pool and its jobs' scratch buffers. */
+static void
+median_worker(void *arg)
+{
+    MedianPool *pool = (MedianPool *)arg;
+    for (;;) {
+        PyThread_acquire_lock(pool->lock, 1);
+        Py_ssize_t j = pool->next_job++;
+        bool finished = j >= pool->num_jobs;
+        bool last = finished && --pool->workers == 0;
+        PyThread_release_lock(pool->lock);
+        /* Once a worker other than the last finishes, the pool may be freed. */
+        if (finished) {
+            if (last) {
+                PyThread_release_lock(pool->done);
+            }
+            return;
+        }
+        pool->jobs[j].median = median_of(pool->jobs[j].values, pool->jobs[j].count);
+    }
+}
+
+/* Takes the medians of jobs, in parallel if they're large enough. Must be
+   called with the GIL released. If threads can't be started, the calling
+   thread takes the medians alone. */
+static void
+run_median_jobs(MedianJob *jobs, Py_ssize_t num_jobs)
+{
+    Py_ssize_t num_values = 0;
+    for (Py_ssize_t j = 0; j < num_jobs; j++) {
+        num_values += jobs[j].count;
+    }
+
+    MedianPool pool = {.jobs = jobs, .num_jobs = num_jobs, .workers = 1};
+    if (num_jobs > 1 && num_values >= STATS_PARALLEL_MIN_VALUES) {
+        pool.lock = PyThread_allocate_lock();
+        pool.done = PyThread_allocate_lock();
+    }
+    if (pool.lock == NULL || pool.done == NULL) {
+        for (Py_ssize_t j = 0; j < num_jobs; j++) {
+            jobs[j].median = median_of(jobs[j].values, jobs[j].count);
+        }
+        goto finally;
+    }
+
+    PyThread_acquire_lock(pool.done, 1);
+    Py_ssize_t num_threads = num_jobs < STATS_THREADS ? num_jobs : STATS_THREADS;
+    for (Py_ssize_t t = 1; t < num_threads; t++) {
+        PyThread_acquire_lock(pool.lock, 1);
+        pool.workers++;
+        PyThread_release_lock(pool.lock);
+        if (PyThread_start_new_thread(median_worker, &pool) == PYTHREAD_INVALID_THREAD_ID) {
+            PyThread_acquire_lock(pool.lock, 1);
+            pool.workers--;
+            PyThread_release_lock(pool.lock);
+            break;
+        }
+    }
+    median_worker(&pool);
+    /* Wait for the last worker, which may be another thread, to finish. */
+    PyThread_acquire_lock(pool.done, 1);
+    PyThread_release_lock(pool.done);
+
+finally:
+    if (pool.lock != NULL) {
+        PyThread_free_lock(pool.lock);
+    }
+    if (pool.done != NULL) {
+        PyThread_free_lock(pool.done);
+    }
+}
+
+/* Gathers the target at index's durations from the per-thread buffers into
+   one scratch buffer of count values, for the median's quickselect. */
+static int64_t *
+gather_durations(ThreadData *threads,
+    uint64_t generation,
+    Py_ssize_t index,
+    bool since_mark,
+    Py_ssize_t count)
+{
+    int64_t *values = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+    if (values == NULL) {
+        PyErr_NoMemory();
+        return NULL;
+    }
+    Py_ssize_t position = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *durations = &data->durations[index];
+        Py_ssize_t start = since_mark ? data->marks[index] : 0;
+        if (durations->len > start) {
+            memcpy(&values[position],
+                &durations->items[start],
+                (size_t)(durations->len - start) * sizeof(int64_t));
+            position += durations->len - start;
+        }
+    }
+    return values;
+}
+
+static PyObject *
+record_stats(PyObject *module, PyObject *args)
+{
+    int since_mark = 0;
+    if (!PyArg_ParseTuple(args, "|p:stats", &since_mark)) {
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    /* Snapshot the list head; nodes are only prepended, and only freed when
+       the module is freed, so iterating without the lock is safe. */
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* Another thread may reconfigure while the GIL is released, so only read
+       data from the generation at the start. */
+    uint64_t generation = state->generation;
+    Py_ssize_t num_targets = state->num_targets;
+
+    PyObject *result = PyList_New(num_targets);
+    if (result == NULL) {
+        return NULL;
+    }
+
+    RunningStats running[STATS_BATCH];
+    MedianJob jobs[STATS_BATCH];
+    for (Py_ssize_t batch = 0; batch < num_targets; batch += STATS_BATCH) {
+        Py_ssize_t num_jobs =
+            num_targets - batch < STATS_BATCH ? num_targets - batch : STATS_BATCH;
+        for (Py_ssize_t j = 0; j < num_jobs; j++) {
+            running[j] = target_running_stats(threads, generation, batch + j, since_mark);
+            jobs[j] = (MedianJob){.count = running[j].count};
+            if (jobs[j].count > 0) {
+                jobs[j].values = gather_durations(
+                    threads, generation, batch + j, since_mark, jobs[j].count);
+                if (jobs[j].values == NULL) {
+                    for (Py_ssize_t k = 0; k < j; k++) {
+                        PyMem_RawFree(jobs[k].values);
+                    }
+                    Py_DECREF(result);
+                    return NULL;
+                }
+            }
+        }
+
+        Py_BEGIN_ALLOW_THREADS
+        run_median_jobs(jobs, num_jobs);
+        Py_END_ALLOW_THREADS
+
+        for (Py_ssize_t j = 0; j < num_jobs; j++) {
+            PyMem_RawFree(jobs[j].values);
+        }
+        if (check_generation(state, generation) < 0) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        for (Py_ssize_t j = 0; j < num_jobs; j++) {
+            /* Sample standard deviation, matching statistics.stdev(). */
+            double stdev = 0.0;
+            if (running[j].count > 1) {
+                stdev = sqrt(running[j].m2 / (double)(running[j].count - 1));
+            }
+            PyObject *item = Py_BuildValue("nLLLdd",
+                running[j].count,
+                (long long)running[j].total,
+                (long long)running[j].minimum,
+                (long long)running[j].maximum,
+                jobs[j].median,
+                stdev);
+            if (item == NULL) {
+                Py_DECREF(result);
+                return NULL;
+            }
+            PyList_SET_ITEM(result, batch + j, item);
+        }
+    }
+
+    return result;
+}
+
+/* Calls below this count per thread are too few to separate warmup. */
+#define WARMUP_MIN_CALLS 20
+
+/* Returns the number of calls at the start of values that are warmup, using
+   scratch, which must hold count values. */
+static Py_ssize_t
+warmup_length(const int64_t *values, Py_ssize_t count, double tolerance, int64_t *scratch)
+{
+    if (count < WARMUP_MIN_CALLS) {
+        return 0;
+    }
+    Py_ssize_t half = count / 2;
+    memcpy(scratch, &values[half], (size_t)(count - half) * sizeof(int64_t));
+    double limit = median_of(scratch, count - half) * (1.0 + tolerance);
+
+    Py_ssize_t start = 0;
+    for (Py_ssize_t size = 1; start + size <= half; start += size, size *= 2) {
+        memcpy(scratch, &values[start], (size_t)size * sizeof(int64_t));
+        if (median_of(scratch, size) <= limit) {
+            break;
+        }
+    }
+    return start;
+}
+
+typedef struct {
+    ThreadData *data;
+    Py_ssize_t length; /* durations gathered from the thread */
+    Py_ssize_t warmup; /* how many of them are warmup calls */
+} WarmupSegment;
+
+/* A target's durations for warmup_stats(), gathered thread by thread with
+   the GIL held, then split into warmup and steady calls without it. */
+typedef struct {
+    WarmupSegment *segments;
+    Py_ssize_t num_segments;
+    Py_ssize_t count;
+    Py_ssize_t warmup_count;
+    int64_t *values; /* each thread's durations in turn */
+    int64_t *split;  /* warmup durations at the start, steady ones at the end */
+} WarmupGather;
+
+static void
+warmup_gather_free(WarmupGather *gather)
+{
+    PyMem_RawFree(gather->segments);
+    PyMem_RawFree(gather->values);
+    PyMem_RawFree(gather->split);
+}
+
+/* Gathers the target at index's durations from each thread. Returns -1 with
+   an exception set on failure. */
+static int
+gather_warmup_durations(
+    ThreadData *threads, uint64_t generation, Py_ssize_t index, WarmupGather *gather)
+{
+    Py_ssize_t num_segments = 0;
+    Py_ssize_t count = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation == generation) {
+            num_segments++;
+            count += data->durations[index].len;
+        }
+    }
+    *gather = (WarmupGather){0};
+    if (count == 0) {
+        return 0;
+    }
+
+    gather->segments = PyMem_RawMalloc((size_t)num_segments * sizeof(WarmupSegment));
+    gather->values = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+    gather->split = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+    if (gather->segments == NULL || gather->values == NULL || gather->split == NULL) {
+        warmup_gather_free(gather);
+        PyErr_NoMemory();
+        return -1;
+    }
+    gather->num_segments = num_segments;
+    gather->count = count;
+    Py_ssize_t position = 0;
+    WarmupSegment *segment = gather->segments;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *durations = &data->durations[index];
+        *segment++ = (WarmupSegment){.data = data, .length = durations->len};
+        memcpy(&gather->values[position],
+            durations->items,
+            (size_t)durations->len * sizeof(int64_t));
+        position += durations->len;
+    }
+    return 0;
+}
+
+/* Finds each thread's warmup calls, then moves their durations to the start
+   of split, and the steady ones to its end. Runs without the GIL. */
+static void
+split_warmup(WarmupGather *gather, double tolerance)
+{
+    /* split isn't filled yet, so it's the scratch for warmup_length(). */
+    const int64_t *values = gather->values;
+    for (Py_ssize_t s = 0; s < gather->num_segments; s++) {
+        WarmupSegment *segment = &gather->segments[s];
+        segment->warmup = warmup_length(values, segment->length, tolerance, gather->split);
+        values += segment->length;
+    }
+
+    Py_ssize_t steady_position = gather->count;
+    values = gather->values;
+    for (Py_ssize_t s = 0; s < gather->num_segments; s++) {
+        WarmupSegment *segment = &gather->segments[s];
+        Py_ssize_t steady = segment->length - segment->warmup;
+        memcpy(&gather->split[gather->warmup_count],
+            values,
+            (size_t)segment->warmup * sizeof(int64_t));
+        gather->warmup_count += segment->warmup;
+        steady_position -= steady;
+        memcpy(&gather->split[steady_position],
+            &values[segment->warmup],
+            (size_t)steady * sizeof(int64_t));
+        values += segment->length;
+    }
+}
+
+static PyObject *
+record_warmup_stats(PyObject *module, PyObject *args)
+{
+    double tolerance;
+    int skip = 0;
+    if (!PyArg_ParseTuple(args, "d|p:warmup_stats", &tolerance, &skip)) {
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* As in stats(), only read data from the generation at the start. */
+    uint64_t generation = state->generation;
+    Py_ssize_t num_targets = state->num_targets;
+
+    PyObject *result = PyList_New(num_targets);
+    if (result == NULL) {
+        return NULL;
+    }
+
+    WarmupGather gathers[STATS_BATCH];
+    MedianJob jobs[2 * STATS_BATCH];
+    for (Py_ssize_t batch = 0; batch < num_targets; batch += STATS_BATCH) {
+        Py_ssize_t batch_size =
+            num_targets - batch < STATS_BATCH ? num_targets - batch : STATS_BATCH;
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            if (gather_warmup_durations(threads, generation, batch + j, &gathers[j]) < 0) {
+                for (Py_ssize_t k = 0; k < j; k++) {
+                    warmup_gather_free(&gathers[k]);
+                }
+                Py_DECREF(result);
+                return NULL;
+            }
+        }
+
+        /* Take the median of each target's warmup and steady durations. */
+        Py_BEGIN_ALLOW_THREADS
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            WarmupGather *gather = &gathers[j];
+            split_warmup(gather, tolerance);
+            jobs[2 * j] = (MedianJob){.values = gather->split, .count = gather->warmup_count};
+            jobs[2 * j + 1] = (MedianJob){
+                .values = gather->count > 0 ? &gather->split[gather->warmup_count] : NULL,
+                .count = gather->count - gather->warmup_count,
+            };
+        }
+        run_median_jobs(jobs, 2 * batch_size);
+        Py_END_ALLOW_THREADS
+
+        bool changed = check_generation(state, generation) < 0;
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            for (Py_ssize_t s = 0; skip && !changed && s < gathers[j].num_segments; s++) {
+                WarmupSegment *segment = &gathers[j].segments[s];
+                segment->data->marks[batch + j] = segment->warmup;
+            }
+            warmup_gather_free(&gathers[j]);
+        }
+        if (changed) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            PyObject *item = Py_BuildValue(
+                "ndd", jobs[2 * j].count, jobs[2 * j].median, jobs[2 * j + 1].median);
+            if (item == NULL) {
+                Py_DECREF(result);
+                return NULL;
+            }
+            PyList_SET_ITEM(result, batch + j, item);
+        }
+    }
+
+    return result;
+}
+
+/* Gathers the target at index's durations into one scratch buffer: returned
+   calls first, for jobs[0], then unwound ones, for jobs[1], walking the sorted
+   unwind indexes alongside. jobs[0].values owns the buffer. Returns -1 with
+   an exception set on failure. */
+static int
+gather_outcome_durations(ThreadData *threads,
+    uint64_t generation,
+    Py_ssize_t index,
+    bool since_mark,
+    MedianJob *jobs)
+{
+    Py_ssize_t count = 0;
+    Py_ssize_t unwound_count = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        Py_ssize_t start = since_mark ? data->marks[index] : 0;
+        count += data->durations[index].len - start;
+        I64Array *unwinds = &data->unwinds[index];
+        for (Py_ssize_t j = unwinds->len - 1; j >= 0 && unwinds->items[j] >= start; j--) {
+            unwound_count++;
+        }
+    }
+
+    Py_ssize_t returned_count = count - unwound_count;
+    jobs[0] = (MedianJob){.count = returned_count};
+    jobs[1] = (MedianJob){.count = unwound_count};
+    if (count == 0) {
+        return 0;
+    }
+    int64_t *values = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+    if (values == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    jobs[0].values = values;
+    jobs[1].values = &values[returned_count];
+
+    Py_ssize_t returned_position = 0;
+    Py_ssize_t unwound_position = returned_count;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *durations = &data->durations[index];
+        I64Array *unwinds = &data->unwinds[index];
+        Py_ssize_t start = since_mark ? data->marks[index] : 0;
+        Py_ssize_t k = 0;
+        while (k < unwinds->len && unwinds->items[k] < start) {
+            k++;
+        }
+        for (Py_ssize_t j = start; j < durations->len; j++) {
+            if (k < unwinds->len && unwinds->items[k] == j) {
+                values[unwound_position++] = durations->items[j];
+                k++;
+            }
+            else {
+                values[returned_position++] = durations->items[j];
+            }
+        }
+    }
+    return 0;
+}
+
+/* Returns a list of (unwound calls, median of returned calls, median of
+   unwound calls) per target. */
+static PyObject *
+record_outcome_stats(PyObject *module, PyObject *args)
+{
+    int since_mark = 0;
+    if (!PyArg_ParseTuple(args, "|p:outcome_stats", &since_mark)) {
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* As in stats(), only read data from the generation at the start. */
+    uint64_t generation = state->generation;
+    Py_ssize_t num_targets = state->num_targets;
+
+    PyObject *result = PyList_New(num_targets);
+    if (result == NULL) {
+        return NULL;
+    }
+
+    MedianJob jobs[2 * STATS_BATCH];
+    for (Py_ssize_t batch = 0; batch < num_targets; batch += STATS_BATCH) {
+        Py_ssize_t batch_size =
+            num_targets - batch < STATS_BATCH ? num_targets - batch : STATS_BATCH;
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            if (gather_outcome_durations(
+                    threads, generation, batch + j, since_mark, &jobs[2 * j]) < 0) {
+                for (Py_ssize_t k = 0; k < j; k++) {
+                    PyMem_RawFree(jobs[2 * k].values);
+                }
+                Py_DECREF(result);
+                return NULL;
+            }
+        }
+
+        Py_BEGIN_ALLOW_THREADS
+        run_median_jobs(jobs, 2 * batch_size);
+        Py_END_ALLOW_THREADS
+
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            PyMem_RawFree(jobs[2 * j].values);
+        }
+        if (check_generation(state, generation) < 0) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            PyObject *item = Py_BuildValue(
+                "ndd", jobs[2 * j + 1].count, jobs[2 * j].median, jobs[2 * j + 1].median);
+            if (item == NULL) {
+                Py_DECREF(result);
+                return NULL;
+            }
+            PyList_SET_ITEM(result, batch + j, item);
+        }
+    }
+
+    return result;
+}
+
+static PyObject *
+record_trace(PyObject *module, PyObject *Py_UNUSED(ignored))
+{
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    PyObject *result = PyList_New(0);
+    if (result == NULL) {
+        return NULL;
+    }
+
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        TraceBuffer *trace = &data->trace;
+        if (data->generation != state->generation || trace->count == 0) {
+            continue;
+        }
+
+        /* Copy out the retained events, oldest first. */
+        Py_ssize_t len = trace->count < trace->capacity ? trace->count : trace->capacity;
+        Py_ssize_t first = trace->count > len ? trace->count % len : 0;
+        PyObject *events =
+            PyBytes_FromStringAndSize(NULL, len * (Py_ssize_t)sizeof(TraceEvent));
+        if (events == NULL) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        char *out = PyBytes_AS_STRING(events);
+        memcpy(out, &trace->items[first], (size_t)(len - first) * sizeof(TraceEvent));
+        memcpy(out + (len - first) * (Py_ssize_t)sizeof(TraceEvent),
+            trace->items,
+            (size_t)first * sizeof(TraceEvent));
+
+        PyObject *item = Py_BuildValue("knN", data->thread_id, trace->count - len, events);
+        if (item == NULL) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        int appended = PyList_Append(result, item);
+        Py_DECREF(item);
+        if (appended < 0) {
+            Py_DECREF(result);
+            return NULL;
+        }
+    }
+
+    return result;
+}
+
+/* Gathers the target at index's allocated bytes per call into one scratch
+   buffer, for jobs[0], followed by its allocations per call, for jobs[1],
+   and sets totals to the total bytes and allocations. jobs[0].values owns
+   the buffer. Returns -1 with an exception set on failure. */
+static int
+gather_memory(ThreadData *threads,
+    uint64_t generation,
+    Py_ssize_t index,
+    MedianJob *jobs,
+    int64_t *totals)
+{
+    Py_ssize_t count = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation == generation) {
+            count += data->memory[index].len / 2;
+        }
+    }
+
+    jobs[0] = (MedianJob){.count = count};
+    jobs[1] = (MedianJob){.count = count};
+    totals[0] = 0;
+    totals[1] = 0;
+    if (count == 0) {
+        return 0;
+    }
+    int64_t *values = PyMem_RawMalloc(2 * (size_t)count * sizeof(int64_t));
+    if (values == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    jobs[0].values = values;
+    jobs[1].values = &values[count];
+
+    Py_ssize_t position = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *memory = &data->memory[index];
+        for (Py_ssize_t j = 0; j + 1 < memory->len; j += 2) {
+            jobs[0].values[position] = memory->items[j];
+            jobs[1].values[position] = memory->items[j + 1];
+            totals[0] += memory->items[j];
+            totals[1] += memory->items[j + 1];
+            position++;
+        }
+    }
+    return 0;
+}
+
+/* Returns a list of (total bytes, median bytes, total allocations, median
+   allocations) per call for each target, or None for each if memory isn't
+   counted. */
+static PyObject *
+record_memory_stats(PyObject *module, PyObject *Py_UNUSED(ignored))
+{
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* As in stats(), only read data from the generation at the start. */
+    uint64_t generation = state->generation;
+    Py_ssize_t num_targets = state->num_targets;
+
+    PyObject *result = PyList_New(num_targets);
+    if (result == NULL) {
+        return NULL;
+    }
+    if (!state->memory) {
+        for (Py_ssize_t i = 0; i < num_targets; i++) {
+            PyList_SET_ITEM(result, i, Py_NewRef(Py_None));
+        }
+        return result;
+    }
+
+    MedianJob jobs[2 * STATS_BATCH];
+    int64_t totals[2 * STATS_BATCH];
+    for (Py_ssize_t batch = 0; batch < num_targets; batch += STATS_BATCH) {
+        Py_ssize_t batch_size =
+            num_targets - batch < STATS_BATCH ? num_targets - batch : STATS_BATCH;
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            if (gather_memory(threads, generation, batch + j, &jobs[2 * j], &totals[2 * j]) <
+                0) {
+                for (Py_ssize_t k = 0; k < j; k++) {
+                    PyMem_RawFree(jobs[2 * k].values);
+                }
+                Py_DECREF(result);
+                return NULL;
+            }
+        }
+
+        Py_BEGIN_ALLOW_THREADS
+        run_median_jobs(jobs, 2 * batch_size);
+        Py_END_ALLOW_THREADS
+
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            PyMem_RawFree(jobs[2 * j].values);
+        }
+        if (check_generation(state, generation) < 0) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            PyObject *item = Py_BuildValue("LdLd",
+                (long long)totals[2 * j],
+                jobs[2 * j].median,
+                (long long)totals[2 * j + 1],
+                jobs[2 * j + 1].median);
+            if (item == NULL) {
+                Py_DECREF(result);
+                return NULL;
+            }
+            PyList_SET_ITEM(result, batch + j, item);
+        }
+    }
+
+    return result;
+}
+
+/* Gathers the target at index's durations into a scratch buffer for job,
+   with GC time added back if exclude_gc, or removed if not, and sets totals
+   to the collections and GC time overlapping its calls. job is left empty,
+   with a median of 0.0, if no calls overlapped a collection, as the median
+   is the same as stats()' then. Returns -1 with an exception set on
+   failure. */
+static int
+gather_gc_durations(ThreadData *threads,
+    uint64_t generation,
+    Py_ssize_t index,
+    bool since_mark,
+    bool exclude_gc,
+    MedianJob *job,
+    int64_t *totals)
+{
+    Py_ssize_t count = 0;
+    int64_t collections = 0;
+    int64_t gc_ns = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        Py_ssize_t start = since_mark ? data->marks[index] : 0;
+        count += data->durations[index].len - start;
+        I64Array *gc = &data->gc[index];
+        for (Py_ssize_t j = 0; j + 2 < gc->len; j += 3) {
+            if (gc->items[j] >= start) {
+                gc_ns += gc->items[j + 1];
+                collections += gc->items[j + 2];
+            }
+        }
+    }
+
+    *job = (MedianJob){0};
+    totals[0] = 0;
+    totals[1] = 0;
+    if (collections == 0) {
+        return 0;
+    }
+    int64_t *values = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+    if (values == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    *job = (MedianJob){.values = values, .count = count};
+    totals[0] = collections;
+    totals[1] = gc_ns;
+
+    int64_t sign = exclude_gc ? 1 : -1;
+    Py_ssize_t position = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *durations = &data->durations[index];
+        Py_ssize_t start = since_mark ? data->marks[index] : 0;
+        if (durations->len <= start) {
+            continue;
+        }
+        memcpy(&values[position],
+            &durations->items[start],
+            (size_t)(durations->len - start) * sizeof(int64_t));
+        I64Array *gc = &data->gc[index];
+        for (Py_ssize_t j = 0; j + 2 < gc->len; j += 3) {
+            if (gc->items[j] >= start) {
+                values[position + gc->items[j] - start] += sign * gc->items[j + 1];
+            }
+        }
+        position += durations->len - start;
+    }
+    return 0;
+}
+
+/* Returns a list of (collections, GC time, median) per target, where the
+   median is of durations with GC time added back if excluded, or removed if
+   not. */
+static PyObject *
+record_gc_stats(PyObject *module, PyObject *args)
+{
+    int since_mark = 0;
+    if (!PyArg_ParseTuple(args, "|p:gc_stats", &since_mark)) {
+        return NULL;
+    }
+
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* As in stats(), only read data from the generation at the start. */
+    uint64_t generation = state->generation;
+    Py_ssize_t num_targets = state->num_targets;
+    bool exclude_gc = state->exclude_gc;
+
+    PyObject *result = PyList_New(num_targets);
+    if (result == NULL) {
+        return NULL;
+    }
+
+    MedianJob jobs[STATS_BATCH];
+    int64_t totals[2 * STATS_BATCH];
+    for (Py_ssize_t batch = 0; batch < num_targets; batch += STATS_BATCH) {
+        Py_ssize_t batch_size =
+            num_targets - batch < STATS_BATCH ? num_targets - batch : STATS_BATCH;
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            if (gather_gc_durations(threads,
+                    generation,
+                    batch + j,
+                    since_mark,
+                    exclude_gc,
+                    &jobs[j],
+                    &totals[2 * j]) < 0) {
+                for (Py_ssize_t k = 0; k < j; k++) {
+                    PyMem_RawFree(jobs[k].values);
+                }
+                Py_DECREF(result);
+                return NULL;
+            }
+        }
+
+        Py_BEGIN_ALLOW_THREADS
+        run_median_jobs(jobs, batch_size);
+        Py_END_ALLOW_THREADS
+
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            PyMem_RawFree(jobs[j].values);
+        }
+        if (check_generation(state, generation) < 0) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        for (Py_ssize_t j = 0; j < batch_size; j++) {
+            PyObject *item = Py_BuildValue(
+                "LLd", (long long)totals[2 * j], (long long)totals[2 * j + 1], jobs[j].median);
+            if (item == NULL) {
+                Py_DECREF(result);
+                return NULL;
+            }
+            PyList_SET_ITEM(result, batch + j, item);
+        }
+    }
+
+    return result;
+}
+
+/* Number of size buckets: sizes are grouped by bit length, 0 to 63. */
+#define SIZE_BUCKETS 64
+
+static int
+size_bucket(int64_t size)
+{
+    int bits = 0;
+    while (size > 0) {
+        bits++;
+        size >>= 1;
+    }
+    return bits;
+}
+
+/* Returns a list of (bits, calls, median size, median duration) tuples for
+   the target at index, for each non-empty size bucket in ascending order.
+   The buckets' medians are taken together with the GIL released. */
+static PyObject *
+target_size_stats(ThreadData *threads, uint64_t generation, Py_ssize_t index)
+{
+    Py_ssize_t bucket_counts[SIZE_BUCKETS] = {0};
+    Py_ssize_t count = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *sizes = &data->sizes[index];
+        for (Py_ssize_t j = 0; j < sizes->len; j++) {
+            if (sizes->items[j] >= 0) {
+                bucket_counts[size_bucket(sizes->items[j])]++;
+                count++;
+            }
+        }
+    }
+
+    /* Gather durations and sizes into scratch buffers, grouped by bucket. */
+    Py_ssize_t offsets[SIZE_BUCKETS];
+    Py_ssize_t position = 0;
+    for (int bits = 0; bits < SIZE_BUCKETS; bits++) {
+        offsets[bits] = position;
+        position += bucket_counts[bits];
+    }
+    int64_t *durations = NULL;
+    int64_t *sizes = NULL;
+    if (count > 0) {
+        durations = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+        sizes = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+        if (durations == NULL || sizes == NULL) {
+            PyMem_RawFree(durations);
+            PyMem_RawFree(sizes);
+            return PyErr_NoMemory();
+        }
+    }
+    Py_ssize_t filled[SIZE_BUCKETS] = {0};
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *thread_sizes = &data->sizes[index];
+        for (Py_ssize_t j = 0; j < thread_sizes->len; j++) {
+            int64_t size = thread_sizes->items[j];
+            if (size < 0) {
+                continue;
+            }
+            int bits = size_bucket(size);
+            Py_ssize_t k = offsets[bits] + filled[bits]++;
+            durations[k] = data->durations[index].items[j];
+            sizes[k] = size;
+        }
+    }
+
+    /* Each bucket's median size, then its median duration. */
+    MedianJob jobs[2 * SIZE_BUCKETS] = {0};
+    for (int bits = 0; bits < SIZE_BUCKETS; bits++) {
+        if (bucket_counts[bits] > 0) {
+            jobs[2 * bits] =
+                (MedianJob){.values = &sizes[offsets[bits]], .count = bucket_counts[bits]};
+            jobs[2 * bits + 1] =
+                (MedianJob){.values = &durations[offsets[bits]], .count = bucket_counts[bits]};
+        }
+    }
+    Py_BEGIN_ALLOW_THREADS
+    run_median_jobs(jobs, 2 * SIZE_BUCKETS);
+    Py_END_ALLOW_THREADS
+    PyMem_RawFree(durations);
+    PyMem_RawFree(sizes);
+
+    PyObject *result = PyList_New(0);
+    if (result == NULL) {
+        return NULL;
+    }
+    for (int bits = 0; bits < SIZE_BUCKETS; bits++) {
+        if (bucket_counts[bits] == 0) {
+            continue;
+        }
+        PyObject *item = Py_BuildValue("indd",
+            bits,
+            bucket_counts[bits],
+            jobs[2 * bits].median,
+            jobs[2 * bits + 1].median);
+        if (item == NULL || PyList_Append(result, item) < 0) {
+            Py_XDECREF(item);
+            Py_DECREF(result);
+            return NULL;
+        }
+        Py_DECREF(item);
+    }
+    return result;
+}
+
+static PyObject *
+record_size_stats(PyObject *module, PyObject *Py_UNUSED(ignored))
+{
     RecordModuleState *state = get_module_state(module);
 
-    Py_ssize_t num_targets = PyTuple_GET_SIZE(arg);
-    PyObject **codes = NULL;
-    if (num_targets > 0) {
-        codes = PyMem_RawCalloc((size_t)num_targets, sizeof(PyObject *));
-        if (codes == NULL) {
-            return PyErr_NoMemory();
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* As in stats(), only read data from the generation at the start. */
+    uint64_t generation = state->generation;
+    Py_ssize_t num_targets = state->num_targets;
+
+    PyObject *result = PyList_New(num_targets);
+    if (result == NULL) {
+        return NULL;
+    }
+
+    for (Py_ssize_t i = 0; i < num_targets; i++) {
+        /* The GIL is released for each target. */
+        if (check_generation(state, generation) < 0) {
+            Py_DECREF(result);
+            return NULL;
         }
-        for (Py_ssize_t i = 0; i < num_targets; i++) {
-            PyObject *code = PyTuple_GET_ITEM(arg, i);
-            if (!PyCode_Check(code)) {
-                for (Py_ssize_t j = 0; j < i; j++) {
-                    Py_DECREF(codes[j]);
-                }
-                PyMem_RawFree(codes);
-                PyErr_SetString(
-                    PyExc_TypeError, "configure() argument must contain only code objects");
+        PyObject *item;
+        if (state->size_args == NULL || state->size_args[i] == NULL) {
+            item = Py_NewRef(Py_None);
+        }
+        else {
+            item = target_size_stats(threads, generation, i);
+            if (item == NULL) {
+                Py_DECREF(result);
                 return NULL;
             }
-            codes[i] = Py_NewRef(code);
         }
+        PyList_SET_ITEM(result, i, item);
     }
 
-    for (Py_ssize_t i = 0; i < state->num_targets; i++) {
-        Py_DECREF(state->codes[i]);
+    return result;
+}
+
+static inline Py_ssize_t
+tag_bucket(int64_t tag, Py_ssize_t num_buckets)
+{
+    Py_ssize_t bucket = (Py_ssize_t)(tag - OTHER_TAG);
+    return bucket < num_buckets ? bucket : 0;
+}
+
+/* Returns a list of (tag, calls, total, median) tuples for the target at
+   index, for each tag with calls in ascending order, including OTHER_TAG and
+   NO_TAG. The tags' medians are taken together with the GIL released. */
+static PyObject *
+target_tag_stats(
+    RecordModuleState *state, ThreadData *threads, uint64_t generation, Py_ssize_t index)
+{
+    /* Bucket 0 is OTHER_TAG, 1 is NO_TAG, and the rest are tag indexes. On
+       free-threaded builds, values interned since counting them are grouped
+       with OTHER_TAG. */
+    Py_ssize_t num_buckets = num_tag_values(state) + 2;
+    Py_ssize_t *bucket_counts = PyMem_RawCalloc((size_t)num_buckets, sizeof(Py_ssize_t));
+    Py_ssize_t *offsets = PyMem_RawCalloc((size_t)num_buckets, sizeof(Py_ssize_t));
+    int64_t *totals = PyMem_RawCalloc((size_t)num_buckets, sizeof(int64_t));
+    MedianJob *jobs = PyMem_RawCalloc((size_t)num_buckets, sizeof(MedianJob));
+    int64_t *durations = NULL;
+    PyObject *result = NULL;
+    if (bucket_counts == NULL || offsets == NULL || totals == NULL || jobs == NULL) {
+        PyErr_NoMemory();
+        goto finally;
     }
-    PyMem_RawFree(state->codes);
-    state->codes = codes;
-    state->num_targets = num_targets;
-    state->generation++;
 
-    /* Eagerly reset this thread's data, freeing the previous session's
-       storage. Other threads reset their own data lazily on their next
-       recorded event. */
-    ThreadData *data = (ThreadData *)PyThread_tss_get(&state->tss);
-    if (data != NULL && data->generation != state->generation) {
-        thread_data_free_arrays(data);
-        /* Deliberately mismatched: forces get_thread_data() to take its
-           reallocation branch on this thread's next recorded event,
-           repopulating the arrays to match the new num_targets. */
-        data->generation = state->generation - 1;
+    Py_ssize_t count = 0;
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *tags = &data->tags[index];
+        for (Py_ssize_t j = 0; j < tags->len; j++) {
+            bucket_counts[tag_bucket(tags->items[j], num_buckets)]++;
+        }
+        count += tags->len;
     }
 
-    Py_RETURN_NONE;
+    /* Gather durations into a scratch buffer, grouped by bucket. */
+    Py_ssize_t position = 0;
+    for (Py_ssize_t bucket = 0; bucket < num_buckets; bucket++) {
+        offsets[bucket] = position;
+        position += bucket_counts[bucket];
+    }
+    if (count > 0) {
+        durations = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
+        if (durations == NULL) {
+            PyErr_NoMemory();
+            goto finally;
+        }
+    }
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != generation) {
+            continue;
+        }
+        I64Array *tags = &data->tags[index];
+        for (Py_ssize_t j = 0; j < tags->len; j++) {
+            Py_ssize_t bucket = tag_bucket(tags->items[j], num_buckets);
+            int64_t duration = data->durations[index].items[j];
+            durations[offsets[bucket]++] = duration;
+            totals[bucket] += duration;
+        }
+    }
+
+    for (Py_ssize_t bucket = 0; bucket < num_buckets; bucket++) {
+        Py_ssize_t bucket_count = bucket_counts[bucket];
+        if (bucket_count > 0) {
+            /* offsets now point at each bucket's end. */
+            jobs[bucket] = (MedianJob){
+                .values = &durations[offsets[bucket] - bucket_count],
+                .count = bucket_count,
+            };
+        }
+    }
+    Py_BEGIN_ALLOW_THREADS
+    run_median_jobs(jobs, num_buckets);
+    Py_END_ALLOW_THREADS
+
+    result = PyList_New(0);
+    if (result == NULL) {
+        goto finally;
+    }
+    for (Py_ssize_t bucket = 0; bucket < num_buckets; bucket++) {
+        if (bucket_counts[bucket] == 0) {
+            continue;
+        }
+        PyObject *item = Py_BuildValue("nnLd",
+            bucket + OTHER_TAG,
+            bucket_counts[bucket],
+            (long long)totals[bucket],
+            jobs[bucket].median);
+        if (item == NULL || PyList_Append(result, item) < 0) {
+            Py_XDECREF(item);
+            Py_CLEAR(result);
+            break;
+        }
+        Py_DECREF(item);
+    }
+
+finally:
+    PyMem_RawFree(durations);
+    PyMem_RawFree(bucket_counts);
+    PyMem_RawFree(offsets);
+    PyMem_RawFree(totals);
+    PyMem_RawFree(jobs);
+    return result;
 }
 
-/* Partially sort values so values[k] holds the k'th smallest value, with all
-   smaller values before it, using quickselect with Hoare partitioning. */
-static int64_t
-select_kth(int64_t *values, Py_ssize_t length, Py_ssize_t k)
+static PyObject *
+record_tag_stats(PyObject *module, PyObject *Py_UNUSED(ignored))
 {
-    Py_ssize_t low = 0;
-    Py_ssize_t high = length - 1;
-    while (low < high) {
-        int64_t pivot = values[low + (high - low) / 2];
-        Py_ssize_t i = low - 1;
-        Py_ssize_t j = high + 1;
-        for (;;) {
-            do {
-                i++;
-            } while (values[i] < pivot);
-            do {
-                j--;
-            } while (values[j] > pivot);
-            if (i >= j) {
-                break;
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
+
+    /* As in stats(), only read data from the generation at the start. */
+    uint64_t generation = state->generation;
+    Py_ssize_t num_targets = state->num_targets;
+
+    PyObject *result = PyList_New(num_targets);
+    if (result == NULL) {
+        return NULL;
+    }
+
+    for (Py_ssize_t i = 0; i < num_targets; i++) {
+        /* The GIL is released for each target. */
+        if (check_generation(state, generation) < 0) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        PyObject *item;
+        if (state->tag_var == NULL) {
+            item = Py_NewRef(Py_None);
+        }
+        else {
+            item = target_tag_stats(state, threads, generation, i);
+            if (item == NULL) {
+                Py_DECREF(result);
+                return NULL;
             }
-            int64_t swapped = values[i];
-            values[i] = values[j];
-            values[j] = swapped;
         }
-        if (k <= j) {
-            high = j;
+        PyList_SET_ITEM(result, i, item);
+    }
+
+    return result;
+}
+
+static PyObject *
+record_tags(PyObject *module, PyObject *Py_UNUSED(ignored))
+{
+    RecordModuleState *state = get_module_state(module);
+    PyObject *result;
+    Py_BEGIN_CRITICAL_SECTION(state->tag_indexes);
+    result = PyList_AsTuple(state->tag_values);
+    Py_END_CRITICAL_SECTION();
+    return result;
+}
+
+/* Returns the index of the first bucket whose upper bound is at least value,
+   or num_bounds for the overflow bucket. */
+static Py_ssize_t
+find_bucket(const int64_t *bounds, Py_ssize_t num_bounds, int64_t value)
+{
+    Py_ssize_t low = 0;
+    Py_ssize_t high = num_bounds;
+    while (low < high) {
+        Py_ssize_t middle = low + (high - low) / 2;
+        if (bounds[middle] < value) {
+            low = middle + 1;
         }
         else {
-            low = j + 1;
+            high = middle;
         }
     }
-    return values[k];
+    return low;
 }
 
 static PyObject *
-record_stats(PyObject *module, PyObject *Py_UNUSED(ignored))
+record_histogram(PyObject *module, PyObject *arg)
 {
+    if (!PyTuple_Check(arg)) {
+        PyErr_SetString(PyExc_TypeError, "histogram() argument must be a tuple");
+        return NULL;
+    }
+
     RecordModuleState *state = get_module_state(module);
 
-    /* Snapshot the list head; nodes are only prepended, and only freed when
-       the module is freed, so iterating without the lock is safe. */
+    Py_ssize_t num_bounds = PyTuple_GET_SIZE(arg);
+    int64_t *bounds = PyMem_RawMalloc((size_t)(num_bounds ? num_bounds : 1) * sizeof(int64_t));
+    if (bounds == NULL) {
+        return PyErr_NoMemory();
+    }
+    for (Py_ssize_t j = 0; j < num_bounds; j++) {
+        long long bound = PyLong_AsLongLong(PyTuple_GET_ITEM(arg, j));
+        if (bound == -1 && PyErr_Occurred()) {
+            PyMem_RawFree(bounds);
+            return NULL;
+        }
+        bounds[j] = (int64_t)bound;
+        if (j > 0 && bounds[j] <= bounds[j - 1]) {
+            PyMem_RawFree(bounds);
+            PyErr_SetString(
+                PyExc_ValueError, "histogram() bucket bounds must be strictly increasing");
+            return NULL;
+        }
+    }
+
     PyThread_acquire_lock(state->threads_lock, 1);
     ThreadData *threads = state->threads;
     PyThread_release_lock(state->threads_lock);
 
+    /* Different bounds need every duration refolding from the start. */
+    if (state->bucket_bounds == NULL || state->num_bounds != num_bounds ||
+        memcmp(state->bucket_bounds, bounds, (size_t)num_bounds * sizeof(int64_t)) != 0) {
+        histogram_reset(state);
+        Py_ssize_t num_targets = state->num_targets ? state->num_targets : 1;
+        state->bucket_counts =
+            PyMem_RawCalloc((size_t)(num_targets * (num_bounds + 1)), sizeof(int64_t));
+        state->bucket_totals = PyMem_RawCalloc((size_t)num_targets, sizeof(int64_t));
+        if (state->bucket_counts == NULL || state->bucket_totals == NULL) {
+            PyMem_RawFree(bounds);
+            histogram_reset(state);
+            return PyErr_NoMemory();
+        }
+        state->bucket_bounds = bounds;
+        state->num_bounds = num_bounds;
+        for (ThreadData *data = threads; data != NULL; data = data->next) {
+            if (data->generation == state->generation && data->num_targets > 0) {
+                memset(data->folded, 0, (size_t)data->num_targets * sizeof(Py_ssize_t));
+            }
+        }
+    }
+    else {
+        PyMem_RawFree(bounds);
+    }
+
     PyObject *result = PyList_New(state->num_targets);
     if (result == NULL) {
         return NULL;
     }
 
     for (Py_ssize_t i = 0; i < state->num_targets; i++) {
-        Py_ssize_t count = 0;
+        int64_t *counts = &state->bucket_counts[i * (num_bounds + 1)];
         for (ThreadData *data = threads; data != NULL; data = data->next) {
-            if (data->generation == state->generation) {
-                count += data->durations[i].len;
+            if (data->generation != state->generation) {
+                continue;
             }
+            I64Array *durations = &data->durations[i];
+            for (Py_ssize_t j = data->folded[i]; j < durations->len; j++) {
+                int64_t value = durations->items[j];
+                counts[find_bucket(state->bucket_bounds, num_bounds, value)]++;
+                state->bucket_totals[i] += value;
+            }
+            data->folded[i] = durations->len;
         }
 
-        /* Gather this target's durations from the per-thread buffers into
-           one scratch buffer, for the median's quickselect. */
-        int64_t *values = NULL;
-        if (count > 0) {
-            values = PyMem_RawMalloc((size_t)count * sizeof(int64_t));
-            if (values == NULL) {
+        /* Cumulative counts, as metrics formats expect, ending with the
+           total count for the overflow bucket. */
+        PyObject *cumulative = PyTuple_New(num_bounds + 1);
+        if (cumulative == NULL) {
+            Py_DECREF(result);
+            return NULL;
+        }
+        long long running = 0;
+        for (Py_ssize_t j = 0; j <= num_bounds; j++) {
+            running += counts[j];
+            PyObject *count = PyLong_FromLongLong(running);
+            if (count == NULL) {
+                Py_DECREF(cumulative);
                 Py_DECREF(result);
-                return PyErr_NoMemory();
-            }
-            Py_ssize_t position = 0;
-            for (ThreadData *data = threads; data != NULL; data = data->next) {
-                if (data->generation != state->generation) {
-                    continue;
-                }
-                I64Array *durations = &data->durations[i];
-                if (durations->len > 0) {
-                    memcpy(&values[position],
-                        durations->items,
-                        (size_t)durations->len * sizeof(int64_t));
-                    position += durations->len;
-                }
+                return NULL;
             }
+            PyTuple_SET_ITEM(cumulative, j, count);
         }
 
-        int64_t total = 0;
-        int64_t minimum = 0;
-        int64_t maximum = 0;
-        for (Py_ssize_t j = 0; j < count; j++) {
-            int64_t value = values[j];
-            if (j == 0 || value < minimum) {
-                minimum = value;
-            }
-            if (j == 0 || value > maximum) {
-                maximum = value;
-            }
-            total += value;
+        PyObject *item =
+            Py_BuildValue("LLN", running, (long long)state->bucket_totals[i], cumulative);
+        if (item == NULL) {
+            Py_DECREF(result);
+            return NULL;
         }
+        PyList_SET_ITEM(result, i, item);
+    }
 
-        /* Sample standard deviation, matching statistics.stdev(). */
-        double stdev = 0.0;
-        if (count > 1) {
-            double mean = (double)total / (double)count;
-            double squared_deviations = 0.0;
-            for (Py_ssize_t j = 0; j < count; j++) {
-                double deviation = (double)values[j] - mean;
-                squared_deviations += deviation * deviation;
-            }
-            stdev = sqrt(squared_deviations / (double)(count - 1));
-        }
+    return result;
+}
+
+/* Returns a dict of each counted code object to its call count, summed
+   across threads. */
+static PyObject *
+record_count_stats(PyObject *module, PyObject *Py_UNUSED(ignored))
+{
+    RecordModuleState *state = get_module_state(module);
+
+    PyThread_acquire_lock(state->threads_lock, 1);
+    ThreadData *threads = state->threads;
+    PyThread_release_lock(state->threads_lock);
 
-        /* Median, matching statistics.median(): for an even count, the
-           midpoint of the two middle values. Computed last since quickselect
-           reorders the scratch buffer. */
-        double median = 0.0;
-        if (count > 0) {
-            int64_t upper = select_kth(values, count, count / 2);
-            if (count % 2) {
-                median = (double)upper;
+    PyObject *result = PyDict_New();
+    if (result == NULL) {
+        return NULL;
+    }
+    for (ThreadData *data = threads; data != NULL; data = data->next) {
+        if (data->generation != state->generation) {
+            continue;
+        }
+        for (Py_ssize_t i = 0; i < data->counts.capacity; i++) {
+            CountEntry *entry = &data->counts.items[i];
+            if (entry->code == NULL) {
+                continue;
             }
-            else {
-                int64_t lower = values[0];
-                for (Py_ssize_t j = 1; j < count / 2; j++) {
-                    if (values[j] > lower) {
-                        lower = values[j];
-                    }
-                }
-                median = ((double)lower + (double)upper) / 2.0;
+            long long count = entry->count;
+            PyObject *previous = PyDict_GetItemWithError(result, entry->code);
+            if (previous != NULL) {
+                count += PyLong_AsLongLong(previous);
+            }
+            else if (PyErr_Occurred()) {
+                Py_DECREF(result);
+                return NULL;
+            }
+            PyObject *value = PyLong_FromLongLong(count);
+            if (value == NULL || PyDict_SetItem(result, entry->code, value) < 0) {
+                Py_XDECREF(value);
+                Py_DECREF(result);
+                return NULL;
             }
+            Py_DECREF(value);
         }
+    }
+    return result;
+}
 
-        PyMem_RawFree(values);
-
-        PyObject *item = Py_BuildValue("nLLLdd",
-            count,
-            (long long)total,
-            (long long)minimum,
-            (long long)maximum,
-            median,
-            stdev);
-        if (item == NULL) {
+static PyObject *
+record_clocks(PyObject *module, PyObject *Py_UNUSED(ignored))
+{
+    PyObject *result = PyList_New(0);
+    if (result == NULL) {
+        return NULL;
+    }
+    for (ClockKind clock = PERF_COUNTER_CLOCK; clock < NUM_CLOCKS; clock++) {
+        if (!clock_available(clock)) {
+            continue;
+        }
+        PyObject *name = PyUnicode_FromString(clock_names[clock]);
+        if (name == NULL || PyList_Append(result, name) < 0) {
+            Py_XDECREF(name);
             Py_DECREF(result);
             return NULL;
         }
-        PyList_SET_ITEM(result, i, item);
+        Py_DECREF(name);
     }
-
+    Py_SETREF(result, PyList_AsTuple(result));
     return result;
 }
 
 static PyMethodDef record_methods[] = {
-    {"configure", (PyCFunction)record_configure, METH_O, NULL},
-    {"stats", (PyCFunction)record_stats, METH_NOARGS, NULL},
+    {"configure", (PyCFunction)record_configure, METH_VARARGS, NULL},
+    {"clocks", (PyCFunction)record_clocks, METH_NOARGS, NULL},
+    {"mark", (PyCFunction)record_mark, METH_NOARGS, NULL},
+    {"stats", (PyCFunction)record_stats, METH_VARARGS, NULL},
+    {"outcome_stats", (PyCFunction)record_outcome_stats, METH_VARARGS, NULL},
+    {"warmup_stats", (PyCFunction)record_warmup_stats, METH_VARARGS, NULL},
+    {"trace", (PyCFunction)record_trace, METH_NOARGS, NULL},
+    {"histogram", (PyCFunction)record_histogram, METH_O, NULL},
+    {"size_stats", (PyCFunction)record_size_stats, METH_NOARGS, NULL},
+    {"memory_stats", (PyCFunction)record_memory_stats, METH_NOARGS, NULL},
+    {"gc_stats", (PyCFunction)record_gc_stats, METH_VARARGS, NULL},
+    {"tag_stats", (PyCFunction)record_tag_stats, METH_NOARGS, NULL},
+    {"tags", (PyCFunction)record_tags, METH_NOARGS, NULL},
+    {"count_stats", (PyCFunction)record_count_stats, METH_NOARGS, NULL},
     {"py_start_callback", (PyCFunction)py_start_callback, METH_FASTCALL, NULL},
     {"py_return_callback", (PyCFunction)py_return_callback, METH_FASTCALL, NULL},
     {"py_unwind_callback", (PyCFunction)py_unwind_callback, METH_FASTCALL, NULL},
+    {"call_callback", (PyCFunction)call_callback, METH_FASTCALL, NULL},
+    {"c_return_callback", (PyCFunction)c_return_callback, METH_FASTCALL, NULL},
+    {"c_raise_callback", (PyCFunction)c_raise_callback, METH_FASTCALL, NULL},
+    {"count_callback", (PyCFunction)count_callback, METH_FASTCALL, NULL},
+    {"gc_callback", (PyCFunction)gc_callback, METH_FASTCALL, NULL},
+    {"start_region", (PyCFunction)record_start_region, METH_O, NULL},
+    {"stop_region", (PyCFunction)record_stop_region, METH_O, NULL},
     {NULL, NULL, 0, NULL}};
 
 static int
@@ -514,15 +3214,29 @@ record_exec(PyObject *module)
 {
     RecordModuleState *state = get_module_state(module);
     state->codes = NULL;
+    state->size_args = NULL;
     state->num_targets = 0;
+    state->trace_limit = 0;
+    state->memory = false;
+    state->exclude_gc = false;
+    state->slow_ns = 0;
+    state->slow_callback = NULL;
+    state->tag_var = NULL;
+    state->tag_indexes = NULL;
+    state->tag_values = NULL;
+    state->count_scope = NULL;
     state->generation = 0;
     state->threads_lock = NULL;
     state->tss_created = 0;
     state->threads = NULL;
     state->monitoring_disable = NULL;
-#if PY_VERSION_HEX < 0x030D0000
-    state->perf_counter_ns = NULL;
-#endif
+    state->region_type = NULL;
+    state->regions = NULL;
+    state->bucket_bounds = NULL;
+    state->num_bounds = 0;
+    state->bucket_counts = NULL;
+    state->bucket_totals = NULL;
+    state->clock = PERF_COUNTER_CLOCK;
 
     state->threads_lock = PyThread_allocate_lock();
     if (state->threads_lock == NULL) {
@@ -551,16 +3265,34 @@ record_exec(PyObject *module)
         return -1;
     }
 
-#if PY_VERSION_HEX < 0x030D0000
-    PyObject *time_module = PyImport_ImportModule("time");
-    if (time_module == NULL) {
+    state->region_type = (PyTypeObject *)PyType_FromModuleAndSpec(module, &region_spec, NULL);
+    if (state->region_type == NULL) {
         return -1;
     }
-    state->perf_counter_ns = PyObject_GetAttrString(time_module, "perf_counter_ns");
-    Py_DECREF(time_module);
-    if (state->perf_counter_ns == NULL) {
+    if (PyModule_AddObjectRef(module, "Region", (PyObject *)state->region_type) < 0) {
         return -1;
     }
+    state->regions = PyDict_New();
+    if (state->regions == NULL) {
+        return -1;
+    }
+    state->tag_indexes = PyDict_New();
+    if (state->tag_indexes == NULL) {
+        return -1;
+    }
+    state->tag_values = PyList_New(0);
+    if (state->tag_values == NULL) {
+        return -1;
+    }
+    if (PyModule_AddIntConstant(module, "TAG_LIMIT", TAG_LIMIT) < 0) {
+        return -1;
+    }
+
+#if PY_VERSION_HEX >= 0x030D0000
+#elif defined(_WIN32)
+    QueryPerformanceFrequency(&perf_frequency);
+#elif defined(__APPLE__)
+    mach_timebase_info(&perf_timebase);
 #endif
 
     return 0;
@@ -572,11 +3304,18 @@ record_traverse(PyObject *module, visitproc visit, void *arg)
     RecordModuleState *state = get_module_state(module);
     for (Py_ssize_t i = 0; i < state->num_targets; i++) {
         Py_VISIT(state->codes[i]);
+        if (state->size_args != NULL) {
+            Py_VISIT(state->size_args[i]);
+        }
     }
+    Py_VISIT(state->slow_callback);
+    Py_VISIT(state->tag_var);
+    Py_VISIT(state->tag_indexes);
+    Py_VISIT(state->tag_values);
+    Py_VISIT(state->count_scope);
     Py_VISIT(state->monitoring_disable);
-#if PY_VERSION_HEX < 0x030D0000
-    Py_VISIT(state->perf_counter_ns);
-#endif
+    Py_VISIT(state->region_type);
+    Py_VISIT(state->regions);
     return 0;
 }
 
@@ -584,16 +3323,21 @@ static int
 record_clear(PyObject *module)
 {
     RecordModuleState *state = get_module_state(module);
+    size_args_free(state);
     for (Py_ssize_t i = 0; i < state->num_targets; i++) {
         Py_CLEAR(state->codes[i]);
     }
     PyMem_RawFree(state->codes);
     state->codes = NULL;
     state->num_targets = 0;
+    Py_CLEAR(state->slow_callback);
+    Py_CLEAR(state->tag_var);
+    Py_CLEAR(state->tag_indexes);
+    Py_CLEAR(state->tag_values);
+    Py_CLEAR(state->count_scope);
     Py_CLEAR(state->monitoring_disable);
-#if PY_VERSION_HEX < 0x030D0000
-    Py_CLEAR(state->perf_counter_ns);
-#endif
+    Py_CLEAR(state->region_type);
+    Py_CLEAR(state->regions);
     return 0;
 }
 
@@ -602,6 +3346,10 @@ record_free(void *module)
 {
     RecordModuleState *state = get_module_state((PyObject *)module);
     (void)record_clear((PyObject *)module);
+    if (state->memory) {
+        uninstall_allocator_hook();
+        state->memory = false;
+    }
 
     ThreadData *data = state->threads;
     while (data != NULL) {
@@ -611,6 +3359,7 @@ record_free(void *module)
         data = next;
     }
     state->threads = NULL;
+    histogram_reset(state);
 
     if (state->tss_created) {
         PyThread_tss_delete(&state->tss);
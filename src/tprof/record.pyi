@@ -1,8 +1,48 @@
+from collections.abc import Callable
+from contextvars import ContextVar
 from types import CodeType
-from typing import Any
+from typing import Any, final
 
-def configure(codes: tuple[CodeType, ...], /) -> None: ...
-def stats() -> list[tuple[int, int, int, int, float, float]]: ...
+TAG_LIMIT: int
+
+@final
+class Region:
+    @property
+    def name(self) -> str: ...
+    def __new__(cls, name: str, /) -> Region: ...
+    def __enter__(self) -> Region: ...
+    def __exit__(self, *exc_info: object) -> None: ...
+
+def configure(
+    codes: tuple[CodeType | Region | Callable[..., Any], ...],
+    trace_limit: int = 0,
+    size_args: tuple[str | None, ...] | None = None,
+    memory: bool = False,
+    slow_ns: int = 0,
+    slow_callback: Callable[[int, int], object] | None = None,
+    clock: str = "perf_counter",
+    tag_var: ContextVar[Any] | None = None,
+    count_scope: tuple[str, ...] | None = None,
+    exclude_gc: bool = False,
+    /,
+) -> None: ...
+def clocks() -> tuple[str, ...]: ...
+def mark() -> None: ...
+def stats(
+    since_mark: bool = False, /
+) -> list[tuple[int, int, int, int, float, float]]: ...
+def outcome_stats(since_mark: bool = False, /) -> list[tuple[int, float, float]]: ...
+def warmup_stats(
+    tolerance: float, skip: bool = False, /
+) -> list[tuple[int, float, float]]: ...
+def trace() -> list[tuple[int, int, bytes]]: ...
+def histogram(bounds: tuple[int, ...], /) -> list[tuple[int, int, tuple[int, ...]]]: ...
+def size_stats() -> list[list[tuple[int, int, float, float]] | None]: ...
+def tag_stats() -> list[list[tuple[int, int, int, float]] | None]: ...
+def tags() -> tuple[Any, ...]: ...
+def count_stats() -> dict[CodeType, int]: ...
+def memory_stats() -> list[tuple[int, float, int, float] | None]: ...
+def gc_stats(since_mark: bool = False, /) -> list[tuple[int, int, float]]: ...
 def py_start_callback(code: CodeType, instruction_offset: int, /) -> Any: ...
 def py_return_callback(
     code: CodeType, instruction_offset: int, retval: Any, /
@@ -10,3 +50,16 @@ def py_return_callback(
 def py_unwind_callback(
     code: CodeType, instruction_offset: int, exception: BaseException, /
 ) -> None: ...
+def call_callback(
+    code: CodeType, instruction_offset: int, callable: object, arg0: object, /
+) -> Any: ...
+def c_return_callback(
+    code: CodeType, instruction_offset: int, callable: object, arg0: object, /
+) -> None: ...
+def c_raise_callback(
+    code: CodeType, instruction_offset: int, callable: object, arg0: object, /
+) -> None: ...
+def count_callback(code: CodeType, instruction_offset: int, /) -> Any: ...
+def gc_callback(phase: str, info: dict[str, int], /) -> None: ...
+def start_region(name: str, /) -> Region: ...
+def stop_region(region: Region, /) -> None: ...
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import math
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+
+from tprof.api import FunctionStats, SizeBucket, TagStats, _read_json
+from tprof.sketch import merge_sketches, quantile
+
+
+def run_many(
+    options: Sequence[str], program: Sequence[str], runs: int, jobs: int = 1
+) -> list[list[FunctionStats]]:
+    """
+    Run tprof with the given options and program arguments in fresh
+    interpreters, up to jobs at once, returning each run's statistics in
+    order.
+
+    With several jobs, each child is pinned to its own CPU where the platform
+    supports it, so parallel runs don't compete for the same core.
+    """
+    cpus: queue.SimpleQueue[int | None] = queue.SimpleQueue()
+    available = (
+        sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    )
+    for job in range(jobs):
+        cpus.put(available[job % len(available)] if jobs > 1 and available else None)
+
+    def run(n: int) -> list[FunctionStats]:
+        cpu = cpus.get()
+        try:
+            return run_once(options, program, f"Run {n + 1}", cpu=cpu)
+        finally:
+            cpus.put(cpu)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(run, range(runs)))
+
+
+def run_once(
+    options: Sequence[str],
+    program: Sequence[str],
+    description: str,
+    cwd: str | None = None,
+    env: dict[str, str] | None = None,
+    cpu: int | None = None,
+) -> list[FunctionStats]:
+    """
+    Run tprof with the given options and program arguments in a fresh
+    interpreter, optionally pinned to a CPU, returning its statistics. Raise
+    RuntimeError, using the description, if the run fails.
+    """
+    with tempfile.TemporaryDirectory(prefix="tprof-") as directory:
+        results_path = os.path.join(directory, "run.json")
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "tprof",
+                *options,
+                "--format",
+                "none",
+                "--json",
+                results_path,
+                *program,
+            ],
+            cwd=cwd,
+            env=env,
+        )
+        if cpu is not None:
+            # Pinned once started, rather than with preexec_fn, which isn't
+            # safe to use from threads.
+            try:
+                os.sched_setaffinity(process.pid, {cpu})
+            except OSError:
+                pass
+        returncode = process.wait()
+        if returncode != 0:
+            raise RuntimeError(f"{description} failed with exit code {returncode}.")
+        _, results = _read_json(results_path)
+        return results
+
+
+def merge_runs(runs: list[list[FunctionStats]]) -> list[FunctionStats]:
+    """
+    Merge statistics for the same targets from several runs.
+
+    Counts and totals add up, and the standard deviation pools every run's
+    calls. Medians can't be combined exactly from per-run statistics, so when
+    every run has a sketch, the merged median is estimated from the merged
+    sketches. Otherwise, it and the other medians are the median of the runs'
+    medians, which also damps a run that was disturbed as a whole. Each run's
+    median is kept, for the between-run standard deviation.
+    """
+    by_name: dict[str, list[FunctionStats]] = {}
+    for results in runs:
+        for function_stats in results:
+            by_name.setdefault(function_stats.name, []).append(function_stats)
+    return [_merge_function(name, stats) for name, stats in by_name.items()]
+
+
+def _merge_function(name: str, stats: list[FunctionStats]) -> FunctionStats:
+    called = [function_stats for function_stats in stats if function_stats.calls]
+    calls = sum(function_stats.calls for function_stats in called)
+
+    # Pool the runs' variances with Chan et al.'s parallel update.
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    for function_stats in called:
+        n = function_stats.calls
+        run_mean = function_stats.total_ns / n
+        delta = run_mean - mean
+        mean += delta * n / (count + n)
+        m2 += function_stats.stdev_ns**2 * (n - 1) + delta**2 * count * n / (count + n)
+        count += n
+
+    errored = [function_stats for function_stats in called if function_stats.errors]
+    succeeded = [
+        function_stats
+        for function_stats in called
+        if function_stats.calls > function_stats.errors
+    ]
+    warmed = [
+        function_stats for function_stats in called if function_stats.warmup_calls
+    ]
+    sketch = (
+        merge_sketches(
+            function_stats.sketch
+            for function_stats in stats
+            if function_stats.sketch is not None
+        )
+        if all(function_stats.sketch is not None for function_stats in stats)
+        else None
+    )
+    min_ns = min((function_stats.min_ns for function_stats in called), default=0)
+    max_ns = max((function_stats.max_ns for function_stats in called), default=0)
+    measured = [
+        function_stats
+        for function_stats in called
+        if function_stats.total_bytes is not None
+    ]
+    return FunctionStats(
+        name,
+        calls,
+        sum(function_stats.total_ns for function_stats in called),
+        min_ns,
+        max_ns,
+        (
+            quantile(sketch, 0.5, min_ns, max_ns)
+            if sketch is not None
+            else _median_of(function_stats.median_ns for function_stats in called)
+        ),
+        math.sqrt(m2 / (calls - 1)) if calls > 1 else 0.0,
+        kind=stats[0].kind,
+        errors=sum(function_stats.errors for function_stats in called),
+        success_median_ns=_median_of(
+            function_stats.success_median_ns for function_stats in succeeded
+        ),
+        error_median_ns=_median_of(
+            function_stats.error_median_ns for function_stats in errored
+        ),
+        warmup_calls=sum(function_stats.warmup_calls for function_stats in warmed),
+        warmup_median_ns=_median_of(
+            function_stats.warmup_median_ns for function_stats in warmed
+        ),
+        steady_median_ns=_median_of(
+            function_stats.steady_median_ns for function_stats in warmed
+        ),
+        size_arg=stats[0].size_arg,
+        size_buckets=_merge_size_buckets(stats),
+        total_bytes=(
+            sum(function_stats.total_bytes or 0 for function_stats in measured)
+            if measured
+            else None
+        ),
+        median_bytes=(
+            _median_of(
+                function_stats.median_bytes or 0.0 for function_stats in measured
+            )
+            if measured
+            else None
+        ),
+        total_allocs=(
+            sum(function_stats.total_allocs or 0 for function_stats in measured)
+            if measured
+            else None
+        ),
+        median_allocs=(
+            _median_of(
+                function_stats.median_allocs or 0.0 for function_stats in measured
+            )
+            if measured
+            else None
+        ),
+        run_medians=[function_stats.median_ns for function_stats in called],
+        sketch=sketch,
+        collections=sum(function_stats.collections for function_stats in called),
+        gc_total_ns=sum(function_stats.gc_total_ns for function_stats in called),
+        gc_inclusive_median_ns=_median_of(
+            function_stats.gc_inclusive_median_ns for function_stats in called
+        ),
+        gc_exclusive_median_ns=_median_of(
+            function_stats.gc_exclusive_median_ns for function_stats in called
+        ),
+        tags=_merge_tags(stats),
+    )
+
+
+def _merge_size_buckets(stats: list[FunctionStats]) -> list[SizeBucket] | None:
+    if all(function_stats.size_buckets is None for function_stats in stats):
+        return None
+    by_bits: dict[int, list[SizeBucket]] = {}
+    for function_stats in stats:
+        for bucket in function_stats.size_buckets or ():
+            by_bits.setdefault(bucket.bits, []).append(bucket)
+    return [
+        SizeBucket(
+            bits,
+            sum(bucket.calls for bucket in buckets),
+            median(bucket.median_size for bucket in buckets),
+            median(bucket.median_ns for bucket in buckets),
+        )
+        for bits, buckets in sorted(by_bits.items())
+    ]
+
+
+def _merge_tags(stats: list[FunctionStats]) -> list[TagStats] | None:
+    if all(function_stats.tags is None for function_stats in stats):
+        return None
+    by_tag: dict[str, list[TagStats]] = {}
+    for function_stats in stats:
+        for tag_stats in function_stats.tags or ():
+            by_tag.setdefault(tag_stats.tag, []).append(tag_stats)
+    merged = [
+        TagStats(
+            tag,
+            sum(tag_stats.calls for tag_stats in tags),
+            sum(tag_stats.total_ns for tag_stats in tags),
+            median(tag_stats.median_ns for tag_stats in tags),
+        )
+        for tag, tags in by_tag.items()
+    ]
+    merged.sort(key=lambda tag_stats: tag_stats.total_ns, reverse=True)
+    return merged
+
+
+def _median_of(values: Iterable[float]) -> float:
+    """The median of the values, or 0.0 if there are none."""
+    listed = list(values)
+    return median(listed) if listed else 0.0
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import math
+from collections.abc import Iterable
+
+from tprof import record
+from tprof.api import FunctionStats
+
+# Quantiles estimated from sketches are within this fraction of a true
+# duration. Buckets are logarithmic, each GAMMA times wider than the last.
+RELATIVE_ERROR = 0.01
+GAMMA = (1 + RELATIVE_ERROR) / (1 - RELATIVE_ERROR)
+
+
+def add_sketches(results: list[FunctionStats]) -> None:
+    """
+    Set the sketch of every recorded duration for each of the current
+    targets' statistics.
+
+    A sketch maps bucket indexes to call counts, where bucket i holds
+    durations in (GAMMA ** (i - 1), GAMMA ** i] nanoseconds. Sketches from
+    separate runs merge exactly by adding counts, unlike medians.
+    """
+    called = [function_stats for function_stats in results if function_stats.calls]
+    if not called:
+        for function_stats in results:
+            function_stats.sketch = {}
+        return
+    # One more bucket than needed at each end, in case of rounding in
+    # _index().
+    low = max(_index(min(function_stats.min_ns for function_stats in called)) - 1, 0)
+    high = _index(max(function_stats.max_ns for function_stats in called)) + 1
+    # Small indexes round up to the same whole nanosecond, and only the
+    # first of those can hold any durations.
+    indexes: list[int] = []
+    bounds: list[int] = []
+    for i in range(low, high + 1):
+        bound = math.ceil(GAMMA**i)
+        if not bounds or bound > bounds[-1]:
+            indexes.append(i)
+            bounds.append(bound)
+    # The overflow bucket is past the last bound, so always empty.
+    indexes.append(high + 1)
+
+    for function_stats, (_, _, cumulative) in zip(
+        results, record.histogram(tuple(bounds)), strict=True
+    ):
+        sketch = {}
+        previous = 0
+        for i, running in zip(indexes, cumulative, strict=True):
+            if running > previous:
+                sketch[i] = running - previous
+            previous = running
+        function_stats.sketch = sketch
+
+
+def merge_sketches(sketches: Iterable[dict[int, int]]) -> dict[int, int]:
+    merged: dict[int, int] = {}
+    for sketch in sketches:
+        for i, count in sketch.items():
+            merged[i] = merged.get(i, 0) + count
+    return dict(sorted(merged.items()))
+
+
+def quantile(sketch: dict[int, int], q: float, min_ns: int, max_ns: int) -> float:
+    """
+    Estimate the q-quantile of the durations in a sketch, within
+    RELATIVE_ERROR, and clamped to the known minimum and maximum.
+    """
+    total = sum(sketch.values())
+    if not total:
+        return 0.0
+    rank = q * (total - 1)
+    running = 0
+    for i, count in sorted(sketch.items()):
+        running += count
+        if running > rank:
+            # The value with the same relative error to both ends of the
+            # bucket.
+            estimate = 2 * GAMMA**i / (GAMMA + 1)
+            return min(max(estimate, float(min_ns)), float(max_ns))
+    raise AssertionError("rank beyond the sketch's total")
+
+
+def _index(ns: int) -> int:
+    """The index of the bucket holding a duration."""
+    if ns <= 1:
+        return 0
+    return math.ceil(math.log(ns, GAMMA))
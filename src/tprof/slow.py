@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import reprlib
+import sys
+import threading
+import time
+import traceback
+from datetime import UTC, datetime
+from types import CodeType, FrameType
+from typing import Any
+
+from tprof.api import CO_VARARGS, CO_VARKEYWORDS, _format_time, _print
+from tprof.record import Region
+
+# Number of slowest calls kept per thread, and reported.
+SLOW_LIMIT = 10
+
+# Maximum number of frames kept per slow call's stack, and the number of
+# innermost frames shown in the report.
+STACK_LIMIT = 20
+REPORT_STACK_LIMIT = 4
+
+# Limits for argument reprs, so capturing a huge argument stays cheap.
+ARG_REPR = reprlib.Repr(maxlevel=2, maxstring=60, maxother=60, maxlong=40)
+
+
+class SlowCall:
+    __slots__ = (
+        "name",
+        "kind",
+        "duration_ns",
+        "started_at",
+        "thread_id",
+        "thread_name",
+        "stack",
+        "final_args",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        duration_ns: int,
+        started_at: float,
+        thread_id: int,
+        thread_name: str,
+        stack: list[str],
+        final_args: dict[str, str] | None,
+    ) -> None:
+        self.name = name
+        self.kind = kind
+        self.duration_ns = duration_ns
+        self.started_at = started_at
+        self.thread_id = thread_id
+        self.thread_name = thread_name
+        self.stack = stack
+        self.final_args = final_args
+
+
+class SlowRecorder:
+    """
+    Capture details of target calls taking at least the slow threshold,
+    keeping the slowest SLOW_LIMIT per thread.
+
+    capture() is called from record_end() in C, while the target’s frame,
+    or the calling frame for callables and regions, is still live.
+    """
+
+    def __init__(self, targets: tuple[Any, ...], names: tuple[str, ...]) -> None:
+        self.targets = targets
+        self.names = names
+        # Per native thread ID, a min-heap of (duration, sequence, call), so
+        # each thread only touches its own list.
+        self.heaps: dict[int, list[tuple[int, int, SlowCall]]] = {}
+        self.sequence = itertools.count()
+
+    def capture(self, index: int, duration_ns: int) -> None:
+        thread_id = threading.get_native_id()
+        heap = self.heaps.setdefault(thread_id, [])
+        if len(heap) >= SLOW_LIMIT and duration_ns <= heap[0][0]:
+            return
+
+        frame = sys._getframe(1)
+        target = self.targets[index]
+        slow_call = SlowCall(
+            self.names[index],
+            "region" if isinstance(target, Region) else "function",
+            duration_ns,
+            time.time() - duration_ns / 1e9,
+            thread_id,
+            threading.current_thread().name,
+            _format_stack(frame),
+            _final_args(frame) if isinstance(target, CodeType) else None,
+        )
+        entry = (duration_ns, next(self.sequence), slow_call)
+        if len(heap) >= SLOW_LIMIT:
+            heapq.heappushpop(heap, entry)
+        else:
+            heapq.heappush(heap, entry)
+
+    def results(self) -> list[SlowCall]:
+        """The slowest calls across all threads, slowest first."""
+        entries = heapq.nlargest(
+            SLOW_LIMIT, itertools.chain.from_iterable(self.heaps.values())
+        )
+        return [slow_call for _, _, slow_call in entries]
+
+
+def _format_stack(frame: FrameType) -> list[str]:
+    summary = traceback.StackSummary.extract(
+        traceback.walk_stack(frame), limit=STACK_LIMIT, lookup_lines=False
+    )
+    return [
+        f"{frame_summary.filename}:{frame_summary.lineno} in {frame_summary.name}"
+        for frame_summary in reversed(summary)
+    ]
+
+
+def _final_args(frame: FrameType) -> dict[str, str]:
+    """
+    Repr the arguments of a target’s frame, as bound when the call ended,
+    rather than as passed, so reassigned arguments show their final values.
+    """
+    code = frame.f_code
+    num_arguments = (
+        code.co_argcount
+        + code.co_kwonlyargcount
+        + bool(code.co_flags & CO_VARARGS)
+        + bool(code.co_flags & CO_VARKEYWORDS)
+    )
+    frame_locals = frame.f_locals
+    return {
+        name: ARG_REPR.repr(frame_locals[name])
+        for name in code.co_varnames[:num_arguments]
+        if name in frame_locals
+    }
+
+
+def slow_call_json(slow_call: SlowCall) -> dict[str, Any]:
+    return {
+        "name": slow_call.name,
+        "kind": slow_call.kind,
+        "duration_ns": slow_call.duration_ns,
+        "started_at": _format_started_at(slow_call.started_at),
+        "thread_id": slow_call.thread_id,
+        "thread_name": slow_call.thread_name,
+        "stack": slow_call.stack,
+        "final_args": slow_call.final_args,
+    }
+
+
+def _format_started_at(started_at: float) -> str:
+    return datetime.fromtimestamp(started_at, UTC).isoformat(timespec="microseconds")
+
+
+def display_slow_calls(
+    slow_calls: list[SlowCall], threshold_ns: int, plain: bool = False
+) -> None:
+    _print(
+        "[bold red]🎯 tprof[/bold red] slowest calls over "
+        f"{_format_time(threshold_ns, None)}:",
+        plain,
+    )
+    if not slow_calls:
+        _print("[dim]No slow calls.[/dim]", plain)
+        return
+
+    for slow_call in slow_calls:
+        if slow_call.kind == "region":
+            name = slow_call.name
+        else:
+            name = f"{slow_call.name}()"
+        _print(
+            f" [bold]{_escape(name, plain)}[/bold] "
+            f"{_format_time(slow_call.duration_ns, 'magenta')} "
+            f"at {_format_started_at(slow_call.started_at)} "
+            f"in thread {_escape(slow_call.thread_name, plain)}",
+            plain,
+            highlight=False,
+        )
+        if slow_call.final_args:
+            arguments = ", ".join(
+                f"{name}={value}" for name, value in slow_call.final_args.items()
+            )
+            _print(
+                f"   [dim]final args:[/dim] {_escape(arguments, plain)}",
+                plain,
+                highlight=False,
+            )
+        if len(slow_call.stack) > REPORT_STACK_LIMIT:
+            _print("   [dim]…[/dim]", plain)
+        for line in slow_call.stack[-REPORT_STACK_LIMIT:]:
+            _print(f"   [dim]{_escape(line, plain)}[/dim]", plain, highlight=False)
+
+
+def _escape(text: str, plain: bool) -> str:
+    """Escape text for Rich markup, unless printing plain text."""
+    if plain:
+        return text
+    from rich.markup import escape
+
+    return escape(text)
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import platform
+import socket
+import sqlite3
+import subprocess
+from datetime import UTC, datetime
+from operator import itemgetter
+from statistics import fmean, median
+
+from tprof.api import FunctionStats, _format_delta, _format_time, _print, _print_table
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """\
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    label TEXT,
+    git_sha TEXT,
+    python_version TEXT NOT NULL,
+    hostname TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS functions (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    total_ns INTEGER NOT NULL,
+    min_ns INTEGER NOT NULL,
+    max_ns INTEGER NOT NULL,
+    median_ns REAL NOT NULL,
+    stdev_ns REAL NOT NULL
+);
+-- History queries look up one name's most recent runs.
+CREATE INDEX IF NOT EXISTS functions_name_run_id ON functions (name, run_id);
+"""
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+class HistoryEntry:
+    __slots__ = (
+        "run_id",
+        "created_at",
+        "label",
+        "git_sha",
+        "python_version",
+        "hostname",
+        "calls",
+        "median_ns",
+    )
+
+    def __init__(
+        self,
+        run_id: int,
+        created_at: str,
+        label: str | None,
+        git_sha: str | None,
+        python_version: str,
+        hostname: str,
+        calls: int,
+        median_ns: float,
+    ) -> None:
+        self.run_id = run_id
+        self.created_at = created_at
+        self.label = label
+        self.git_sha = git_sha
+        self.python_version = python_version
+        self.hostname = hostname
+        self.calls = calls
+        self.median_ns = median_ns
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    try:
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version == 0:
+            with connection:
+                connection.executescript(SCHEMA)
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        elif version != SCHEMA_VERSION:
+            raise ValueError(
+                f"Cannot use store {path!r}: unsupported schema version {version}."
+            )
+    except (sqlite3.Error, ValueError):
+        connection.close()
+        raise
+    return connection
+
+
+def _git_sha() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def save_run(path: str, label: str | None, results: list[FunctionStats]) -> int:
+    """
+    Append a run's statistics to the store, returning the new run's ID.
+    """
+    connection = _connect(path)
+    try:
+        with connection:
+            cursor = connection.execute(
+                """
+                INSERT INTO runs (created_at, label, git_sha, python_version, hostname)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    datetime.now(UTC).isoformat(timespec="seconds"),
+                    label,
+                    _git_sha(),
+                    platform.python_version(),
+                    socket.gethostname(),
+                ),
+            )
+            run_id = cursor.lastrowid
+            assert run_id is not None
+            connection.executemany(
+                """
+                INSERT INTO functions (
+                    run_id, name, kind, calls, total_ns, min_ns, max_ns,
+                    median_ns, stdev_ns
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        run_id,
+                        function_stats.name,
+                        function_stats.kind,
+                        function_stats.calls,
+                        function_stats.total_ns,
+                        function_stats.min_ns,
+                        function_stats.max_ns,
+                        function_stats.median_ns,
+                        function_stats.stdev_ns,
+                    )
+                    for function_stats in results
+                ],
+            )
+    finally:
+        connection.close()
+    return run_id
+
+
+def load_history(path: str, name: str, limit: int) -> list[HistoryEntry]:
+    """
+    Load the most recent runs that called the named target, oldest first.
+    """
+    connection = _connect(path)
+    try:
+        rows = connection.execute(
+            """
+            SELECT
+                runs.id, runs.created_at, runs.label, runs.git_sha,
+                runs.python_version, runs.hostname,
+                functions.calls, functions.median_ns
+            FROM functions
+            JOIN runs ON runs.id = functions.run_id
+            WHERE functions.name = ? AND functions.calls > 0
+            ORDER BY functions.run_id DESC
+            LIMIT ?
+            """,
+            (name, limit),
+        ).fetchall()
+    finally:
+        connection.close()
+    return [HistoryEntry(*row) for row in reversed(rows)]
+
+
+def find_changepoints(
+    values: list[float], window: int = 5, threshold: float = 10.0
+) -> set[int]:
+    """
+    Find indexes where values step to a new level.
+
+    At each index, compare equal, odd-sized windows of at least three and up
+    to `window` values before and from it. Medians differing by more than
+    `threshold` percent flag a step, ignoring one-off outliers. Since a run
+    of neighbouring indexes then get flagged, pick the one where the means
+    differ most, which is where the step happens.
+    """
+    candidates: list[tuple[int, float]] = []
+    for i in range(3, len(values) - 2):
+        size = min(window, i, len(values) - i)
+        if size % 2 == 0:
+            size -= 1
+        before = values[i - size : i]
+        after = values[i : i + size]
+        before_median = median(before)
+        if not before_median:
+            continue
+        if abs(median(after) - before_median) / before_median * 100 > threshold:
+            candidates.append((i, abs(fmean(after) - fmean(before))))
+
+    changepoints = set()
+    group: list[tuple[int, float]] = []
+    for candidate in candidates:
+        if group and candidate[0] != group[-1][0] + 1:
+            changepoints.add(max(group, key=itemgetter(1))[0])
+            group = []
+        group.append(candidate)
+    if group:
+        changepoints.add(max(group, key=itemgetter(1))[0])
+    return changepoints
+
+
+def _sparkline(values: list[float]) -> str:
+    low = min(values)
+    high = max(values)
+    if high == low:
+        return SPARK_CHARS[0] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[round((value - low) * scale)] for value in values)
+
+
+def display_history(name: str, entries: list[HistoryEntry]) -> None:
+    _print(f"[bold red]🎯 tprof[/bold red] history for [bold]{name}[/bold]:")
+    if not entries:
+        _print("[dim]No runs found.[/dim]")
+        return
+
+    medians = [entry.median_ns for entry in entries]
+    _print(_sparkline(medians), highlight=False)
+    changepoints = find_changepoints(medians)
+
+    rows: list[tuple[str, ...]] = []
+    previous: HistoryEntry | None = None
+    for i, entry in enumerate(entries):
+        rows.append(
+            (
+                str(entry.run_id),
+                entry.created_at.replace("T", " ").removesuffix("+00:00"),
+                entry.label or "",
+                (entry.git_sha or "")[:8],
+                entry.python_version,
+                entry.hostname,
+                str(entry.calls),
+                _format_time(int(entry.median_ns), "bright_green"),
+                (
+                    _format_delta(entry.median_ns, previous.median_ns)
+                    if previous is not None and previous.median_ns
+                    else "[dim]-[/dim]"
+                ),
+                "[bold yellow]◆ changepoint[/bold yellow]" if i in changepoints else "",
+            )
+        )
+        previous = entry
+    _print_table(
+        [
+            ("run", "right", None),
+            ("date", "left", None),
+            ("label", "left", None),
+            ("git", "left", None),
+            ("python", "left", None),
+            ("host", "left", None),
+            ("calls", "right", None),
+            ("median", "right", "bright_green"),
+            ("delta", "left", None),
+            ("", "left", None),
+        ],
+        rows,
+    )
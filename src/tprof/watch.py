@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import json
+import os
+import shutil
+import site
+import sys
+import sysconfig
+import tempfile
+import time
+import traceback
+from collections.abc import Callable, Iterable
+from typing import NoReturn
+
+# Seconds between checks of the watched files' modification times.
+WATCH_INTERVAL = 0.2
+
+
+def watch(
+    run: Callable[[str, str | None], None],
+    baseline_path: str | None = None,
+    json_path: str | None = None,
+    script: str | None = None,
+    module: str | None = None,
+) -> int:
+    """
+    Profile the program in a forked child with run(results_path,
+    baseline_path), then again each time one of its source files changes,
+    comparing each run against the previous one, until interrupted.
+
+    This process acts as a fork server. After each run, it imports the
+    modules the program imported from the standard library and installed
+    packages, so later runs start with them already loaded. All other source
+    files, wherever they are, are watched instead, and left for each child to
+    import afresh.
+    """
+    watched: set[str] = set()
+    with tempfile.TemporaryDirectory(prefix="tprof-") as directory:
+        n = 0
+        try:
+            while True:
+                n += 1
+                results_path = os.path.join(directory, f"run-{n}.json")
+                started_ns = time.time_ns()
+                returncode, modules, files = _fork_run(
+                    run, results_path, baseline_path, script, module
+                )
+                if returncode == 0:
+                    baseline_path = results_path
+                    if json_path is not None:
+                        _copy_json(results_path, json_path)
+                else:
+                    print(
+                        f"tprof: Run {n} failed with exit code {returncode}.",
+                        file=sys.stderr,
+                    )
+                preimport(modules)
+                watched = {path for path in watched | files if os.path.exists(path)}
+                if not watched:
+                    print(
+                        "tprof: No source files to watch, as the program only "
+                        "imported installed modules.",
+                        file=sys.stderr,
+                    )
+                    return 1
+                print(
+                    f"tprof: Watching {len(watched)} files for changes, press "
+                    "Ctrl-C to stop.",
+                    file=sys.stderr,
+                )
+                wait_for_change(watched, started_ns)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def _fork_run(
+    run: Callable[[str, str | None], None],
+    results_path: str,
+    baseline_path: str | None,
+    script: str | None,
+    module: str | None,
+) -> tuple[int, list[str], set[str]]:
+    """
+    Run the program in a forked child, returning its exit code, the
+    dependency modules it imported, and its source files to watch.
+    """
+    read_fd, write_fd = os.pipe()
+    # Unflushed output would be written again by the child.
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        os.close(read_fd)
+        _child(run, results_path, baseline_path, script, module, write_fd)
+    os.close(write_fd)
+    try:
+        with open(read_fd, "rb") as pipe:
+            report = pipe.read()
+        _, status = os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        # The child is interrupted too.
+        os.waitpid(pid, 0)
+        raise
+
+    modules: list[str] = []
+    files: set[str] = set()
+    # The child reports nothing if it died before finishing.
+    for name, filename in json.loads(report) if report else ():
+        if _is_dependency(filename):
+            modules.append(name)
+        else:
+            files.add(filename)
+    return os.waitstatus_to_exitcode(status), modules, files
+
+
+def _child(  # pragma: no cover
+    run: Callable[[str, str | None], None],
+    results_path: str,
+    baseline_path: str | None,
+    script: str | None,
+    module: str | None,
+    write_fd: int,
+) -> NoReturn:
+    """
+    Run the program, report the files of the modules it imported to the
+    server through write_fd, then exit without returning to the server's code.
+    """
+    # Modules the server had loaded, such as tprof itself, aren't the
+    # program's.
+    loaded = set(sys.modules)
+    returncode = 0
+    try:
+        run(results_path, baseline_path)
+    except SystemExit as exc:
+        if isinstance(exc.code, int):
+            returncode = exc.code
+        elif exc.code is not None:
+            print(exc.code, file=sys.stderr)
+            returncode = 1
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+
+    imported = []
+    for name, imported_module in list(sys.modules.items()):
+        filename = getattr(imported_module, "__file__", None)
+        if (
+            name not in loaded
+            and isinstance(filename, str)
+            and "__main__" not in name.split(".")
+        ):
+            imported.append((name, os.path.abspath(filename)))
+    program = _program_file(script, module)
+    if program is not None:
+        imported.append(("__main__", program))
+    with open(write_fd, "w") as pipe:
+        json.dump(imported, pipe)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(returncode)
+
+
+def _program_file(script: str | None, module: str | None) -> str | None:
+    """The absolute path of the script, or the module run with -m."""
+    if script is not None:
+        return os.path.abspath(script)
+    assert module is not None
+    try:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None or not spec.has_location:
+        return None
+    return os.path.abspath(spec.origin)
+
+
+def preimport(modules: Iterable[str]) -> None:
+    """
+    Import the given modules into this process, ignoring any that fail.
+    Project modules imported along the way are removed from sys.modules, so
+    children still import their latest source.
+    """
+    before = set(sys.modules)
+    for name in modules:
+        if name in sys.modules or "__main__" in name.split("."):
+            continue
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+    for name in set(sys.modules) - before:
+        filename = getattr(sys.modules[name], "__file__", None)
+        if isinstance(filename, str) and not _is_dependency(os.path.abspath(filename)):
+            del sys.modules[name]
+
+
+def wait_for_change(paths: Iterable[str], since_ns: int) -> None:
+    """
+    Return once any of the files has been modified since the given time, in
+    nanoseconds since the epoch, or removed.
+    """
+    while True:
+        for path in paths:
+            try:
+                if os.stat(path).st_mtime_ns >= since_ns:
+                    return
+            except OSError:
+                return
+        time.sleep(WATCH_INTERVAL)
+
+
+def _is_dependency(filename: str) -> bool:
+    """
+    Whether a module's file is installed, in the standard library or a
+    site-packages directory. Anything else, such as a package in the
+    repository being worked on, is project source, even outside the current
+    directory.
+    """
+    return filename.startswith(_installed_paths())
+
+
+def _installed_paths() -> tuple[str, ...]:
+    paths = {
+        sysconfig.get_path(name)
+        for name in ("stdlib", "platstdlib", "purelib", "platlib")
+    }
+    paths.update(site.getsitepackages())
+    if site.ENABLE_USER_SITE:
+        paths.add(site.getusersitepackages())
+    return tuple(os.path.join(os.path.abspath(path), "") for path in paths)
+
+
+def _copy_json(results_path: str, json_path: str) -> None:
+    if json_path == "-":
+        with open(results_path) as fp:
+            sys.stdout.write(fp.read())
+        sys.stdout.flush()
+    else:
+        shutil.copyfile(results_path, json_path)
@@ -1,10 +1,15 @@
 from __future__ import annotations
 
 import os
+from contextvars import ContextVar
 from unittest import mock
 
 import pytest
 
+from tprof import api
+
+pytest_plugins = ["pytester"]
+
 
 @pytest.fixture(autouse=True)
 def set_columns():
@@ -13,3 +18,13 @@ def set_columns():
     """
     with mock.patch.dict(os.environ, {"COLUMNS": "120"}):
         yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_tag_var():
+    """
+    Replace the variable set by tprof.set_tag(), so tags don't leak between
+    tests through the shared context.
+    """
+    with mock.patch.object(api, "default_tag_var", ContextVar("tprof_tag")):
+        yield
@@ -1,14 +1,32 @@
 from __future__ import annotations
 
+import gc
 import json
+import math
+import re
+import statistics
+import struct
+import subprocess
+import sys
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
-from typing import NoReturn
+from contextvars import ContextVar
+from typing import Any, NoReturn
+from unittest import mock
 
 import pytest
 
-from tprof import tprof
-from tprof.api import _extract_code, _format_time
+from tprof import api as tprof_api
+from tprof import record, region, set_tag, start_region, stop_region, tprof
+from tprof.api import (
+    FunctionStats,
+    SizeBucket,
+    _extract_code,
+    _format_bytes,
+    _format_count,
+    _format_time,
+)
 
 
 class TestTprof:
@@ -30,6 +48,21 @@ class TestTprof:
 
         assert str(excinfo.value) == "compare and baseline_path may not be combined."
 
+    def test_clock_unavailable(self):
+        def sample() -> int:
+            return 42  # pragma: no cover
+
+        with (
+            mock.patch.object(record, "clocks", return_value=("perf_counter",)),
+            pytest.raises(ValueError) as excinfo,
+            tprof(sample, clock="tsc"),
+        ):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == (
+            "Clock 'tsc' is not available, expected one of: perf_counter."
+        )
+
     def test_target_not_callable(self):
         thing = 1
 
@@ -115,6 +148,291 @@ class TestTprof:
         assert out == ""
         assert err == ""
 
+    def test_raises_outcomes(self, capsys):
+        def sample(fail: bool) -> None:
+            if fail:
+                raise RuntimeError("Failure")
+            time.sleep(0.001)
+
+        with tprof(sample) as results:
+            for i in range(10):
+                try:
+                    sample(i < 3)
+                except RuntimeError:
+                    pass
+
+        (function_stats,) = results
+        assert function_stats.calls == 10
+        assert function_stats.errors == 3
+        assert function_stats.error_rate == 0.3
+        assert function_stats.success_median_ns >= 1_000_000
+        assert function_stats.error_median_ns < function_stats.success_median_ns
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[1].rstrip().endswith(" error")
+        assert "30.0%" in errlines[2]
+
+    def test_raises_none(self, capsys):
+        def sample() -> int:
+            return 42
+
+        with tprof(sample) as results:
+            sample()
+
+        (function_stats,) = results
+        assert function_stats.errors == 0
+        assert function_stats.error_rate == 0.0
+        assert function_stats.success_median_ns == function_stats.median_ns
+        assert function_stats.error_median_ns == 0.0
+        assert " errors" not in capsys.readouterr().err.splitlines()[1]
+
+    def test_raises_json_and_baseline(self, capsys, tmp_path):
+        def sample(fail: bool) -> None:
+            if fail:
+                raise RuntimeError("Failure")
+
+        def main() -> None:
+            for fail in (False, True):
+                try:
+                    sample(fail)
+                except RuntimeError:
+                    pass
+
+        path = tmp_path / "tprof.json"
+
+        with tprof(sample, json_path=str(path)):
+            main()
+
+        data = json.loads(path.read_text())
+        (function_data,) = data["functions"]
+        assert function_data["errors"] == 1
+        assert function_data["success_median_ns"] > 0
+        assert function_data["error_median_ns"] > 0
+        _, (function_stats,) = tprof_api._read_json(str(path))
+        assert function_stats.errors == 1
+        assert function_stats.error_median_ns == function_data["error_median_ns"]
+        capsys.readouterr()
+
+        with tprof(sample, baseline_path=str(path)):
+            main()
+
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[1].rstrip().endswith(" error delta")
+        assert errlines[2].rstrip().endswith("%")
+
+    def test_format_plain(self, capsys):
+        def sample() -> None:
+            pass
+
+        with tprof(sample, report_format="plain", label="run [1]"):
+            sample()
+
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof results @ run [1]:"
+        assert errlines[1].split() == [
+            *("function", "calls", "total", "median"),
+            *("±", "σ", "min", "…", "max"),
+        ]
+        assert errlines[2].startswith(f" {__name__}:TestTprof.test_format_plain.")
+        assert "[" not in errlines[2]
+        assert errlines[2].split()[1] == "1"
+
+    def test_format_plain_size_buckets(self, capsys):
+        def scan(items: list[int]) -> int:
+            return sum(items)
+
+        with tprof(scan, size_args={scan: "items"}, report_format="plain"):
+            scan([1, 2])
+
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[3].endswith("scan() by len(items):")
+        assert errlines[4].split() == ["size", "calls", "median"]
+        assert errlines[5].split()[:2] == ["2…3", "1"]
+        assert errlines[6] == "Too few sizes to fit an exponent."
+
+    @pytest.mark.parametrize(
+        ("report_format", "delimiter"), [("csv", ","), ("tsv", "\t")]
+    )
+    def test_format_delimited(self, report_format, delimiter, capsys):
+        def sample() -> None:
+            pass
+
+        def other() -> None:
+            pass
+
+        with tprof(sample, other, compare=True, report_format=report_format):
+            sample()
+            other()
+            other()
+
+        header, first, second = (
+            line.split(delimiter) for line in capsys.readouterr().err.splitlines()
+        )
+        assert header == list(tprof_api.DELIMITED_COLUMNS)
+        first_row = dict(zip(header, first, strict=True))
+        second_row = dict(zip(header, second, strict=True))
+        assert first_row["label"] == ""
+        assert first_row["name"].endswith(".sample")
+        assert first_row["kind"] == "function"
+        assert first_row["calls"] == "1"
+        assert first_row["delta_percent"] == ""
+        assert first_row["total_bytes"] == ""
+        assert second_row["calls"] == "2"
+        assert float(second_row["delta_percent"]) > -100
+        assert int(second_row["total_ns"]) > 0
+
+    def test_format_delimited_baseline(self, capsys, tmp_path):
+        def sample() -> None:
+            pass
+
+        baseline_path = tmp_path / "baseline.json"
+        baseline_path.write_text(
+            json.dumps(
+                {
+                    "version": 1,
+                    "functions": [
+                        {
+                            "name": f"{__name__}:TestTprof."
+                            "test_format_delimited_baseline.<locals>.sample",
+                            "median_ns": 1e9,
+                        }
+                    ],
+                }
+            )
+        )
+
+        with tprof(
+            sample, baseline_path=str(baseline_path), memory=True, report_format="csv"
+        ):
+            sample()
+
+        header, row = (line.split(",") for line in capsys.readouterr().err.splitlines())
+        values = dict(zip(header, row, strict=True))
+        assert float(values["delta_percent"]) < -99
+        assert values["total_bytes"] != ""
+
+    def test_format_invalid(self):
+        def sample() -> int:
+            return 42  # pragma: no cover
+
+        with pytest.raises(ValueError) as excinfo, tprof(sample, report_format="xml"):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == (
+            "Invalid report format 'xml', expected one of: rich, plain, csv, tsv, none."
+        )
+
+    def test_format_none(self, capsys, tmp_path):
+        def sample() -> None:
+            pass
+
+        path = tmp_path / "tprof.json"
+
+        with tprof(sample, report_format="none", json_path=str(path)):
+            sample()
+
+        assert capsys.readouterr().err == ""
+        assert json.loads(path.read_text())["functions"][0]["calls"] == 1
+
+    @pytest.mark.parametrize("clock", record.clocks())
+    def test_clock(self, clock, capsys):
+        def sample() -> None:
+            time.sleep(0.01)
+
+        with tprof(sample, clock=clock) as results:
+            sample()
+            sample()
+
+        (function_stats,) = results
+        assert function_stats.calls == 2
+        assert 10_000_000 <= function_stats.min_ns < 1_000_000_000
+
+    # A wider tolerance than the default keeps warmup detection stable when
+    # sleeps overrun on busy machines.
+    @mock.patch.object(tprof_api, "WARMUP_TOLERANCE", 1.0)
+    def test_warmup(self, capsys, tmp_path):
+        def sample(i: int) -> None:
+            time.sleep(0.015 if i < 3 else 0.003)
+
+        path = tmp_path / "tprof.json"
+
+        with tprof(sample, json_path=str(path)) as results:
+            for i in range(20):
+                sample(i)
+
+        (function_stats,) = results
+        assert function_stats.calls == 20
+        assert function_stats.warmup_calls == 3
+        assert function_stats.warmup_median_ns >= 15_000_000
+        assert function_stats.steady_median_ns < 15_000_000
+        (function_data,) = json.loads(path.read_text())["functions"]
+        assert function_data["warmup_calls"] == 3
+        assert function_data["steady_median_ns"] == function_stats.steady_median_ns
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[1].rstrip().endswith(" steady median")
+
+    @mock.patch.object(tprof_api, "WARMUP_TOLERANCE", 1.0)
+    def test_warmup_skipped(self, capsys):
+        def sample(i: int) -> None:
+            time.sleep(0.015 if i < 3 else 0.003)
+
+        with tprof(sample, skip_warmup=True) as results:
+            for i in range(20):
+                sample(i)
+
+        (function_stats,) = results
+        assert function_stats.calls == 17
+        assert function_stats.warmup_calls == 3
+        assert function_stats.median_ns == function_stats.steady_median_ns
+
+    def test_warmup_too_few_calls(self, capsys):
+        def sample(i: int) -> None:
+            time.sleep(0.015 if i < 3 else 0.003)
+
+        with tprof(sample, skip_warmup=True) as results:
+            for i in range(19):
+                sample(i)
+
+        (function_stats,) = results
+        assert function_stats.calls == 19
+        assert function_stats.warmup_calls == 0
+        assert "warmup" not in capsys.readouterr().err.splitlines()[1]
+
+    @mock.patch.object(tprof_api, "WARMUP_TOLERANCE", 1.0)
+    def test_warmup_none(self, capsys):
+        # Calls getting slower aren't warming up.
+        def sample(i: int) -> None:
+            if i >= 10:
+                time.sleep(0.002)
+
+        with tprof(sample) as results:
+            for i in range(20):
+                sample(i)
+
+        (function_stats,) = results
+        assert function_stats.warmup_calls == 0
+        assert function_stats.warmup_median_ns == 0.0
+        assert function_stats.steady_median_ns == function_stats.median_ns
+
+    @mock.patch.object(tprof_api, "WARMUP_TOLERANCE", 1.0)
+    def test_warmup_threaded(self, capsys):
+        def sample(i: int) -> None:
+            time.sleep(0.015 if i < 3 else 0.003)
+
+        def main() -> None:
+            for i in range(20):
+                sample(i)
+
+        with tprof(sample, skip_warmup=True) as results:
+            main()
+            thread = threading.Thread(target=main)
+            thread.start()
+            thread.join()
+
+        # Each thread's warmup is detected separately.
+        (function_stats,) = results
+        assert function_stats.calls == 34
+        assert function_stats.warmup_calls == 6
+
     def test_recursive(self, capsys):
         def factorial(n: int) -> int:
             if n == 0:
@@ -342,6 +660,76 @@ class TestTprof:
             f"Cannot load baseline from {str(path)!r}:"
         )
 
+    def test_trace_path(self, capsys, tmp_path):
+        def sample() -> None:
+            time.sleep(0.001)
+
+        path = tmp_path / "trace.json"
+
+        with tprof(sample, region("loop"), trace_path=str(path)):
+            with region("loop"):
+                sample()
+            thread = threading.Thread(target=sample, name="worker")
+            thread.start()
+            thread.join()
+
+        data = json.loads(path.read_text())
+        assert data["displayTimeUnit"] == "ns"
+        assert data["otherData"] == {"dropped_events": 0}
+        metadata = [e for e in data["traceEvents"] if e["ph"] == "M"]
+        # The worker thread has finished, so its name is no longer known.
+        assert sorted(e["args"]["name"] for e in metadata) == [
+            "MainThread",
+            f"Thread {thread.native_id}",
+        ]
+        events = [e for e in data["traceEvents"] if e["ph"] == "X"]
+        name = "tests.test_api:TestTprof.test_trace_path.<locals>.sample"
+        assert sorted((e["name"], e["cat"]) for e in events) == [
+            ("loop", "region"),
+            (name, "function"),
+            (name, "function"),
+        ]
+        assert len({e["tid"] for e in events}) == 2
+        loop_event = next(e for e in events if e["name"] == "loop")
+        sample_event = next(
+            e for e in events if e["name"] == name and e["tid"] == loop_event["tid"]
+        )
+        assert loop_event["ts"] <= sample_event["ts"]
+        assert sample_event["dur"] >= 1_000
+
+    def test_trace_path_ring_buffer(self, capsys, tmp_path):
+        def sample() -> int:
+            return 42
+
+        path = tmp_path / "trace.json"
+
+        with (
+            mock.patch.object(tprof_api, "TRACE_LIMIT", 2),
+            tprof(sample, trace_path=str(path)) as results,
+        ):
+            for _ in range(5):
+                sample()
+
+        (function_stats,) = results
+        assert function_stats.calls == 5
+        data = json.loads(path.read_text())
+        assert data["otherData"] == {"dropped_events": 3}
+        events = [e for e in data["traceEvents"] if e["ph"] == "X"]
+        assert len(events) == 2
+        assert events[0]["ts"] < events[1]["ts"]
+
+    def test_trace_path_no_calls(self, capsys, tmp_path):
+        def sample() -> int:
+            return 42  # pragma: no cover
+
+        path = tmp_path / "trace.json"
+
+        with tprof(sample, trace_path=str(path)):
+            pass
+
+        data = json.loads(path.read_text())
+        assert data["traceEvents"] == []
+
     def test_threaded(self, capsys):
         def worker() -> None:
             time.sleep(0.01)
@@ -366,6 +754,772 @@ class TestTprof:
         )
         assert " 5 " in errlines[2]
 
+    def test_region(self, capsys):
+        with tprof(region("loop")) as results:
+            for _ in range(3):
+                with region("loop"):
+                    pass
+
+        (function_stats,) = results
+        assert function_stats.name == "loop"
+        assert function_stats.kind == "region"
+        assert function_stats.calls == 3
+        out, err = capsys.readouterr()
+        errlines = err.splitlines()
+        assert len(errlines) == 3
+        assert errlines[2].startswith(" loop ")
+
+    def test_region_with_function(self, capsys):
+        def sample() -> int:
+            return 42
+
+        with tprof(sample, region("loop"), compare=True) as results:
+            sample()
+            with region("loop"):
+                sample()
+
+        assert [(s.name, s.kind, s.calls) for s in results] == [
+            (
+                "tests.test_api:TestTprof.test_region_with_function.<locals>.sample",
+                "function",
+                2,
+            ),
+            ("loop", "region", 1),
+        ]
+        out, err = capsys.readouterr()
+        errlines = err.splitlines()
+        assert errlines[3].startswith(" loop ")
+        assert errlines[3].rstrip().endswith("%")
+
+    def test_region_nested(self):
+        with tprof(region("outer"), region("inner")) as results:
+            with region("outer"), region("inner"), region("outer"):
+                pass
+            with region("outer"):
+                pass
+
+        outer, inner = results
+        assert outer.calls == 3
+        assert inner.calls == 1
+        assert outer.max_ns >= inner.max_ns
+
+    def test_region_not_target(self):
+        with tprof(region("target")) as results, region("other"):
+            pass
+
+        (function_stats,) = results
+        assert function_stats.calls == 0
+
+    def test_region_start_stop(self):
+        with tprof(region("work")) as results:
+            token = start_region("work")
+            time.sleep(0.001)
+            stop_region(token)
+
+        (function_stats,) = results
+        assert function_stats.calls == 1
+        assert function_stats.min_ns >= 1_000_000
+
+    def test_region_exception(self):
+        with (
+            tprof(region("fail")) as results,
+            pytest.raises(ValueError),
+            region("fail"),
+        ):
+            raise ValueError("Failure")
+
+        (function_stats,) = results
+        assert function_stats.calls == 1
+        assert function_stats.errors == 1
+
+    def test_region_json(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(region("work"), json_path=str(path)), region("work"):
+            pass
+
+        data = json.loads(path.read_text())
+        (function_data,) = data["functions"]
+        assert function_data["name"] == "work"
+        assert function_data["kind"] == "region"
+        assert function_data["calls"] == 1
+
+    def test_builtin(self, capsys):
+        def main() -> None:
+            math.factorial(10)
+            math.factorial(20)
+            try:
+                math.factorial(-1)
+            except ValueError:
+                pass
+
+        with tprof(math.factorial) as results:
+            main()
+
+        (function_stats,) = results
+        assert function_stats.name == "math:factorial"
+        assert function_stats.kind == "function"
+        assert function_stats.calls == 3
+        assert function_stats.errors == 1
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[2].startswith(" math:factorial() ")
+
+    def test_builtin_string(self, capsys):
+        with tprof("math.factorial") as results:
+            math.factorial(10)
+
+        (function_stats,) = results
+        assert function_stats.name == "math.factorial"
+        assert function_stats.calls == 1
+
+    def test_builtin_method_descriptor(self, capsys):
+        pattern = re.compile("a+")
+
+        with tprof(re.Pattern.match) as results:
+            pattern.match("aaa")
+            pattern.search("baaa")
+
+        (function_stats,) = results
+        assert function_stats.name == "re:Pattern.match"
+        assert function_stats.calls == 1
+
+    def test_builtin_class(self, capsys):
+        class Point:
+            def __init__(self, x: int) -> None:
+                time.sleep(0.001)
+
+        with tprof(Point) as results:
+            Point(1)
+
+        (function_stats,) = results
+        assert function_stats.name.endswith("<locals>.Point")
+        assert function_stats.calls == 1
+        assert function_stats.min_ns >= 1_000_000
+
+    def test_builtin_with_function(self, capsys):
+        def sample() -> int:
+            return math.factorial(5)
+
+        with tprof(sample, math.factorial) as results:
+            sample()
+
+        assert [function_stats.calls for function_stats in results] == [1, 1]
+        assert results[0].min_ns >= results[1].min_ns
+
+    def test_builtin_call_site_restarted(self, capsys):
+        def call(func: Any) -> None:
+            func(4)
+
+        # The first session disables CALL events at call()'s call site, since
+        # it calls a non-target.
+        with tprof(math.factorial):
+            call(math.sqrt)
+        with tprof(math.sqrt) as results:
+            call(math.sqrt)
+
+        (function_stats,) = results
+        assert function_stats.calls == 1
+
+    def test_builtin_threaded(self, capsys):
+        with tprof(math.factorial) as results, ThreadPoolExecutor(2) as executor:
+            list(executor.map(math.factorial, range(4)))
+
+        (function_stats,) = results
+        assert function_stats.calls == 4
+
+    def test_builtin_called_from_c(self, capsys):
+        with tprof(math.factorial) as results:
+            list(map(math.factorial, range(4)))
+
+        # Calls from C code have no CALL events.
+        (function_stats,) = results
+        assert function_stats.calls == 0
+
+    def test_size_args(self, capsys):
+        def scan(items: list[int]) -> int:
+            return sum(items)
+
+        with tprof(scan, size_args={scan: "items"}) as results:
+            scan([])
+            scan([1])
+            scan([1, 2])
+            scan([1, 2, 3])
+            scan(list(range(6)))
+
+        (function_stats,) = results
+        assert function_stats.calls == 5
+        assert function_stats.size_arg == "items"
+        buckets = function_stats.size_buckets
+        assert buckets is not None
+        assert [
+            (bucket.min_size, bucket.max_size, bucket.calls, bucket.median_size)
+            for bucket in buckets
+        ] == [(0, 0, 1, 0.0), (1, 1, 1, 1.0), (2, 3, 2, 2.5), (4, 7, 1, 6.0)]
+        assert function_stats.exponent is not None
+        err = capsys.readouterr().err
+        assert "scan() by len(items):" in err
+        assert " 2…3     2 " in err
+        assert "Fitted exponent: " in err
+
+    def test_size_args_keyword_only(self, capsys):
+        def scan(*, items: str) -> None:
+            pass
+
+        with tprof(scan, size_args={scan: "items"}) as results:
+            scan(items="abc")
+
+        buckets = results[0].size_buckets
+        assert buckets is not None
+        assert [bucket.median_size for bucket in buckets] == [3.0]
+
+    def test_size_args_varargs(self, capsys):
+        def scan(*items: int) -> None:
+            pass
+
+        with tprof(scan, size_args={scan: "items"}) as results:
+            scan(1, 2, 3, 4)
+
+        buckets = results[0].size_buckets
+        assert buckets is not None
+        assert [bucket.median_size for bucket in buckets] == [4.0]
+
+    def test_size_args_no_len(self, capsys):
+        def scan(items: object) -> None:
+            pass
+
+        with tprof(scan, size_args={scan: "items"}) as results:
+            scan(1)
+            scan([1])
+
+        (function_stats,) = results
+        assert function_stats.calls == 2
+        buckets = function_stats.size_buckets
+        assert buckets is not None
+        assert [bucket.calls for bucket in buckets] == [1]
+        assert function_stats.exponent is None
+        assert "Too few sizes to fit an exponent." in capsys.readouterr().err
+
+    def test_size_args_recursive(self, capsys):
+        def count(items: list[int]) -> int:
+            if not items:
+                return 0
+            return 1 + count(items[1:])
+
+        with tprof(count, size_args={count: "items"}) as results:
+            count([1, 2, 3])
+
+        buckets = results[0].size_buckets
+        assert buckets is not None
+        assert [(bucket.bits, bucket.calls) for bucket in buckets] == [
+            (0, 1),
+            (1, 1),
+            (2, 2),
+        ]
+
+    def test_size_args_no_calls(self, capsys):
+        def scan(items: list[int]) -> None:
+            pass  # pragma: no cover
+
+        with tprof(scan, size_args={scan: "items"}) as results:
+            pass
+
+        assert results[0].size_buckets == []
+        assert "No sized calls." in capsys.readouterr().err
+
+    def test_size_args_missing_argument(self):
+        def scan(items: list[int]) -> None:
+            pass  # pragma: no cover
+
+        with (
+            pytest.raises(ValueError) as excinfo,
+            tprof(scan, size_args={scan: "other"}),
+        ):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == (
+            "tests.test_api:TestTprof.test_size_args_missing_argument.<locals>.scan() "
+            "has no argument 'other'."
+        )
+
+    def test_size_args_not_target(self):
+        def scan(items: list[int]) -> None:
+            pass  # pragma: no cover
+
+        def other(items: list[int]) -> None:
+            pass  # pragma: no cover
+
+        with (
+            pytest.raises(ValueError) as excinfo,
+            tprof(scan, size_args={other: "items"}),
+        ):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value).startswith("Size argument target <function ")
+
+    def test_size_args_region(self):
+        with (
+            pytest.raises(ValueError) as excinfo,
+            tprof(region("work"), size_args={region("work"): "items"}),
+        ):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == (
+            "Cannot take argument sizes for region Region('work')."
+        )
+
+    def test_size_args_builtin(self):
+        with (
+            pytest.raises(ValueError) as excinfo,
+            tprof(math.factorial, size_args={math.factorial: "n"}),
+        ):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == (
+            "Cannot take argument sizes for <built-in function factorial>."
+        )
+
+    def test_size_args_json(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        def scan(items: list[int]) -> None:
+            pass
+
+        with tprof(scan, size_args={scan: "items"}, json_path=str(path)):
+            scan([1, 2])
+
+        data = json.loads(path.read_text())
+        (function_data,) = data["functions"]
+        assert function_data["size_arg"] == "items"
+        (bucket_data,) = function_data["size_buckets"]
+        assert bucket_data["min_size"] == 2
+        assert bucket_data["max_size"] == 3
+        assert bucket_data["calls"] == 1
+        assert bucket_data["median_size"] == 2.0
+        assert function_data["exponent"] is None
+
+        _, (function_stats,) = tprof_api._read_json(str(path))
+        assert function_stats.size_arg == "items"
+        assert function_stats.size_buckets is not None
+        assert function_stats.size_buckets[0].bits == 2
+
+    def test_memory(self, capsys):
+        def build(n: int) -> list[str]:
+            return [str(i) for i in range(n)]
+
+        def noop() -> None:
+            pass
+
+        with tprof(build, noop, memory=True) as results:
+            build(100)
+            build(100)
+            noop()
+
+        build_stats, noop_stats = results
+        assert build_stats.median_allocs is not None
+        assert build_stats.median_allocs >= 100
+        assert build_stats.total_allocs == 2 * build_stats.median_allocs
+        assert build_stats.median_bytes is not None
+        assert build_stats.median_bytes >= 100 * sys.getsizeof("99")
+        assert build_stats.total_bytes == 2 * build_stats.median_bytes
+        assert noop_stats.median_allocs == 0
+        assert noop_stats.total_bytes == 0
+        errlines = capsys.readouterr().err.splitlines()
+        assert " bytes " in errlines[1] or " bytes " in errlines[2]
+
+    def test_memory_other_thread(self, capsys):
+        def build(n: int) -> list[str]:
+            return [str(i) for i in range(n)]
+
+        with tprof(build, memory=True) as results:
+            thread = threading.Thread(target=build, args=(100,))
+            thread.start()
+            thread.join()
+
+        (function_stats,) = results
+        assert function_stats.calls == 1
+        assert function_stats.median_allocs is not None
+        assert function_stats.median_allocs >= 100
+
+    def test_memory_disabled(self, capsys):
+        def sample() -> None:
+            pass
+
+        with tprof(sample, memory=True):
+            sample()
+        with tprof(sample) as results:
+            sample()
+
+        (function_stats,) = results
+        assert function_stats.total_bytes is None
+        assert function_stats.median_allocs is None
+        assert "bytes" not in capsys.readouterr().err.splitlines()[-2]
+
+    def test_memory_json_and_baseline(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        def build(n: int) -> list[str]:
+            return [str(i) for i in range(n)]
+
+        with tprof(build, memory=True, json_path=str(path)):
+            build(100)
+
+        data = json.loads(path.read_text())
+        (function_data,) = data["functions"]
+        assert function_data["total_allocs"] >= 100
+        assert function_data["median_allocs"] >= 100
+        assert function_data["total_bytes"] > 0
+        assert function_data["median_bytes"] > 0
+        _, (function_stats,) = tprof_api._read_json(str(path))
+        assert function_stats.median_bytes == function_data["median_bytes"]
+        capsys.readouterr()
+
+        with tprof(build, memory=True, baseline_path=str(path)):
+            build(100)
+
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[1].rstrip().endswith("bytes delta")
+        assert errlines[2].rstrip().endswith("+0.00%")
+
+    def test_memory_baseline_without_memory(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        def sample() -> None:
+            pass
+
+        with tprof(sample, json_path=str(path)):
+            sample()
+        capsys.readouterr()
+
+        with tprof(sample, memory=True, baseline_path=str(path)):
+            sample()
+
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[2].rstrip().endswith("n/a")
+
+    def test_gc(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        def collect() -> None:
+            gc.collect()
+
+        def noop() -> None:
+            pass
+
+        with tprof(collect, noop, json_path=str(path)) as results:
+            for _ in range(3):
+                collect()
+                noop()
+
+        collect_stats, noop_stats = results
+        assert collect_stats.collections == 3
+        assert collect_stats.collections_per_call == 1
+        assert 0 < collect_stats.gc_total_ns <= collect_stats.total_ns
+        assert collect_stats.gc_inclusive_median_ns == collect_stats.median_ns
+        assert (
+            collect_stats.gc_exclusive_median_ns < collect_stats.gc_inclusive_median_ns
+        )
+        assert noop_stats.collections == 0
+        assert noop_stats.gc_total_ns == 0
+        assert noop_stats.gc_exclusive_median_ns == noop_stats.median_ns
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[1].rstrip().endswith("excl. gc")
+        data = json.loads(path.read_text())
+        assert data["functions"][0]["collections"] == 3
+        _, (read_stats, _) = tprof_api._read_json(str(path))
+        assert read_stats.gc_exclusive_median_ns == collect_stats.gc_exclusive_median_ns
+        assert record.gc_callback not in gc.callbacks
+
+    def test_gc_nested(self, capsys):
+        def collect() -> None:
+            gc.collect()
+
+        def outer() -> None:
+            collect()
+
+        with tprof(outer, collect) as results:
+            outer()
+
+        outer_stats, collect_stats = results
+        assert outer_stats.collections == collect_stats.collections == 1
+        assert outer_stats.gc_total_ns == collect_stats.gc_total_ns
+
+    def test_gc_other_thread(self, capsys):
+        # Collections are charged to calls on the thread that ran them.
+        started = threading.Event()
+        finish = threading.Event()
+
+        def wait() -> None:
+            started.set()
+            finish.wait()
+
+        with tprof(wait) as results:
+            thread = threading.Thread(target=wait)
+            thread.start()
+            started.wait()
+            gc.collect()
+            finish.set()
+            thread.join()
+
+        (function_stats,) = results
+        assert function_stats.calls == 1
+        assert function_stats.collections == 0
+        assert "gc/call" not in capsys.readouterr().err
+
+    def test_exclude_gc(self, capsys):
+        def collect() -> None:
+            gc.collect()
+
+        with tprof(collect, exclude_gc=True) as results:
+            for _ in range(3):
+                collect()
+
+        (function_stats,) = results
+        assert function_stats.collections == 3
+        assert function_stats.median_ns == function_stats.gc_exclusive_median_ns
+        assert function_stats.gc_inclusive_median_ns > function_stats.median_ns
+        # Every statistic excludes the collections.
+        assert function_stats.total_ns < function_stats.gc_total_ns
+
+    def test_gc_callback_invalid(self):
+        with pytest.raises(TypeError) as excinfo:
+            record.gc_callback(1, {})  # type: ignore [arg-type]
+
+        assert str(excinfo.value) == "gc_callback requires a phase and an info dict"
+
+    def test_tags(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(
+            sample, tag=True, json_path=str(path), report_format="plain"
+        ) as results:
+            sample()
+            for tenant in ("small", "large", "large"):
+                set_tag(tenant)
+                sample()
+                if tenant == "large":
+                    sample()
+            set_tag(("batch", 1))
+            sample()
+
+        (function_stats,) = results
+        assert function_stats.tags is not None
+        by_tag = {tag_stats.tag: tag_stats for tag_stats in function_stats.tags}
+        assert {tag: tag_stats.calls for tag, tag_stats in by_tag.items()} == {
+            "<untagged>": 1,
+            "small": 1,
+            "large": 4,
+            "('batch', 1)": 1,
+        }
+        assert sum(tag_stats.total_ns for tag_stats in function_stats.tags) == (
+            function_stats.total_ns
+        )
+        totals = [tag_stats.total_ns for tag_stats in function_stats.tags]
+        assert totals == sorted(totals, reverse=True)
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[3] == f"{__name__}:sample() by tag:"
+        assert errlines[4].split() == ["tag", "calls", "total", "median"]
+        assert len(errlines) == 9
+        data = json.loads(path.read_text())
+        assert {
+            tag_data["tag"]: tag_data["calls"]
+            for tag_data in data["functions"][0]["tags"]
+        } == {"<untagged>": 1, "small": 1, "large": 4, "('batch', 1)": 1}
+        _, (read_stats,) = tprof_api._read_json(str(path))
+        assert read_stats.tags is not None
+        assert [tag_stats.tag for tag_stats in read_stats.tags] == list(by_tag)
+
+    def test_tags_context_var(self, capsys):
+        tenant: ContextVar[str] = ContextVar("tenant")
+
+        def work(name: str) -> None:
+            tenant.set(name)
+            sample()
+
+        with tprof(sample, tag=tenant) as results:
+            with ThreadPoolExecutor(2) as executor:
+                list(executor.map(work, ["a", "b", "a"]))
+            # Contexts are per thread, so this call is untagged.
+            set_tag("ignored")
+            sample()
+
+        (function_stats,) = results
+        assert function_stats.tags is not None
+        assert sorted(
+            (tag_stats.tag, tag_stats.calls) for tag_stats in function_stats.tags
+        ) == [("<untagged>", 1), ("a", 2), ("b", 1)]
+
+    def test_tags_threads(self, capsys):
+        # Threads interning the same and new values at once get one index per
+        # value.
+        def work(n: int) -> None:
+            for value in (n % 10, "shared"):
+                set_tag(value)
+                sample()
+
+        with tprof(sample, tag=True) as results, ThreadPoolExecutor(8) as executor:
+            list(executor.map(work, range(200)))
+
+        (function_stats,) = results
+        assert function_stats.tags is not None
+        # Values interned twice would be listed twice.
+        assert sorted(
+            (tag_stats.tag, tag_stats.calls) for tag_stats in function_stats.tags
+        ) == sorted([(repr(n), 20) for n in range(10)] + [("shared", 200)])
+
+    def test_tags_off(self, capsys):
+        with tprof(sample, report_format="plain") as results:
+            set_tag("ignored")
+            sample()
+
+        assert results[0].tags is None
+        assert "by tag:" not in capsys.readouterr().err
+
+    def test_tags_not_called(self, capsys):
+        with tprof(sample, tag=True, report_format="plain") as results:
+            pass
+
+        assert results[0].tags == []
+        assert capsys.readouterr().err.splitlines()[-2:] == [
+            f"{__name__}:sample() by tag:",
+            "No calls.",
+        ]
+
+    def test_tags_limit(self, capsys):
+        with tprof(sample, tag=True, report_format="plain") as results:
+            for n in range(record.TAG_LIMIT + 5):
+                set_tag(n)
+                sample()
+
+        (function_stats,) = results
+        assert function_stats.tags is not None
+        assert len(function_stats.tags) == record.TAG_LIMIT + 1
+        (other,) = [
+            tag_stats for tag_stats in function_stats.tags if tag_stats.tag == "<other>"
+        ]
+        assert other.calls == 5
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[-1] == (
+            f"… and {record.TAG_LIMIT + 1 - tprof_api.TAG_DISPLAY_LIMIT} more tags, "
+            "in JSON output."
+        )
+
+    def test_tags_markup(self, capsys):
+        with tprof(sample, tag=True) as results:
+            set_tag("[bold]tenant")
+            sample()
+
+        assert results[0].tags is not None
+        assert results[0].tags[0].tag == "[bold]tenant"
+        assert "[bold]tenant" in capsys.readouterr().err
+
+
+class TestFunctionStats:
+    def test_exponent_linear(self):
+        function_stats = FunctionStats(
+            "f",
+            3,
+            0,
+            0,
+            0,
+            0.0,
+            0.0,
+            size_arg="items",
+            size_buckets=[
+                SizeBucket(4, 1, 10.0, 1_000.0),
+                SizeBucket(7, 1, 100.0, 10_000.0),
+                SizeBucket(10, 1, 1_000.0, 100_000.0),
+            ],
+        )
+
+        assert function_stats.exponent == pytest.approx(1.0)
+
+    def test_exponent_quadratic(self):
+        function_stats = FunctionStats(
+            "f",
+            2,
+            0,
+            0,
+            0,
+            0.0,
+            0.0,
+            size_arg="items",
+            size_buckets=[
+                SizeBucket(4, 1, 10.0, 1_000.0),
+                SizeBucket(7, 1, 100.0, 100_000.0),
+            ],
+        )
+
+        assert function_stats.exponent == pytest.approx(2.0)
+
+    def test_exponent_no_size_arg(self):
+        function_stats = FunctionStats("f", 0, 0, 0, 0, 0.0, 0.0)
+
+        assert function_stats.exponent is None
+
+    def test_exponent_ignores_zero_sizes(self):
+        function_stats = FunctionStats(
+            "f",
+            2,
+            0,
+            0,
+            0,
+            0.0,
+            0.0,
+            size_arg="items",
+            size_buckets=[
+                SizeBucket(0, 1, 0.0, 1_000.0),
+                SizeBucket(4, 1, 10.0, 1_000.0),
+            ],
+        )
+
+        assert function_stats.exponent is None
+
+
+class TestRegion:
+    def test_interned(self):
+        assert region("a") is region("a")
+        assert region("a") is not region("b")
+
+    def test_name(self):
+        assert region("a").name == "a"
+
+    def test_repr(self):
+        assert repr(region("a")) == "Region('a')"
+
+    def test_enter_returns_region(self):
+        with region("a") as entered:
+            pass
+
+        assert entered is region("a")
+
+    def test_no_session(self):
+        with region("a"):
+            pass
+        stop_region(start_region("a"))
+
+    def test_name_not_str(self):
+        with pytest.raises(TypeError):
+            region(1)  # type: ignore[arg-type]
+
+    def test_start_region_not_str(self):
+        with pytest.raises(TypeError) as excinfo:
+            start_region(1)  # type: ignore[arg-type]
+
+        assert str(excinfo.value) == "start_region() argument must be a str"
+
+    def test_stop_region_not_region(self):
+        with pytest.raises(TypeError) as excinfo:
+            stop_region("a")  # type: ignore[arg-type]
+
+        assert str(excinfo.value) == "stop_region() argument must be a Region"
+
+    def test_stop_without_start(self):
+        with tprof(region("a")) as results:
+            stop_region(region("a"))
+
+        (function_stats,) = results
+        assert function_stats.calls == 0
+
 
 class TestFormatTime:
     def test_ns_no_colour(self):
@@ -408,6 +1562,37 @@ class TestFormatTime:
         assert _format_time(12_345_678_901_234, None) == "12,346s "
 
 
+class TestFormatBytes:
+    def test_bytes(self):
+        assert _format_bytes(123, None) == "123B"
+
+    def test_bytes_with_colour(self):
+        assert _format_bytes(123, "red") == "[red]123[/red]B"
+
+    def test_kib(self):
+        assert _format_bytes(1536, None) == "1.50KiB"
+
+    def test_kib_10_100_range(self):
+        assert _format_bytes(12_800, None) == "12.5KiB"
+
+    def test_mib(self):
+        assert _format_bytes(200 * 1024 * 1024, None) == "200MiB"
+
+    def test_tib(self):
+        assert _format_bytes(2048 * 1024**4, None) == "2,048TiB"
+
+
+class TestFormatCount:
+    def test_integer(self):
+        assert _format_count(12_345.0, None) == "12,345"
+
+    def test_fraction(self):
+        assert _format_count(2.5, None) == "2.5"
+
+    def test_with_colour(self):
+        assert _format_count(3, "red") == "[red]3[/red]"
+
+
 class TestExtractCode:
     def test_code_object(self):
         def jump():  # pragma: no cover
@@ -512,5 +1697,198 @@ class TestExtractCode:
         assert code is sample.__code__
 
 
-def sample():  # pragma: no cover
+def sample() -> None:
+    pass
+
+
+def other():  # pragma: no cover
     pass
+
+
+class TestRecordStats:
+    def record_calls(self, codes: tuple[Any, ...], repeat: int) -> None:
+        for code in codes * repeat:
+            record.py_start_callback(code, 0)
+            record.py_return_callback(code, 0, None)
+
+    def traced_durations(self, num_targets: int) -> list[list[int]]:
+        durations: list[list[int]] = [[] for _ in range(num_targets)]
+        ((_, _, events),) = record.trace()
+        for target, start, end in struct.iter_unpack("qqq", events):
+            durations[target].append(end - start)
+        return durations
+
+    def check(
+        self, stats: tuple[int, int, int, int, float, float], values: list[int]
+    ) -> None:
+        calls, total, minimum, maximum, median, stdev = stats
+        assert calls == len(values)
+        assert total == sum(values)
+        assert minimum == min(values)
+        assert maximum == max(values)
+        assert median == statistics.median(values)
+        assert stdev == pytest.approx(statistics.stdev(values))
+
+    def test_matches_statistics(self):
+        codes = (sample.__code__, other.__code__)
+        record.configure(codes, 200_000)
+        try:
+            # Enough values to take the medians on several threads.
+            self.record_calls(codes, 60_000)
+            stats = record.stats()
+            durations = self.traced_durations(2)
+        finally:
+            record.configure(())
+
+        for target_stats, values in zip(stats, durations, strict=True):
+            self.check(target_stats, values)
+
+    def test_since_mark(self):
+        codes = (sample.__code__, other.__code__)
+        record.configure(codes, 1_000)
+        try:
+            self.record_calls(codes, 10)
+            record.mark()
+            self.record_calls(codes[:1], 5)
+            stats = record.stats(True)
+            all_stats = record.stats()
+            durations = self.traced_durations(2)
+        finally:
+            record.configure(())
+
+        self.check(stats[0], durations[0][10:])
+        assert stats[1] == (0, 0, 0, 0, 0.0, 0.0)
+        self.check(all_stats[0], durations[0])
+        self.check(all_stats[1], durations[1])
+
+    def test_many_targets(self):
+        codes = tuple(compile("pass", f"<target {i}>", "exec") for i in range(10))
+        record.configure(codes, 1_000)
+        try:
+            self.record_calls(codes, 3)
+            stats = record.stats()
+            durations = self.traced_durations(10)
+        finally:
+            record.configure(())
+
+        for target_stats, values in zip(stats, durations, strict=True):
+            self.check(target_stats, values)
+
+    def test_other_stats_match_statistics(self):
+        codes = (sample.__code__, other.__code__)
+        record.configure(codes, 200_000)
+        try:
+            # Enough values to take the medians on several threads.
+            self.record_calls(codes, 60_000)
+            outcome_stats = record.outcome_stats()
+            warmup_stats = record.warmup_stats(0.1)
+            durations = self.traced_durations(2)
+        finally:
+            record.configure(())
+
+        for target_outcome_stats, values in zip(outcome_stats, durations, strict=True):
+            assert target_outcome_stats == (0, statistics.median(values), 0.0)
+        for (warmup_count, warmup_median, steady_median), values in zip(
+            warmup_stats, durations, strict=True
+        ):
+            if warmup_count:
+                assert warmup_median == statistics.median(values[:warmup_count])
+            assert steady_median == statistics.median(values[warmup_count:])
+
+    def test_other_stats_many_targets(self):
+        codes = tuple(compile("pass", f"<target {i}>", "exec") for i in range(10))
+        record.configure(codes, 1_000)
+        try:
+            self.record_calls(codes, 3)
+            outcome_stats = record.outcome_stats()
+            warmup_stats = record.warmup_stats(0.1)
+            gc_stats = record.gc_stats()
+            durations = self.traced_durations(10)
+        finally:
+            record.configure(())
+
+        for target_outcome_stats, target_warmup_stats, values in zip(
+            outcome_stats, warmup_stats, durations, strict=True
+        ):
+            assert target_outcome_stats == (0, statistics.median(values), 0.0)
+            assert target_warmup_stats == (0, 0.0, statistics.median(values))
+        assert gc_stats == [(0, 0, 0.0)] * 10
+
+    @pytest.mark.parametrize(
+        "take_stats",
+        [
+            record.stats,
+            lambda: record.warmup_stats(0.1, True),
+            record.outcome_stats,
+            record.tag_stats,
+        ],
+    )
+    def test_configure_while_taking_stats(self, take_stats):
+        # More targets than a batch, so stats are taken over two.
+        codes = tuple(compile("pass", f"<target {i}>", "exec") for i in range(9))
+
+        def reconfigure(recorded: threading.Event, ready: threading.Event) -> None:
+            # Record on this thread too, so configure() frees its arrays.
+            self.record_calls(codes, 10_000)
+            recorded.set()
+            ready.wait()
+            record.configure(())
+
+        tag_var: ContextVar[str] = ContextVar("tag")
+        tag_var.set("tagged")
+
+        # The other thread usually reconfigures once the GIL is released to
+        # take the first batch's medians, but may not be scheduled in time.
+        errors = []
+        for _ in range(10):
+            recorded = threading.Event()
+            ready = threading.Event()
+            record.configure(codes, 0, None, False, 0, None, "perf_counter", tag_var)
+            thread = threading.Thread(target=reconfigure, args=(recorded, ready))
+            try:
+                self.record_calls(codes, 10_000)
+                thread.start()
+                recorded.wait()
+                ready.set()
+                take_stats()
+            except RuntimeError as exc:
+                errors.append(str(exc))
+                break
+            finally:
+                thread.join()
+                record.configure(())
+
+        assert errors == ["configure() was called while taking stats"]
+
+
+class TestRecordClocks:
+    def test_perf_counter_available(self):
+        assert record.clocks()[0] == "perf_counter"
+
+    def test_unknown(self):
+        with pytest.raises(ValueError) as excinfo:
+            record.configure((), 0, None, False, 0, None, "sundial")
+
+        assert str(excinfo.value) == "configure() clock sundial is not available"
+
+
+class TestImport:
+    def test_without_rich(self):
+        # Programmatic use shouldn't pay for importing Rich, which is only
+        # needed to print reports, nor the CLI for standard library modules
+        # that only some features need.
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import tprof, tprof.main"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        modules = [
+            line.rsplit("|", 1)[1].strip()
+            for line in result.stderr.splitlines()
+            if line.startswith("import time:") and "|" in line
+        ]
+        assert "tprof.api" in modules
+        assert [module for module in modules if module.split(".")[0] == "rich"] == []
+        assert {"inspect", "statistics", "sqlite3"}.isdisjoint(modules)
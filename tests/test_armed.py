@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+import os
+import signal
+import sys
+import time
+from collections.abc import Callable
+from unittest import mock
+
+import pytest
+
+from tprof import armed as tprof_armed
+from tprof.api import TOOL_ID
+from tprof.armed import arm
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(signal, "SIGUSR1"), reason="Requires SIGUSR1 and SIGUSR2."
+)
+
+
+def sample() -> int:
+    return 42
+
+
+def wait_for(condition: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + 5.0
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out."
+        time.sleep(0.01)
+
+
+class TestArm:
+    def test_idle(self, tmp_path):
+        json_path = str(tmp_path / "out.json")
+        with arm(sample, json_path=json_path) as armed:
+            assert sys.monitoring.get_tool(TOOL_ID) == "tprof"
+            assert sys.monitoring.get_events(TOOL_ID) == 0
+            sample()
+            path = armed.dump()
+
+        assert path == json_path
+        data = json.loads((tmp_path / "out.json").read_text())
+        assert data["functions"][0]["calls"] == 0
+        assert sys.monitoring.get_tool(TOOL_ID) is None
+
+    def test_signals(self, tmp_path, capsys):
+        json_path = str(tmp_path / "out-{n}.json")
+        with arm(sample, json_path=json_path) as armed:
+            os.kill(os.getpid(), signal.SIGUSR1)
+            assert armed.recording
+            assert sys.monitoring.get_events(TOOL_ID) != 0
+            sample()
+            sample()
+            os.kill(os.getpid(), signal.SIGUSR1)
+            assert sys.monitoring.get_events(TOOL_ID) == 0
+            sample()
+            os.kill(os.getpid(), signal.SIGUSR2)
+            os.kill(os.getpid(), signal.SIGUSR2)
+
+        first = json.loads((tmp_path / "out-0.json").read_text())
+        assert first["functions"][0]["name"] == f"{__name__}:sample"
+        assert first["functions"][0]["calls"] == 2
+        second = json.loads((tmp_path / "out-1.json").read_text())
+        assert second["functions"][0]["calls"] == 0
+        assert capsys.readouterr() == ("", "")
+
+    def test_dump_while_recording(self, tmp_path):
+        json_path = str(tmp_path / "out-{n}.json")
+        with arm(sample, json_path=json_path) as armed:
+            armed.start()
+            sample()
+            armed.dump()
+            sample()
+            sample()
+            armed.dump()
+
+        first = json.loads((tmp_path / "out-0.json").read_text())
+        assert first["functions"][0]["calls"] == 1
+        second = json.loads((tmp_path / "out-1.json").read_text())
+        assert second["functions"][0]["calls"] == 2
+
+    def test_default_json_path(self):
+        with arm(sample) as armed:
+            assert armed.json_path == "tprof-{pid}-{n}.json"
+
+    def test_restores_handlers(self, tmp_path):
+        previous = signal.getsignal(signal.SIGUSR1)
+
+        with arm(sample, json_path=str(tmp_path / "out.json")):
+            assert signal.getsignal(signal.SIGUSR1) != previous
+
+        assert signal.getsignal(signal.SIGUSR1) == previous
+
+    def test_custom_signals(self, tmp_path):
+        previous = signal.getsignal(signal.SIGUSR1)
+
+        with arm(
+            sample,
+            json_path=str(tmp_path / "out.json"),
+            toggle_signal=signal.SIGUSR2,
+            dump_signal=None,
+        ) as armed:
+            assert signal.getsignal(signal.SIGUSR1) == previous
+            os.kill(os.getpid(), signal.SIGUSR2)
+            assert armed.recording
+
+    def test_disarm_twice(self, tmp_path):
+        armed = arm(sample, json_path=str(tmp_path / "out.json"))
+        armed.start()
+
+        armed.disarm()
+        armed.disarm()
+
+        assert not armed.recording
+        assert sys.monitoring.get_tool(TOOL_ID) is None
+
+    def test_invalid_target(self):
+        with pytest.raises(ValueError):
+            arm(1)
+
+        assert sys.monitoring.get_tool(TOOL_ID) is None
+
+    def test_control_file(self, tmp_path):
+        control_path = tmp_path / "control"
+        json_path = str(tmp_path / "out.json")
+        with (
+            mock.patch.object(tprof_armed, "CONTROL_INTERVAL", 0.01),
+            arm(
+                sample,
+                json_path=json_path,
+                toggle_signal=None,
+                dump_signal=None,
+                control_path=str(control_path),
+            ) as armed,
+        ):
+            control_path.touch()
+            wait_for(lambda: armed.recording)
+            sample()
+            control_path.unlink()
+            wait_for(lambda: armed.dumps == 1)
+
+        assert not armed.recording
+        data = json.loads((tmp_path / "out.json").read_text())
+        assert data["functions"][0]["calls"] == 1
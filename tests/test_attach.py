@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from tprof import attach as tprof_attach
+from tprof import record
+from tprof.attach import _bootstrap, attach
+
+
+def sample() -> int:
+    return 42
+
+
+def run_script(pid: int, script_path: str) -> None:
+    """Stand in for sys.remote_exec() by running the script in this process."""
+    exec(Path(script_path).read_text(), {})
+    for _ in range(3):
+        sample()
+
+
+def join_attach_thread() -> None:
+    for thread in threading.enumerate():
+        if thread.name == "tprof-attach":
+            thread.join()
+
+
+class TestAttach:
+    def test_success(self):
+        with mock.patch.object(sys, "remote_exec", run_script, create=True):
+            results = attach(1234, [f"{__name__}:sample"], 0.05)
+
+        (function_stats,) = results
+        assert function_stats.name == f"{__name__}:sample"
+        assert function_stats.calls == 3
+
+    def test_unsupported(self):
+        with (
+            mock.patch.object(sys, "remote_exec", None, create=True),
+            pytest.raises(RuntimeError) as excinfo,
+        ):
+            attach(1234, [f"{__name__}:sample"], 0.05)
+
+        assert str(excinfo.value) == "Attaching to a process requires Python 3.14+."
+
+    def test_timeout(self):
+        with (
+            mock.patch.object(sys, "remote_exec", lambda pid, path: None, create=True),
+            mock.patch.object(tprof_attach, "RESULTS_TIMEOUT", 0.0),
+            pytest.raises(RuntimeError) as excinfo,
+        ):
+            attach(1234, [f"{__name__}:sample"], 0.0)
+
+        assert str(excinfo.value) == "Timed out waiting for results from process 1234."
+
+    def test_error(self):
+        with (
+            mock.patch.object(sys, "remote_exec", run_script, create=True),
+            pytest.raises(RuntimeError) as excinfo,
+        ):
+            attach(1234, [f"{__name__}:nonexistent"], 0.05)
+
+        assert str(excinfo.value).startswith("Profiling failed in process 1234: ")
+
+    def test_other_owner(self):
+        process_stat = mock.Mock(st_uid=os.geteuid() + 1, st_gid=os.getegid() + 1)
+        real_stat = os.stat
+
+        def stat(path: str, *args: Any, **kwargs: Any) -> Any:
+            if path == "/proc/1234":
+                return process_stat
+            return real_stat(path, *args, **kwargs)
+
+        with (
+            mock.patch.object(sys, "remote_exec", run_script, create=True),
+            mock.patch.object(os, "stat", stat),
+            mock.patch.object(os, "chown") as chown,
+        ):
+            attach(1234, [f"{__name__}:sample"], 0.05)
+
+        directory, script_path = (call.args[0] for call in chown.call_args_list)
+        assert script_path == os.path.join(directory, "bootstrap.py")
+        assert {call.args[1:] for call in chown.call_args_list} == {
+            (process_stat.st_uid, process_stat.st_gid)
+        }
+
+    def test_same_owner(self):
+        with (
+            mock.patch.object(sys, "remote_exec", run_script, create=True),
+            mock.patch.object(os, "chown") as chown,
+        ):
+            attach(os.getpid(), [f"{__name__}:sample"], 0.05)
+
+        chown.assert_not_called()
+
+    def test_error_collecting(self):
+        with (
+            mock.patch.object(sys, "remote_exec", run_script, create=True),
+            mock.patch.object(
+                tprof_attach, "_collect_stats", side_effect=MemoryError("full")
+            ),
+            pytest.raises(RuntimeError) as excinfo,
+        ):
+            attach(1234, [f"{__name__}:sample"], 0.05)
+
+        assert str(excinfo.value) == "Profiling failed in process 1234: full"
+        # Profiling stopped regardless.
+        assert record.stats() == []
+
+
+class TestBootstrap:
+    def test_profiles_until_duration(self, tmp_path):
+        results_path = tmp_path / "results.json"
+
+        _bootstrap((f"{__name__}:sample",), 0.05, str(results_path))
+        sample()
+        sample()
+        join_attach_thread()
+
+        data = json.loads(results_path.read_text())
+        (function_data,) = data["functions"]
+        assert function_data["calls"] == 2
+        assert not (tmp_path / "results.json.partial").exists()
+
+    def test_error(self, tmp_path):
+        results_path = tmp_path / "results.json"
+
+        _bootstrap(("not-a-module-name:sample",), 0.05, str(results_path))
+
+        data = json.loads(results_path.read_text())
+        assert "error" in data
+
+    def test_directory_removed(self, tmp_path, monkeypatch):
+        exceptions: list[Any] = []
+        monkeypatch.setattr(threading, "excepthook", exceptions.append)
+        results_path = tmp_path / "removed" / "results.json"
+
+        _bootstrap((f"{__name__}:sample",), 0.05, str(results_path))
+        sample()
+        join_attach_thread()
+
+        assert exceptions == []
+        assert record.stats() == []
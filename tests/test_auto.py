@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import time
+from unittest import mock
+
+import pytest
+
+from tprof import auto as tprof_auto
+from tprof import tprof
+
+
+def hot() -> None:
+    time.sleep(0.002)
+
+
+def cold() -> None:
+    pass
+
+
+def run_for(seconds: float) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        hot()
+        cold()
+
+
+class TestAuto:
+    @mock.patch.object(tprof_auto, "DISCOVERY_DURATION", 0.1)
+    def test_profiles_discovered(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(auto=1, json_path=str(path)) as results:
+            run_for(0.4)
+
+        (function_stats,) = results
+        assert function_stats.name == f"{__name__}:hot"
+        assert function_stats.calls > 0
+        assert function_stats.median_ns >= 2_000_000
+        (function_data,) = json.loads(path.read_text())["functions"]
+        assert function_data["name"] == f"{__name__}:hot"
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == f"🎯 tprof discovered targets: -t {__name__}:hot"
+        assert errlines[1] == "🎯 tprof results:"
+
+    def test_run_ends_during_discovery(self, capsys):
+        with tprof(auto=1, report_format="plain") as results:
+            run_for(0.1)
+
+        assert results == []
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == f"🎯 tprof discovered targets: -t {__name__}:hot"
+        assert errlines[1] == (
+            "The run ended during discovery, so no calls were profiled. Rerun "
+            "with these targets to profile them."
+        )
+
+    def test_nothing_found(self, capsys):
+        with tprof(auto=1, report_format="plain") as results:
+            pass
+
+        assert results == []
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof found no functions to profile."
+
+    @mock.patch.object(tprof_auto, "DISCOVERY_DURATION", 0.1)
+    def test_slow(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(auto=1, slow_threshold="1ms", json_path=str(path)):
+            run_for(0.4)
+
+        slow_calls = json.loads(path.read_text())["slow_calls"]
+        assert slow_calls[0]["name"] == f"{__name__}:hot"
+
+    def test_with_targets(self):
+        with pytest.raises(ValueError) as excinfo, tprof(hot, auto=1):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == "targets and auto may not be combined."
+
+    def test_not_positive(self):
+        with pytest.raises(ValueError) as excinfo, tprof(auto=0):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == "auto must be at least 1."
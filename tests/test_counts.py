@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import importlib
+import json
+import sys
+from collections.abc import Iterator
+from contextlib import chdir
+from pathlib import Path
+
+import pytest
+
+from tprof import count_calls, record
+from tprof.main import main
+
+PACKAGE = {
+    "__init__.py": "def f():\n    return g()\n\n\ndef g():\n    return 1\n",
+    "sub.py": "class C:\n    def h(self):\n        return 2\n",
+}
+
+
+@pytest.fixture
+def package(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    directory = tmp_path / "countpkg"
+    directory.mkdir()
+    for name, source in PACKAGE.items():
+        (directory / name).write_text(source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path
+    for name in ("countpkg", "countpkg.sub"):
+        sys.modules.pop(name, None)
+
+
+def work() -> None:
+    countpkg = importlib.import_module("countpkg")
+    sub = importlib.import_module("countpkg.sub")
+
+    for _ in range(3):
+        countpkg.f()
+    sub.C().h()
+
+
+class TestCountCalls:
+    def test_package(self, package, capsys):
+        with count_calls("countpkg", report_format="plain") as counts:
+            work()
+
+        assert counts == {
+            "countpkg:f": 3,
+            "countpkg:g": 3,
+            "countpkg.sub:C.h": 1,
+            # Module-level code runs once, on import.
+            "countpkg:<module>": 1,
+            "countpkg.sub:<module>": 1,
+            "countpkg.sub:C": 1,
+        }
+        # Sorted by descending count, then name.
+        assert list(counts)[:3] == ["countpkg:f", "countpkg:g", "countpkg.sub:<module>"]
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof call counts:"
+        assert errlines[2].split() == ["countpkg:f()", "3"]
+
+    def test_module(self, package):
+        with count_calls("countpkg.sub", report_format="none") as counts:
+            work()
+
+        assert counts == {
+            "countpkg.sub:<module>": 1,
+            "countpkg.sub:C": 1,
+            "countpkg.sub:C.h": 1,
+        }
+
+    def test_restart(self, package):
+        # Code disabled as out of scope in one session is counted in the next.
+        with count_calls("countpkg.sub", report_format="none"):
+            work()
+        with count_calls("countpkg", report_format="none") as counts:
+            work()
+
+        assert counts["countpkg:f"] == 3
+
+    def test_json(self, package, tmp_path):
+        path = tmp_path / "counts.json"
+
+        with count_calls(
+            "countpkg", label="run", json_path=str(path), report_format="none"
+        ):
+            work()
+
+        data = json.loads(path.read_text())
+        assert data["version"] == 1
+        assert data["label"] == "run"
+        assert data["counts"][0] == {"name": "countpkg:f", "calls": 3}
+
+    def test_csv(self, package, capsys):
+        with count_calls("countpkg.sub", label="run", report_format="csv"):
+            work()
+
+        assert capsys.readouterr().err.splitlines() == [
+            "label,name,calls",
+            "run,countpkg.sub:<module>,1",
+            "run,countpkg.sub:C,1",
+            "run,countpkg.sub:C.h,1",
+        ]
+
+    def test_nothing_counted(self, package, capsys):
+        with count_calls("countpkg", report_format="plain") as counts:
+            pass
+
+        assert counts == {}
+        assert capsys.readouterr().err.splitlines()[1] == "No calls counted."
+
+    def test_exception(self, package, capsys):
+        with (
+            pytest.raises(ZeroDivisionError),
+            count_calls("countpkg") as counts,
+        ):
+            work()
+            1 / 0  # noqa: B018
+
+        assert counts["countpkg:f"] == 3
+        assert capsys.readouterr().err == ""
+
+    def test_unknown_module(self):
+        with pytest.raises(ValueError) as excinfo, count_calls("nonexistent_mod"):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == "Cannot find module 'nonexistent_mod'."
+
+    def test_builtin_module(self):
+        with pytest.raises(ValueError) as excinfo, count_calls("sys"):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == (
+            "Module 'sys' has no source file to count calls in."
+        )
+
+    def test_no_modules(self):
+        with pytest.raises(ValueError) as excinfo, count_calls():
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == "At least one module must be provided."
+
+    def test_invalid_count_scope(self):
+        with pytest.raises(TypeError) as excinfo:
+            record.configure((), 0, None, False, 0, None, "perf_counter", None, (1,))  # type: ignore [arg-type]
+
+        assert str(excinfo.value) == (
+            "configure() count scope must be a tuple of str or None"
+        )
+
+
+class TestMain:
+    def test_count_only(self, package, capsys):
+        (package / "example.py").write_text(
+            "import countpkg\n\nfor _ in range(5):\n    countpkg.f()\n"
+        )
+
+        with chdir(package):
+            result = main(
+                ["--count-only", "countpkg", "--format", "plain", "example.py"]
+            )
+
+        assert result == 0
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof call counts:"
+        assert errlines[2].split() == ["countpkg:f()", "5"]
+
+    def test_count_only_unknown_module(self, tmp_path, capsys):
+        (tmp_path / "example.py").write_text("")
+
+        with chdir(tmp_path):
+            result = main(["--count-only", "nonexistent_mod", "example.py"])
+
+        assert result == 2
+        assert capsys.readouterr().err == (
+            "tprof: Cannot find module 'nonexistent_mod'.\n"
+        )
+
+    def test_count_only_with_target(self, capsys):
+        with pytest.raises(SystemExit) as excinfo:
+            main(["--count-only", "lib", "-t", "lib:f", "example.py"])
+
+        assert excinfo.value.code == 2
+        assert (
+            "argument --count-only: not allowed with -t or -r"
+            in capsys.readouterr().err
+        )
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import subprocess
+from contextlib import chdir
+from pathlib import Path
+
+import pytest
+
+from tprof.api import FunctionStats
+from tprof.diff import mann_whitney_p, p_values
+from tprof.main import main
+
+BENCH = """\
+import time
+
+def work():
+    time.sleep({seconds})
+
+for _ in range(5):
+    work()
+"""
+
+
+def git(repo: Path, *args: str) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=tprof", "-c", "user.email=tprof@example.com", *args],
+        cwd=repo,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    git(tmp_path, "init", "-q")
+    (tmp_path / "bench.py").write_text(BENCH.format(seconds=0.001))
+    git(tmp_path, "add", "bench.py")
+    git(tmp_path, "commit", "-q", "-m", "Base")
+    git(tmp_path, "tag", "base")
+    (tmp_path / "bench.py").write_text(BENCH.format(seconds=0.01))
+    git(tmp_path, "commit", "-q", "-a", "-m", "Head")
+    return tmp_path
+
+
+class TestDiff:
+    def test_diff(self, repo, capsys):
+        (repo / "bench.py").write_text("raise SystemExit('Uncommitted')\n")
+        json_path = repo / "head.json"
+
+        with chdir(repo):
+            result = main(
+                ["diff", "base", "HEAD", "--runs", "4", "-t", "work"]
+                + ["--format", "plain", "--json", str(json_path), "-m", "bench"]
+            )
+
+        assert result == 0
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof results @ HEAD vs base:"
+        assert "delta" in errlines[1]
+        assert errlines[2].startswith(" bench:work() ")
+        # Four runs a side are enough to be significant.
+        assert "(p=0.029)" in errlines[2]
+        (function_data,) = json.loads(json_path.read_text())["functions"]
+        assert function_data["calls"] == 20
+        assert function_data["median_ns"] >= 10_000_000
+        assert len(function_data["run_medians_ns"]) == 4
+        # The working tree and its worktrees are as they were.
+        assert git(repo, "status", "--porcelain") == " M bench.py\n?? head.json\n"
+        assert len(git(repo, "worktree", "list").splitlines()) == 1
+
+    def test_subdirectory_script(self, repo, capsys):
+        (repo / "scripts").mkdir()
+        # bench is importable from the worktree's root.
+        (repo / "scripts" / "run.py").write_text("import bench\n\nbench.work()\n")
+        git(repo, "add", "scripts")
+        git(repo, "commit", "-q", "-m", "Script")
+
+        with chdir(repo / "scripts"):
+            result = main(
+                ["diff", "HEAD", "HEAD", "--runs", "1", "-t", "bench:work"]
+                + ["--format", "csv", "run.py"]
+            )
+
+        assert result == 0
+        header, row = capsys.readouterr().err.splitlines()
+        assert row.startswith("HEAD vs HEAD,bench:work,function,1,")
+        values = dict(zip(header.split(","), row.split(","), strict=True))
+        assert values["runs"] == "1"
+        assert values["run_stdev_ns"] == ""
+        assert values["delta_p_value"] == "1.0"
+
+    def test_missing_directory(self, repo, capsys):
+        (repo / "scripts").mkdir()
+        (repo / "scripts" / "run.py").write_text("")
+        git(repo, "add", "scripts")
+        git(repo, "commit", "-q", "-m", "Script")
+
+        with chdir(repo / "scripts"):
+            result = main(["diff", "base", "HEAD", "-t", "bench:work", "run.py"])
+
+        assert result == 1
+        assert capsys.readouterr().err == (
+            "tprof: The directory 'scripts' doesn't exist at revision 'base'.\n"
+        )
+        assert len(git(repo, "worktree", "list").splitlines()) == 1
+
+    def test_run_fails(self, repo, capsys):
+        with chdir(repo):
+            result = main(["diff", "base", "HEAD", "-t", "work", "missing.py"])
+
+        assert result == 1
+        assert capsys.readouterr().err.endswith(
+            "tprof: Run 1 of base failed with exit code 1.\n"
+        )
+
+    def test_revisions_required(self, capsys):
+        with pytest.raises(SystemExit) as excinfo:
+            main(["diff", "-t", "work", "-m", "bench"])
+
+        assert excinfo.value.code == 2
+        assert capsys.readouterr().err.endswith(
+            "tprof diff: error: the following arguments are required: base, head\n"
+        )
+
+    def test_unknown_revision(self, repo, capsys):
+        with chdir(repo):
+            result = main(["diff", "nope", "HEAD", "-t", "work", "-m", "bench"])
+
+        assert result == 1
+        assert capsys.readouterr().err == "tprof: Unknown git revision 'nope'.\n"
+
+    def test_not_repository(self, tmp_path, capsys):
+        with chdir(tmp_path):
+            result = main(["diff", "main", "HEAD", "-t", "work", "-m", "bench"])
+
+        assert result == 1
+        assert capsys.readouterr().err.startswith(
+            "tprof: git rev-parse --show-toplevel failed: fatal: not a git repository"
+        )
+
+
+class TestMannWhitneyP:
+    def test_separated(self):
+        assert mann_whitney_p([1, 2, 3, 4, 5], [6, 7, 8, 9, 10]) == 2 / 252
+        assert mann_whitney_p([6, 7, 8, 9, 10], [1, 2, 3, 4, 5]) == 2 / 252
+
+    def test_same(self):
+        assert mann_whitney_p([1, 2, 3], [1, 2, 3]) == 1.0
+
+    def test_interleaved(self):
+        # U is 2, and 4 of the 20 orderings have U at most 2.
+        assert mann_whitney_p([1, 3, 5], [2, 6, 7]) == pytest.approx(2 * 4 / 20)
+
+    def test_single(self):
+        assert mann_whitney_p([1], [2]) == 1.0
+
+
+class TestPValues:
+    def test_p_values(self):
+        def stats(name: str, run_medians: list[float] | None) -> FunctionStats:
+            return FunctionStats(name, 1, 1, 1, 1, 1.0, 0.0, run_medians=run_medians)
+
+        base = [stats("lib:f", [1.0, 2.0]), stats("lib:g", [1.0]), stats("lib:h", [])]
+        head = [stats("lib:f", [3.0, 4.0]), stats("lib:g", None), stats("lib:h", [1.0])]
+
+        assert p_values(base, head) == {"lib:f": pytest.approx(1 / 3)}
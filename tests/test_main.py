@@ -11,8 +11,14 @@ from unittest import mock
 import pytest
 from rich.console import Console
 
-from tprof import __main__  # noqa: F401
+from tprof import (
+    __main__,  # noqa: F401
+    record,
+)
 from tprof import api as tprof_api
+from tprof import attach as tprof_attach
+from tprof import auto as tprof_auto
+from tprof.api import FunctionStats
 from tprof.main import main
 
 
@@ -110,6 +116,95 @@ def test_main_script(tmp_path, capsys):
     assert errlines[2].startswith(" pathlib:Path.__new__() ")
 
 
+def test_main_no_targets(tmp_path, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(["example.py"])
+
+    assert excinfo.value.code == 2
+    out, err = capsys.readouterr()
+    assert "at least one of the arguments -t -r --auto --count-only is required" in err
+
+
+@mock.patch.object(tprof_auto, "DISCOVERY_DURATION", 0.1)
+def test_main_auto(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(
+        dedent(
+            """\
+            import time
+
+            def work():
+                time.sleep(0.002)
+
+            deadline = time.monotonic() + 0.4
+            while time.monotonic() < deadline:
+                work()
+            """
+        )
+    )
+    json_path = tmp_path / "tprof.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(["--auto", "1", "--json", str(json_path), "-m", "example"])
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    (function_data,) = json.loads(json_path.read_text())["functions"]
+    assert function_data["name"] == "example:work"
+    assert function_data["calls"] > 0
+    errlines = capsys.readouterr().err.splitlines()
+    assert errlines[0] == "🎯 tprof discovered targets: -t example:work"
+
+
+def test_main_auto_with_targets(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(["--auto", "1", "-t", "example:work", "example.py"])
+
+    assert excinfo.value.code == 2
+    assert "argument --auto: not allowed with -t or -r" in capsys.readouterr().err
+
+
+def test_main_auto_invalid(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(["--auto", "0", "example.py"])
+
+    assert excinfo.value.code == 2
+    assert "invalid count '0', expected a positive integer" in capsys.readouterr().err
+
+
+def test_main_region(tmp_path, capsys):
+    path = tmp_path / "example.py"
+    path.write_text(
+        dedent(
+            """\
+            import tprof
+
+            def work():
+                pass
+
+            for _ in range(10):
+                with tprof.region("loop"):
+                    work()
+            """
+        )
+    )
+
+    try:
+        with chdir(tmp_path):
+            result = main(["-t", "work", "-r", "loop", "-m", "example"])
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    out, err = capsys.readouterr()
+    errlines = err.splitlines()
+    assert len(errlines) == 4
+    assert errlines[2].startswith(" example:work() ")
+    assert errlines[3].startswith(" loop ")
+    assert " 10 " in errlines[3]
+
+
 def test_main_module(tmp_path, capsys):
     path = tmp_path / "example.py"
     path.write_text(
@@ -227,6 +322,362 @@ def test_main_json_stdout(tmp_path, capsys):
     assert data["version"] == 1
 
 
+def test_main_trace(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+    trace_path = tmp_path / "trace.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(["-t", "snooze", "--trace", str(trace_path), "-m", "example"])
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    data = json.loads(trace_path.read_text())
+    events = [e for e in data["traceEvents"] if e["ph"] == "X"]
+    assert len(events) == 5
+    assert all(e["name"] == "example:snooze" for e in events)
+    assert all(e["dur"] >= 1_000 for e in events)
+
+
+def test_main_openmetrics(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+    metrics_path = tmp_path / "tprof.prom"
+
+    try:
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "snooze", "--openmetrics", str(metrics_path), "-m", "example"]
+            )
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    lines = metrics_path.read_text().splitlines()
+    assert 'tprof_calls_total{target="example:snooze"} 5' in lines
+    assert 'tprof_duration_seconds_bucket{target="example:snooze",le="+Inf"} 5' in lines
+    assert lines[-1] == "# EOF"
+
+
+def test_main_memory(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+    json_path = tmp_path / "tprof.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "snooze", "--memory", "--json", str(json_path), "-m", "example"]
+            )
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    (function_data,) = json.loads(json_path.read_text())["functions"]
+    assert function_data["calls"] == 5
+    assert "median_allocs" in function_data
+    assert "allocs" in capsys.readouterr().err
+
+
+def test_main_exclude_gc(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(
+        "import gc\n\ndef collect():\n    gc.collect()\n\ncollect()\n"
+    )
+    json_path = tmp_path / "tprof.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "collect", "--exclude-gc", "--json", str(json_path)]
+                + ["-m", "example"]
+            )
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    (function_data,) = json.loads(json_path.read_text())["functions"]
+    assert function_data["collections"] == 1
+    assert function_data["median_ns"] == function_data["gc_exclusive_median_ns"]
+    assert function_data["median_ns"] < function_data["gc_inclusive_median_ns"]
+    assert "excl. gc" in capsys.readouterr().err
+
+
+def test_main_tags(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(
+        dedent(
+            """\
+            import tprof
+
+            def handle():
+                pass
+
+            for tenant in ("a", "b", "a"):
+                tprof.set_tag(tenant)
+                handle()
+            """
+        )
+    )
+    json_path = tmp_path / "tprof.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "handle", "--tags", "--json", str(json_path)]
+                + ["--format", "plain", "-m", "example"]
+            )
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    (function_data,) = json.loads(json_path.read_text())["functions"]
+    assert sorted((tag["tag"], tag["calls"]) for tag in function_data["tags"]) == [
+        ("a", 2),
+        ("b", 1),
+    ]
+    assert "example:handle() by tag:" in capsys.readouterr().err.splitlines()
+
+
+def test_main_builtin(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(
+        dedent(
+            """\
+            import math
+
+            for n in range(3):
+                math.factorial(n)
+            """
+        )
+    )
+
+    try:
+        with chdir(tmp_path):
+            result = main(["-t", "math:factorial", "-m", "example"])
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    errlines = capsys.readouterr().err.splitlines()
+    assert errlines[2].startswith(" math:factorial() ")
+    assert errlines[2].split()[1] == "3"
+
+
+def test_main_size_arg(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(
+        dedent(
+            """\
+            def scan(items):
+                return sum(items)
+
+            for size in (1, 10, 100):
+                scan(list(range(size)))
+            """
+        )
+    )
+
+    try:
+        with chdir(tmp_path):
+            result = main(["-t", "scan", "--size-arg", "scan=items", "-m", "example"])
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    err = capsys.readouterr().err
+    assert "example:scan() by len(items):" in err
+    assert "Fitted exponent: " in err
+
+
+def test_main_size_arg_not_target(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(["-t", "lib:a", "--size-arg", "lib:b=items", "example.py"])
+
+    assert excinfo.value.code == 2
+    assert "--size-arg target 'lib:b' is not a -t target" in capsys.readouterr().err
+
+
+def test_main_size_arg_invalid(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(["-t", "lib:a", "--size-arg", "lib:a", "example.py"])
+
+    assert excinfo.value.code == 2
+    assert (
+        "invalid size argument 'lib:a', expected target=argument"
+        in capsys.readouterr().err
+    )
+
+
+@mock.patch.object(tprof_api, "WARMUP_TOLERANCE", 1.0)
+def test_main_skip_warmup(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(
+        dedent(
+            """\
+            import time
+
+            def sample(i):
+                time.sleep(0.015 if i < 3 else 0.003)
+
+            for i in range(20):
+                sample(i)
+            """
+        )
+    )
+    json_path = tmp_path / "tprof.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "sample", "--skip-warmup", "--json", str(json_path)]
+                + ["-m", "example"]
+            )
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    (function_data,) = json.loads(json_path.read_text())["functions"]
+    assert function_data["calls"] == 17
+    assert function_data["warmup_calls"] == 3
+    assert "warmup median" in capsys.readouterr().err
+
+
+def test_main_slow(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+    json_path = tmp_path / "tprof.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "snooze", "--slow", "1ms", "--json", str(json_path)]
+                + ["-m", "example"]
+            )
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    slow_calls = json.loads(json_path.read_text())["slow_calls"]
+    assert len(slow_calls) == 5
+    assert slow_calls[0]["name"] == "example:snooze"
+    assert "slowest calls over 1.00ms:" in capsys.readouterr().err
+
+
+def test_main_clock(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+    json_path = tmp_path / "tprof.json"
+
+    try:
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "snooze", "--clock", record.clocks()[-1]]
+                + ["--json", str(json_path), "-m", "example"]
+            )
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    (function_data,) = json.loads(json_path.read_text())["functions"]
+    assert function_data["min_ns"] >= 1_000_000
+
+
+def test_main_format_tsv(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+
+    try:
+        with chdir(tmp_path):
+            result = main(["-t", "snooze", "--format", "tsv", "-m", "example"])
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    header, row = capsys.readouterr().err.splitlines()
+    assert header.split("\t")[:4] == ["label", "name", "kind", "calls"]
+    assert row.split("\t")[:4] == ["", "example:snooze", "function", "5"]
+
+
+def test_main_clock_unavailable(capsys):
+    with (
+        mock.patch.object(record, "clocks", return_value=("perf_counter",)),
+        pytest.raises(SystemExit) as excinfo,
+    ):
+        main(["-t", "lib:a", "--clock", "tsc", "example.py"])
+
+    assert excinfo.value.code == 2
+    assert "clock 'tsc' is not available on this platform" in capsys.readouterr().err
+
+
+def test_main_slow_invalid(capsys):
+    with pytest.raises(SystemExit) as excinfo:
+        main(["-t", "lib:a", "--slow", "50", "example.py"])
+
+    assert excinfo.value.code == 2
+    assert (
+        "invalid duration '50', expected a number with unit ns, us, ms, or s"
+        in capsys.readouterr().err
+    )
+
+
+def test_main_store_and_history(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+    store_path = tmp_path / "tprof.sqlite"
+
+    try:
+        with chdir(tmp_path):
+            for label in ["one", "two"]:
+                result = main(
+                    [
+                        "-t",
+                        "snooze",
+                        "--store",
+                        str(store_path),
+                        "--label",
+                        label,
+                        "-m",
+                        "example",
+                    ]
+                )
+                assert result == 0
+    finally:
+        sys.modules.pop("example", None)
+
+    out, err = capsys.readouterr()
+    assert err.splitlines()[0] == "🎯 tprof results @ one:"
+
+    result = main(["history", "--store", str(store_path), "-t", "example:snooze"])
+
+    assert result == 0
+    out, err = capsys.readouterr()
+    errlines = err.splitlines()
+    assert errlines[0] == "🎯 tprof history for example:snooze:"
+    assert len(errlines) == 5
+    assert " one " in errlines[3]
+    assert " two " in errlines[4]
+
+
+def test_main_invalid_store(tmp_path, capsys):
+    (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
+    store_path = tmp_path / "tprof.sqlite"
+    store_path.write_text("not a database")
+
+    try:
+        with chdir(tmp_path):
+            result = main(["-t", "snooze", "--store", str(store_path), "-m", "example"])
+    finally:
+        sys.modules.pop("example", None)
+
+    assert result == 0
+    out, err = capsys.readouterr()
+    errlines = err.splitlines()
+    assert errlines[0].startswith(f"tprof: Couldn't save run to {store_path}: ")
+    assert errlines[1] == "🎯 tprof results:"
+
+
+def test_main_history_invalid_store(tmp_path, capsys):
+    store_path = tmp_path / "tprof.sqlite"
+    store_path.write_text("not a database")
+
+    result = main(["history", "--store", str(store_path), "-t", "example:snooze"])
+
+    assert result == 2
+    out, err = capsys.readouterr()
+    assert err.startswith("tprof: ")
+
+
 def test_main_baseline(tmp_path, capsys):
     (tmp_path / "example.py").write_text(SLEEPY_SCRIPT)
     json_path = tmp_path / "tprof.json"
@@ -270,3 +721,42 @@ def test_main_baseline_and_compare(tmp_path, capsys):
     assert excinfo.value.code == 2
     out, err = capsys.readouterr()
     assert "not allowed with argument" in err
+
+
+def test_main_attach(tmp_path, capsys):
+    json_path = tmp_path / "tprof.json"
+    results = [FunctionStats("example:snooze", 2, 4_000, 1_000, 3_000, 2_000.0, 0.0)]
+
+    with mock.patch.object(tprof_attach, "attach", return_value=results) as attach:
+        result = main(
+            [
+                "attach",
+                "1234",
+                "-t",
+                "example:snooze",
+                "--duration",
+                "5",
+                "--json",
+                str(json_path),
+            ]
+        )
+
+    assert result == 0
+    attach.assert_called_once_with(1234, ["example:snooze"], 5.0)
+    out, err = capsys.readouterr()
+    errlines = err.splitlines()
+    assert errlines[0] == "🎯 tprof results @ PID 1234:"
+    assert errlines[2].startswith(" example:snooze() ")
+    data = json.loads(json_path.read_text())
+    assert data["functions"][0]["calls"] == 2
+
+
+def test_main_attach_error(capsys):
+    with mock.patch.object(
+        tprof_attach, "attach", side_effect=ProcessLookupError("No such process")
+    ):
+        result = main(["attach", "1234", "-t", "example:snooze"])
+
+    assert result == 1
+    out, err = capsys.readouterr()
+    assert err == "tprof: No such process\n"
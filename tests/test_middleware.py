@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+
+from tprof import record
+from tprof.middleware import (
+    OTHER_ROUTE,
+    ASGIMiddleware,
+    WSGIMiddleware,
+    route_var,
+    set_route,
+)
+
+
+def lookup(key: str) -> str:
+    return key
+
+
+def render() -> None:
+    time.sleep(0.001)
+
+
+def wsgi_app(environ: dict[str, Any], start_response: Any) -> list[bytes]:
+    path = environ["PATH_INFO"]
+    if path == "/fail":
+        raise ValueError("Failure")
+    if path.startswith("/items/"):
+        set_route("/items/{id}")
+        lookup(path)
+        lookup(path)
+    render()
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [b"app"]
+
+
+def lazy_wsgi_app(environ: dict[str, Any], start_response: Any) -> Iterator[bytes]:
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    yield b"first"
+    render()
+    yield b"second"
+
+
+def call_wsgi(
+    app: WSGIMiddleware, path: str, authorization: str | None = None
+) -> tuple[str, bytes]:
+    environ = {"REQUEST_METHOD": "GET", "PATH_INFO": path, "REMOTE_ADDR": "127.0.0.1"}
+    if authorization is not None:
+        environ["HTTP_AUTHORIZATION"] = authorization
+    statuses = []
+
+    def start_response(status: str, headers: list[tuple[str, str]]) -> None:
+        statuses.append(status)
+
+    body = b"".join(app(environ, start_response))
+    return statuses[0], body
+
+
+async def asgi_app(scope: dict[str, Any], receive: Any, send: Any) -> None:
+    if scope["path"].startswith("/items/"):
+        set_route("/items/{id}")
+        lookup(scope["path"])
+    render()
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"app"})
+
+
+def call_asgi(
+    app: ASGIMiddleware, path: str, authorization: bytes | None = None
+) -> list[dict[str, Any]]:
+    headers = [(b"authorization", authorization)] if authorization is not None else []
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "client": ("127.0.0.1", 1234),
+        "headers": headers,
+    }
+    messages: list[dict[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+def routes_by_name(stats: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    return {route["route"]: route for route in stats["routes"]}
+
+
+class TestWSGIMiddleware:
+    def test_routes(self):
+        app = WSGIMiddleware(wsgi_app, lookup, render)
+        try:
+            for path in ("/items/1", "/items/2", "/items/3", "/health"):
+                assert call_wsgi(app, path) == ("200 OK", b"app")
+            stats = app.stats()
+        finally:
+            app.close()
+
+        assert stats["version"] == 1
+        totals = [route["total_ns"] for route in stats["routes"]]
+        assert totals == sorted(totals, reverse=True)
+        routes = routes_by_name(stats)
+        assert set(routes) == {"/items/{id}", "/health"}
+        items = routes["/items/{id}"]
+        assert items["requests"] == 3
+        assert items["total_ns"] >= 3_000_000
+        targets = {target["name"]: target for target in items["targets"]}
+        lookup_json = targets[f"{__name__}:lookup"]
+        render_json = targets[f"{__name__}:render"]
+        assert lookup_json["kind"] == "function"
+        assert lookup_json["calls"] == 6
+        assert lookup_json["calls_per_request"] == 2.0
+        assert render_json["calls"] == 3
+        assert render_json["ns_per_request"] >= 1_000_000
+        assert 0 < render_json["share"] <= 1
+        (health_render,) = routes["/health"]["targets"]
+        assert health_render["name"] == f"{__name__}:render"
+        assert health_render["calls"] == 1
+
+    def test_route_callable(self):
+        app = WSGIMiddleware(
+            wsgi_app, render, route=lambda environ: environ["REQUEST_METHOD"]
+        )
+        try:
+            call_wsgi(app, "/health")
+            call_wsgi(app, "/other")
+            stats = app.stats()
+        finally:
+            app.close()
+
+        (route,) = stats["routes"]
+        assert route["route"] == "GET"
+        assert route["requests"] == 2
+        assert route["targets"][0]["calls"] == 2
+
+    def test_lazy_body(self):
+        app = WSGIMiddleware(lazy_wsgi_app, render)
+        try:
+            assert call_wsgi(app, "/stream") == ("200 OK", b"firstsecond")
+            stats = app.stats()
+        finally:
+            app.close()
+
+        (route,) = stats["routes"]
+        assert route["route"] == "/stream"
+        assert route["total_ns"] >= 1_000_000
+        assert route["targets"][0]["calls"] == 1
+
+    def test_raises(self):
+        app = WSGIMiddleware(wsgi_app, render)
+        try:
+            with pytest.raises(ValueError):
+                call_wsgi(app, "/fail")
+            stats = app.stats()
+        finally:
+            app.close()
+
+        (route,) = stats["routes"]
+        assert route["route"] == "/fail"
+        assert route["requests"] == 1
+        assert route["targets"] == []
+
+    def test_outside_requests(self):
+        app = WSGIMiddleware(wsgi_app, render)
+        try:
+            render()
+            call_wsgi(app, "/health")
+            stats = app.stats()
+        finally:
+            app.close()
+
+        (route,) = stats["routes"]
+        assert route["targets"][0]["calls"] == 1
+        assert route_var.get(None) is None
+
+    def test_route_limit(self):
+        app = WSGIMiddleware(wsgi_app, lookup)
+        try:
+            for n in range(record.TAG_LIMIT + 2):
+                call_wsgi(app, f"/health/{n}")
+                lookup(str(n))
+            call_wsgi(app, "/items/1")
+            stats = app.stats()
+        finally:
+            app.close()
+
+        routes = routes_by_name(stats)
+        assert len(routes) == record.TAG_LIMIT + 1
+        assert routes[OTHER_ROUTE]["requests"] == 3
+        (lookup_json,) = routes[OTHER_ROUTE]["targets"]
+        assert lookup_json["calls"] == 2
+
+    def test_endpoint(self):
+        app = WSGIMiddleware(
+            wsgi_app, render, endpoint_path="/_tprof", endpoint_token="secret"
+        )
+        try:
+            call_wsgi(app, "/health")
+            status, body = call_wsgi(app, "/_tprof", "Bearer secret")
+            # Even from a local address, such as a reverse proxy's, requests
+            # without the token pass through to the app.
+            _, no_token_body = call_wsgi(app, "/_tprof")
+            _, wrong_token_body = call_wsgi(app, "/_tprof", "Bearer guess")
+        finally:
+            app.close()
+
+        assert status == "200 OK"
+        (route,) = json.loads(body)["routes"]
+        assert route["route"] == "/health"
+        assert no_token_body == b"app"
+        assert wrong_token_body == b"app"
+
+    def test_endpoint_without_token(self):
+        with pytest.raises(ValueError) as excinfo:
+            WSGIMiddleware(wsgi_app, render, endpoint_path="/_tprof")
+
+        assert str(excinfo.value) == "endpoint_path requires an endpoint_token."
+
+    def test_dump_on_close(self, tmp_path):
+        path = tmp_path / "routes-{pid}.json"
+
+        app = WSGIMiddleware(wsgi_app, render, json_path=str(path))
+        call_wsgi(app, "/health")
+        app.close()
+
+        written = tmp_path / f"routes-{os.getpid()}.json"
+        (route,) = json.loads(written.read_text())["routes"]
+        assert route["route"] == "/health"
+        assert list(tmp_path.iterdir()) == [written]
+
+    def test_periodic_dump(self, tmp_path):
+        path = tmp_path / "routes.json"
+
+        app = WSGIMiddleware(wsgi_app, render, json_path=str(path), dump_interval=0.01)
+        try:
+            call_wsgi(app, "/health")
+            deadline = time.monotonic() + 10
+            while not path.exists() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert path.exists()
+        finally:
+            app.close()
+
+    def test_dump_without_path(self):
+        app = WSGIMiddleware(wsgi_app, render)
+        try:
+            with pytest.raises(ValueError) as excinfo:
+                app.dump()
+        finally:
+            app.close()
+
+        assert str(excinfo.value) == "No json_path to dump to."
+
+
+class TestASGIMiddleware:
+    def test_routes(self):
+        app = ASGIMiddleware(asgi_app, lookup, render)
+        try:
+            for path in ("/items/1", "/items/2", "/health"):
+                messages = call_asgi(app, path)
+                assert messages[-1]["body"] == b"app"
+            stats = app.stats()
+        finally:
+            app.close()
+
+        totals = [route["total_ns"] for route in stats["routes"]]
+        assert totals == sorted(totals, reverse=True)
+        routes = routes_by_name(stats)
+        assert set(routes) == {"/items/{id}", "/health"}
+        items = routes["/items/{id}"]
+        assert items["requests"] == 2
+        assert {target["name"]: target["calls"] for target in items["targets"]} == {
+            f"{__name__}:lookup": 2,
+            f"{__name__}:render": 2,
+        }
+        assert route_var.get(None) is None
+
+    def test_route_callable(self):
+        app = ASGIMiddleware(asgi_app, render, route=lambda scope: "all")
+        try:
+            call_asgi(app, "/health")
+            stats = app.stats()
+        finally:
+            app.close()
+
+        (route,) = stats["routes"]
+        assert route["route"] == "all"
+
+    def test_endpoint(self):
+        app = ASGIMiddleware(
+            asgi_app, render, endpoint_path="/_tprof", endpoint_token="secret"
+        )
+        try:
+            call_asgi(app, "/health")
+            start, body = call_asgi(app, "/_tprof", b"Bearer secret")
+            remote_messages = call_asgi(app, "/_tprof")
+        finally:
+            app.close()
+
+        assert start["status"] == 200
+        assert (b"content-type", b"application/json") in start["headers"]
+        (route,) = json.loads(body["body"])["routes"]
+        assert route["route"] == "/health"
+        assert remote_messages[-1]["body"] == b"app"
+
+    def test_lifespan(self):
+        scopes = []
+
+        async def app(scope: dict[str, Any], receive: Any, send: Any) -> None:
+            scopes.append(scope)
+
+        async def receive() -> dict[str, Any]:
+            return {"type": "lifespan.startup"}
+
+        async def send(message: dict[str, Any]) -> None:
+            pass
+
+        middleware = ASGIMiddleware(app, render)
+        try:
+            asyncio.run(middleware({"type": "lifespan"}, receive, send))
+            stats = middleware.stats()
+        finally:
+            middleware.close()
+
+        assert scopes == [{"type": "lifespan"}]
+        assert stats["routes"] == []
+
+
+class TestConfigure:
+    def test_tag_var_invalid(self):
+        with pytest.raises(TypeError) as excinfo:
+            record.configure((), 0, None, False, 0, None, "perf_counter", "route")  # type: ignore [arg-type]
+
+        assert str(excinfo.value) == (
+            "configure() tag variable must be a ContextVar or None"
+        )
+
+    def test_no_tag_var(self):
+        record.configure((render.__code__,))
+        try:
+            record.py_start_callback(render.__code__, 0)
+            record.py_return_callback(render.__code__, 0, None)
+            assert record.tag_stats() == [None]
+            assert record.tags() == ()
+        finally:
+            record.configure(())
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from tprof import record
+from tprof.api import code_to_name, tprof
+from tprof.openmetrics import CONTENT_TYPE, generate, serve, write_textfile
+
+
+def snooze() -> None:
+    time.sleep(0.001)
+
+
+def fast() -> None:
+    pass
+
+
+HEADER = (
+    "# TYPE tprof_calls counter\n"
+    "# HELP tprof_calls Completed calls to tprof targets.\n"
+    "# TYPE tprof_duration_seconds histogram\n"
+    "# UNIT tprof_duration_seconds seconds\n"
+    "# HELP tprof_duration_seconds Durations of calls to tprof targets.\n"
+)
+
+
+class TestGenerate:
+    def test_no_targets(self):
+        assert generate() == HEADER + "# EOF\n"
+
+    def test_session_stopping(self, capsys):
+        with tprof(fast):
+            fast()
+            # As when scraping during teardown, after the names are cleared.
+            saved = dict(code_to_name)
+            code_to_name.clear()
+            text = generate()
+            code_to_name.update(saved)
+
+        assert text == HEADER + "# EOF\n"
+
+    def test_histogram(self, capsys):
+        with tprof(snooze):
+            snooze()
+            snooze()
+            text = generate((0.0005, 10.0))
+
+        lines = text.splitlines()
+        name = f"{__name__}:snooze"
+        assert lines[2] == f'tprof_calls_total{{target="{name}"}} 2'
+        assert lines[6:9] == [
+            f'tprof_duration_seconds_bucket{{target="{name}",le="0.0005"}} 0',
+            f'tprof_duration_seconds_bucket{{target="{name}",le="10.0"}} 2',
+            f'tprof_duration_seconds_bucket{{target="{name}",le="+Inf"}} 2',
+        ]
+        assert lines[9] == f'tprof_duration_seconds_count{{target="{name}"}} 2'
+        sum_line = lines[10]
+        assert sum_line.startswith(f'tprof_duration_seconds_sum{{target="{name}"}} ')
+        assert float(sum_line.rsplit(" ", 1)[1]) >= 0.002
+        assert lines[-1] == "# EOF"
+
+    def test_incremental(self, capsys):
+        with tprof(fast):
+            fast()
+            first = generate()
+            fast()
+            fast()
+            second = generate()
+
+        name = f"{__name__}:fast"
+        assert f'tprof_calls_total{{target="{name}"}} 1' in first.splitlines()
+        assert f'tprof_calls_total{{target="{name}"}} 3' in second.splitlines()
+        assert (
+            f'tprof_duration_seconds_bucket{{target="{name}",le="+Inf"}} 3'
+            in second.splitlines()
+        )
+
+    def test_changed_buckets(self, capsys):
+        with tprof(fast):
+            fast()
+            generate((1.0,))
+            fast()
+            text = generate((2.0,))
+
+        name = f"{__name__}:fast"
+        assert (
+            f'tprof_duration_seconds_bucket{{target="{name}",le="2.0"}} 2'
+            in text.splitlines()
+        )
+
+    def test_escapes_names(self, capsys):
+        with tprof(fast):
+            code_to_name[fast.__code__] = 'a"b\\c\nd'
+            text = generate()
+
+        assert 'tprof_calls_total{target="a\\"b\\\\c\\nd"} 0' in text.splitlines()
+
+
+class TestHistogram:
+    def test_invalid_argument(self):
+        with pytest.raises(TypeError):
+            record.histogram([1, 2])  # type: ignore [arg-type]
+
+    def test_unsorted_bounds(self):
+        with pytest.raises(ValueError) as excinfo:
+            record.histogram((2, 1))
+
+        assert str(excinfo.value) == (
+            "histogram() bucket bounds must be strictly increasing"
+        )
+
+    def test_reset_on_configure(self, capsys):
+        with tprof(fast):
+            fast()
+            record.histogram((1,))
+        with tprof(fast):
+            ((count, total_ns, cumulative),) = record.histogram((1,))
+
+        assert count == 0
+        assert total_ns == 0
+        assert cumulative == (0, 0)
+
+
+class TestWriteTextfile:
+    def test_success(self, tmp_path):
+        path = tmp_path / "tprof.prom"
+
+        write_textfile(str(path))
+
+        assert path.read_text() == HEADER + "# EOF\n"
+        assert list(tmp_path.iterdir()) == [path]
+
+
+class TestServe:
+    def test_metrics(self, capsys):
+        server = serve(0)
+        port = server.server_address[1]
+        try:
+            with tprof(fast):
+                fast()
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}/metrics"
+                ) as response:
+                    content_type = response.headers["Content-Type"]
+                    text = response.read().decode()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert content_type == CONTENT_TYPE
+        assert f'tprof_calls_total{{target="{__name__}:fast"}} 1' in text.splitlines()
+        assert capsys.readouterr().err.startswith("🎯 tprof results:")
+
+    def test_not_found(self):
+        server = serve(0)
+        port = server.server_address[1]
+        try:
+            with pytest.raises(urllib.error.HTTPError) as excinfo:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert excinfo.value.code == 404
+        excinfo.value.close()
@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import io
+import json
+from textwrap import dedent
+from unittest import mock
+
+import pytest
+from rich.console import Console
+from rich.table import Table
+
+from tprof import api as tprof_api
+from tprof import pytest_plugin
+
+HELPERS = dedent(
+    """\
+    import time
+
+    def fast():
+        pass
+
+    def slow():
+        time.sleep(0.002)
+    """
+)
+
+
+@pytest.fixture
+def pytester(pytester: pytest.Pytester) -> pytest.Pytester:
+    # Modules first imported during an in-process run are unloaded after it,
+    # which would leave tprof's Rich console using stale classes, so render a
+    # table now to import all that the report needs.
+    Console(file=io.StringIO()).print(Table("[bold]name[/bold]"))
+    pytester.makepyfile(helpers=HELPERS)
+    pytester.syspathinsert()
+    return pytester
+
+
+def test_inactive(pytester):
+    pytester.makepyfile(
+        """
+        def test_it():
+            pass
+        """
+    )
+
+    result = pytester.runpytest("-p", "no:randomly")
+
+    result.assert_outcomes(passed=1)
+    assert "tprof results" not in result.stderr.str()
+
+
+def test_target_option(pytester):
+    pytester.makepyfile(
+        """
+        from helpers import fast
+
+        def test_one():
+            fast()
+
+        def test_two():
+            fast()
+            fast()
+        """
+    )
+
+    result = pytester.runpytest("-p", "no:randomly", "--tprof-target", "helpers:fast")
+
+    result.assert_outcomes(passed=2)
+    errlines = result.stderr.lines
+    assert errlines[0] == "🎯 tprof results @ pytest:"
+    assert errlines[2].startswith(" helpers:fast() ")
+    assert " 3 " in errlines[2]
+
+
+def test_full_stats_once(pytester):
+    pytester.makepyfile(
+        """
+        from helpers import fast
+
+        def test_one():
+            fast()
+
+        def test_two():
+            fast()
+        """
+    )
+
+    with mock.patch.object(
+        pytest_plugin, "_collect_stats", wraps=tprof_api._collect_stats
+    ) as collect_stats:
+        result = pytester.runpytest(
+            "-p", "no:randomly", "--tprof-target", "helpers:fast"
+        )
+
+    result.assert_outcomes(passed=2)
+    # Tests only take timing statistics, with the rest once for the session.
+    collect_stats.assert_called_once_with()
+
+
+def test_target_option_invalid(pytester):
+    pytester.makepyfile(
+        """
+        def test_it():
+            pass
+        """
+    )
+
+    result = pytester.runpytest("-p", "no:randomly", "--tprof-target", "helpers:nope")
+
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+
+
+def test_marker_max_median_pass(pytester):
+    pytester.makepyfile(
+        """
+        import pytest
+        from helpers import fast
+
+        @pytest.mark.tprof(targets=["helpers:fast"], max_median="1s")
+        def test_it():
+            fast()
+        """
+    )
+
+    result = pytester.runpytest("-p", "no:randomly")
+
+    result.assert_outcomes(passed=1)
+
+
+def test_marker_max_median_fail(pytester):
+    pytester.makepyfile(
+        """
+        import pytest
+        from helpers import fast, slow
+
+        @pytest.mark.tprof(targets="helpers:slow", max_median="1ms")
+        def test_slow():
+            slow()
+
+        @pytest.mark.tprof(targets="helpers:fast", max_median="1ms")
+        def test_fast():
+            fast()
+            slow()
+        """
+    )
+
+    result = pytester.runpytest("-p", "no:randomly")
+
+    result.assert_outcomes(passed=1, failed=1)
+    result.stdout.fnmatch_lines(
+        ["*tprof: helpers:slow() median *ms exceeds max_median 1.00ms."]
+    )
+
+
+def test_marker_only_checks_own_calls(pytester):
+    pytester.makepyfile(
+        """
+        import pytest
+        from helpers import slow
+
+        def test_before():
+            slow()
+
+        @pytest.mark.tprof(targets="helpers:slow", max_median="1ms")
+        def test_no_calls():
+            pass
+        """
+    )
+
+    result = pytester.runpytest("-p", "no:randomly")
+
+    result.assert_outcomes(passed=2)
+
+
+def test_json_and_baseline(pytester):
+    pytester.makepyfile(
+        """
+        from helpers import fast
+
+        def test_it():
+            fast()
+        """
+    )
+    json_path = pytester.path / "tprof.json"
+
+    result = pytester.runpytest(
+        "-p",
+        "no:randomly",
+        "--tprof-target",
+        "helpers:fast",
+        "--tprof-json",
+        str(json_path),
+    )
+
+    result.assert_outcomes(passed=1)
+    data = json.loads(json_path.read_text())
+    assert data["label"] == "pytest"
+    (function_data,) = data["functions"]
+    assert function_data["name"] == "helpers:fast"
+    assert function_data["calls"] == 1
+    assert list(data["tests"]) == ["test_json_and_baseline.py::test_it"]
+    assert list(data["tests"]["test_json_and_baseline.py::test_it"]) == ["helpers:fast"]
+
+    result = pytester.runpytest(
+        "-p",
+        "no:randomly",
+        "--tprof-target",
+        "helpers:fast",
+        "--tprof-baseline",
+        str(json_path),
+        "--tprof-max-regression",
+        "1000000",
+    )
+
+    result.assert_outcomes(passed=1)
+
+
+def test_baseline_regression(pytester):
+    pytester.makepyfile(
+        """
+        from helpers import slow
+
+        def test_it():
+            slow()
+        """
+    )
+    json_path = pytester.path / "tprof.json"
+    json_path.write_text(
+        json.dumps(
+            {
+                "version": 1,
+                "label": None,
+                "functions": [{"name": "helpers:slow", "median_ns": 1_000.0}],
+                "tests": {
+                    "test_baseline_regression.py::test_it": {"helpers:slow": 1_000.0}
+                },
+            }
+        )
+    )
+
+    result = pytester.runpytest(
+        "-p",
+        "no:randomly",
+        "--tprof-target",
+        "helpers:slow",
+        "--tprof-baseline",
+        str(json_path),
+    )
+
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(
+        ["*tprof: helpers:slow() median *ms regressed +*% against baseline 1.00μs."]
+    )
+
+
+def test_baseline_per_test(pytester):
+    # One target with different workloads in each test is compared against
+    # each test's own median, not the whole session's.
+    pytester.makepyfile(
+        """
+        import time
+
+        def work(seconds):
+            time.sleep(seconds)
+
+        def test_small():
+            for _ in range(3):
+                work(0.001)
+
+        def test_large():
+            for _ in range(3):
+                work(0.02)
+        """
+    )
+    json_path = pytester.path / "tprof.json"
+    args = [
+        "-p",
+        "no:randomly",
+        "--tprof-target",
+        "test_baseline_per_test:work",
+        "--tprof-max-regression",
+        "50",
+    ]
+
+    result = pytester.runpytest(*args, "--tprof-json", str(json_path))
+
+    result.assert_outcomes(passed=2)
+    tests = json.loads(json_path.read_text())["tests"]
+    assert (
+        tests["test_baseline_per_test.py::test_small"]["test_baseline_per_test:work"]
+        < (
+            tests["test_baseline_per_test.py::test_large"][
+                "test_baseline_per_test:work"
+            ]
+        )
+    )
+
+    result = pytester.runpytest(*args, "--tprof-baseline", str(json_path))
+
+    result.assert_outcomes(passed=2)
+
+
+def test_baseline_new_test(pytester):
+    # Tests missing from the baseline aren't compared.
+    pytester.makepyfile(
+        """
+        from helpers import slow
+
+        def test_it():
+            slow()
+        """
+    )
+    json_path = pytester.path / "tprof.json"
+    json_path.write_text(
+        json.dumps(
+            {
+                "version": 1,
+                "label": None,
+                "functions": [{"name": "helpers:slow", "median_ns": 1_000.0}],
+                "tests": {"test_other.py::test_it": {"helpers:slow": 1_000.0}},
+            }
+        )
+    )
+
+    result = pytester.runpytest(
+        "--tprof-target", "helpers:slow", "--tprof-baseline", str(json_path)
+    )
+
+    result.assert_outcomes(passed=1)
+
+
+def test_baseline_invalid(pytester):
+    json_path = pytester.path / "tprof.json"
+    json_path.write_text("[]")
+
+    result = pytester.runpytest("--tprof-baseline", str(json_path))
+
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*tprof: Cannot load baseline from *"])
+
+
+def test_baseline_without_tests(pytester):
+    # The CLI's --json output has no per-test medians.
+    json_path = pytester.path / "tprof.json"
+    json_path.write_text(
+        json.dumps({"version": 1, "label": None, "functions": []}),
+    )
+
+    result = pytester.runpytest("--tprof-baseline", str(json_path))
+
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*tprof: Cannot load baseline from *: 'tests'"])
+
+
+def test_user_properties(pytester):
+    pytester.makepyfile(
+        """
+        from helpers import fast
+
+        def test_it():
+            fast()
+        """
+    )
+    pytester.makeconftest(
+        """
+        def pytest_runtest_logreport(report):
+            if report.when == "call":
+                print("PROPS", [name for name, _ in report.user_properties])
+        """
+    )
+
+    result = pytester.runpytest(
+        "-p", "no:randomly", "-s", "--tprof-target", "helpers:fast"
+    )
+
+    result.assert_outcomes(passed=1)
+    assert "PROPS ['tprof:helpers:fast:median_ns']" in result.stdout.str()
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import json
+import math
+import statistics
+import sys
+from contextlib import chdir
+
+import pytest
+
+from tprof.api import FunctionStats, SizeBucket, TagStats
+from tprof.main import main
+from tprof.runs import merge_runs, run_many
+
+SCRIPT = """\
+import time
+
+def nap():
+    time.sleep(0.001)
+
+for _ in range(5):
+    nap()
+"""
+
+
+class TestMergeRuns:
+    def test_merge(self):
+        first = [1.0, 2.0, 3.0]
+        second = [10.0, 20.0]
+        runs = [
+            [
+                FunctionStats(
+                    "lib:f",
+                    3,
+                    6,
+                    1,
+                    3,
+                    2.0,
+                    statistics.stdev(first),
+                    errors=1,
+                    success_median_ns=2.5,
+                    error_median_ns=1.0,
+                ),
+                FunctionStats("lib:g", 0, 0, 0, 0, 0.0, 0.0),
+            ],
+            [
+                FunctionStats(
+                    "lib:f",
+                    2,
+                    30,
+                    10,
+                    20,
+                    15.0,
+                    statistics.stdev(second),
+                    success_median_ns=15.0,
+                )
+            ],
+        ]
+
+        merged_f, merged_g = merge_runs(runs)
+
+        assert merged_f.name == "lib:f"
+        assert merged_f.calls == 5
+        assert merged_f.total_ns == 36
+        assert merged_f.min_ns == 1
+        assert merged_f.max_ns == 20
+        assert merged_f.median_ns == 8.5
+        assert math.isclose(merged_f.stdev_ns, statistics.stdev(first + second))
+        assert merged_f.errors == 1
+        assert merged_f.success_median_ns == 8.75
+        assert merged_f.error_median_ns == 1.0
+        assert merged_f.run_medians == [2.0, 15.0]
+        assert merged_f.run_stdev_ns == statistics.stdev([2.0, 15.0])
+        assert merged_f.total_bytes is None
+        assert merged_f.size_buckets is None
+        assert merged_g.calls == 0
+        assert merged_g.run_medians == []
+        assert merged_g.run_stdev_ns is None
+
+    def test_size_buckets_and_memory(self):
+        runs = [
+            [
+                FunctionStats(
+                    "lib:f",
+                    1,
+                    5,
+                    5,
+                    5,
+                    5.0,
+                    0.0,
+                    size_arg="items",
+                    size_buckets=[SizeBucket(2, 1, 3.0, 5.0)],
+                    total_bytes=100,
+                    median_bytes=100.0,
+                    total_allocs=2,
+                    median_allocs=2.0,
+                )
+            ]
+            for _ in range(2)
+        ]
+
+        (merged,) = merge_runs(runs)
+
+        assert merged.size_arg == "items"
+        assert merged.size_buckets is not None
+        (bucket,) = merged.size_buckets
+        assert (bucket.bits, bucket.calls, bucket.median_size) == (2, 2, 3.0)
+        assert merged.total_bytes == 200
+        assert merged.median_bytes == 100.0
+        assert merged.total_allocs == 4
+        assert merged.run_stdev_ns == 0.0
+
+    def test_gc(self):
+        runs = [
+            [
+                FunctionStats(
+                    "lib:f",
+                    2,
+                    40,
+                    10,
+                    30,
+                    20.0,
+                    0.0,
+                    collections=collections,
+                    gc_total_ns=gc_total_ns,
+                    gc_inclusive_median_ns=20.0,
+                    gc_exclusive_median_ns=exclusive,
+                )
+            ]
+            for collections, gc_total_ns, exclusive in ((1, 15, 12.5), (0, 0, 20.0))
+        ]
+
+        (merged,) = merge_runs(runs)
+
+        assert merged.collections == 1
+        assert merged.gc_total_ns == 15
+        assert merged.gc_inclusive_median_ns == 20.0
+        assert merged.gc_exclusive_median_ns == 16.25
+
+    def test_tags(self):
+        runs = [
+            [FunctionStats("lib:f", 3, 60, 10, 30, 20.0, 0.0, tags=tags)]
+            for tags in (
+                [TagStats("a", 2, 50, 25.0), TagStats("<untagged>", 1, 10, 10.0)],
+                [TagStats("b", 1, 40, 40.0), TagStats("a", 2, 20, 15.0)],
+                None,
+            )
+        ]
+
+        (merged,) = merge_runs(runs)
+
+        assert merged.tags is not None
+        assert [
+            (tag_stats.tag, tag_stats.calls, tag_stats.total_ns, tag_stats.median_ns)
+            for tag_stats in merged.tags
+        ] == [("a", 4, 70, 20.0), ("b", 1, 40, 40.0), ("<untagged>", 1, 10, 10.0)]
+
+    def test_no_tags(self):
+        stats = FunctionStats("lib:f", 1, 10, 10, 10, 10.0, 0.0)
+
+        (merged,) = merge_runs([[stats], [stats]])
+
+        assert merged.tags is None
+
+
+class TestRunMany:
+    def test_runs(self, tmp_path):
+        (tmp_path / "example.py").write_text(SCRIPT)
+
+        with chdir(tmp_path):
+            runs = run_many(["-t", "example:nap"], ["-m", "example"], 2, jobs=2)
+
+        assert [[stats.calls for stats in results] for results in runs] == [[5], [5]]
+
+    def test_failure(self, tmp_path):
+        (tmp_path / "example.py").write_text("raise SystemExit(3)\n")
+
+        with chdir(tmp_path), pytest.raises(RuntimeError) as excinfo:
+            run_many(["-t", "time:sleep"], ["example.py"], 1)
+
+        assert str(excinfo.value) == "Run 1 failed with exit code 3."
+
+
+class TestMain:
+    def test_runs(self, tmp_path, capsys):
+        (tmp_path / "example.py").write_text(SCRIPT)
+        json_path = tmp_path / "tprof.json"
+
+        with chdir(tmp_path):
+            result = main(
+                ["--runs", "3", "-t", "nap", "--json", str(json_path)]
+                + ["--format", "plain", "-m", "example"]
+            )
+
+        assert result == 0
+        (function_data,) = json.loads(json_path.read_text())["functions"]
+        assert function_data["name"] == "example:nap"
+        assert function_data["calls"] == 15
+        assert function_data["runs"] == 3
+        assert len(function_data["run_medians_ns"]) == 3
+        assert function_data["run_stdev_ns"] >= 0
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof results:"
+        assert "run σ" in errlines[1]
+        assert errlines[2].startswith(" example:nap() ")
+        assert "example" not in sys.modules
+
+    def test_not_allowed(self, capsys):
+        with pytest.raises(SystemExit) as excinfo:
+            main(["--runs", "2", "--slow", "1ms", "-t", "lib:f", "example.py"])
+
+        assert excinfo.value.code == 2
+        assert "argument --runs: not allowed with --slow" in capsys.readouterr().err
+
+    def test_failure(self, tmp_path, capsys):
+        (tmp_path / "example.py").write_text("raise SystemExit(1)\n")
+
+        with chdir(tmp_path):
+            result = main(["--runs", "2", "-t", "time:sleep", "example.py"])
+
+        assert result == 1
+        assert capsys.readouterr().err.endswith(
+            "tprof: Run 1 failed with exit code 1.\n"
+        )
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import json
+import statistics
+import time
+from contextlib import chdir
+
+import pytest
+
+from tprof import tprof
+from tprof.api import FunctionStats, _load_baseline, _read_json
+from tprof.main import main
+from tprof.runs import merge_runs
+from tprof.sketch import GAMMA, RELATIVE_ERROR, _index, merge_sketches, quantile
+
+
+def snooze(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def sketch_of(values: list[int]) -> dict[int, int]:
+    sketch: dict[int, int] = {}
+    for value in values:
+        sketch[_index(value)] = sketch.get(_index(value), 0) + 1
+    return sketch
+
+
+class TestQuantile:
+    @pytest.mark.parametrize("q", [0.0, 0.25, 0.5, 0.9, 1.0])
+    def test_relative_error(self, q):
+        values = [10 + 37 * n**2 for n in range(101)]
+        sketch = sketch_of(values)
+
+        estimate = quantile(sketch, q, min(values), max(values))
+
+        exact = values[round(q * (len(values) - 1))]
+        assert abs(estimate - exact) <= RELATIVE_ERROR * exact
+
+    def test_clamped(self):
+        assert quantile(sketch_of([1000]), 0.5, 1000, 1000) == 1000.0
+
+    def test_empty(self):
+        assert quantile({}, 0.5, 0, 0) == 0.0
+
+    def test_index(self):
+        assert _index(0) == 0
+        assert _index(1) == 0
+        for ns in (2, 99, 1_000_000, 10**12):
+            i = _index(ns)
+            assert GAMMA ** (i - 1) < ns <= GAMMA**i * (1 + 1e-9)
+
+
+class TestMergeSketches:
+    def test_merge(self):
+        assert merge_sketches([{3: 1, 1: 2}, {}, {1: 1, 2: 5}]) == {1: 3, 2: 5, 3: 1}
+
+    def test_merge_runs(self):
+        first = [1_000, 1_100, 1_200]
+        second = [5_000, 6_000]
+        runs = [
+            [
+                FunctionStats(
+                    "lib:f",
+                    len(values),
+                    sum(values),
+                    min(values),
+                    max(values),
+                    statistics.median(values),
+                    statistics.stdev(values),
+                    sketch=sketch_of(values),
+                )
+            ]
+            for values in (first, second)
+        ]
+
+        (merged,) = merge_runs(runs)
+
+        assert merged.sketch == sketch_of(first + second)
+        assert merged.median_ns == pytest.approx(1_200, rel=RELATIVE_ERROR)
+
+    def test_merge_runs_without_sketches(self):
+        with_sketch = FunctionStats("lib:f", 1, 10, 10, 10, 10.0, 0.0, sketch={})
+        without = FunctionStats("lib:f", 1, 30, 30, 30, 30.0, 0.0)
+
+        (merged,) = merge_runs([[with_sketch], [without]])
+
+        assert merged.sketch is None
+        assert merged.median_ns == 20.0
+
+
+class TestTprof:
+    def test_sketch(self, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(
+            snooze, sketch=True, json_path=str(path), report_format="none"
+        ) as results:
+            for _ in range(5):
+                snooze(0.001)
+            snooze(0.01)
+
+        (function_stats,) = results
+        assert function_stats.sketch is not None
+        assert sum(function_stats.sketch.values()) == 6
+        assert min(function_stats.sketch) == _index(function_stats.min_ns)
+        assert max(function_stats.sketch) == _index(function_stats.max_ns)
+        data = json.loads(path.read_text())
+        assert data["functions"][0]["sketch"]["relative_error"] == RELATIVE_ERROR
+        _, (read_stats,) = _read_json(str(path))
+        assert read_stats.sketch == function_stats.sketch
+
+    def test_not_called(self):
+        with tprof(snooze, sketch=True, report_format="none") as results:
+            pass
+
+        assert results[0].sketch == {}
+
+    def test_skip_warmup(self):
+        with (
+            pytest.raises(ValueError) as excinfo,
+            tprof(snooze, sketch=True, skip_warmup=True),
+        ):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == "sketch and skip_warmup may not be combined."
+
+
+class TestMain:
+    def test_merge(self, tmp_path, capsys):
+        shards = []
+        for n, seconds in enumerate((0.001, 0.002, 0.004)):
+            shard = tmp_path / f"shard-{n}.json"
+            with tprof(snooze, sketch=True, json_path=str(shard), report_format="none"):
+                for _ in range(3):
+                    snooze(seconds)
+            shards.append(str(shard))
+        merged_path = tmp_path / "all.json"
+
+        result = main(
+            ["merge", *shards, "-o", str(merged_path), "--format", "plain"]
+            + ["--label", "all"]
+        )
+
+        assert result == 0
+        (function_data,) = json.loads(merged_path.read_text())["functions"]
+        assert function_data["calls"] == 9
+        assert function_data["runs"] == 3
+        assert sum(count for _, count in function_data["sketch"]["buckets"]) == 9
+        assert 2_000_000 <= function_data["median_ns"] < 4_000_000
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof results @ all:"
+        assert errlines[2].startswith(f" {__name__}:snooze() ")
+        assert _load_baseline(str(merged_path)) == {
+            f"{__name__}:snooze": function_data["median_ns"]
+        }
+
+    def test_merge_unreadable(self, tmp_path, capsys):
+        path = tmp_path / "missing.json"
+
+        result = main(["merge", str(path)])
+
+        assert result == 2
+        assert capsys.readouterr().err.startswith(f"tprof: Cannot read {str(path)!r}:")
+
+    def test_sketch_option(self, tmp_path):
+        (tmp_path / "example.py").write_text(
+            "import time\n\ntime.sleep(0.001)\ntime.sleep(0.001)\n"
+        )
+        path = tmp_path / "tprof.json"
+
+        with chdir(tmp_path):
+            result = main(
+                ["-t", "time:sleep", "--sketch", "--json", str(path)]
+                + ["--format", "none", "example.py"]
+            )
+
+        assert result == 0
+        (function_data,) = json.loads(path.read_text())["functions"]
+        assert sum(count for _, count in function_data["sketch"]["buckets"]) == 2
+
+    def test_sketch_skip_warmup(self, capsys):
+        with pytest.raises(SystemExit) as excinfo:
+            main(["-t", "lib:f", "--sketch", "--skip-warmup", "example.py"])
+
+        assert excinfo.value.code == 2
+        assert (
+            "argument --sketch: not allowed with --skip-warmup"
+            in capsys.readouterr().err
+        )
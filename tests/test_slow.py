@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+import math
+import sys
+import threading
+import time
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from tprof import record, region, tprof
+from tprof import slow as tprof_slow
+
+
+def nap(ms: int, items: list[int] | None = None) -> None:
+    time.sleep(ms / 1000)
+
+
+class TestSlowThreshold:
+    def test_captured(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(nap, slow_threshold="5ms", json_path=str(path)):
+            nap(0)
+            nap(10, items=list(range(100)))
+            nap(20)
+
+        slow_calls = json.loads(path.read_text())["slow_calls"]
+        assert [slow_call["final_args"]["ms"] for slow_call in slow_calls] == [
+            "20",
+            "10",
+        ]
+        slowest, second = slow_calls
+        assert slowest["name"] == f"{__name__}:nap"
+        assert slowest["kind"] == "function"
+        assert slowest["duration_ns"] >= 20_000_000
+        assert slowest["final_args"]["items"] == "None"
+        assert second["final_args"]["items"] == "[0, 1, 2, 3, 4, 5, ...]"
+        assert slowest["thread_id"] == threading.get_native_id()
+        assert slowest["thread_name"] == "MainThread"
+        assert slowest["stack"][-1].endswith(" in nap")
+        assert slowest["stack"][-2].endswith(" in test_captured")
+        assert slowest["started_at"].endswith("+00:00")
+
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[3].startswith("🎯 tprof slowest calls over 5.00ms:")
+        assert errlines[4].startswith(f" {__name__}:nap() ")
+        assert errlines[5] == "   final args: ms=20, items=None"
+
+    def test_plain(self, capsys):
+        with tprof(nap, slow_threshold="1ms", report_format="plain"):
+            nap(2, items=[1])
+
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[3] == "🎯 tprof slowest calls over 1.00ms:"
+        assert errlines[4].startswith(f" {__name__}:nap() ")
+        assert errlines[5] == "   final args: ms=2, items=[1]"
+        assert errlines[-1].endswith(" in nap")
+
+    def test_delimited(self, capsys):
+        with tprof(nap, slow_threshold="1ms", report_format="csv"):
+            nap(2)
+
+        assert "slowest" not in capsys.readouterr().err
+
+    def test_none(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(nap, slow_threshold="1s", json_path=str(path)):
+            nap(0)
+
+        assert json.loads(path.read_text())["slow_calls"] == []
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[-1] == "No slow calls."
+
+    def test_disabled(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(nap, json_path=str(path)):
+            nap(0)
+
+        assert "slow_calls" not in json.loads(path.read_text())
+        assert "slowest" not in capsys.readouterr().err
+
+    def test_limit(self, capsys):
+        with (
+            mock.patch.object(tprof_slow, "SLOW_LIMIT", 2),
+            tprof(nap, slow_threshold="0ns"),
+        ):
+            for ms in (10, 1, 20, 2):
+                nap(ms)
+
+        err = capsys.readouterr().err
+        assert "ms=20," in err
+        assert "ms=10," in err
+        assert "ms=1," not in err
+        assert "ms=2," not in err
+
+    def test_threaded(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(nap, slow_threshold="1ms", json_path=str(path)):
+            thread = threading.Thread(target=nap, args=(2,), name="worker")
+            thread.start()
+            thread.join()
+
+        (slow_call,) = json.loads(path.read_text())["slow_calls"]
+        assert slow_call["thread_name"] == "worker"
+        assert slow_call["thread_id"] == thread.native_id
+
+    def test_raises(self, capsys, tmp_path):
+        def fail(ms: int) -> None:
+            nap(ms)
+            raise ValueError("Failure")
+
+        path = tmp_path / "tprof.json"
+
+        with (
+            tprof(fail, slow_threshold="1ms", json_path=str(path)),
+            pytest.raises(ValueError),
+        ):
+            fail(2)
+
+        (slow_call,) = json.loads(path.read_text())["slow_calls"]
+        assert slow_call["final_args"] == {"ms": "2"}
+
+    def test_region(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with (
+            tprof(region("work"), slow_threshold="1ms", json_path=str(path)),
+            region("work"),
+        ):
+            nap(2)
+
+        (slow_call,) = json.loads(path.read_text())["slow_calls"]
+        assert slow_call["kind"] == "region"
+        assert slow_call["final_args"] is None
+        assert slow_call["stack"][-1].endswith(" in test_region")
+        errlines = capsys.readouterr().err.splitlines()
+        assert errlines[4].startswith(" work ")
+
+    def test_builtin(self, capsys, tmp_path):
+        path = tmp_path / "tprof.json"
+
+        with tprof(math.factorial, slow_threshold="0ns", json_path=str(path)):
+            math.factorial(5)
+
+        (slow_call,) = json.loads(path.read_text())["slow_calls"]
+        assert slow_call["name"] == "math:factorial"
+        assert slow_call["final_args"] is None
+        assert slow_call["stack"][-1].endswith(" in test_builtin")
+
+    def test_reassigned_argument(self, capsys, tmp_path):
+        def drain(items: list[int]) -> None:
+            while items:
+                items = items[1:]
+
+        path = tmp_path / "tprof.json"
+
+        with tprof(drain, slow_threshold="0ns", json_path=str(path)):
+            drain([1, 2, 3])
+
+        (slow_call,) = json.loads(path.read_text())["slow_calls"]
+        assert slow_call["final_args"] == {"items": "[]"}
+
+    def test_repr_fails(self, capsys, tmp_path):
+        class Broken:
+            def __repr__(self) -> str:
+                raise RuntimeError("No repr")
+
+        path = tmp_path / "tprof.json"
+
+        with tprof(nap, slow_threshold="0ns", json_path=str(path)):
+            nap(0, items=Broken())  # type: ignore [arg-type]
+
+        (slow_call,) = json.loads(path.read_text())["slow_calls"]
+        assert slow_call["final_args"]["items"].startswith("<Broken instance at ")
+
+    def test_capture_fails(self, capsys):
+        unraisable: list[Any] = []
+
+        with (
+            mock.patch.object(
+                tprof_slow.SlowRecorder, "capture", side_effect=RuntimeError("Broken")
+            ),
+            mock.patch.object(sys, "unraisablehook", unraisable.append),
+            tprof(nap, slow_threshold="0ns"),
+        ):
+            nap(0)
+            nap(0)
+
+        assert [str(args.exc_value) for args in unraisable] == ["Broken", "Broken"]
+        errlines = capsys.readouterr().err.splitlines()
+        assert f" {__name__}:nap()" in errlines[2]
+
+    def test_invalid(self):
+        with pytest.raises(ValueError) as excinfo, tprof(nap, slow_threshold="fast"):
+            pass  # pragma: no cover
+
+        assert str(excinfo.value) == (
+            "Invalid duration 'fast', expected a number with unit ns, us, ms, or s."
+        )
+
+
+class TestConfigure:
+    def test_negative_threshold(self):
+        with pytest.raises(ValueError) as excinfo:
+            record.configure((), 0, None, False, -1)
+
+        assert str(excinfo.value) == "configure() slow threshold must be non-negative"
+
+    def test_callback_not_callable(self):
+        with pytest.raises(TypeError) as excinfo:
+            record.configure((), 0, None, False, 0, 1)  # type: ignore [arg-type]
+
+        assert str(excinfo.value) == (
+            "configure() slow callback must be callable or None"
+        )
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import sqlite3
+import subprocess
+from unittest import mock
+
+import pytest
+
+from tprof.api import FunctionStats
+from tprof.store import (
+    _git_sha,
+    _sparkline,
+    display_history,
+    find_changepoints,
+    load_history,
+    save_run,
+)
+
+
+def make_stats(name: str, median_ns: float, calls: int = 1) -> FunctionStats:
+    return FunctionStats(
+        name, calls, int(median_ns) * calls, 1, 2, median_ns, 0.0, kind="function"
+    )
+
+
+class TestSaveRun:
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "tprof.sqlite")
+
+        first = save_run(path, "one", [make_stats("a:f", 100.0)])
+        second = save_run(path, None, [make_stats("a:f", 200.0), make_stats("a:g", 5)])
+
+        assert second > first
+        entries = load_history(path, "a:f", 10)
+        assert [(e.run_id, e.label, e.median_ns) for e in entries] == [
+            (first, "one", 100.0),
+            (second, None, 200.0),
+        ]
+        assert entries[0].python_version
+        assert entries[0].hostname
+
+    def test_limit(self, tmp_path):
+        path = str(tmp_path / "tprof.sqlite")
+        for i in range(5):
+            save_run(path, None, [make_stats("a:f", float(i))])
+
+        entries = load_history(path, "a:f", 2)
+
+        assert [e.median_ns for e in entries] == [3.0, 4.0]
+
+    def test_skips_uncalled(self, tmp_path):
+        path = str(tmp_path / "tprof.sqlite")
+        save_run(path, None, [make_stats("a:f", 0.0, calls=0)])
+
+        assert load_history(path, "a:f", 10) == []
+
+    def test_uses_index(self, tmp_path):
+        path = str(tmp_path / "tprof.sqlite")
+        save_run(path, None, [make_stats("a:f", 1.0)])
+
+        connection = sqlite3.connect(path)
+        plan = connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM functions "
+            "WHERE name = ? ORDER BY run_id DESC LIMIT 1",
+            ("a:f",),
+        ).fetchall()
+        connection.close()
+
+        assert "functions_name_run_id" in str(plan)
+
+    def test_unsupported_schema(self, tmp_path):
+        path = str(tmp_path / "tprof.sqlite")
+        connection = sqlite3.connect(path)
+        connection.execute("PRAGMA user_version = 99")
+        connection.close()
+
+        with pytest.raises(ValueError) as excinfo:
+            load_history(path, "a:f", 10)
+
+        assert "unsupported schema version 99" in str(excinfo.value)
+
+    def test_not_database(self, tmp_path):
+        path = tmp_path / "tprof.sqlite"
+        path.write_text("not a database" * 10)
+
+        connections = []
+        connect = sqlite3.connect
+
+        def record_connect(path: str) -> sqlite3.Connection:
+            connections.append(connect(path))
+            return connections[-1]
+
+        with (
+            mock.patch.object(sqlite3, "connect", record_connect),
+            pytest.raises(sqlite3.DatabaseError),
+        ):
+            load_history(str(path), "a:f", 10)
+
+        # The connection is closed, so unusable.
+        with pytest.raises(sqlite3.ProgrammingError):
+            connections[0].execute("SELECT 1")
+
+
+class TestGitSha:
+    def test_in_repo(self):
+        with mock.patch.object(subprocess, "run") as run:
+            run.return_value.returncode = 0
+            run.return_value.stdout = "abc123\n"
+
+            assert _git_sha() == "abc123"
+
+    def test_not_repo(self):
+        with mock.patch.object(subprocess, "run") as run:
+            run.return_value.returncode = 128
+
+            assert _git_sha() is None
+
+    def test_no_git(self):
+        with mock.patch.object(subprocess, "run", side_effect=OSError):
+            assert _git_sha() is None
+
+
+class TestFindChangepoints:
+    def test_flat(self):
+        assert find_changepoints([100.0] * 20) == set()
+
+    def test_step(self):
+        values = [100.0, 101.0, 99.0, 100.0, 102.0, 150.0, 151.0, 149.0, 150.0]
+
+        assert find_changepoints(values) == {5}
+
+    def test_single_outlier(self):
+        values = [100.0, 101.0, 99.0, 300.0, 100.0, 102.0, 101.0]
+
+        assert find_changepoints(values) == set()
+
+    def test_multiple_steps(self):
+        values = [100.0] * 6 + [200.0] * 6 + [100.0] * 6
+
+        assert find_changepoints(values) == {6, 12}
+
+    def test_zero(self):
+        assert find_changepoints([0.0] * 6) == set()
+
+    def test_short(self):
+        assert find_changepoints([1.0, 100.0]) == set()
+
+
+class TestSparkline:
+    def test_flat(self):
+        assert _sparkline([5.0, 5.0]) == "▁▁"
+
+    def test_range(self):
+        assert _sparkline([0.0, 6.0, 14.0]) == "▁▄█"
+
+
+class TestDisplayHistory:
+    def test_entries(self, tmp_path, capsys):
+        path = str(tmp_path / "tprof.sqlite")
+        for median_ns in [100.0, 100.0, 100.0, 200.0, 200.0, 200.0]:
+            save_run(path, "lbl", [make_stats("a:f", median_ns)])
+
+        display_history("a:f", load_history(path, "a:f", 10))
+
+        out, err = capsys.readouterr()
+        errlines = err.splitlines()
+        assert errlines[0] == "🎯 tprof history for a:f:"
+        assert errlines[1] == "▁▁▁███"
+        assert errlines[2].split() == [
+            "run",
+            "date",
+            "label",
+            "git",
+            "python",
+            "host",
+            "calls",
+            "median",
+            "delta",
+        ]
+        assert len(errlines) == 9
+        assert errlines[3].rstrip().endswith(" -")
+        assert errlines[6].rstrip().endswith("+100.00% ◆ changepoint")
+        assert errlines[7].rstrip().endswith("+0.00%")
+
+    def test_empty(self, capsys):
+        display_history("a:f", [])
+
+        out, err = capsys.readouterr()
+        assert err.splitlines() == ["🎯 tprof history for a:f:", "No runs found."]
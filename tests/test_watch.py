@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from collections.abc import Iterator
+from contextlib import chdir
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+
+from tprof import watch as tprof_watch
+from tprof.main import main
+from tprof.watch import preimport, wait_for_change
+
+BENCH = """\
+import watchdep
+import watchhelper
+
+for _ in range(3):
+    watchhelper.work()
+"""
+
+HELPER = """\
+import time
+
+def work():
+    time.sleep({seconds})
+"""
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """
+    A project directory with a benchmark module, and an installed
+    dependency.
+    """
+    deps = tmp_path / "deps"
+    deps.mkdir()
+    (deps / "watchdep.py").write_text("")
+    monkeypatch.syspath_prepend(str(deps))
+    installed = tprof_watch._installed_paths()
+    monkeypatch.setattr(
+        tprof_watch, "_installed_paths", lambda: (*installed, f"{deps}{os.sep}")
+    )
+    directory = tmp_path / "project"
+    directory.mkdir()
+    (directory / "bench.py").write_text(BENCH)
+    (directory / "watchhelper.py").write_text(HELPER.format(seconds=0.001))
+    with chdir(directory):
+        yield directory
+    for name in ("watchdep", "watchhelper", "watchproject"):
+        sys.modules.pop(name, None)
+
+
+def stop_watching(*args: Any) -> None:
+    raise KeyboardInterrupt
+
+
+class TestMain:
+    def test_watch(self, project, capfd):
+        json_path = project / "tprof.json"
+        waits = []
+
+        def wait(paths: set[str], since_ns: int) -> None:
+            waits.append(set(paths))
+            if len(waits) == 2:
+                raise KeyboardInterrupt
+            (project / "watchhelper.py").write_text(HELPER.format(seconds=0.01))
+
+        with mock.patch.object(tprof_watch, "wait_for_change", wait):
+            result = main(
+                ["-t", "watchhelper:work", "--watch", "--json", str(json_path)]
+                + ["--format", "plain", "-m", "bench"]
+            )
+
+        assert result == 0
+        assert waits[0] == {
+            str(project / "bench.py"),
+            str(project / "watchhelper.py"),
+        }
+        # The dependency was imported in this process, for later runs, but
+        # project modules weren't.
+        assert "watchdep" in sys.modules
+        assert "watchhelper" not in sys.modules
+        (function_data,) = json.loads(json_path.read_text())["functions"]
+        assert function_data["calls"] == 3
+        assert function_data["median_ns"] >= 10_000_000
+        errlines = capfd.readouterr().err.splitlines()
+        assert errlines[0] == "🎯 tprof results:"
+        assert "delta" not in errlines[1]
+        assert errlines[3] == (
+            "tprof: Watching 2 files for changes, press Ctrl-C to stop."
+        )
+        # The second run is compared against the first.
+        assert errlines[4] == "🎯 tprof results:"
+        assert errlines[5].rstrip().endswith("delta")
+        assert errlines[6].rstrip().endswith("%")
+
+    def test_source_outside_cwd(self, project, monkeypatch, capfd):
+        # Run from a subdirectory, with the project's modules on sys.path.
+        monkeypatch.syspath_prepend(str(project))
+        benchmarks = project / "benchmarks"
+        benchmarks.mkdir()
+        (project / "bench.py").rename(benchmarks / "bench.py")
+        waits = []
+
+        def wait(paths: set[str], since_ns: int) -> None:
+            waits.append(set(paths))
+            raise KeyboardInterrupt
+
+        with chdir(benchmarks), mock.patch.object(tprof_watch, "wait_for_change", wait):
+            result = main(
+                ["-t", "watchhelper:work", "--watch", "--format", "none"]
+                + [str(benchmarks / "bench.py")]
+            )
+
+        assert result == 0
+        assert waits == [
+            {str(benchmarks / "bench.py"), str(project / "watchhelper.py")}
+        ]
+        assert "watchhelper" not in sys.modules
+
+    def test_nothing_to_watch(self, project, capfd):
+        with mock.patch.object(tprof_watch, "wait_for_change", stop_watching):
+            result = main(["-t", "time:sleep", "--watch", "-m", "watchdep"])
+
+        assert result == 1
+        assert capfd.readouterr().err.endswith(
+            "tprof: No source files to watch, as the program only imported "
+            "installed modules.\n"
+        )
+
+    def test_baseline(self, project, capfd):
+        baseline_path = project / "baseline.json"
+        baseline_path.write_text(
+            json.dumps(
+                {
+                    "version": 1,
+                    "label": None,
+                    "functions": [{"name": "watchhelper:work", "median_ns": 1000}],
+                }
+            )
+        )
+
+        with mock.patch.object(tprof_watch, "wait_for_change", stop_watching):
+            result = main(
+                ["-t", "watchhelper:work", "--watch", "--baseline", str(baseline_path)]
+                + ["--format", "plain", "-m", "bench"]
+            )
+
+        assert result == 0
+        errlines = capfd.readouterr().err.splitlines()
+        assert errlines[1].rstrip().endswith("delta")
+
+    def test_json_stdout(self, project, capfd):
+        with mock.patch.object(tprof_watch, "wait_for_change", stop_watching):
+            result = main(
+                ["-t", "watchhelper:work", "--watch", "--json", "-"]
+                + ["--format", "none", "-m", "bench"]
+            )
+
+        assert result == 0
+        (function_data,) = json.loads(capfd.readouterr().out)["functions"]
+        assert function_data["name"] == "watchhelper:work"
+
+    @pytest.mark.parametrize(
+        ("source", "message"),
+        [
+            ("raise ValueError('broken')\n", "ValueError: broken"),
+            ("raise SystemExit(3)\n", None),
+            ("raise SystemExit('Stopped')\n", "Stopped"),
+        ],
+    )
+    def test_run_fails(self, project, capfd, source, message):
+        (project / "bench.py").write_text(source)
+
+        with mock.patch.object(tprof_watch, "wait_for_change", stop_watching):
+            result = main(
+                ["-t", "watchhelper:work", "--watch", "--format", "plain"]
+                + ["-m", "bench"]
+            )
+
+        assert result == 0
+        err = capfd.readouterr().err
+        exit_code = 3 if message is None else 1
+        assert f"tprof: Run 1 failed with exit code {exit_code}.\n" in err
+        if message is not None:
+            assert f"{message}\n" in err
+        # The files imported so far are still watched, to run again once fixed.
+        assert "tprof: Watching 2 files for changes" in err
+
+    def test_watch_script(self, project, capfd):
+        (project / "run.py").write_text("import time\n\ntime.sleep(0.001)\n")
+
+        with mock.patch.object(tprof_watch, "wait_for_change", stop_watching):
+            result = main(
+                ["-t", "time:sleep", "--watch", "--format", "plain", "run.py"]
+            )
+
+        assert result == 0
+        errlines = capfd.readouterr().err.splitlines()
+        assert errlines[2].startswith(" time:sleep() ")
+        assert errlines[3] == (
+            "tprof: Watching 1 files for changes, press Ctrl-C to stop."
+        )
+
+    @pytest.mark.parametrize("option", [["--runs", "2"], ["-x"]])
+    def test_not_allowed_with(self, capsys, option):
+        with pytest.raises(SystemExit) as excinfo:
+            main(["-t", "lib:f", "--watch", *option, "example.py"])
+
+        assert excinfo.value.code == 2
+        assert (
+            f"argument --watch: not allowed with {option[0]}" in capsys.readouterr().err
+        )
+
+    def test_count_only(self, capsys):
+        with pytest.raises(SystemExit) as excinfo:
+            main(["--count-only", "lib", "--watch", "example.py"])
+
+        assert excinfo.value.code == 2
+        assert (
+            "argument --count-only: not allowed with --watch" in capsys.readouterr().err
+        )
+
+    def test_no_fork(self, monkeypatch, capsys):
+        monkeypatch.delattr(os, "fork")
+
+        with pytest.raises(SystemExit) as excinfo:
+            main(["-t", "lib:f", "--watch", "example.py"])
+
+        assert excinfo.value.code == 2
+        assert (
+            "argument --watch: not supported on this platform"
+            in capsys.readouterr().err
+        )
+
+
+class TestPreimport:
+    def test_preimport(self, project, monkeypatch):
+        # A dependency that imports project code, which must stay fresh.
+        monkeypatch.syspath_prepend(str(project))
+        (project / "watchproject.py").write_text("")
+        (project.parent / "deps" / "watchdep.py").write_text("import watchproject\n")
+
+        preimport(["watchdep", "nonexistent_mod", "watchdep.__main__"])
+
+        assert "watchdep" in sys.modules
+        assert "watchproject" not in sys.modules
+        assert "nonexistent_mod" not in sys.modules
+
+
+class TestWaitForChange:
+    def test_modified(self, tmp_path):
+        path = tmp_path / "example.py"
+        path.write_text("")
+        since_ns = path.stat().st_mtime_ns + 1
+        sleeps = []
+
+        def sleep(seconds: float) -> None:
+            sleeps.append(seconds)
+            os.utime(path, ns=(since_ns, since_ns))
+
+        with mock.patch("tprof.watch.time.sleep", sleep):
+            wait_for_change([str(path)], since_ns)
+
+        assert sleeps == [tprof_watch.WATCH_INTERVAL]
+
+    def test_modified_already(self, tmp_path):
+        path = tmp_path / "example.py"
+        path.write_text("")
+
+        wait_for_change([str(path)], 0)
+
+    def test_removed(self, tmp_path):
+        wait_for_change([str(tmp_path / "missing.py")], 0)